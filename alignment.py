@@ -0,0 +1,115 @@
+import numpy as np
+from structures import *
+
+'''
+As-of time join of series with different sampling, e.g. BTC lending rates (hourly, irregular) and altcoin 15 minute candles.
+
+Both series are expected to be sorted by timestamp in ascending order, so they are matched with a single merge
+(stable sort of two sorted runs is linear) rather than a search per timestamp.
+'''
+
+"""
+Constants
+"""
+PREVIOUS = "previous"
+LINEAR = "linear"
+NEAREST = "nearest"
+METHODS = (PREVIOUS, LINEAR, NEAREST)
+
+
+def asof_indices(left_timestamps, right_timestamps):
+	""" Finds for each left timestamp the index of the latest right timestamp which is less than or equal to it
+
+		Args:
+			left_timestamps - NumPy array of timestamps sorted in ascending order
+			right_timestamps - NumPy array of timestamps sorted in ascending order
+
+		Returns:
+			int64 NumPy array with an index into 'right_timestamps' per left timestamp, -1 where no right timestamp precedes the left one
+	"""
+	left_timestamps = np.asarray(left_timestamps)
+	right_timestamps = np.asarray(right_timestamps)
+	num_right = len(right_timestamps)
+	# right timestamps go first, so on ties stable sort places them before left ones and they count as preceding
+	order = np.argsort(np.concatenate((right_timestamps, left_timestamps)), kind="mergesort")
+	num_right_seen = np.cumsum(order < num_right)
+	is_left = order >= num_right
+	indices = np.empty(len(left_timestamps), dtype=np.int64)
+	indices[order[is_left] - num_right] = num_right_seen[is_left] - 1
+	return indices
+
+def asof_join(left_timestamps, right_timestamps, right_values, method=LINEAR, tolerance=None):
+	""" Aligns values sampled at 'right_timestamps' to 'left_timestamps'
+
+		Methods:
+			"previous" - latest right value at or before the left timestamp
+			"linear" - right value linearly interpolated between the right entries surrounding the left timestamp
+			"nearest" - right value closest in time to the left timestamp (earlier one on ties)
+
+		Args:
+			left_timestamps - NumPy array of timestamps to align values to, sorted in ascending order
+			right_timestamps - NumPy array of timestamps of the values, sorted in ascending order
+			right_values - NumPy array of values to align
+			method - one of "previous", "linear" or "nearest". Default value is "linear".
+			tolerance - maximum distance in seconds between a left timestamp and each right entry its value is derived from. Default value is None (no limit).
+
+		Returns:
+			float64 NumPy array of aligned values, NaN where no value could be aligned (outside of right series or beyond tolerance)
+	"""
+	if method not in METHODS:
+		raise ValueError("method should be one of: %s" % (", ".join(METHODS)))
+	left_timestamps = np.asarray(left_timestamps)
+	right_timestamps = np.asarray(right_timestamps)
+	right_values = np.asarray(right_values, dtype=np.float64)
+	if right_timestamps.shape != right_values.shape:
+		raise ValueError("right timestamps and values should have same length")
+	result = np.full(len(left_timestamps), np.nan)
+	if not len(right_timestamps) or not len(left_timestamps):
+		return result
+	prev_idx = asof_indices(left_timestamps, right_timestamps)
+	next_idx = prev_idx + 1
+	# an exact match doesn't need the next entry
+	exact = (prev_idx >= 0) & (right_timestamps[np.maximum(prev_idx, 0)] == left_timestamps)
+	next_idx[exact] = prev_idx[exact]
+	has_prev = prev_idx >= 0
+	has_next = next_idx < len(right_timestamps)
+	prev_clipped = np.clip(prev_idx, 0, len(right_timestamps) - 1)
+	next_clipped = np.clip(next_idx, 0, len(right_timestamps) - 1)
+	prev_gap = (left_timestamps - right_timestamps[prev_clipped]).astype(np.float64)
+	next_gap = (right_timestamps[next_clipped] - left_timestamps).astype(np.float64)
+	if tolerance is None:
+		prev_ok, next_ok = has_prev, has_next
+	else:
+		prev_ok = has_prev & (prev_gap <= tolerance)
+		next_ok = has_next & (next_gap <= tolerance)
+	if method == PREVIOUS:
+		result[prev_ok] = right_values[prev_clipped[prev_ok]]
+	elif method == NEAREST:
+		use_next = next_ok & (~prev_ok | (next_gap < prev_gap))
+		use_prev = prev_ok & ~use_next
+		result[use_prev] = right_values[prev_clipped[use_prev]]
+		result[use_next] = right_values[next_clipped[use_next]]
+	else:
+		both = prev_ok & next_ok
+		span = prev_gap[both] + next_gap[both]
+		weight = np.divide(prev_gap[both], span, out=np.zeros_like(span), where=span > 0)
+		prev_values = right_values[prev_clipped[both]]
+		result[both] = prev_values + weight * (right_values[next_clipped[both]] - prev_values)
+	return result
+
+def align_lending_to_prices(lending_series, price_series, method=LINEAR, tolerance=None):
+	""" Aligns lending rates to timestamps of price series and returns them as a single columnar frame
+
+		Args:
+			lending_series - LendingSeries sorted by timestamp in ascending order
+			price_series - PriceSeries sorted by timestamp in ascending order
+			method - one of "previous", "linear" or "nearest". Default value is "linear".
+			tolerance - maximum distance in seconds between a price timestamp and lending entries its lending rate is derived from. Default value is None (no limit).
+
+		Returns:
+			AlignedSeries with prices and lending rates (NaN if they couldn't be aligned) at the timestamps of 'price_series'
+	"""
+	if not isinstance(lending_series, LendingSeries): raise TypeError("lending series should be of type LendingSeries")
+	if not isinstance(price_series, PriceSeries): raise TypeError("price series should be of type PriceSeries")
+	lending_rates = asof_join(price_series.timestamps, lending_series.timestamps, lending_series.lending_rates, method, tolerance)
+	return AlignedSeries(price_series.ticker, price_series.timestamps, price_series.close_prices, price_series.volumes, lending_rates, lending_series.ticker)
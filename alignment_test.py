@@ -0,0 +1,59 @@
+import pytest
+import numpy as np
+import alignment
+from structures import *
+
+LENDING_TIMESTAMPS = np.array([1500000000, 1500003600, 1500007200, 1500018000])
+LENDING_RATES = np.array([1.0, 2.0, 4.0, 7.0])
+
+def test_asof_indices():
+	""" Tests whether 'asof_indices' finds the latest right timestamp at or before each left timestamp """
+	left = np.array([1499999000, 1500000000, 1500001800, 1500003600, 1500020000])
+	assert alignment.asof_indices(left, LENDING_TIMESTAMPS).tolist() == [-1, 0, 0, 1, 3]
+
+def test_asof_join_previous():
+	""" Tests whether 'asof_join' with "previous" method takes the latest value at or before each timestamp """
+	left = np.array([1499999000, 1500000900, 1500003600, 1500010000])
+	result = alignment.asof_join(left, LENDING_TIMESTAMPS, LENDING_RATES, alignment.PREVIOUS)
+	assert np.isnan(result[0])
+	assert result[1:].tolist() == [1.0, 2.0, 4.0]
+
+def test_asof_join_linear():
+	""" Tests whether 'asof_join' with "linear" method interpolates between surrounding values and leaves timestamps outside of the right series unaligned """
+	left = np.array([1500000900, 1500003600, 1500005400, 1500018000, 1500020000])
+	result = alignment.asof_join(left, LENDING_TIMESTAMPS, LENDING_RATES, alignment.LINEAR)
+	assert result[:4].tolist() == [1.25, 2.0, 3.0, 7.0]
+	assert np.isnan(result[4])
+
+def test_asof_join_nearest():
+	""" Tests whether 'asof_join' with "nearest" method takes the value closest in time """
+	left = np.array([1499999000, 1500000900, 1500003000, 1500020000])
+	result = alignment.asof_join(left, LENDING_TIMESTAMPS, LENDING_RATES, alignment.NEAREST)
+	assert result.tolist() == [1.0, 1.0, 2.0, 7.0]
+
+def test_asof_join_tolerance():
+	""" Tests whether 'asof_join' leaves timestamps unaligned if lending entries they would be derived from are further than 'tolerance' """
+	left = np.array([1500001800, 1500009000, 1500016200])
+	result = alignment.asof_join(left, LENDING_TIMESTAMPS, LENDING_RATES, alignment.LINEAR, tolerance=3600)
+	assert result[0] == 1.5
+	assert np.isnan(result[1]) and np.isnan(result[2])
+	result = alignment.asof_join(left, LENDING_TIMESTAMPS, LENDING_RATES, alignment.PREVIOUS, tolerance=3600)
+	assert result.tolist()[:2] == [1.0, 4.0] and np.isnan(result[2])
+
+def test_asof_join_invalid_method():
+	""" Tests whether 'asof_join' throws ValueError given unknown method """
+	with pytest.raises(ValueError):
+		alignment.asof_join(LENDING_TIMESTAMPS, LENDING_TIMESTAMPS, LENDING_RATES, "cubic")
+
+def test_align_lending_to_prices():
+	""" Tests whether 'align_lending_to_prices' returns AlignedSeries with prices and lending rates at price timestamps that can be sliced per interval """
+	lending_series = LendingSeries("BTC", LENDING_TIMESTAMPS, LENDING_RATES)
+	price_timestamps = np.arange(1500000000, 1500018001, 900)
+	price_series = PriceSeries("LTC", price_timestamps, np.linspace(1.0, 2.0, len(price_timestamps)), np.ones(len(price_timestamps)))
+	aligned = alignment.align_lending_to_prices(lending_series, price_series)
+	assert isinstance(aligned, AlignedSeries)
+	assert aligned.timestamps.tolist() == price_timestamps.tolist()
+	sliced = aligned.slice_by_time(1500003600, 1500007200)
+	assert sliced.lending_rates.tolist() == [2.0, 2.5, 3.0, 3.5, 4.0]
+	assert sliced.lending_series().ticker == "BTC"
+	assert sliced.price_series().close_prices.tolist() == sliced.close_prices.tolist()
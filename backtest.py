@@ -0,0 +1,170 @@
+import inspect
+import argparse
+import numpy as np
+import pandas as pd
+import lr_growing_altcoin as analysis
+from structures import *
+
+'''
+Backtesting of deal strategies against prices of target currencies.
+
+A pair of EnterDealStrategy and CloseDealStrategy subclasses defines a deal for each InterestInterval: the enter strategy picks the lending entry
+when target currency is bought, the close strategy picks the lending entry when it is sold. Strategies of a pair are evaluated for all intervals
+at once through their vectorized 'get_enter_indices' and 'get_close_indices' over a single IntervalBatch, deal prices of every target currency
+are then looked up with a binary search over its candles. A deal buys at the first close price at or after the enter time and sells at the last
+close price at or before the close time, deals without such prices are not made.
+'''
+
+"""
+Constants
+"""
+TRADE_COLUMNS = ["enter_strategy", "close_strategy", "ticker", "interval_start", "interval_end", "enter_time", "close_time", "enter_price", "exit_price", "return"]
+SUMMARY_COLUMNS = ["enter_strategy", "close_strategy", "ticker", "num_intervals", "num_trades", "hit_rate", "avg_return", "total_return", "max_drawdown"]
+DEFAULT_STRATEGY_PAIRS = [
+	(IntervalStartEnterDealStrategy, LrLessThanAvgCloseDealStrategy, dict()),
+	(IntervalStartEnterDealStrategy, LrFallsXPercentCloseDealStrategy, dict(fall_percent=10.0)),
+	(IntervalStartEnterDealStrategy, LrFallsXPeriodsCloseDealStrategy, dict(num_periods=3)),
+]
+
+
+def check_strategies(enter_strategy, close_strategy):
+	""" Raises TypeError unless given classes are EnterDealStrategy and CloseDealStrategy subclasses implementing their vectorized methods """
+	for strategy, base in ((enter_strategy, EnterDealStrategy), (close_strategy, CloseDealStrategy)):
+		if not (isinstance(strategy, type) and issubclass(strategy, base)):
+			raise TypeError("%r should be a subclass of %s" % (strategy, base.__name__))
+		if inspect.isabstract(strategy):
+			raise TypeError("%s doesn't implement %s" % (strategy.__name__, ", ".join(sorted(strategy.__abstractmethods__))))
+
+def get_deal_times(batch, enter_strategy, close_strategy, parameters=None):
+	""" Computes enter and close time of a deal for each interval of the batch
+
+	Note: a deal can't be closed before it is entered, close time is moved to the enter time in such case.
+
+	Args:
+		batch - IntervalBatch of InterestInterval instances
+		enter_strategy - EnterDealStrategy subclass
+		close_strategy - CloseDealStrategy subclass
+		parameters - dictionary of strategy parameters, e.g. {"fall_percent": 10.0}. Default value is None (no parameters).
+
+	Returns:
+		a tuple of two int64 NumPy arrays: enter times and close times, one element per interval
+	"""
+	check_strategies(enter_strategy, close_strategy)
+	parameters = parameters or dict()
+	enter_indices = enter_strategy.get_enter_indices(batch, **parameters)
+	close_indices = np.maximum(close_strategy.get_close_indices(batch, **parameters), enter_indices)
+	return batch.timestamps[enter_indices], batch.timestamps[close_indices]
+
+def get_deal_prices(enter_times, close_times, price_series):
+	""" Looks up prices of deals in the price series, all deals at once
+
+	Args:
+		enter_times - NumPy array of enter times
+		close_times - NumPy array of close times
+		price_series - PriceSeries sorted by timestamp in ascending order
+
+	Returns:
+		a tuple of two float64 NumPy arrays: enter prices and exit prices, NaN for deals without prices
+	"""
+	enter_idx = np.searchsorted(price_series.timestamps, enter_times, side="left")
+	exit_idx = np.searchsorted(price_series.timestamps, close_times, side="right") - 1
+	has_prices = (enter_idx < len(price_series)) & (exit_idx >= enter_idx)
+	enter_prices = np.full(len(enter_times), np.nan)
+	exit_prices = np.full(len(enter_times), np.nan)
+	enter_prices[has_prices] = price_series.close_prices[enter_idx[has_prices]]
+	exit_prices[has_prices] = price_series.close_prices[exit_idx[has_prices]]
+	return enter_prices, exit_prices
+
+def get_max_drawdown(returns):
+	""" Computes maximum drawdown of the equity curve obtained by reinvesting all capital into consecutive deals
+
+	Args:
+		returns - NumPy array of returns of deals in the order they were made
+
+	Returns:
+		the largest relative fall of equity from its preceding peak (initial capital counts as a peak), 0.0 if equity never fell
+	"""
+	if not len(returns):
+		return 0.0
+	equity = np.cumprod(1.0 + np.asarray(returns, dtype=np.float64))
+	peaks = np.maximum.accumulate(np.maximum(equity, 1.0))
+	return float(np.max(1.0 - equity / peaks))
+
+def summarize_returns(returns):
+	""" Summarizes returns of deals made in given order, NaN returns (deals that weren't made) are left out
+
+	Returns:
+		a dictionary with number of trades, hit rate (share of deals with positive return), average return, total compounded return and maximum drawdown
+	"""
+	returns = returns[~np.isnan(returns)]
+	num_trades = len(returns)
+	return {
+		"num_trades": num_trades,
+		"hit_rate": float(np.mean(returns > 0.0)) if num_trades else float("nan"),
+		"avg_return": float(np.mean(returns)) if num_trades else float("nan"),
+		"total_return": float(np.prod(1.0 + returns) - 1.0),
+		"max_drawdown": get_max_drawdown(returns),
+	}
+
+def run_backtest(interest_intervals, price_series, strategy_pairs=DEFAULT_STRATEGY_PAIRS, fee=0.0):
+	""" Evaluates strategy pairs over all InterestInterval instances against prices of all target currencies
+
+	Args:
+		interest_intervals - list of InterestInterval instances
+		price_series - list of PriceSeries, one per target currency
+		strategy_pairs - list of (EnterDealStrategy subclass, CloseDealStrategy subclass, parameters dictionary) tuples. Default value is DEFAULT_STRATEGY_PAIRS.
+		fee - fraction of deal value paid when entering and again when closing a deal. Default value is 0.0.
+
+	Returns:
+		a tuple of two Pandas dataframes: deals (see TRADE_COLUMNS, one row per strategy pair, target currency and interval) and
+		summary (see SUMMARY_COLUMNS, one row per strategy pair and target currency)
+	"""
+	if not 0.0 <= fee < 1.0: raise ValueError("fee should be in range [0.0, 1.0)")
+	# all pairs are checked before any of them is evaluated
+	for pair in strategy_pairs:
+		check_strategies(pair[0], pair[1])
+	# deals are made one after another, so intervals are ordered by time
+	intervals = sorted(interest_intervals, key=lambda interval: interval.start_date)
+	batch = IntervalBatch(intervals)
+	interval_starts = np.array([interval.start_date for interval in intervals], dtype=np.int64)
+	interval_ends = np.array([interval.end_date for interval in intervals], dtype=np.int64)
+	trades = list()
+	summary = list()
+	for pair in strategy_pairs:
+		enter_strategy, close_strategy = pair[0], pair[1]
+		parameters = pair[2] if len(pair) > 2 else dict()
+		enter_times, close_times = get_deal_times(batch, enter_strategy, close_strategy, parameters)
+		for series in price_series:
+			enter_prices, exit_prices = get_deal_prices(enter_times, close_times, series)
+			returns = exit_prices * (1.0 - fee) / (enter_prices * (1.0 + fee)) - 1.0
+			trades.append(pd.DataFrame({
+				"enter_strategy": enter_strategy.__name__, "close_strategy": close_strategy.__name__, "ticker": series.ticker,
+				"interval_start": interval_starts, "interval_end": interval_ends, "enter_time": enter_times, "close_time": close_times,
+				"enter_price": enter_prices, "exit_price": exit_prices, "return": returns}, columns=TRADE_COLUMNS))
+			row = dict(enter_strategy=enter_strategy.__name__, close_strategy=close_strategy.__name__, ticker=series.ticker, num_intervals=len(intervals))
+			row.update(summarize_returns(returns))
+			summary.append(row)
+	trades = pd.concat(trades, ignore_index=True) if trades else pd.DataFrame(columns=TRADE_COLUMNS)
+	return trades, pd.DataFrame(summary, columns=SUMMARY_COLUMNS)
+
+def main():
+	parser = argparse.ArgumentParser(description="Backtest of deal strategies over BTC lending rate interest intervals against target currency prices")
+	parser.add_argument("--duration", type=int, default=analysis.TEN_DAYS, help="duration of lending intervals, in seconds")
+	parser.add_argument("--min-num-tickers", type=int, default=10, help="minimum number of entries within interest interval")
+	parser.add_argument("--period", type=float, nargs=2, default=(1480530600.0, 1507062600.0), help="period start and end")
+	parser.add_argument("--tickers", nargs="+", help="target currency tickers, all tickers in data directory by default")
+	parser.add_argument("--fee", type=float, default=0.0, help="fraction of deal value paid on enter and on close")
+	parser.add_argument("--output", help=".csv file to write the deals to")
+	args = parser.parse_args()
+	period_start, period_end = args.period
+	lending_series = analysis.load_lending_series(period_start, period_end)
+	growing, not_growing = analysis.get_interest_intervals(analysis.generate_lending_intervals(args.duration, lending_series), args.min_num_tickers)
+	tickers = args.tickers or analysis.get_target_tickers()
+	price_series = [analysis.load_price_series(ticker, period_start, period_end) for ticker in tickers]
+	trades, summary = run_backtest(growing, price_series, fee=args.fee)
+	if args.output:
+		trades.to_csv(args.output, index=False)
+	print(summary.to_string())
+
+if __name__ == "__main__":
+	main()
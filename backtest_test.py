@@ -0,0 +1,62 @@
+import pytest
+import numpy as np
+import backtest
+from sample_data import make_interest_interval, make_price_series
+from structures import *
+
+def test_max_drawdown():
+	""" Tests whether maximum drawdown measures the largest fall of compounded equity from its peak """
+	assert backtest.get_max_drawdown(np.array([])) == 0.0
+	assert backtest.get_max_drawdown(np.array([0.1, 0.2])) == 0.0
+	# equity: 1.0 -> 2.0 -> 1.0 -> 1.5, drawdown from 2.0 to 1.0
+	assert backtest.get_max_drawdown(np.array([1.0, -0.5, 0.5])) == pytest.approx(0.5)
+	assert backtest.get_max_drawdown(np.array([-0.2])) == pytest.approx(0.2)
+
+def test_deal_prices_outside_series():
+	""" Tests whether deals without prices between enter and close time get NaN prices """
+	prices = make_price_series("ETH", [1.0, 2.0, 3.0])
+	enter_prices, exit_prices = backtest.get_deal_prices(np.array([1500000000, 1500001000, 1500010000]), np.array([1500007200, 1500003000, 1500020000]), prices)
+	assert enter_prices[0] == 1.0 and exit_prices[0] == 3.0
+	assert np.isnan(enter_prices[1:]).all() and np.isnan(exit_prices[1:]).all()
+
+def test_run_backtest():
+	""" Tests whether strategy pairs are evaluated for all intervals and target currencies with correct prices, returns and summary """
+	# lending rate falls below average of the first interval at its third entry, of the second interval at its second entry
+	intervals = [make_interest_interval([2.0, 4.0, 1.0, 1.0], 1500000000 + 5 * 3600), make_interest_interval([3.0, 1.0, 2.0], 1500000000)]
+	prices = [make_price_series("ETH", np.arange(10, dtype=np.float64) + 1.0), make_price_series("LTC", np.arange(10, 0, -1, dtype=np.float64))]
+	trades, summary = backtest.run_backtest(intervals, prices, [(IntervalStartEnterDealStrategy, LrLessThanAvgCloseDealStrategy, dict())])
+	assert len(trades) == 4 and len(summary) == 2
+	eth = trades[trades.ticker == "ETH"]
+	# intervals are traded in order of time
+	assert eth.interval_start.tolist() == [1500000000, 1500000000 + 5 * 3600]
+	assert eth.enter_price.tolist() == [1.0, 6.0]
+	assert eth.exit_price.tolist() == [2.0, 8.0]
+	assert eth["return"].tolist() == pytest.approx([1.0, 1.0 / 3.0])
+	eth_summary = summary[summary.ticker == "ETH"].iloc[0]
+	assert eth_summary.num_trades == 2 and eth_summary.hit_rate == 1.0
+	assert eth_summary.total_return == pytest.approx(2.0 * 4.0 / 3.0 - 1.0)
+	ltc_summary = summary[summary.ticker == "LTC"].iloc[0]
+	assert ltc_summary.hit_rate == 0.0
+	assert ltc_summary.max_drawdown == pytest.approx(1.0 - (9.0 / 10.0) * (3.0 / 5.0))
+
+def test_run_backtest_fee():
+	""" Tests whether fee is paid both when entering and when closing a deal """
+	intervals = [make_interest_interval([3.0, 1.0], 1500000000)]
+	trades, summary = backtest.run_backtest(intervals, [make_price_series("ETH", [1.0, 1.0])], [(IntervalStartEnterDealStrategy, LrLessThanAvgCloseDealStrategy)], fee=0.01)
+	assert trades["return"].iloc[0] == pytest.approx(0.99 / 1.01 - 1.0)
+	with pytest.raises(ValueError):
+		backtest.run_backtest(intervals, list(), fee=1.0)
+
+def test_run_backtest_rejects_incomplete_strategy():
+	""" Tests whether a close strategy not implementing 'get_close_indices' is rejected before any strategy pair is evaluated """
+	class IncompleteCloseDealStrategy(CloseDealStrategy):
+		pass
+
+	intervals = [make_interest_interval([2.0, 4.0, 1.0], 1500000000)]
+	pairs = [(IntervalStartEnterDealStrategy, LrLessThanAvgCloseDealStrategy, dict()), (IntervalStartEnterDealStrategy, IncompleteCloseDealStrategy, dict())]
+	with pytest.raises(TypeError):
+		backtest.run_backtest(intervals, [make_price_series("ETH", [1.0, 2.0, 3.0])], pairs)
+	with pytest.raises(TypeError):
+		IncompleteCloseDealStrategy(intervals[0])
+	with pytest.raises(TypeError):
+		backtest.run_backtest(intervals, [], [(LrLessThanAvgCloseDealStrategy, IntervalStartEnterDealStrategy, dict())])
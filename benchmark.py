@@ -0,0 +1,237 @@
+import os
+import gc
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+import numpy as np
+import pandas as pd
+import utils
+import ticker_cache
+import alignment
+import synthetic
+import lr_growing_altcoin as analysis
+
+'''
+Benchmarks of the analysis pipeline at growing data sizes.
+
+Each stage of the pipeline (loading, conversion to entries and series, bucketing, interest interval discovery, alignment of prices
+and the end-to-end flow of 'main' without the report) is timed and, in a separate pass, memory-profiled with tracemalloc, since tracing
+slows allocations down and would distort timings. Stages run on synthetic data files of requested sizes as well as on the real files in 'data'.
+Results are written as JSON together with the commit they were measured at, so runs of different commits can be compared with '--compare'.
+
+Note: stages creating an object per row (get_ticker_data, df_rows_to_*_entries) are skipped above 'max_object_rows' rows, where they would
+need gigabytes of memory.
+'''
+
+"""
+Constants
+"""
+DEFAULT_SIZES = [10000, 100000, 1000000]
+# largest number of rows for stages which create a Python object per row
+MAX_OBJECT_ROWS = 1000000
+SYNTHETIC = "synthetic"
+REAL = "real"
+TICK_SECONDS = 900
+SYNTHETIC_START = 1480530600
+SYNTHETIC_TICKER = "SYN"
+REAL_TICKER = "LTC"
+RESULT_FIELDS = ["dataset", "size", "stage", "seconds", "cpu_seconds", "peak_memory_bytes", "skipped"]
+
+
+def write_synthetic_files(data_dir, size, seed=0):
+	""" Writes BTC lending rates and target currency candles of 'size' rows each into 'data_dir', spaced by 15 minutes
+
+		Args:
+			data_dir - directory of the files
+			size - number of rows of each file
+			seed - seed of the random generator. Default value is 0.
+
+		Returns:
+			a tuple of paths to the lending rates file and to the candles file
+	"""
+	rng = synthetic.get_rng(seed)
+	lending_path = os.path.join(data_dir, "synthetic_lending_rates.csv")
+	price_path = os.path.join(data_dir, SYNTHETIC_TICKER.lower() + analysis.TARGET_DATA_SUFFIX)
+	synthetic.write_csv(lending_path, *synthetic.generate_lending_columns(size, SYNTHETIC_START, TICK_SECONDS, rng))
+	synthetic.write_csv(price_path, *synthetic.generate_candle_columns(size, SYNTHETIC_START, TICK_SECONDS, rng))
+	return lending_path, price_path
+
+def _remove_cache(path):
+	for cache_path in ticker_cache.get_cache_paths(path):
+		if os.path.exists(cache_path):
+			os.remove(cache_path)
+
+def measure(func, trace_memory):
+	""" Runs 'func' and measures wall time, CPU time and, if 'trace_memory' is set, peak of memory allocated during the run
+
+		Returns:
+			a tuple of the value returned by 'func' and a dictionary with the measurements
+	"""
+	gc.collect()
+	if trace_memory:
+		tracemalloc.start()
+	wall_start, cpu_start = time.perf_counter(), time.process_time()
+	value = func()
+	measurement = {"seconds": time.perf_counter() - wall_start, "cpu_seconds": time.process_time() - cpu_start, "peak_memory_bytes": None}
+	if trace_memory:
+		measurement["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+		tracemalloc.stop()
+	return value, measurement
+
+def run_stages(lending_path, price_path, ticker, trace_memory=False, max_object_rows=MAX_OBJECT_ROWS):
+	""" Runs every stage of the pipeline on given files once
+
+		Args:
+			lending_path - path to BTC lending rates file
+			price_path - path to candles file of the target currency
+			ticker - target currency ticker
+			trace_memory - if True, peak memory of each stage is measured. Default value is False.
+			max_object_rows - stages creating an object per row are skipped for larger files. Default value is MAX_OBJECT_ROWS.
+
+		Returns:
+			a tuple of number of lending rate rows and a list of dictionaries, one per stage, with 'stage', 'skipped' and measurements (see 'measure')
+	"""
+	results = list()
+
+	def run(stage, func, skip=False):
+		if skip:
+			results.append({"stage": stage, "skipped": True, "seconds": None, "cpu_seconds": None, "peak_memory_bytes": None})
+			return None
+		value, measurement = measure(func, trace_memory)
+		measurement.update(stage=stage, skipped=False)
+		results.append(measurement)
+		return value
+
+	_remove_cache(lending_path)
+	names, columns = ticker_cache.load_columns(lending_path)
+	period_start, period_end = int(columns[0][0]), int(columns[0][-1])
+	num_rows = len(columns[0])
+	_remove_cache(lending_path)
+	objects_skipped = num_rows > max_object_rows
+	run("get_ticker_columns (cold cache)", lambda: utils.get_ticker_columns(lending_path, period_start, period_end))
+	lending_columns = run("get_ticker_columns (warm cache)", lambda: utils.get_ticker_columns(lending_path, period_start, period_end))
+	price_columns = utils.get_ticker_columns(price_path, period_start, period_end)
+	lending_rows = run("get_ticker_data", lambda: utils.get_ticker_data(lending_path, period_start, period_end), objects_skipped)
+	price_rows = None if objects_skipped else utils.get_ticker_data(price_path, period_start, period_end)
+	run("df_rows_to_lending_entries", lambda: utils.df_rows_to_lending_entries("BTC", lending_rows, analysis.LENDING_RATE_IDX), objects_skipped)
+	run("df_rows_to_interest_entries", lambda: utils.df_rows_to_interest_entries(ticker, price_rows, analysis.CLOSE_PRICE_IDX, analysis.VOLUME_IDX), objects_skipped)
+	del lending_rows, price_rows
+	lending_series = run("columns_to_lending_series", lambda: utils.columns_to_lending_series("BTC", lending_columns, analysis.LENDING_RATE_IDX))
+	price_series = utils.columns_to_price_series(ticker, price_columns, analysis.CLOSE_PRICE_IDX, analysis.VOLUME_IDX)
+	lending_intervals = run("generate_lending_intervals", lambda: analysis.generate_lending_intervals(analysis.TEN_DAYS, lending_series))
+	growing, not_growing = run("get_interest_intervals", lambda: analysis.get_interest_intervals(lending_intervals))
+
+	def set_all_interest_entries():
+		aligned = alignment.align_lending_to_prices(lending_series, price_series, alignment.LINEAR, analysis.MAX_LENDING_GAP)
+		return [analysis.set_interest_entries(interval, aligned) for interval in growing + not_growing]
+
+	run("set_interest_entries", set_all_interest_entries)
+
+	# the report is left out
+	run("main", lambda: analysis.run_analysis(ticker, period_start, period_end, lending_path, price_path))
+	return num_rows, results
+
+def benchmark_dataset(dataset, lending_path, price_path, ticker, size, trace_memory=True, max_object_rows=MAX_OBJECT_ROWS):
+	""" Runs stages of the pipeline on a dataset, a timing pass followed by a memory pass if 'trace_memory' is set
+
+		Returns:
+			list of result dictionaries, see RESULT_FIELDS
+	"""
+	num_rows, results = run_stages(lending_path, price_path, ticker, False, max_object_rows)
+	if trace_memory:
+		num_rows, memory_results = run_stages(lending_path, price_path, ticker, True, max_object_rows)
+		for result, memory_result in zip(results, memory_results):
+			result["peak_memory_bytes"] = memory_result["peak_memory_bytes"]
+	for result in results:
+		result.update(dataset=dataset, size=size if size is not None else num_rows)
+	return [dict((field, result[field]) for field in RESULT_FIELDS) for result in results]
+
+def get_commit():
+	""" Returns hash of the current git commit, None outside of a git repository """
+	try:
+		return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL).decode().strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+def run_benchmarks(sizes=DEFAULT_SIZES, datasets=(SYNTHETIC, REAL), trace_memory=True, max_object_rows=MAX_OBJECT_ROWS, seed=0, progress=None):
+	""" Runs benchmarks of the pipeline on synthetic data of each size and on the real data files
+
+		Args:
+			sizes - numbers of rows of synthetic data files. Default value is DEFAULT_SIZES.
+			datasets - datasets to run: "synthetic" and/or "real". Default value is both.
+			trace_memory - if True, peak memory of each stage is measured in a second pass. Default value is True.
+			max_object_rows - stages creating an object per row are skipped for larger files. Default value is MAX_OBJECT_ROWS.
+			seed - seed of synthetic data. Default value is 0.
+			progress - callable taking a message, or None
+
+		Returns:
+			a dictionary with metadata of the run (commit, versions, time) and a list of results, see RESULT_FIELDS
+	"""
+	results = list()
+	if SYNTHETIC in datasets:
+		for size in sizes:
+			data_dir = tempfile.mkdtemp(prefix="benchmark_")
+			try:
+				if progress:
+					progress("synthetic data of %d rows" % (size))
+				lending_path, price_path = write_synthetic_files(data_dir, size, seed)
+				results.extend(benchmark_dataset(SYNTHETIC, lending_path, price_path, SYNTHETIC_TICKER, size, trace_memory, max_object_rows))
+			finally:
+				shutil.rmtree(data_dir)
+	if REAL in datasets:
+		if progress:
+			progress("real data")
+		results.extend(benchmark_dataset(REAL, analysis.BTC_LENDING_DATA, analysis.get_target_data_path(REAL_TICKER), REAL_TICKER, None, trace_memory, max_object_rows))
+	return {
+		"commit": get_commit(),
+		"created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+		"python": platform.python_version(),
+		"numpy": np.__version__,
+		"pandas": pd.__version__,
+		"machine": platform.machine(),
+		"results": results,
+	}
+
+def compare_results(old, new):
+	""" Compares two benchmark runs stage by stage
+
+		Args:
+			old - dictionary returned by 'run_benchmarks' (or loaded from its JSON file) of the baseline run
+			new - dictionary of the compared run
+
+		Returns:
+			Pandas dataframe with time and peak memory of both runs and their ratios (new / old) for stages present in both
+	"""
+	key = ["dataset", "size", "stage"]
+	old_results = pd.DataFrame(old["results"], columns=RESULT_FIELDS)
+	new_results = pd.DataFrame(new["results"], columns=RESULT_FIELDS)
+	merged = old_results[key + ["seconds", "peak_memory_bytes"]].merge(new_results[key + ["seconds", "peak_memory_bytes"]], on=key, suffixes=("_old", "_new"))
+	merged["time_ratio"] = merged["seconds_new"] / merged["seconds_old"]
+	merged["memory_ratio"] = merged["peak_memory_bytes_new"].astype(float) / merged["peak_memory_bytes_old"].astype(float)
+	return merged
+
+def main():
+	parser = argparse.ArgumentParser(description="Benchmarks of the analysis pipeline")
+	parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="numbers of rows of synthetic data, e.g. 10000 100000 1000000 10000000")
+	parser.add_argument("--datasets", nargs="+", choices=[SYNTHETIC, REAL], default=[SYNTHETIC, REAL], help="datasets to run")
+	parser.add_argument("--no-memory", action="store_true", help="skip the memory profiling pass")
+	parser.add_argument("--max-object-rows", type=int, default=MAX_OBJECT_ROWS, help="skip stages creating an object per row above this number of rows")
+	parser.add_argument("--output", default="benchmark.json", help="JSON file to write the results to")
+	parser.add_argument("--compare", help="JSON file of a previous run to compare the results with")
+	args = parser.parse_args()
+	run = run_benchmarks(args.sizes, args.datasets, not args.no_memory, args.max_object_rows, progress=lambda message: sys.stderr.write("benchmarking %s...\n" % (message)))
+	with open(args.output, "w") as f:
+		json.dump(run, f, indent=1)
+	print(pd.DataFrame(run["results"], columns=RESULT_FIELDS).to_string(index=False))
+	if args.compare:
+		with open(args.compare, "r") as f:
+			print(compare_results(json.load(f), run).to_string(index=False))
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,34 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+import benchmark
+
+def test_synthetic_files(tmpdir):
+	""" Tests whether synthetic files have the layout of real data files, timestamps spaced evenly and positive lending rates """
+	lending_path, price_path = benchmark.write_synthetic_files(str(tmpdir), 500, seed=1)
+	lending = pd.read_csv(lending_path)
+	prices = pd.read_csv(price_path)
+	assert list(lending.columns) == ["timestamp", "amount_lent", "amount_used", "rate"]
+	assert list(prices.columns) == ["timestamp", "open_price", "close_price", "high", "low", "volume"]
+	assert len(lending) == len(prices) == 500
+	assert (np.diff(lending["timestamp"].values) == benchmark.TICK_SECONDS).all()
+	assert (lending["rate"] > 0).all()
+	assert os.path.basename(price_path).startswith(benchmark.SYNTHETIC_TICKER.lower())
+
+def test_run_and_compare_benchmarks(tmpdir):
+	""" Tests whether every stage is measured, object stages are skipped above the limit and two runs are compared stage by stage """
+	run = benchmark.run_benchmarks([1000, 3000], [benchmark.SYNTHETIC], trace_memory=True, max_object_rows=2000)
+	results = run["results"]
+	assert json.loads(json.dumps(run))["results"] == results
+	assert set(results[0]) == set(benchmark.RESULT_FIELDS)
+	stages = [result["stage"] for result in results if result["size"] == 1000]
+	assert "main" in stages and "get_interest_intervals" in stages and len(stages) * 2 == len(results)
+	for result in results:
+		skipped = result["size"] == 3000 and result["stage"] in ("get_ticker_data", "df_rows_to_lending_entries", "df_rows_to_interest_entries")
+		assert result["skipped"] == skipped
+		if not skipped:
+			assert result["seconds"] >= 0.0 and result["peak_memory_bytes"] > 0
+	comparison = benchmark.compare_results(run, run)
+	assert len(comparison) == len(results)
+	assert (comparison["time_ratio"].dropna() == 1.0).all()
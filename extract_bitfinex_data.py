@@ -1,34 +1,360 @@
 import pandas as pd
 import time
-import sys
+import os
+import random
+import shutil
+import asyncio
+import argparse
+import aiohttp
 import numpy as np
+import ticker_cache
+
+'''
+Downloads 15 minute candles of altcoin/BTC pairs from Bitfinex into .csv files in the format of 'data' directory.
+
+'backfill' downloads many tickers concurrently with asyncio:
+the requested period is split into windows of at most 'PAGE_LIMIT' candles, so all pages are known up front and fetched in parallel
+over a pool of HTTP connections. All requests share a token bucket limiter tuned to the exchange limit for candles, failed requests
+(connection errors, timeouts, "429 Too Many Requests" and server errors) are retried with exponential backoff. A page which fails
+all its retries doesn't discard the others: pages adjacent to the data already on disk are written before the failure is raised,
+so that a later incremental run resumes from them.
+The endpoint is configurable, so the extractor can be run against a local stand-in server.
+
+'sync_ticker' (or 'backfill' with 'incremental' set) updates existing files incrementally: time range already on disk is read from the first and the last line of the file
+(no full parse), only the missing periods before and after it are fetched and, in the usual case of new candles after the end of
+an ascending file, they are appended to a copy of the file which then replaces it. Files written by earlier versions of this script
+(newest first, without header, possibly with duplicates) are converted to the ascending deduplicated format once.
+Note: gaps inside the covered range are not looked for, since the exchange has no candles for periods without trades anyway.
+'''
+
+"""
+Constants
+"""
+BASE_URL = "https://api.bitfinex.com"
+CANDLES_PATH = "/v2/candles/trade:%s:t%sBTC/hist"
+TIMEFRAME = "15m"
+# duration of a candle of each timeframe, in milliseconds
+CANDLE_DURATIONS = {"1m": 60000, "5m": 300000, "15m": 900000, "30m": 1800000, "1h": 3600000, "3h": 10800000, "6h": 21600000, "12h": 43200000, "1D": 86400000}
+PAGE_LIMIT = 1000
+# Bitfinex allows 30 requests per minute to candles endpoint
+REQUESTS_PER_MINUTE = 30
+MAX_CONNECTIONS = 8
+MAX_RETRIES = 5
+# delay before the first retry in seconds, doubled on each next retry
+BACKOFF_BASE = 2.0
+REQUEST_TIMEOUT = 30
+CSV_COLUMNS = ["timestamp", "open_price", "close_price", "high", "low", "volume"]
+
+class RetryableResponse(Exception): pass
 
-URL = "https://api.bitfinex.com/v2/candles/trade:15m:t%sBTC/hist?limit=1000&start=%d&end=%d"
-
-def extract_bitfinex_data(ticker, period_start, period_end, filename):
-	file = open(filename, 'a')
-	while period_end > period_start:
-		print("Getting the data between %s and %s..." % (period_start, period_end))
-		df = pd.read_json(URL % (ticker, period_start, period_end))
-		if df.empty:
-			break
-		period_end = df[0][len(df[0])-1]- 900000
-		for i in range(0, len(df[0])):
-			timestamp = df[0][i]
-			df.set_value(i,0,bitfinex_timestamp_to_unix(timestamp))
-		df.to_csv(file, index=False, header=False)
-		time.sleep(60)
-	file.close()
 
 def bitfinex_timestamp_to_unix(timestamp):
-	return timestamp/np.int64(1000)
+	""" Converts Bitfinex timestamps (milliseconds) to Unix timestamps (seconds), works on a single value as well as on a NumPy array """
+	return np.asarray(timestamp, dtype=np.int64) // np.int64(1000)
+
+'''
+Token bucket shared by concurrent requests: tokens are refilled at 'rate' per second up to 'capacity', each request takes one token
+'''
+class TokenBucket(object):
+
+	def __init__(self, rate, capacity=1, clock=time.monotonic):
+		if rate <= 0: raise ValueError("rate should be positive")
+		if capacity < 1: raise ValueError("capacity should be at least 1")
+		self.rate = float(rate)
+		self.capacity = float(capacity)
+		self.clock = clock
+		self.tokens = float(capacity)
+		self.updated = clock()
+		self._lock = None
+
+	def _refill(self):
+		now = self.clock()
+		self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+		self.updated = now
+
+	async def acquire(self):
+		""" Waits until a token is available and takes it """
+		if self._lock is None:
+			self._lock = asyncio.Lock()
+		# requests are served in order of arrival, the lock is held while waiting for the refill
+		async with self._lock:
+			self._refill()
+			while self.tokens < 1.0:
+				await asyncio.sleep((1.0 - self.tokens) / self.rate)
+				self._refill()
+			self.tokens -= 1.0
+
+	def penalize(self, delay):
+		""" Holds all requests back for 'delay' seconds, e.g. once the exchange reports that the limit was exceeded
+
+		Penalties of concurrent requests don't add up: requests which failed at the same time hold the bucket back for the longest of their delays.
+		"""
+		self._refill()
+		self.tokens = min(self.tokens, -delay * self.rate)
+
+def get_page_windows(period_start, period_end, timeframe=TIMEFRAME, limit=PAGE_LIMIT):
+	""" Splits the period into windows containing at most 'limit' candles each
+
+	Args:
+		period_start - start of the period, Bitfinex timestamp in milliseconds
+		period_end - end of the period (inclusive), Bitfinex timestamp in milliseconds
+		timeframe - timeframe of candles. Default value is "15m".
+		limit - maximum number of candles returned by a single request. Default value is 1000.
+
+	Returns:
+		list of (start, end) pairs, ends are inclusive
+	"""
+	if timeframe not in CANDLE_DURATIONS: raise ValueError("timeframe should be one of: %s" % (", ".join(sorted(CANDLE_DURATIONS))))
+	span = CANDLE_DURATIONS[timeframe] * limit
+	starts = np.arange(period_start, period_end + 1, span, dtype=np.int64)
+	ends = np.minimum(starts + span - 1, period_end)
+	return list(zip(starts.tolist(), ends.tolist()))
+
+async def fetch_candles(session, limiter, url, params, max_retries=MAX_RETRIES, backoff_base=BACKOFF_BASE):
+	""" Fetches a single page of candles, retrying failed requests with exponential backoff
+
+	Args:
+		session - aiohttp.ClientSession
+		limiter - TokenBucket shared by all requests
+		url - URL of the candles endpoint
+		params - dictionary of query parameters
+		max_retries - maximum number of retries. Default value is 5.
+		backoff_base - delay before the first retry in seconds, doubled on each next retry. Default value is 2.0.
+
+	Returns:
+		list of candles, each candle is a list [timestamp (ms), open, close, high, low, volume]
+	"""
+	for attempt in range(max_retries + 1):
+		await limiter.acquire()
+		try:
+			async with session.get(url, params=params) as response:
+				if response.status == 429 or response.status >= 500:
+					raise RetryableResponse("HTTP %d" % (response.status))
+				response.raise_for_status()
+				candles = await response.json(content_type=None)
+			# errors such as exceeded rate limit may come as ["error", code, message] with status 200
+			if candles and candles[0] == "error":
+				raise RetryableResponse(" ".join(str(field) for field in candles))
+			return candles
+		except (RetryableResponse, aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) as e:
+			if attempt == max_retries:
+				raise IOError("failed to fetch %s %s after %d attempts: %s" % (url, params, max_retries + 1, e))
+			delay = backoff_base * 2 ** attempt * random.uniform(0.5, 1.0)
+			if isinstance(e, RetryableResponse):
+				# the exchange is overloaded or the limit was exceeded, hold back all requests rather than just this one
+				limiter.penalize(delay)
+			await asyncio.sleep(delay)
+
+def candles_to_frame(pages):
+	""" Converts pages of candles into a dataframe in the format of 'data' directory
+
+	Timestamps are converted from milliseconds to seconds in a single vectorized operation, candles are deduplicated and sorted by timestamp in ascending order.
+
+	Args:
+		pages - list of lists of candles as returned by 'fetch_candles'
+
+	Returns:
+		Pandas dataframe with CSV_COLUMNS
+	"""
+	rows = [candle for page in pages for candle in page]
+	values = np.array(rows, dtype=np.float64).reshape(len(rows), len(CSV_COLUMNS))
+	df = pd.DataFrame(values, columns=CSV_COLUMNS)
+	df["timestamp"] = bitfinex_timestamp_to_unix(values[:, 0])
+	return df.drop_duplicates("timestamp", keep="last").sort_values("timestamp", kind="mergesort").reset_index(drop=True)
+
+async def backfill_ticker(session, limiter, ticker, period_start, period_end, filename, base_url=BASE_URL, timeframe=TIMEFRAME, **retry_args):
+	""" Downloads candles of a single ticker for the whole period, pages are fetched concurrently
+
+	Args:
+		session - aiohttp.ClientSession
+		limiter - TokenBucket shared by all requests
+		ticker - altcoin ticker, e.g. "LTC"
+		period_start - start of the period, Bitfinex timestamp in milliseconds
+		period_end - end of the period (inclusive), Bitfinex timestamp in milliseconds
+		filename - path to the resulting .csv file, it is overwritten. If a page fails, the pages before it are written and the file is left
+			as is if there are none.
+		base_url - base URL of the exchange API. Default value is BASE_URL.
+		timeframe - timeframe of candles. Default value is "15m".
+		retry_args - 'max_retries' and 'backoff_base', see 'fetch_candles'
+
+	Returns:
+		number of candles written to the file
+	"""
+	pages = await _fetch_pages(session, limiter, ticker, get_page_windows(period_start, period_end, timeframe), base_url, timeframe, **retry_args)
+	pages, error = _leading_pages(pages)
+	df = candles_to_frame(pages)
+	if pages:
+		ticker_cache.write_atomically(filename, lambda tmp_path: df.to_csv(tmp_path, index=False))
+	if error is not None:
+		raise error
+	return len(df)
+
+async def _fetch_pages(session, limiter, ticker, windows, base_url, timeframe, **retry_args):
+	""" Fetches pages of all windows concurrently, a page which failed doesn't cancel the others and is returned as its exception """
+	url = base_url + CANDLES_PATH % (timeframe, ticker.upper())
+	return await asyncio.gather(*[fetch_candles(session, limiter, url, {"start": start, "end": end, "limit": PAGE_LIMIT, "sort": 1}, **retry_args) for start, end in windows], return_exceptions=True)
+
+def _leading_pages(pages):
+	""" Returns pages before the first failed one and the exception it failed with (None if no page failed) """
+	for idx, page in enumerate(pages):
+		if isinstance(page, BaseException):
+			return pages[:idx], page
+	return list(pages), None
+
+def _trailing_pages(pages):
+	""" Returns pages after the last failed one and the exception it failed with (None if no page failed) """
+	leading, error = _leading_pages(pages[::-1])
+	return leading[::-1], error
+
+def _read_edge_lines(path, block_size=4096):
+	""" Returns the first two lines and the last non-empty line of a file, reading only its beginning and its end """
+	with open(path, "rb") as f:
+		first_lines = [f.readline(), f.readline()]
+		f.seek(0, os.SEEK_END)
+		size = f.tell()
+		offset = size
+		tail = b""
+		# read blocks backwards until the tail contains a complete non-empty line
+		while offset > 0:
+			offset = max(0, offset - block_size)
+			f.seek(offset)
+			tail = f.read(size - offset).rstrip(b"\r\n")
+			if b"\n" in tail or offset == 0:
+				break
+	last_line = tail.splitlines()[-1] if tail else b""
+	return [line.decode().strip() for line in first_lines], last_line.decode().strip()
+
+def _line_timestamp(line):
+	timestamp = int(float(line.split(",")[0]))
+	return timestamp // 1000 if timestamp > ticker_cache.MILLISECONDS_THRESHOLD else timestamp
+
+def read_time_range(path):
+	""" Reads time range covered by a candle file from its first and last lines, without parsing the whole file
+
+	Args:
+		path - path to .csv file with candles
+
+	Returns:
+		a tuple of first and last Unix timestamp (seconds) in the file and a flag telling whether the file is in the format written by 'backfill'
+		(header, ascending order), None if the file doesn't exist or has no candles
+	"""
+	if not os.path.isfile(path):
+		return None
+	first_lines, last_line = _read_edge_lines(path)
+	header = first_lines[0].split(",") == CSV_COLUMNS
+	first_line = first_lines[1] if header else first_lines[0]
+	if not first_line or not last_line or last_line.split(",") == CSV_COLUMNS:
+		return None
+	first, last = _line_timestamp(first_line), _line_timestamp(last_line)
+	return min(first, last), max(first, last), header and first <= last
+
+def _append_rows(path, df):
+	def write(tmp_path):
+		shutil.copyfile(path, tmp_path)
+		with open(tmp_path, "rb+") as f:
+			f.seek(-1, os.SEEK_END)
+			ends_with_newline = f.read(1) == b"\n"
+		with open(tmp_path, "a") as f:
+			if not ends_with_newline:
+				f.write("\n")
+			df.to_csv(f, index=False, header=False)
+	ticker_cache.write_atomically(path, write)
+
+def _merge_rows(path, df):
+	names, columns = ticker_cache.normalize_csv(path)
+	if len(columns) != len(CSV_COLUMNS):
+		raise ValueError("%s doesn't contain candles" % (path))
+	existing = pd.DataFrame(dict(zip(CSV_COLUMNS, columns)), columns=CSV_COLUMNS)
+	merged = pd.concat([existing, df], ignore_index=True).drop_duplicates("timestamp", keep="last").sort_values("timestamp", kind="mergesort")
+	ticker_cache.write_atomically(path, lambda tmp_path: merged.to_csv(tmp_path, index=False))
+
+async def sync_ticker(session, limiter, ticker, period_start, period_end, filename, base_url=BASE_URL, timeframe=TIMEFRAME, **retry_args):
+	""" Brings candle file of a single ticker up to date, fetching only the periods which are not in the file yet
+
+	Args:
+		session - aiohttp.ClientSession
+		limiter - TokenBucket shared by all requests
+		ticker - altcoin ticker, e.g. "LTC"
+		period_start - start of the period, Bitfinex timestamp in milliseconds
+		period_end - end of the period (inclusive), Bitfinex timestamp in milliseconds
+		filename - path to the .csv file, created by a full backfill if it doesn't exist. If a page fails, pages between it and the existing
+			candles are still added to the file.
+		base_url - base URL of the exchange API. Default value is BASE_URL.
+		timeframe - timeframe of candles. Default value is "15m".
+		retry_args - 'max_retries' and 'backoff_base', see 'fetch_candles'
+
+	Returns:
+		number of candles added to the file
+	"""
+	covered = read_time_range(filename)
+	if covered is None:
+		return await backfill_ticker(session, limiter, ticker, period_start, period_end, filename, base_url, timeframe, **retry_args)
+	first, last, is_ascending = covered
+	before = get_page_windows(period_start, min(period_end, first * 1000 - 1), timeframe) if period_start < first * 1000 else list()
+	after = get_page_windows(max(period_start, last * 1000 + 1), period_end, timeframe) if period_end > last * 1000 else list()
+	pages = await _fetch_pages(session, limiter, ticker, before + after, base_url, timeframe, **retry_args)
+	# only pages adjacent to the candles in the file are kept, so that the file doesn't get gaps which later runs wouldn't notice
+	before_pages, before_error = _trailing_pages(pages[:len(before)])
+	after_pages, after_error = _leading_pages(pages[len(before):])
+	df = candles_to_frame(before_pages + after_pages)
+	df = df[(df.timestamp < first) | (df.timestamp > last)]
+	if is_ascending and not (df.timestamp < first).any():
+		if len(df):
+			_append_rows(filename, df)
+	else:
+		_merge_rows(filename, df)
+	if before_error is not None or after_error is not None:
+		raise before_error if before_error is not None else after_error
+	return len(df)
+
+async def backfill(tickers, period_start, period_end, data_dir=".", base_url=BASE_URL, timeframe=TIMEFRAME, requests_per_minute=REQUESTS_PER_MINUTE, max_connections=MAX_CONNECTIONS, incremental=False, **retry_args):
+	""" Downloads candles of many tickers concurrently over a pool of connections, files are named <ticker>_bitfinex_data.csv
+
+	Args:
+		tickers - list of altcoin tickers
+		period_start - start of the period, Bitfinex timestamp in milliseconds
+		period_end - end of the period (inclusive), Bitfinex timestamp in milliseconds
+		data_dir - directory of the resulting files. Default value is current directory.
+		base_url - base URL of the exchange API. Default value is BASE_URL.
+		timeframe - timeframe of candles. Default value is "15m".
+		requests_per_minute - limit of requests shared by all tickers. Default value is 30.
+		max_connections - maximum number of simultaneously open connections. Default value is 8.
+		incremental - if True, existing files are only brought up to date (see 'sync_ticker'), otherwise they are overwritten. Default value is False.
+		retry_args - 'max_retries' and 'backoff_base', see 'fetch_candles'
+
+	Returns:
+		a dictionary mapping ticker to number of downloaded candles (added candles if 'incremental' is True)
+
+	Raises:
+		IOError once all tickers are finished if some of their pages couldn't be fetched, candles fetched until then are kept in the files
+	"""
+	limiter = TokenBucket(requests_per_minute / 60.0)
+	connector = aiohttp.TCPConnector(limit=max_connections)
+	timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+	async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+		fetch_ticker = sync_ticker if incremental else backfill_ticker
+		counts = await asyncio.gather(*[fetch_ticker(session, limiter, ticker, period_start, period_end, os.path.join(data_dir, ticker.lower() + "_bitfinex_data.csv"), base_url, timeframe, **retry_args) for ticker in tickers], return_exceptions=True)
+	failed = [(ticker, count) for ticker, count in zip(tickers, counts) if isinstance(count, BaseException)]
+	if failed:
+		raise IOError("failed to download %s" % ("; ".join("%s: %s" % (ticker, error) for ticker, error in failed)))
+	return dict(zip(tickers, counts))
 
 def main():
-	ticker = sys.argv[1]
-	period_start = int(sys.argv[2])
-	period_end = int(sys.argv[3])
-	filename = ticker.lower() + "_bitfinex_data.csv"
-	extract_bitfinex_data(ticker, period_start, period_end, filename)
+	parser = argparse.ArgumentParser(description="Downloads Bitfinex candles of altcoin/BTC pairs")
+	parser.add_argument("tickers", help="altcoin ticker or comma-separated list of tickers, e.g. LTC,XMR")
+	parser.add_argument("period_start", type=int, help="start of the period, timestamp in milliseconds")
+	parser.add_argument("period_end", type=int, nargs="?", help="end of the period, timestamp in milliseconds. Current time by default.")
+	parser.add_argument("--data-dir", default=".", help="directory of the resulting files")
+	parser.add_argument("--base-url", default=BASE_URL, help="base URL of the exchange API")
+	parser.add_argument("--requests-per-minute", type=float, default=REQUESTS_PER_MINUTE, help="limit of requests shared by all tickers")
+	parser.add_argument("--connections", type=int, default=MAX_CONNECTIONS, help="maximum number of simultaneously open connections")
+	parser.add_argument("--sync", action="store_true", help="only fetch candles missing in existing files instead of downloading them again")
+	args = parser.parse_args()
+	tickers = [ticker.strip() for ticker in args.tickers.split(",") if ticker.strip()]
+	period_end = args.period_end if args.period_end is not None else int(time.time() * 1000)
+	counts = asyncio.run(backfill(tickers, args.period_start, period_end, args.data_dir, args.base_url, requests_per_minute=args.requests_per_minute, max_connections=args.connections, incremental=args.sync))
+	for ticker in tickers:
+		print("%s: %d candles" % (ticker, counts[ticker]))
 
 if __name__ == "__main__":
 	main()
@@ -0,0 +1,143 @@
+import asyncio
+import pytest
+import numpy as np
+import pandas as pd
+from aiohttp import web
+import extract_bitfinex_data as test_tgt
+
+CANDLE_MS = test_tgt.CANDLE_DURATIONS["15m"]
+
+def make_app(first_candle, num_candles, failures, failing_starts=()):
+	""" Returns aiohttp application standing in for Bitfinex candles endpoint
+
+	Serves 'num_candles' candles every 15 minutes starting at 'first_candle' for any ticker, answers the first 'failures' requests with "429 Too Many Requests"
+	and every request of a page starting at one of 'failing_starts' with "503 Service Unavailable"
+	"""
+	timestamps = first_candle + np.arange(num_candles, dtype=np.int64) * CANDLE_MS
+	state = {"requests": 0}
+
+	async def candles(request):
+		state["requests"] += 1
+		if state["requests"] <= failures:
+			return web.json_response(["error", 11010, "ratelimit: error"], status=429)
+		if int(request.query["start"]) in failing_starts:
+			return web.json_response(["error", 20060, "maintenance"], status=503)
+		start, end, limit = int(request.query["start"]), int(request.query["end"]), int(request.query["limit"])
+		selected = timestamps[(timestamps >= start) & (timestamps <= end)][:limit]
+		if request.query.get("sort") != "1":
+			selected = selected[::-1]
+		return web.json_response([[int(ts), 1.0, float(ts % 1000003), 2.0, 0.5, 10.0] for ts in selected])
+
+	app = web.Application()
+	app.router.add_get("/v2/candles/trade:15m:t{pair}/hist", candles)
+	return app, state
+
+async def run_backfill(tmp_path, first_candle, num_candles, failures, period=None, incremental=False, failing_starts=()):
+	""" Runs backfill of LTC and XMR against a local stand-in server, returns numbers of candles per ticker and state of the server """
+	app, state = make_app(first_candle, num_candles, failures, failing_starts)
+	runner = web.AppRunner(app)
+	await runner.setup()
+	site = web.TCPSite(runner, "127.0.0.1", 0)
+	await site.start()
+	port = site._server.sockets[0].getsockname()[1]
+	period_start, period_end = period or (first_candle, first_candle + (num_candles - 1) * CANDLE_MS)
+	try:
+		counts = await test_tgt.backfill(["LTC", "XMR"], period_start, period_end, str(tmp_path), "http://127.0.0.1:%d" % (port), requests_per_minute=6000, incremental=incremental, max_retries=2, backoff_base=0.01)
+	finally:
+		await runner.cleanup()
+	return counts, state
+
+def test_bitfinex_timestamp_to_unix():
+	""" Tests whether Bitfinex timestamps in milliseconds are converted to Unix timestamps both as a single value and as an array """
+	assert test_tgt.bitfinex_timestamp_to_unix(1507062600000) == 1507062600
+	assert test_tgt.bitfinex_timestamp_to_unix(np.array([1507062600000, 1507061700000])).tolist() == [1507062600, 1507061700]
+
+def test_page_windows_cover_period():
+	""" Tests whether the period is split into consecutive windows of at most 1000 candles covering it entirely """
+	windows = test_tgt.get_page_windows(0, 2500 * CANDLE_MS)
+	assert windows == [(0, 1000 * CANDLE_MS - 1), (1000 * CANDLE_MS, 2000 * CANDLE_MS - 1), (2000 * CANDLE_MS, 2500 * CANDLE_MS)]
+	with pytest.raises(ValueError):
+		test_tgt.get_page_windows(0, 1, "7m")
+
+def test_token_bucket_limits_rate(monkeypatch):
+	""" Tests whether token bucket lets a burst up to its capacity through and then spaces requests by the refill rate """
+	now = [0.0]
+	bucket = test_tgt.TokenBucket(rate=10.0, capacity=2, clock=lambda: now[0])
+
+	async def fake_sleep(delay):
+		now[0] += delay
+
+	async def take(num):
+		for i in range(num):
+			await bucket.acquire()
+
+	monkeypatch.setattr(test_tgt.asyncio, "sleep", fake_sleep)
+	asyncio.run(take(6))
+	assert now[0] == pytest.approx(0.4)
+
+def test_token_bucket_penalties_dont_stack():
+	""" Tests whether penalties of several requests failing at the same time hold the bucket back for the longest delay rather than for their sum """
+	bucket = test_tgt.TokenBucket(rate=10.0, capacity=2, clock=lambda: 0.0)
+	for delay in (3.0, 3.0, 1.0, 3.0):
+		bucket.penalize(delay)
+	assert bucket.tokens == pytest.approx(-30.0)
+
+def test_backfill_from_local_server(tmp_path):
+	""" Tests whether backfill downloads all pages of several tickers from a local stand-in server, retrying rate limited requests """
+	first_candle = 1480530600000
+	counts, state = asyncio.run(run_backfill(tmp_path, first_candle, 2345, failures=3))
+	assert counts == {"LTC": 2345, "XMR": 2345}
+	# 3 pages per ticker plus retries of rate limited requests
+	assert state["requests"] == 6 + 3
+	df = pd.read_csv(str(tmp_path / "ltc_bitfinex_data.csv"))
+	assert list(df.columns) == test_tgt.CSV_COLUMNS
+	assert df.timestamp.tolist() == (first_candle // 1000 + np.arange(2345) * 900).tolist()
+
+def test_read_time_range(tmp_path):
+	""" Tests whether covered time range is read from both ends of ascending files with header as well as of descending files without header in milliseconds """
+	ascending = tmp_path / "ascending.csv"
+	ascending.write_text(",".join(test_tgt.CSV_COLUMNS) + "\n1500000000,1,1,1,1,1\n1500000900,1,1,1,1,1\n")
+	assert test_tgt.read_time_range(str(ascending)) == (1500000000, 1500000900, True)
+	descending = tmp_path / "descending.csv"
+	descending.write_text("1500000900000,1,1,1,1,1\n1500000000000,1,1,1,1,1")
+	assert test_tgt.read_time_range(str(descending)) == (1500000000, 1500000900, False)
+	header_only = tmp_path / "empty.csv"
+	header_only.write_text(",".join(test_tgt.CSV_COLUMNS) + "\n")
+	assert test_tgt.read_time_range(str(header_only)) is None
+	assert test_tgt.read_time_range(str(tmp_path / "missing.csv")) is None
+
+def test_sync_appends_missing_candles(tmp_path):
+	""" Tests whether incremental sync fetches only candles after the end of an existing file and appends them keeping ascending order """
+	first_candle = 1480530600000
+	asyncio.run(run_backfill(tmp_path, first_candle, 2000, failures=0, period=(first_candle, first_candle + 1499 * CANDLE_MS)))
+	counts, state = asyncio.run(run_backfill(tmp_path, first_candle, 2000, failures=0, incremental=True))
+	assert counts == {"LTC": 500, "XMR": 500}
+	# a single page per ticker
+	assert state["requests"] == 2
+	df = pd.read_csv(str(tmp_path / "ltc_bitfinex_data.csv"))
+	assert df.timestamp.tolist() == (first_candle // 1000 + np.arange(2000) * 900).tolist()
+	counts, state = asyncio.run(run_backfill(tmp_path, first_candle, 2000, failures=0, incremental=True))
+	assert counts == {"LTC": 0, "XMR": 0} and state["requests"] == 0
+
+def test_sync_converts_legacy_file(tmp_path):
+	""" Tests whether incremental sync turns a newest first file without header and with duplicates into an ascending deduplicated file """
+	first_candle = 1480530600000
+	legacy = tmp_path / "ltc_bitfinex_data.csv"
+	legacy.write_text("".join("%d,1.0,1.0,2.0,0.5,10.0\n" % (first_candle // 1000 + idx * 900) for idx in (5, 4, 3, 3, 2)))
+	counts, state = asyncio.run(run_backfill(tmp_path, first_candle, 10, failures=0, incremental=True))
+	assert counts == {"LTC": 6, "XMR": 10}
+	df = pd.read_csv(str(legacy))
+	assert list(df.columns) == test_tgt.CSV_COLUMNS
+	assert df.timestamp.tolist() == (first_candle // 1000 + np.arange(10) * 900).tolist()
+
+def test_backfill_keeps_pages_before_failed_page(tmp_path):
+	""" Tests whether pages fetched before a page which failed all its retries are written, so that an incremental run resumes after them """
+	first_candle = 1480530600000
+	with pytest.raises(IOError):
+		asyncio.run(run_backfill(tmp_path, first_candle, 2345, failures=0, failing_starts=(first_candle + 2000 * CANDLE_MS,)))
+	df = pd.read_csv(str(tmp_path / "xmr_bitfinex_data.csv"))
+	assert df.timestamp.tolist() == (first_candle // 1000 + np.arange(2000) * 900).tolist()
+	counts, state = asyncio.run(run_backfill(tmp_path, first_candle, 2345, failures=0, incremental=True))
+	assert counts == {"LTC": 345, "XMR": 345}
+	df = pd.read_csv(str(tmp_path / "ltc_bitfinex_data.csv"))
+	assert df.timestamp.tolist() == (first_candle // 1000 + np.arange(2345) * 900).tolist()
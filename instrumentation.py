@@ -0,0 +1,191 @@
+import sys
+import json
+import time
+import tracemalloc
+import collections
+try:
+	import resource
+except ImportError:
+	resource = None
+
+'''
+Lightweight instrumentation of pipeline stages.
+
+A stage is measured by wrapping it in 'with metrics.stage(name, rows_in) as stage:' and setting 'stage.rows_out' inside the block.
+Each stage records wall time, CPU time, rows in and out and peak memory. Peak memory is by default the peak resident set size of the
+process at the end of the stage (cheap, but it grows only when a stage exceeds all previous peaks). With 'trace_memory' set it is the
+peak of memory allocated by Python during the stage, measured by tracemalloc, which is exact but slows allocations down considerably.
+
+Disabled Metrics hand out a single shared no-op stage, so instrumented code costs one method call per stage when metrics are off.
+Summary of a run, aggregated by stage name, is exported as JSON or in Prometheus text exposition format.
+'''
+
+StageRecord = collections.namedtuple("StageRecord", ["name", "wall_seconds", "cpu_seconds", "peak_memory_bytes", "rows_in", "rows_out"])
+
+"""
+Constants
+"""
+PROMETHEUS_PREFIX = "pipeline_stage_"
+# metrics exported in Prometheus format: name suffix, help text and key of the stage summary
+PROMETHEUS_METRICS = (
+	("calls_total", "Number of runs of the stage", "calls"),
+	("wall_seconds", "Wall time spent in the stage", "wall_seconds"),
+	("cpu_seconds", "CPU time spent in the stage", "cpu_seconds"),
+	("peak_memory_bytes", "Peak memory during the stage", "peak_memory_bytes"),
+	("rows_in", "Number of rows consumed by the stage", "rows_in"),
+	("rows_out", "Number of rows produced by the stage", "rows_out"),
+)
+
+
+def get_peak_rss():
+	""" Returns peak resident set size of the process in bytes, None where it isn't available """
+	if resource is None:
+		return None
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	# reported in kilobytes on Linux and in bytes on macOS
+	return peak if sys.platform == "darwin" else peak * 1024
+
+'''
+Stage being measured, handed out by Metrics.stage
+'''
+class Stage(object):
+
+	def __init__(self, metrics, name, rows_in):
+		self.metrics = metrics
+		self.name = name
+		self.rows_in = rows_in
+		self.rows_out = None
+		self.peak_memory = 0
+
+	def __enter__(self):
+		self.metrics._enter(self)
+		self.wall_start = time.perf_counter()
+		self.cpu_start = time.process_time()
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		wall_seconds = time.perf_counter() - self.wall_start
+		cpu_seconds = time.process_time() - self.cpu_start
+		self.metrics._exit(self, wall_seconds, cpu_seconds)
+		return False
+
+'''
+Stage of disabled Metrics, does nothing
+'''
+class NullStage(object):
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		return False
+
+NULL_STAGE = NullStage()
+
+'''
+Collects records of measured stages of a run
+'''
+class Metrics(object):
+	""" Collects StageRecord instances of measured stages
+
+		Args:
+			enabled - if False, stages are not measured at all. Default value is True.
+			trace_memory - if True, peak memory of stages is measured with tracemalloc instead of the peak resident set size. Default value is False.
+	"""
+
+	def __init__(self, enabled=True, trace_memory=False):
+		self.enabled = enabled
+		self.trace_memory = trace_memory
+		self.records = list()
+		self.open_stages = list()
+		self.started_tracing = False
+
+	def stage(self, name, rows_in=None):
+		""" Returns context manager measuring a stage, set 'rows_out' of the returned stage within the block
+
+			Args:
+				name - name of the stage
+				rows_in - number of rows consumed by the stage. Default value is None (unknown).
+		"""
+		if not self.enabled:
+			return NULL_STAGE
+		return Stage(self, name, rows_in)
+
+	def _fold_traced_peak(self):
+		# peak since the last reset is attributed to every open stage, so that nested stages don't hide it from the enclosing ones
+		peak = tracemalloc.get_traced_memory()[1]
+		for stage in self.open_stages:
+			stage.peak_memory = max(stage.peak_memory, peak - stage.memory_start)
+		tracemalloc.reset_peak()
+
+	def _enter(self, stage):
+		if self.trace_memory:
+			if not tracemalloc.is_tracing():
+				tracemalloc.start()
+				self.started_tracing = True
+			self._fold_traced_peak()
+			stage.memory_start = tracemalloc.get_traced_memory()[0]
+		self.open_stages.append(stage)
+
+	def _exit(self, stage, wall_seconds, cpu_seconds):
+		if self.trace_memory:
+			self._fold_traced_peak()
+		self.open_stages.remove(stage)
+		if self.trace_memory:
+			peak_memory = stage.peak_memory
+			if self.started_tracing and not self.open_stages:
+				tracemalloc.stop()
+				self.started_tracing = False
+		else:
+			peak_memory = get_peak_rss()
+		self.records.append(StageRecord(stage.name, wall_seconds, cpu_seconds, peak_memory, stage.rows_in, stage.rows_out))
+
+	def summary(self):
+		""" Aggregates records by stage name in order of first appearance
+
+			Returns:
+				list of dictionaries with stage name, number of calls, total wall and CPU time, maximum peak memory and total rows in and out
+		"""
+		summaries = collections.OrderedDict()
+		for record in self.records:
+			summary = summaries.setdefault(record.name, {"stage": record.name, "calls": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0,
+				"peak_memory_bytes": None, "rows_in": None, "rows_out": None})
+			summary["calls"] += 1
+			summary["wall_seconds"] += record.wall_seconds
+			summary["cpu_seconds"] += record.cpu_seconds
+			for key, value, combine in (("peak_memory_bytes", record.peak_memory_bytes, max), ("rows_in", record.rows_in, sum), ("rows_out", record.rows_out, sum)):
+				if value is not None:
+					summary[key] = value if summary[key] is None else combine((summary[key], value))
+		return list(summaries.values())
+
+	def to_json(self):
+		""" Returns summary and individual records of the run as a JSON string """
+		return json.dumps({"stages": self.summary(), "records": [record._asdict() for record in self.records]}, indent=1)
+
+	def to_prometheus(self, labels=None):
+		""" Returns summary of the run in Prometheus text exposition format
+
+			Args:
+				labels - dictionary of labels added to every sample, e.g. {"ticker": "LTC"}. Default value is None.
+		"""
+		base_labels = "".join(',%s="%s"' % (key, _escape_label(value)) for key, value in sorted((labels or {}).items()))
+		summaries = self.summary()
+		lines = list()
+		for suffix, help_text, key in PROMETHEUS_METRICS:
+			name = PROMETHEUS_PREFIX + suffix
+			lines.append("# HELP %s %s" % (name, help_text))
+			lines.append("# TYPE %s %s" % (name, "counter" if suffix.endswith("_total") else "gauge"))
+			for summary in summaries:
+				if summary[key] is not None:
+					lines.append('%s{stage="%s"%s} %s' % (name, _escape_label(summary["stage"]), base_labels, repr(summary[key])))
+		return "\n".join(lines) + "\n"
+
+	def export(self, path, labels=None):
+		""" Writes summary of the run to a file, in Prometheus text format if the path ends with .prom, otherwise as JSON """
+		with open(path, "w") as f:
+			f.write(self.to_prometheus(labels) if path.endswith(".prom") else self.to_json())
+
+def _escape_label(value):
+	return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+DISABLED = Metrics(enabled=False)
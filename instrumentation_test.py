@@ -0,0 +1,64 @@
+import json
+import pytest
+import instrumentation
+import synthetic
+import lr_growing_altcoin as analysis
+
+def test_disabled_metrics_record_nothing():
+	""" Tests whether disabled metrics hand out the shared no-op stage and record nothing """
+	metrics = instrumentation.Metrics(enabled=False)
+	with metrics.stage("load", 10) as stage:
+		stage.rows_out = 5
+	assert metrics.stage("load") is instrumentation.NULL_STAGE
+	assert metrics.records == [] and metrics.summary() == []
+
+def test_stage_records_and_summary():
+	""" Tests whether repeated stages are aggregated by name in order of first appearance, with rows summed and times accumulated """
+	metrics = instrumentation.Metrics()
+	for rows in (10, 20):
+		with metrics.stage("convert", rows) as stage:
+			stage.rows_out = rows // 2
+	with metrics.stage("report"):
+		pass
+	summary = metrics.summary()
+	assert [item["stage"] for item in summary] == ["convert", "report"]
+	assert summary[0]["calls"] == 2 and summary[0]["rows_in"] == 30 and summary[0]["rows_out"] == 15
+	assert summary[1]["rows_in"] is None and summary[1]["wall_seconds"] >= 0.0
+	assert json.loads(metrics.to_json())["stages"] == summary
+
+def test_traced_memory_of_nested_stages():
+	""" Tests whether an allocation within a nested stage counts towards the peak memory of both stages and not of a later one """
+	metrics = instrumentation.Metrics(trace_memory=True)
+	with metrics.stage("outer"):
+		with metrics.stage("inner"):
+			buffer = bytearray(8 * 1024 * 1024)
+			del buffer
+	with metrics.stage("after"):
+		pass
+	peaks = dict((record.name, record.peak_memory_bytes) for record in metrics.records)
+	assert peaks["inner"] >= 8 * 1024 * 1024 and peaks["outer"] >= 8 * 1024 * 1024
+	assert peaks["after"] < 1024 * 1024
+
+def test_prometheus_format():
+	""" Tests whether summary is exported as Prometheus samples labelled by stage and extra labels """
+	metrics = instrumentation.Metrics()
+	with metrics.stage("detect", 3) as stage:
+		stage.rows_out = 2
+	text = metrics.to_prometheus({"ticker": "LTC"})
+	assert "# TYPE pipeline_stage_calls_total counter" in text
+	assert 'pipeline_stage_calls_total{stage="detect",ticker="LTC"} 1\n' in text
+	assert 'pipeline_stage_rows_out{stage="detect",ticker="LTC"} 2\n' in text
+
+def test_run_analysis_stages(tmpdir):
+	""" Tests whether a run of the analysis records every stage with rows flowing from one stage to the next """
+	lending_path = synthetic.write_csv(str(tmpdir.join("lending.csv")), *synthetic.generate_lending_columns(2000, seed=5))
+	price_path = synthetic.write_csv(str(tmpdir.join("syn_bitfinex_data.csv")), *synthetic.generate_candle_columns(8000, seed=5))
+	metrics = instrumentation.Metrics()
+	start, end = synthetic.DEFAULT_START_DATE, synthetic.DEFAULT_START_DATE + 2000 * synthetic.LENDING_STEP
+	growing, not_growing = analysis.run_analysis("SYN", start, end, lending_path, price_path, metrics=metrics)
+	summary = dict((item["stage"], item) for item in metrics.summary())
+	assert list(summary) == ["load", "convert", "bucket", "detect", "align", "report"]
+	assert summary["bucket"]["rows_in"] == 2000
+	assert summary["detect"]["rows_in"] == summary["bucket"]["rows_out"]
+	assert summary["detect"]["rows_out"] == len(growing) + len(not_growing)
+	assert summary["align"]["rows_out"] == 8000
@@ -0,0 +1,239 @@
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+import utils
+import resample
+import alignment
+import ticker_cache
+import lr_growing_altcoin as analysis
+
+'''
+Lead/lag analysis of BTC lending rates against prices of target currencies.
+
+Lending rates and close prices are resampled into bars of a common resolution (served by the bar pyramid of 'ticker_cache') and placed
+on a regular grid. A missing bar takes the value of the latest bar before it within 'max_gap' seconds (sparsely sampled prices thus move
+in the bar where a new price appears), bars after longer gaps are NaN. Changes of lending rate are then cross-correlated with log returns of every target currency at every lag
+from -max_lag to max_lag bars. A positive lag k pairs the change of lending rate in bar t with the return in bar t + k, so a peak at a positive lag
+means that lending rates lead prices.
+
+All cross-correlations are computed with the FFT (O(N log N) instead of O(N * L) for L lags), for all currencies (and all rolling windows) in a single
+batch of array operations. Missing bars are left out: series are centered over their valid bars and zero-filled, and the sum of products at each lag
+is divided by the number of pairs of valid bars at that lag (correlated the same way) and by standard deviations of both series.
+'''
+
+"""
+Constants
+"""
+DEFAULT_RESOLUTION = "1h"
+# lags at which fewer pairs of valid bars overlap get NaN correlation
+MIN_OVERLAP = 10
+# changes are clipped to this many robust standard deviations (estimated from median absolute deviation) from their median
+CLIP_DEVIATIONS = 5.0
+SUMMARY_COLUMNS = ["ticker", "num_bars", "best_lag", "best_lag_hours", "best_correlation", "best_z_score", "num_overlap", "zero_lag_correlation"]
+
+
+def get_lead_lag_series(tickers, period_start, period_end, resolution=DEFAULT_RESOLUTION, data_dir=analysis.DATA_DIR, lending_path=analysis.BTC_LENDING_DATA, max_gap=analysis.MAX_LENDING_GAP):
+	""" Loads BTC lending rates and close prices of target currencies as bars on a common regular grid and turns them into changes
+
+		Args:
+			tickers - target currency tickers
+			period_start - start of the analyzed period
+			period_end - end of the analyzed period
+			resolution - resolution of bars, e.g. "1h" or number of seconds. Default value is "1h".
+			data_dir - directory containing price data files of target currencies
+			lending_path - path to BTC lending rates file
+			max_gap - longest gap in seconds across which the latest bar is carried forward. Default value is MAX_LENDING_GAP.
+
+		Returns:
+			a tuple of int64 NumPy array of bar start timestamps (N), float64 NumPy array of changes of lending rate (N) and
+			float64 NumPy array of log returns of each target currency (len(tickers) x N). The change in bar t is the difference
+			between bars t and t - 1, NaN where either of them is missing.
+	"""
+	period = resample.get_resolution_seconds(resolution)
+	paths = [analysis.get_target_data_path(ticker, data_dir) for ticker in tickers]
+	ticker_cache.ensure_cached([lending_path] + paths)
+	first_bar = int(period_start) // period * period
+	grid = np.arange(first_bar, int(period_end) + 1, period, dtype=np.int64)
+
+	def place(path, column_idx):
+		columns = utils.get_ticker_columns(path, first_bar, period_end, 0, resolution=resolution)
+		if not len(columns):
+			return np.full(len(grid), np.nan)
+		return alignment.asof_join(grid, columns[0], columns[column_idx], alignment.PREVIOUS, max(max_gap, 0))
+
+	lending_changes = np.diff(place(lending_path, analysis.LENDING_RATE_IDX), prepend=np.nan)
+	returns = np.empty((len(tickers), len(grid)))
+	for idx, path in enumerate(paths):
+		close_prices = place(path, analysis.CLOSE_PRICE_IDX)
+		with np.errstate(divide="ignore", invalid="ignore"):
+			returns[idx] = np.diff(np.log(close_prices), prepend=np.nan)
+	returns[~np.isfinite(returns)] = np.nan
+	return grid, lending_changes, returns
+
+def clip_outliers(values, num_deviations=CLIP_DEVIATIONS):
+	""" Clips values farther than 'num_deviations' robust standard deviations from their median along the last axis, so that a few spikes don't dominate correlations
+
+		Note: robust standard deviation is estimated from median absolute deviation, or is the standard deviation where most values are equal (e.g. sparse prices carried forward).
+	"""
+	values = np.asarray(values, dtype=np.float64)
+	if not values.shape[-1] or np.isnan(values).all():
+		return values.copy()
+	with np.errstate(invalid="ignore"):
+		medians = np.nanmedian(values, axis=-1, keepdims=True)
+		deviations = 1.4826 * np.nanmedian(np.abs(values - medians), axis=-1, keepdims=True)
+		deviations = np.where(deviations > 0.0, deviations, np.nanstd(values, axis=-1, keepdims=True))
+	return np.clip(values, medians - num_deviations * deviations, medians + num_deviations * deviations)
+
+def _center(values):
+	""" Centers values over their valid (not NaN) elements along the last axis and zero-fills the rest
+
+		Returns:
+			a tuple of centered values, float64 mask of valid elements and standard deviation over valid elements
+	"""
+	valid = ~np.isnan(values)
+	counts = np.maximum(valid.sum(axis=-1, keepdims=True), 1)
+	means = np.where(valid, values, 0.0).sum(axis=-1, keepdims=True) / counts
+	centered = np.where(valid, values - means, 0.0)
+	stds = np.sqrt((centered * centered).sum(axis=-1, keepdims=True) / counts)
+	return centered, valid.astype(np.float64), stds
+
+def _lagged_sums(a, b, max_lag):
+	""" Computes sums of a[t] * b[t + k] along the last axis for every lag k from -max_lag to max_lag with the FFT, arrays are broadcast against each other """
+	length = max(a.shape[-1], b.shape[-1])
+	# circular correlation of zero-padded arrays has no wrap-around within the requested lags
+	n_fft = 1 << int(length + max_lag - 1).bit_length()
+	full = np.fft.irfft(np.conj(np.fft.rfft(a, n_fft)) * np.fft.rfft(b, n_fft), n_fft)
+	return np.concatenate((full[..., n_fft - max_lag:], full[..., :max_lag + 1]), axis=-1)
+
+def cross_correlate(x, y, max_lag, min_overlap=MIN_OVERLAP):
+	""" Computes Pearson cross-correlation of x[t] with y[t + k] for every lag k from -max_lag to max_lag, NaN elements are left out
+
+		Args:
+			x - float64 NumPy array (..., N), e.g. changes of lending rate
+			y - float64 NumPy array (..., N) broadcastable against x, e.g. returns of each target currency (C x N)
+			max_lag - largest lag in elements, less than N
+			min_overlap - lags with fewer pairs of valid elements get NaN correlation. Default value is MIN_OVERLAP.
+
+		Returns:
+			a tuple of int64 NumPy array of lags (2 * max_lag + 1), float64 NumPy array of correlations (..., 2 * max_lag + 1)
+			and int64 NumPy array of numbers of pairs of valid elements at each lag (same shape)
+	"""
+	x = np.asarray(x, dtype=np.float64)
+	y = np.asarray(y, dtype=np.float64)
+	if x.shape[-1] != y.shape[-1]:
+		raise ValueError("series should be of the same length")
+	if max_lag < 0 or max_lag >= x.shape[-1]:
+		raise ValueError("maximum lag should be non-negative and less than length of the series")
+	x_centered, x_valid, x_std = _center(x)
+	y_centered, y_valid, y_std = _center(y)
+	sums = _lagged_sums(x_centered, y_centered, max_lag)
+	overlaps = np.rint(_lagged_sums(x_valid, y_valid, max_lag)).astype(np.int64)
+	with np.errstate(divide="ignore", invalid="ignore"):
+		correlations = sums / (overlaps * x_std * y_std)
+	correlations[(overlaps < max(min_overlap, 1)) | ~np.isfinite(correlations)] = np.nan
+	return np.arange(-max_lag, max_lag + 1), correlations, overlaps
+
+def rolling_cross_correlate(x, y, window, step, max_lag, min_overlap=MIN_OVERLAP):
+	""" Computes cross-correlation (see 'cross_correlate') within rolling windows, all windows in a single batch
+
+		Each window is centered and normalized on its own, lags don't reach outside of the window.
+
+		Args:
+			x - float64 NumPy array (N)
+			y - float64 NumPy array (C x N) or (N)
+			window - number of elements of a window
+			step - number of elements between starts of consecutive windows
+			max_lag - largest lag in elements, less than 'window'
+			min_overlap - see 'cross_correlate'
+
+		Returns:
+			a tuple of int64 NumPy array of indices where windows start (W), lags (2 * max_lag + 1),
+			float64 NumPy array of correlations (C x W x (2 * max_lag + 1)), or (W x (2 * max_lag + 1)) for one-dimensional 'y',
+			and int64 NumPy array of numbers of pairs of valid elements (same shape)
+	"""
+	x = np.asarray(x, dtype=np.float64)
+	y = np.asarray(y, dtype=np.float64)
+	if window <= 0 or step <= 0 or window > x.shape[-1]:
+		raise ValueError("window should be positive and not longer than the series, step should be positive")
+	starts = np.arange(0, x.shape[-1] - window + 1, step)
+	x_windows = np.lib.stride_tricks.sliding_window_view(x, window, axis=-1)[starts]
+	y_windows = np.lib.stride_tricks.sliding_window_view(y, window, axis=-1)[..., starts, :]
+	lags, correlations, overlaps = cross_correlate(x_windows, y_windows, max_lag, min_overlap)
+	return starts, lags, correlations, overlaps
+
+def summarize_lead_lag(tickers, lags, correlations, overlaps, period):
+	""" Returns Pandas dataframe with the lag of the most significant (positive or negative) correlation of each target currency, see SUMMARY_COLUMNS
+
+	Correlations are compared by their z-scores (correlation times square root of the number of overlapping bars), since correlations at long lags
+	rest on fewer bars and are noisier.
+	"""
+	rows = list()
+	zero_lag = int(np.flatnonzero(lags == 0)[0])
+	z_scores = correlations * np.sqrt(overlaps)
+	for ticker, ticker_correlations, ticker_overlaps, ticker_z_scores in zip(tickers, correlations, overlaps, z_scores):
+		row = dict(ticker=ticker, num_bars=int(ticker_overlaps[zero_lag]), zero_lag_correlation=float(ticker_correlations[zero_lag]))
+		if np.isnan(ticker_correlations).all():
+			row.update(best_lag=None, best_lag_hours=None, best_correlation=float("nan"), best_z_score=float("nan"), num_overlap=0)
+		else:
+			best = int(np.nanargmax(np.abs(ticker_z_scores)))
+			row.update(best_lag=int(lags[best]), best_lag_hours=lags[best] * period / 3600.0, best_correlation=float(ticker_correlations[best]),
+				best_z_score=float(ticker_z_scores[best]), num_overlap=int(ticker_overlaps[best]))
+		rows.append(row)
+	return pd.DataFrame(rows, columns=SUMMARY_COLUMNS)
+
+def analyze_lead_lag(period_start, period_end, max_lag, resolution=DEFAULT_RESOLUTION, tickers=None, data_dir=analysis.DATA_DIR, lending_path=analysis.BTC_LENDING_DATA, clip=CLIP_DEVIATIONS):
+	""" Cross-correlates changes of BTC lending rate with returns of all target currencies in a single batch
+
+		Args:
+			period_start - start of the analyzed period
+			period_end - end of the analyzed period
+			max_lag - largest lag in bars
+			resolution - resolution of bars. Default value is "1h".
+			tickers - target currency tickers. Default value is None (all tickers with price data in 'data_dir').
+			data_dir - directory containing price data files of target currencies
+			lending_path - path to BTC lending rates file
+			clip - changes are clipped to this many robust standard deviations, see 'clip_outliers'. Default value is CLIP_DEVIATIONS, None disables clipping.
+
+		Returns:
+			a tuple of Pandas dataframe summarizing each currency (see 'summarize_lead_lag'), lags and correlations (one row per currency)
+	"""
+	tickers = tickers or analysis.get_target_tickers(data_dir)
+	timestamps, lending_changes, returns = get_lead_lag_series(tickers, period_start, period_end, resolution, data_dir, lending_path)
+	if clip is not None:
+		lending_changes, returns = clip_outliers(lending_changes, clip), clip_outliers(returns, clip)
+	lags, correlations, overlaps = cross_correlate(lending_changes, returns, max_lag)
+	summary = summarize_lead_lag(tickers, lags, correlations, overlaps, resample.get_resolution_seconds(resolution))
+	return summary, lags, correlations
+
+def main():
+	parser = argparse.ArgumentParser(description="Lead/lag cross-correlation of BTC lending rate changes and target currency returns")
+	parser.add_argument("--period", type=float, nargs=2, default=[1480530600.0, 1507062600.0], help="period start and end")
+	parser.add_argument("--resolution", default=DEFAULT_RESOLUTION, help="resolution of bars, e.g. 15m, 1h or 1d")
+	parser.add_argument("--max-lag", type=int, default=24 * 14, help="largest lag, in bars")
+	parser.add_argument("--window", type=int, help="also correlate within rolling windows of this many bars")
+	parser.add_argument("--step", type=int, help="bars between starts of rolling windows, the window length by default")
+	parser.add_argument("--tickers", nargs="+", help="target currency tickers, all tickers in data directory by default")
+	parser.add_argument("--clip", type=float, default=CLIP_DEVIATIONS, help="clip changes to this many robust standard deviations, 0 disables clipping")
+	parser.add_argument("--output", help=".npz file to write lags and correlations to")
+	args = parser.parse_args()
+	tickers = args.tickers or analysis.get_target_tickers()
+	summary, lags, correlations = analyze_lead_lag(args.period[0], args.period[1], args.max_lag, args.resolution, tickers, clip=args.clip or None)
+	print(summary.to_string(index=False))
+	arrays = dict(tickers=np.array(tickers), lags=lags, correlations=correlations)
+	if args.window:
+		timestamps, lending_changes, returns = get_lead_lag_series(tickers, args.period[0], args.period[1], args.resolution)
+		if args.clip:
+			lending_changes, returns = clip_outliers(lending_changes, args.clip), clip_outliers(returns, args.clip)
+		starts, lags, rolling_correlations, overlaps = rolling_cross_correlate(lending_changes, returns, args.window, args.step or args.window, min(args.max_lag, args.window - 1))
+		best = np.argmax(np.abs(np.nan_to_num(rolling_correlations * np.sqrt(overlaps))), axis=-1)
+		has_correlations = ~np.isnan(rolling_correlations).all(axis=-1)
+		for ticker, ticker_best, ticker_has_correlations in zip(tickers, best, has_correlations):
+			window_lags = [str(lag) if has else "-" for lag, has in zip(lags[ticker_best].tolist(), ticker_has_correlations.tolist())]
+			sys.stdout.write("%s lag of the most significant correlation in each window: %s\n" % (ticker, " ".join(window_lags)))
+		arrays.update(window_starts=timestamps[starts], rolling_lags=lags, rolling_correlations=rolling_correlations)
+	if args.output:
+		np.savez(args.output, **arrays)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,54 @@
+import pytest
+import numpy as np
+import leadlag
+
+def lagged_series(lag=5, num_entries=600, seed=11):
+	""" Returns noise x and y where y follows x by 'lag' elements plus noise, with a few NaN elements in both """
+	rng = np.random.RandomState(seed)
+	x = rng.normal(0.0, 1.0, num_entries)
+	y = np.concatenate((rng.normal(0.0, 1.0, lag), x[:-lag])) + rng.normal(0.0, 0.5, num_entries)
+	x[[3, 100, 101]] = np.nan
+	y[[50, 300]] = np.nan
+	return x, y
+
+def test_cross_correlate_matches_direct_sums():
+	""" Tests that correlations computed with the FFT match sums of products of valid pairs computed lag by lag """
+	x, y = lagged_series()
+	lags, correlations, overlaps = leadlag.cross_correlate(x, y, 20)
+	x_centered, y_centered = x - np.nanmean(x), y - np.nanmean(y)
+	for idx, lag in enumerate(lags):
+		a, b = (x_centered[:len(x) - lag], y_centered[lag:]) if lag >= 0 else (x_centered[-lag:], y_centered[:len(y) + lag])
+		valid = ~np.isnan(a) & ~np.isnan(b)
+		assert overlaps[idx] == valid.sum()
+		assert correlations[idx] == pytest.approx((a[valid] * b[valid]).sum() / (valid.sum() * np.nanstd(x) * np.nanstd(y)), rel=1e-9)
+
+def test_cross_correlate_finds_lag():
+	""" Tests that the correlation peaks at the lag by which y follows x, for every row of a batch """
+	x, y = lagged_series(lag=7)
+	lags, correlations, overlaps = leadlag.cross_correlate(x, np.vstack((y, -y)), 50)
+	assert correlations.shape == (2, 101)
+	assert lags[np.nanargmax(np.abs(correlations), axis=-1)].tolist() == [7, 7]
+	assert correlations[0, 57] > 0.8 and correlations[1, 57] < -0.8
+	with pytest.raises(ValueError):
+		leadlag.cross_correlate(x, y, len(x))
+
+def test_rolling_cross_correlate_matches_windows():
+	""" Tests that rolling correlations of all windows equal correlations of each window computed on its own """
+	x, y = lagged_series()
+	starts, lags, correlations, overlaps = leadlag.rolling_cross_correlate(x, np.vstack((y, y[::-1])), 200, 150, 10)
+	assert starts.tolist() == [0, 150, 300]
+	assert correlations.shape == (2, 3, 21)
+	for idx, start in enumerate(starts):
+		expected = leadlag.cross_correlate(x[start:start + 200], y[start:start + 200], 10)[1]
+		assert np.allclose(correlations[0, idx], expected, equal_nan=True)
+
+def test_clip_outliers():
+	""" Tests that spikes are clipped to robust standard deviations from the median while other values are kept """
+	values = np.array([[1.0, -1.0, 0.5, -0.5, 0.0, 100.0, np.nan], [0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 1.0]])
+	clipped = leadlag.clip_outliers(values, 3.0)
+	assert clipped[0, :5].tolist() == values[0, :5].tolist()
+	# median is 0.25, median absolute deviation 0.75
+	assert clipped[0, 5] == pytest.approx(0.25 + 3.0 * 1.4826 * 0.75)
+	assert np.isnan(clipped[0, 6])
+	# median absolute deviation is 0, standard deviation is used instead
+	assert clipped[1, 6] == pytest.approx(min(1.0, 3.0 * np.std(values[1])))
@@ -1,25 +1,58 @@
 import pandas as pd
+import numpy as np
 import os
 import utils
+import regression
+import alignment
+import report
+import itertools
+import ticker_cache
+import validation
+import resample
 import math
 import sys
-import matplotlib.pyplot as plt
+import logging
+import argparse
+import instrumentation
+import result_cache
+import rolling
+import segmentation
+import structures
 from structures import *
-from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
 
 '''
 Given information about BTC lending rates and prices for the target currency for same time period,
 this script breaks the data about BTC lending rates into fixed intervals of time (can be set),
 establishes once lending rate within an interval exceeds the average for that interval and
-extracts target currency prices for respective timestamps logging results into .docx file.
+extracts target currency prices for respective timestamps logging results into an .html report.
+Instead of fixed intervals, lending rates can also be compared with a statistic of their trailing window, see 'get_rolling_interest_intervals'.
+Progress is reported through the 'logging' module, stages of a run can be measured with 'instrumentation.Metrics'.
 
 Basic assumption: if BTC lending rate grows, altcoins prices should increase as people borrow BTC to buy altcoins.
 '''
 
+logger = logging.getLogger(__name__)
+
 """
 Constants
 """
 TEN_DAYS = 10*24*60*60
+# duration of lending intervals meaning that lending rates are broken into intervals at changepoints (see 'segmentation') rather than into intervals of fixed duration
+CHANGEPOINTS = "changepoints"
+# lending rates aren't interpolated across gaps in lending data longer than this, in seconds
+MAX_LENDING_GAP = 6*60*60
+DATA_DIR = "data"
+BTC_LENDING_DATA = os.path.join(DATA_DIR, "(2016-08-13)-btc_lending_rates_bitfinex.csv")
+TARGET_DATA_SUFFIX = "_bitfinex_data.csv"
+REPORT_SUFFIX = "_report.html"
+# indices of columns within the normalized data files (see ticker_cache)
+LENDING_RATE_IDX = 3
+CLOSE_PRICE_IDX = 2
+VOLUME_IDX = 5
+SUMMARY_COLUMNS = ["ticker", "num_prices",
+	"num_growing", "avg_price_change_growing", "price_rise_ratio_growing",
+	"num_not_growing", "avg_price_change_not_growing", "price_rise_ratio_not_growing"]
 
 class BreakIt(Exception): pass
 
@@ -27,11 +60,16 @@ class BreakIt(Exception): pass
 def generate_lending_intervals(duration, entries):
 	""" Breaks down and organizes input LendingTickerEntry instances into LendingInterval instances of specified duration
 
-	Note: this function is generic and is capable of breaking into intervals any kind of objects that possess 'timestamp' property
+	Note: this function is generic and is capable of breaking into intervals any kind of objects that possess 'timestamp' property.
+	Both ends of an interval are inclusive, so an entry with timestamp exactly at the boundary of two intervals belongs to both of them.
+
+	Entries are bucketed in a single pass: boundaries of all intervals are located with a binary search over sorted timestamps,
+	so each interval is a slice of the input rather than a result of filtering the whole input. If the input is a LendingSeries,
+	the slices share memory with it.
 
 	Args:
 		duration - desired duration of returned LendingInterval instances, in seconds
-		entries - list of LendingTickerEntry instances to be broken down into resulting LendingInterval instances
+		entries - list of LendingTickerEntry instances or LendingSeries to be broken down into resulting LendingInterval instances
 
 	Returns:
 		list of LendingInterval instances where duration of each returned LendingInterval is specified by 'duration' input parameter
@@ -40,8 +78,15 @@ def generate_lending_intervals(duration, entries):
 		raise ValueError("duration of resulting LendingInterval must be positive integer")
 	if not len(entries):
 		raise ValueError("number of LendingEntry instances must be more than 0")
-	start_date = min(entry.timestamp for entry in entries)
-	end_date = max(entry.timestamp for entry in entries)
+	is_series = isinstance(entries, LendingSeries)
+	if is_series:
+		timestamps = entries.timestamps
+		ticker = entries.ticker
+	else:
+		timestamps = np.array([entry.timestamp for entry in entries])
+		ticker = entries[0].ticker
+	start_date = timestamps.min().item()
+	end_date = timestamps.max().item()
 	if end_date - start_date <= 0:
 		if len(entries) == 1:
 			raise ValueError("given single entry, no interval can be generated")
@@ -50,164 +95,464 @@ def generate_lending_intervals(duration, entries):
 	num_intervals = int(math.ceil((end_date - start_date)/duration))
 	if num_intervals > len(entries):
 		raise ValueError("resulting number of intervals (%d) is larger than number of entries (%d)" % (num_intervals, len(entries))) 
+	interval_starts = [start_date + i * duration for i in range(num_intervals)]
+	interval_ends = [min(interval_start + duration, end_date) for interval_start in interval_starts]
+	# sort timestamps (stable) only if needed, entries within each interval keep their input order
+	order = None
+	if (np.diff(timestamps) < 0).any():
+		order = np.argsort(timestamps, kind="mergesort")
+	sorted_timestamps = timestamps if order is None else timestamps[order]
+	los = np.searchsorted(sorted_timestamps, interval_starts, side="left").tolist()
+	his = np.searchsorted(sorted_timestamps, interval_ends, side="right").tolist()
 	intervals = list()
-	for i in range(0, num_intervals):
-		interval_start = start_date + i * duration
-		interval_end = start_date + (i + 1) * duration
-		if interval_end > end_date:
-			interval_end = end_date
-		interval_entries = list(filter(lambda entry: entry.timestamp >= interval_start and entry.timestamp <= interval_end, entries))
-		interval = LendingInterval(entries[0].ticker, interval_start, interval_end, interval_entries)
+	for interval_start, interval_end, lo, hi in zip(interval_starts, interval_ends, los, his):
+		if order is None:
+			interval_entries = entries[lo:hi]
+		elif is_series:
+			interval_entries = entries[np.sort(order[lo:hi])]
+		else:
+			interval_entries = [entries[idx] for idx in np.sort(order[lo:hi]).tolist()]
+		interval = LendingInterval(ticker, interval_start, interval_end, interval_entries)
 		intervals.append(interval)
 	return intervals
 
-'''
-Returns list of Intervals of interest when lending rate was higher than average 
-'''
-def get_interest_intervals(lending_intervals, min_num_tickers=10):
+def get_lending_intervals(duration, entries):
+	""" Breaks lending entries into LendingInterval instances of fixed duration (see 'generate_lending_intervals') or, if 'duration' is "changepoints",
+	at changepoints of lending rate (see 'segmentation.generate_segment_intervals' which is used with its default parameters)
 	"""
+	if duration == CHANGEPOINTS:
+		return segmentation.generate_segment_intervals(entries)
+	return generate_lending_intervals(duration, entries)
 
+def get_interest_intervals(lending_intervals, min_num_tickers=10):
+	""" Discovers InterestInterval instances: periods within LendingInterval instances when lending rate stayed higher than or equal to the average for the respective LendingInterval
+
+	An interest interval starts at the first entry with lending rate higher than or equal to the average and ends at the last such entry before lending rate falls below the average.
+	Periods that last till the end of a LendingInterval (lending rate never falls below the average) as well as periods with less than 'min_num_tickers' entries are dropped.
+	Resulting intervals are split into the ones where lending rate is growing and the ones where it isn't.
+
+	Note: all LendingInterval instances are processed in a batch: means, above-average masks, run boundaries and slopes are computed as array operations over the concatenated lending rates.
+
+	Args:
+		lending_intervals - list of LendingInterval instances, their lending entries must be sorted by timestamp in ascending order
+		min_num_tickers - minimum number of entries within resulting InterestInterval. Default value is 10.
+
+	Returns:
+		a tuple of two lists: InterestInterval instances where lending rate is growing and InterestInterval instances where it isn't
 	"""
 	if lending_intervals is None or type(lending_intervals) is not list or not all(isinstance(x, LendingInterval) for x in lending_intervals):
 		raise TypeError("input type should be list containing LendingTickerEntry objects")
 	if not len(lending_intervals):
 		return list(), list()
+	batch = IntervalBatch(lending_intervals)
+	timestamps, lending_rates, lengths = batch.timestamps, batch.lending_rates, batch.lengths
+	bucket_ends = batch.ends + 1
+	bucket_starts = batch.starts
+	is_bucket_first = np.zeros(len(timestamps), dtype=bool)
+	is_bucket_first[bucket_starts] = True
+	is_bucket_last = np.zeros(len(timestamps), dtype=bool)
+	is_bucket_last[bucket_ends - 1] = True
 	# assure that LendingTickerEntry objects within input LendingInterval objects are sorted by timestamp in ascending order
-	for lending_interval in lending_intervals:
-		for idx, lending_entry in enumerate(lending_interval.lending_entries):
-			if idx == len(lending_interval.lending_entries)-1:
-				break
-			if lending_entry.timestamp >= lending_interval.lending_entries[idx+1].timestamp:
-				raise ValueError("LendingTickerEntry objects must be sorted by timestamp in ascending order")
-	interest_intervals = list()
-	for i in range(len(lending_intervals)):
-		interest_interval_start = None
-		interest_interval_end = None
-		lending_tickers = list()
-		lending_interval = lending_intervals[i]
-		avg_lending_rate = lending_interval.get_avg_lending_rate()
-		for entry in lending_interval.lending_entries:
-			#begin interest interval when lending rate is higher than average
-			if entry.lending_rate >= avg_lending_rate:
-				if not interest_interval_start:
-					interest_interval_start = entry.timestamp
-			else:
-				#finish interest interval when lending rate gets below average
-				if interest_interval_start:
-					interest_interval_end = lending_tickers[-1].timestamp
-			# collect ticker entries within the period of interest
-			if interest_interval_start and not interest_interval_end:
-				lending_tickers.append(entry)
-			if interest_interval_start and interest_interval_end:
-				# ensure that short intervals with less than 10 ticker entries aren't counted
-				if len(lending_tickers) >= min_num_tickers:
-					interest_interval = InterestInterval(entry.ticker, interest_interval_start, interest_interval_end, lending_tickers)
-					interest_intervals.append(interest_interval)
-				interest_interval_start = None
-				interest_interval_end = None
-				lending_tickers = list()
+	if ((np.diff(timestamps) <= 0) & ~is_bucket_last[:-1]).any():
+		raise ValueError("LendingTickerEntry objects must be sorted by timestamp in ascending order")
+	avg_lending_rates = batch.reduce(np.add, lending_rates) / lengths
+	above_avg = lending_rates >= batch.broadcast(avg_lending_rates)
+	# runs of entries above average within the same LendingInterval
+	prev_above_avg = np.concatenate(([False], above_avg[:-1])) & ~is_bucket_first
+	next_above_avg = np.concatenate((above_avg[1:], [False])) & ~is_bucket_last
+	run_starts = np.flatnonzero(above_avg & ~prev_above_avg)
+	run_ends = np.flatnonzero(above_avg & ~next_above_avg)
+	# keep only runs closed by an entry below average within the same LendingInterval and long enough
+	keep = ~is_bucket_last[run_ends] & (run_ends - run_starts + 1 >= min_num_tickers)
+	run_starts, run_ends = run_starts[keep], run_ends[keep]
+	# each run is regressed once, so slopes are computed over its entries only rather than from prefix sums of all entries
+	growing = regression.direct_segment_slopes(timestamps, lending_rates, run_starts, run_ends) > 0.0
+	run_buckets = np.searchsorted(bucket_ends, run_starts, side="right")
+	# positions of the runs within entries of their LendingInterval
+	run_los = run_starts - bucket_starts[run_buckets]
+	run_his = run_ends - bucket_starts[run_buckets] + 1
+	filtered_interest_intervals = list()
+	filteredout_interest_intervals = list()
+	for bucket, lo, hi, start_date, end_date, is_growing in zip(run_buckets.tolist(), run_los.tolist(), run_his.tolist(), timestamps[run_starts].tolist(), timestamps[run_ends].tolist(), growing.tolist()):
+		lending_entries = lending_intervals[bucket].lending_entries
+		ticker = lending_entries.ticker if isinstance(lending_entries, LendingSeries) else lending_entries[lo].ticker
+		interval = InterestInterval.from_validated(ticker, start_date, end_date, lending_entries[lo:hi])
+		if is_growing:
+			filtered_interest_intervals.append(interval)
+		else:
+			filteredout_interest_intervals.append(interval)
+	return filtered_interest_intervals, filteredout_interest_intervals
+
+def get_rolling_interest_intervals(entries, window, statistic=rolling.MEAN, time_window=True, min_num_tickers=10):
+	""" Discovers InterestInterval instances by comparing each entry with a statistic of its trailing window instead of the average of a fixed LendingInterval
+
+	An interest interval starts at the first entry with lending rate higher than or equal to the statistic of its trailing window (the entry included)
+	and ends at the last such entry before lending rate falls below it. Unlike 'get_interest_intervals', results don't depend on where boundaries
+	of LendingInterval instances fall, so a rise of lending rate is never split by a boundary. Entries whose window reaches before the first entry
+	are never part of an interest interval. Periods that last till the last entry as well as periods with less than 'min_num_tickers' entries are dropped.
+	Resulting intervals are split into the ones where lending rate is growing and the ones where it isn't.
+
+	Args:
+		entries - LendingSeries or list of LendingTickerEntry instances, sorted by timestamp in ascending order
+		window - length of the trailing window (half-life for "ewma"): seconds for a time window, number of entries for a count window
+		statistic - "mean", "median" or "ewma", see 'rolling'. Default value is "mean".
+		time_window - if True, the window is measured in seconds, otherwise in entries. Default value is True.
+		min_num_tickers - minimum number of entries within resulting InterestInterval. Default value is 10.
+
+	Returns:
+		a tuple of two lists: InterestInterval instances where lending rate is growing and InterestInterval instances where it isn't
+	"""
+	if entries is None or not isinstance(entries, (list, LendingSeries)):
+		raise TypeError("input type should be LendingSeries or list containing LendingTickerEntry objects")
+	if not len(entries):
+		return list(), list()
+	series = entries if isinstance(entries, LendingSeries) else LendingSeries.from_entries(entries)
+	timestamps, lending_rates = series.timestamps, series.lending_rates
+	if (np.diff(timestamps) <= 0).any():
+		raise ValueError("LendingTickerEntry objects must be sorted by timestamp in ascending order")
+	baseline = rolling.rolling_statistic(timestamps, lending_rates, window, statistic, time_window)
+	above = (lending_rates >= baseline) & rolling.get_full_windows(timestamps, window, time_window)
+	prev_above = np.concatenate(([False], above[:-1]))
+	next_above = np.concatenate((above[1:], [False]))
+	run_starts = np.flatnonzero(above & ~prev_above)
+	run_ends = np.flatnonzero(above & ~next_above)
+	# keep only runs closed by an entry below the statistic and long enough
+	keep = (run_ends < len(timestamps) - 1) & (run_ends - run_starts + 1 >= min_num_tickers)
+	run_starts, run_ends = run_starts[keep], run_ends[keep]
+	growing = regression.segment_slopes(timestamps, lending_rates, run_starts, run_ends) > 0.0
 	filtered_interest_intervals = list()
 	filteredout_interest_intervals = list()
-	for interval in interest_intervals:
-		if interval.is_growing():
+	for start, end, is_growing in zip(run_starts.tolist(), run_ends.tolist(), growing.tolist()):
+		interval = InterestInterval(series.ticker, int(timestamps[start]), int(timestamps[end]), entries[start:end + 1])
+		if is_growing:
 			filtered_interest_intervals.append(interval)
 		else:
 			filteredout_interest_intervals.append(interval)
 	return filtered_interest_intervals, filteredout_interest_intervals
 
-def set_interest_entries(interval, tgt_entries):
+def get_growth_statistics(intervals):
+	""" Computes slope, correlation coefficient and p-value of lending rate growth for each of given LendingInterval (or InterestInterval) instances in a single vectorized call
+
+	Args:
+		intervals - list of LendingInterval instances
+
+	Returns:
+		a tuple of NumPy arrays: slopes, correlation coefficients and p-values, one element per interval
 	"""
+	if not len(intervals):
+		return regression.segment_regressions(None, None, [], [])
+	batch = IntervalBatch(intervals)
+	return regression.segment_regressions(batch.timestamps, batch.lending_rates, batch.starts, batch.ends)
 
+def get_target_tickers(data_dir=DATA_DIR):
+	""" Returns sorted list of tickers of target currencies which have price data in 'data_dir' (files named <ticker>_bitfinex_data.csv) """
+	return sorted(filename[:-len(TARGET_DATA_SUFFIX)].upper() for filename in os.listdir(data_dir) if filename.endswith(TARGET_DATA_SUFFIX))
+
+def get_target_data_path(ticker, data_dir=DATA_DIR):
+	""" Returns path to the price data file of given target currency ticker """
+	return os.path.join(data_dir, ticker.lower() + TARGET_DATA_SUFFIX)
+
+def load_lending_series(period_start, period_end, path=BTC_LENDING_DATA):
+	""" Loads BTC lending rates within given period of time as LendingSeries """
+	columns = utils.get_ticker_columns(path, period_start, period_end, 0)
+	return utils.columns_to_lending_series("BTC", columns, lending_rate_idx=LENDING_RATE_IDX, time_idx=0)
+
+def load_price_series(ticker, period_start, period_end, path=None):
+	""" Loads prices of given target currency within given period of time as PriceSeries """
+	columns = utils.get_ticker_columns(path or get_target_data_path(ticker), period_start, period_end, 0)
+	return utils.columns_to_price_series(ticker, columns, price_idx=CLOSE_PRICE_IDX, volume_idx=VOLUME_IDX, time_idx=0)
+
+def get_price_changes(intervals, price_series):
+	""" Computes relative change of close price between the first and the last price within each interval, all intervals at once
+
+	Args:
+		intervals - list of Interval instances
+		price_series - PriceSeries sorted by timestamp in ascending order
+
+	Returns:
+		float64 NumPy array with a relative price change per interval, NaN for intervals without prices
 	"""
-	matching_entries = list(filter(lambda x: x.timestamp >= interval.start_date and x.timestamp <= interval.end_date, tgt_entries))
-	interval.interest_entries = matching_entries
-	time_delta = tgt_entries[0].timestamp - interval.lending_entries[0].timestamp
-	print("Starting target timestamp: " + str(tgt_entries[0].timestamp))
-	print("Starting lending timestamp: " + str(interval.lending_entries[0].timestamp))
-	#if target currency price data isn't aligned by timestamp with lending rate data, assume that lending rate between entries was increasing linearly
-	if time_delta > 0:
-		fst_entry, snd_entry = interval.lending_entries[0], interval.lending_entries[1]
-		lending_rate_delta = snd_entry.lending_rate - fst_entry.lending_rate
-		lending_time_delta = snd_entry.timestamp - fst_entry.timestamp
-		if time_delta > lending_time_delta:
-			raise Exception("Timestamp period between interest entries is larger than timestamp period between lending entries!")
-		lending_rate = fst_entry.lending_rate + (float(time_delta)/float(lending_time_delta)) * float(lending_rate_delta)
-		aligned_entry = LendingTickerEntry(fst_entry.ticker, tgt_entries[0].timestamp, lending_rate)
-		interval.lending_entries[0] = aligned_entry
-		print("Starting lending entry: " + aligned_entry.to_string())
-		interval.start_date = tgt_entries[0].timestamp
-	time_delta = interval.lending_entries[-1].timestamp - tgt_entries[-1].timestamp
-	print("Ending target timestamp: " + str(tgt_entries[-1].timestamp))
-	print("Ending lending timestamp: " + str(interval.lending_entries[-1].timestamp))
-	if time_delta > 0:
-		before_last_entry, last_entry = interval.lending_entries[-2], interval.lending_entries[-1]
-		lending_rate_delta = last_entry.lending_rate - before_last_entry.lending_rate
-		lending_time_delta = last_entry.timestamp - before_last_entry.timestamp
-		lending_rate = before_last_entry.lending_rate + (1 - float(time_delta)/float(lending_time_delta)) * float(lending_rate_delta)
-		print("Lending rate: " + str(lending_rate))
-		aligned_entry = LendingTickerEntry(last_entry.ticker, tgt_entries[-1].timestamp, lending_rate)
-		print("Ending lending entry: " + aligned_entry.to_string())
-		interval.lending_entries[-1] = aligned_entry
-		interval.end_date = tgt_entries[-1].timestamp
+	starts = np.array([interval.start_date for interval in intervals], dtype=np.float64)
+	ends = np.array([interval.end_date for interval in intervals], dtype=np.float64)
+	return _price_changes(starts, ends, price_series)
+
+def _price_changes(starts, ends, price_series):
+	los = np.searchsorted(price_series.timestamps, starts, side="left")
+	his = np.searchsorted(price_series.timestamps, ends, side="right")
+	changes = np.full(len(starts), np.nan)
+	has_prices = his > los
+	close_prices = price_series.close_prices
+	changes[has_prices] = close_prices[his[has_prices] - 1] / close_prices[los[has_prices]] - 1.0
+	return changes
+
+def summarize_target(ticker, path, period_start, period_end, starts, ends, growing):
+	""" Joins interest intervals given by their boundaries against prices of a target currency and summarizes price changes during them
+
+	Note: the function takes plain arrays rather than InterestInterval instances so that it is cheap to run in another process.
+
+	Args:
+		ticker - target currency ticker
+		path - path to price data file of the target currency
+		period_start - start of the analyzed period
+		period_end - end of the analyzed period
+		starts - NumPy array of start dates of interest intervals
+		ends - NumPy array of end dates of interest intervals
+		growing - boolean NumPy array, True for intervals where lending rate is growing
+
+	Returns:
+		a dictionary with the summary, see SUMMARY_COLUMNS
+	"""
+	price_series = load_price_series(ticker, period_start, period_end, path)
+	changes = _price_changes(starts, ends, price_series)
+	summary = dict(ticker=ticker, num_prices=len(price_series))
+	for name, mask in (("growing", growing), ("not_growing", ~growing)):
+		group_changes = changes[mask & ~np.isnan(changes)]
+		summary["num_%s" % (name)] = int(len(group_changes))
+		summary["avg_price_change_%s" % (name)] = float(group_changes.mean()) if len(group_changes) else float("nan")
+		summary["price_rise_ratio_%s" % (name)] = float((group_changes > 0.0).mean()) if len(group_changes) else float("nan")
+	return summary
+
+def analyze_all_targets(period_start, period_end, duration=TEN_DAYS, min_num_tickers=10, tickers=None, data_dir=DATA_DIR, lending_path=BTC_LENDING_DATA, max_workers=None):
+	""" Analyzes all target currencies against BTC lending rates in a single run
+
+	BTC lending rates are loaded, broken into LendingInterval instances and searched for InterestInterval instances once.
+	Resulting intervals are then joined against prices of every target currency in parallel, one process per currency.
+
+	Args:
+		period_start - start of the analyzed period
+		period_end - end of the analyzed period
+		duration - duration of LendingInterval instances, in seconds, or "changepoints" (see 'get_lending_intervals'). Default value is TEN_DAYS.
+		min_num_tickers - minimum number of entries within InterestInterval. Default value is 10.
+		tickers - target currency tickers. Default value is None (all tickers with price data in 'data_dir').
+		data_dir - directory containing price data files of target currencies
+		lending_path - path to BTC lending rates file
+		max_workers - number of worker processes, 0 runs everything in the current process. Default value is None (number of CPUs).
+
+	Returns:
+		Pandas dataframe with a summary row per target currency, see SUMMARY_COLUMNS
+	"""
+	tickers = tickers or get_target_tickers(data_dir)
+	paths = dict((ticker, get_target_data_path(ticker, data_dir)) for ticker in tickers)
+	# ingest data files once, worker processes then only memory-map them
+	ticker_cache.ensure_cached([lending_path] + list(paths.values()))
+	lending_series = load_lending_series(period_start, period_end, lending_path)
+	growing_intervals, not_growing_intervals = get_interest_intervals(get_lending_intervals(duration, lending_series), min_num_tickers)
+	intervals = growing_intervals + not_growing_intervals
+	starts = np.array([interval.start_date for interval in intervals], dtype=np.float64)
+	ends = np.array([interval.end_date for interval in intervals], dtype=np.float64)
+	growing = np.arange(len(intervals)) < len(growing_intervals)
+	args = [(ticker, paths[ticker], period_start, period_end, starts, ends, growing) for ticker in tickers]
+	if max_workers == 0:
+		summaries = [summarize_target(*task_args) for task_args in args]
+	else:
+		with ProcessPoolExecutor(max_workers=max_workers) as executor:
+			summaries = list(executor.map(summarize_target, *zip(*args)))
+	return pd.DataFrame(summaries, columns=SUMMARY_COLUMNS)
+
+def set_interest_entries(interval, aligned):
+	""" Attaches target currency prices within the interval to it and replaces its lending entries with lending rates aligned to the price timestamps
+
+	If target currency prices aren't aligned by timestamp with lending rates, lending rate between lending entries is assumed to change linearly.
+	Prices without an aligned lending rate (see 'alignment.align_lending_to_prices' tolerance) are left out.
+	Start and end date of the interval are moved to the first and last kept price timestamp within it.
+
+	Args:
+		interval - InterestInterval to attach prices to
+		aligned - AlignedSeries returned by 'alignment.align_lending_to_prices' or a list of DetailedTickerEntry instances
+			(then aligned with the lending entries of the interval)
+
+	Returns:
+		the input InterestInterval. Its interest entries are left empty if there are no prices within the interval
+	"""
+	if not isinstance(aligned, AlignedSeries):
+		lending_series = interval.lending_entries if isinstance(interval.lending_entries, LendingSeries) else LendingSeries.from_entries(interval.lending_entries)
+		aligned = alignment.align_lending_to_prices(lending_series, PriceSeries.from_entries(aligned))
+	interval_aligned = aligned.slice_by_time(interval.start_date, interval.end_date)
+	# prices without aligned lending rate (too far from lending entries) are left out, so that prices, lending entries and dates cover the same rows
+	has_lending_rate = ~np.isnan(interval_aligned.lending_rates)
+	if not has_lending_rate.all():
+		interval_aligned = interval_aligned[has_lending_rate]
+	if not len(interval_aligned):
+		interval.interest_entries = list()
+		return interval
+	interval.interest_entries = interval_aligned.price_series()
+	interval.lending_entries = interval_aligned.lending_series()
+	interval.start_date = int(interval_aligned.timestamps[0])
+	interval.end_date = int(interval_aligned.timestamps[-1])
 	return interval
 
-def main():
-	# define period that we are interested in
-	period_start = 1480530600.0
-	period_end = 1507062600.0
+def get_report_sections(intervals, aligned, ticker, title_prefix, is_growing):
+	""" Lazily attaches aligned target currency prices to each interval and yields its section of the report (see 'report.make_section') """
+	for idx, interval in enumerate(intervals):
+		interval = set_interest_entries(interval, aligned)
+		if logger.isEnabledFor(logging.DEBUG):
+			logger.debug("Interval: %s", interval.to_string())
+		if len(interval.interest_entries):
+			yield report.make_section(interval, "%s %d" % (title_prefix, idx), ticker, is_growing)
 
-	# collect data about tickers for respective interest period
-	btc_rows = utils.get_ticker_data("data/(2016-08-13)-btc_lending_rates_bitfinex.csv", period_start, period_end, 0)
-	btc_entries = utils.df_rows_to_lending_entries("BTC", btc_rows, 0, 3)
-	print("%d %s entries collected!" % (len(btc_entries), "BTC"))
-	tgt_rows = utils.get_ticker_data("data/ltc_bitfinex_data.csv", period_start, period_end, 0)
-	tgt_entries = utils.df_rows_to_interest_entries("LTC", tgt_rows, 0, 2, 5)
-	print("%d %s entries collected!" % (len(tgt_entries), "LTC"))
+def get_code_version():
+	""" Returns version of the code computing cached results of the analysis, see 'result_cache.get_code_version'
 
-	#break data about lending rates into 10 day intervals
-	lending_intervals = generate_lending_intervals(TEN_DAYS, btc_entries)
+	Modules ingesting data files (ticker_cache with its CACHE_VERSION, validation and resample) are included, since they produce the loaded columns.
+	"""
+	return result_cache.get_code_version([sys.modules[__name__], structures, regression, alignment, utils, rolling, segmentation, ticker_cache, validation, resample])
 
-	# generate and return InterestInterval objects that matched the strategy 
-	filtered_intervals, filteredout_intervals = get_interest_intervals(lending_intervals)
-	print("Total filtered interest intervals: %d" % (len(filtered_intervals)))
-	print("Total filtered out interest intervals: %d" % (len(filteredout_intervals)))
-	for idx, interval in enumerate(filtered_intervals):
-		entries = list(filter(lambda x: x.timestamp >= interval.start_date and x.timestamp <= interval.end_date, tgt_entries))
+def get_result_keys(ticker, period_start, period_end, lending_path, target_path, duration, min_num_tickers, window=None, statistic=rolling.MEAN):
+	""" Returns keys of cached results of the analysis stages: lending intervals, interest intervals and aligned series
+
+	Each key covers the inputs of its stage only (the interest intervals key includes the lending intervals key),
+	so that a run whose inputs changed only for later stages reuses the results of the earlier ones.
+	If 'window' is set, the interest intervals key is the one of intervals discovered by 'get_rolling_interest_intervals' with a time window.
+	"""
+	code_version = get_code_version()
+	lending_hash = ticker_cache.get_source_hash(lending_path)
+	target_hash = ticker_cache.get_source_hash(target_path)
+	lending_key = result_cache.make_key("lending_intervals", lending=lending_hash, period=[period_start, period_end], duration=duration, code=code_version)
+	if window is None:
+		interest_key = result_cache.make_key("interest_intervals", lending_intervals=lending_key, min_num_tickers=min_num_tickers, code=code_version)
+	else:
+		interest_key = result_cache.make_key("rolling_interest_intervals", lending=lending_hash, period=[period_start, period_end], window=window,
+			statistic=statistic, min_num_tickers=min_num_tickers, code=code_version)
+	aligned_key = result_cache.make_key("aligned", lending=lending_hash, target=target_hash, ticker=ticker, period=[period_start, period_end],
+		method=alignment.LINEAR, tolerance=MAX_LENDING_GAP, code=code_version)
+	return lending_key, interest_key, aligned_key
+
+def run_analysis(ticker, period_start, period_end, lending_path=BTC_LENDING_DATA, target_path=None, duration=TEN_DAYS, report_path=None, metrics=None, cache=None, min_num_tickers=10, window=None, statistic=rolling.MEAN):
+	""" Runs the whole analysis of a target currency: loads data, discovers interest intervals, aligns prices with them and writes the report
+
+	Args:
+		ticker - target currency ticker
+		period_start - start of the analyzed period
+		period_end - end of the analyzed period
+		lending_path - path to BTC lending rates file. Default value is BTC_LENDING_DATA.
+		target_path - path to price data file of the target currency. Default value is None (file of the ticker in DATA_DIR).
+		duration - duration of lending intervals, in seconds, or "changepoints" (see 'get_lending_intervals'). Default value is TEN_DAYS.
+		report_path - path to the resulting .html report. Default value is None (no report, sections are still built).
+		metrics - instrumentation.Metrics recording stages of the run: load, convert, bucket, detect, align and report, and cache_lookup if 'cache' is set.
+			Prices are attached to intervals lazily while the report is written, so that work is part of the report stage. Default value is None (not measured).
+		cache - result_cache.ResultCache storing lending intervals, interest intervals and aligned series. Data is loaded only if some of them
+			isn't cached, stages with cached results only decode them. Default value is None (nothing is cached).
+		min_num_tickers - minimum number of entries within InterestInterval. Default value is 10.
+		window - length of the trailing window in seconds. If set, interest intervals are discovered by comparing lending rates with a statistic of
+			their trailing window (see 'get_rolling_interest_intervals') and lending rates aren't bucketed. Default value is None (LendingInterval averages are used).
+		statistic - statistic of the trailing window: "mean", "median" or "ewma". Default value is "mean".
+
+	Returns:
+		a tuple of two lists: InterestInterval instances where lending rate is growing and InterestInterval instances where it isn't, with interest entries set
+	"""
+	metrics = metrics or instrumentation.DISABLED
+	target_path = target_path or get_target_data_path(ticker)
+	loaded = dict()
 
-		interval = set_interest_entries(interval, entries)
+	# the cache_lookup stage measures only lookups and decoding of cached results, results computed on a miss are measured by their own stages
+	def get_or_compute(key, compute, encode, decode):
+		with metrics.stage("cache_lookup", 1) as stage:
+			found, value = cache.lookup(key, decode)
+			stage.rows_out = int(found)
+		if not found:
+			value = compute()
+			cache.put(key, encode(value))
+		return value
 
-		#price information plotting
-		x_data = list(map(lambda x: datetime.fromtimestamp(x.timestamp), interval.interest_entries))
-		y_data = list(map(lambda x: x.close_price, interval.interest_entries))
+	# collect data about tickers for respective interest period, only once some stage needs it
+	def load_series():
+		if not loaded:
+			with metrics.stage("load") as stage:
+				btc_columns = utils.get_ticker_columns(lending_path, period_start, period_end, 0)
+				tgt_columns = utils.get_ticker_columns(target_path, period_start, period_end, 0)
+				stage.rows_out = len(btc_columns[0]) + len(tgt_columns[0])
+			with metrics.stage("convert", len(btc_columns[0]) + len(tgt_columns[0])) as stage:
+				loaded["btc"] = utils.columns_to_lending_series("BTC", btc_columns, lending_rate_idx=LENDING_RATE_IDX, time_idx=0)
+				loaded["tgt"] = utils.columns_to_price_series(ticker, tgt_columns, price_idx=CLOSE_PRICE_IDX, volume_idx=VOLUME_IDX, time_idx=0)
+				stage.rows_out = len(loaded["btc"]) + len(loaded["tgt"])
+			logger.info("%d %s entries collected!", len(loaded["btc"]), "BTC")
+			logger.info("%d %s entries collected!", len(loaded["tgt"]), ticker)
+		return loaded["btc"], loaded["tgt"]
 
-		graph_title = "LTC Analysis based on BTC Lending Rate from " + x_data[0].strftime("%B %d, %Y") + " till " + x_data[-1].strftime("%B %d, %Y") + "<br> Filtered Interval " + str(idx)
+	#break data about lending rates into intervals
+	def bucket():
+		btc_series = load_series()[0]
+		with metrics.stage("bucket", len(btc_series)) as stage:
+			lending_intervals = get_lending_intervals(duration, btc_series)
+			stage.rows_out = len(lending_intervals)
+		return lending_intervals
 
-		utils.plot_interval(x_data, y_data, graph_title, "LTC Price")
+	# generate and return InterestInterval objects that matched the strategy 
+	def detect():
+		if window is not None:
+			btc_series = load_series()[0]
+			with metrics.stage("detect", len(btc_series)) as stage:
+				interest_intervals = get_rolling_interest_intervals(btc_series, window, statistic, True, min_num_tickers)
+				stage.rows_out = len(interest_intervals[0]) + len(interest_intervals[1])
+			return interest_intervals
+		lending_intervals = bucket() if cache is None else get_or_compute(lending_key, bucket, result_cache.encode_intervals, result_cache.decode_intervals)
+		with metrics.stage("detect", len(lending_intervals)) as stage:
+			interest_intervals = get_interest_intervals(lending_intervals, min_num_tickers)
+			stage.rows_out = len(interest_intervals[0]) + len(interest_intervals[1])
+		return interest_intervals
 
-		#lending rate information plotting
-		x_data = list(map(lambda x: datetime.fromtimestamp(x.timestamp), interval.lending_entries))
-		y_data = list(map(lambda x: x.lending_rate, interval.lending_entries))
-		utils.plot_interval(x_data, y_data, graph_title, "BTC Lending Rate")
-		print("Interval: " + interval.to_string())
-	print("------------------------------------")
-	for idx, filtered_interval in enumerate(filteredout_intervals):
-		entries = list(filter(lambda x: x.timestamp >= filtered_interval.start_date and x.timestamp <= filtered_interval.end_date, tgt_entries))
-		interval = set_interest_entries(filtered_interval, entries)
+	# align lending rates with target currency prices once, intervals take slices of the aligned series
+	def align():
+		btc_series, tgt_series = load_series()
+		with metrics.stage("align", len(tgt_series)) as stage:
+			aligned = alignment.align_lending_to_prices(btc_series, tgt_series, alignment.LINEAR, MAX_LENDING_GAP)
+			stage.rows_out = len(aligned)
+		return aligned
 
-		#price information plotting
-		x_data = list(map(lambda x: datetime.fromtimestamp(x.timestamp), interval.interest_entries))
-		y_data = list(map(lambda x: x.close_price, interval.interest_entries))
+	if cache is None:
+		filtered_intervals, filteredout_intervals = detect()
+		aligned = align()
+	else:
+		lending_key, interest_key, aligned_key = get_result_keys(ticker, period_start, period_end, lending_path, target_path, duration, min_num_tickers, window, statistic)
+		filtered_intervals, filteredout_intervals = get_or_compute(interest_key, detect, result_cache.encode_interest_intervals, result_cache.decode_interest_intervals)
+		aligned = get_or_compute(aligned_key, align, result_cache.encode_aligned, result_cache.decode_aligned)
+	logger.info("Total filtered interest intervals: %d", len(filtered_intervals))
+	logger.info("Total filtered out interest intervals: %d", len(filteredout_intervals))
 
-		graph_title = "LTC Analysis based on BTC Lending Rate from " + x_data[0].strftime("%B %d, %Y") + " till " + x_data[-1].strftime("%B %d, %Y") + "<br> Filtered Out Interval " + str(idx)
+	sections = itertools.chain(
+		get_report_sections(filtered_intervals, aligned, ticker, "Filtered Interval", True),
+		get_report_sections(filteredout_intervals, aligned, ticker, "Filtered Out Interval", False))
+	with metrics.stage("report", len(filtered_intervals) + len(filteredout_intervals)) as stage:
+		if report_path is None:
+			num_sections = sum(1 for section in sections)
+		else:
+			num_sections = report.write_report(report_path, sections, "%s Analysis based on BTC Lending Rate" % (ticker))
+			logger.info("%d intervals written to %s", num_sections, report_path)
+		stage.rows_out = num_sections
+	return filtered_intervals, filteredout_intervals
 
-		utils.plot_interval(x_data, y_data, graph_title, "LTC Price")
+def main(metrics_path=None, trace_memory=False, cache_dir=result_cache.DEFAULT_CACHE_DIR, cache_max_bytes=result_cache.DEFAULT_MAX_BYTES, window=None, statistic=rolling.MEAN):
+	# define period that we are interested in
+	period_start = 1480530600.0
+	period_end = 1507062600.0
+	metrics = instrumentation.Metrics(enabled=metrics_path is not None, trace_memory=trace_memory)
+	cache = result_cache.ResultCache(cache_dir, cache_max_bytes) if cache_dir else None
+	run_analysis("LTC", period_start, period_end, report_path="ltc" + REPORT_SUFFIX, metrics=metrics, cache=cache, window=window, statistic=statistic)
+	if metrics_path is not None:
+		metrics.export(metrics_path, {"ticker": "LTC"})
+		logger.info("Metrics of the run written to %s", metrics_path)
 
-		#lending rate information plotting
-		x_data = list(map(lambda x: datetime.fromtimestamp(x.timestamp), interval.lending_entries))
-		y_data = list(map(lambda x: x.lending_rate, interval.lending_entries))
-		utils.plot_interval(x_data, y_data, graph_title, "BTC Lending Rate")
-		print("Interval: " + filtered_interval.to_string())
-	print("------------------------------------")
+def main_all():
+	# define period that we are interested in
+	period_start = 1480530600.0
+	period_end = 1507062600.0
+	summary = analyze_all_targets(period_start, period_end)
+	print(summary.to_string(index=False))
 
 if __name__ == "__main__":
-	main()
\ No newline at end of file
+	parser = argparse.ArgumentParser(description="Analysis of target currency prices within periods of growing BTC lending rate")
+	parser.add_argument("--all", action="store_true", help="summarize all target currencies in the data directory instead of writing the LTC report")
+	parser.add_argument("--metrics", help="file to export measurements of the run stages to, in Prometheus text format if it ends with .prom, otherwise as JSON")
+	parser.add_argument("--trace-memory", action="store_true", help="measure peak memory of stages with tracemalloc (slower)")
+	parser.add_argument("--cache-dir", default=result_cache.DEFAULT_CACHE_DIR, help="directory of cached intermediate results, empty string disables the cache")
+	parser.add_argument("--cache-max-mb", type=float, default=result_cache.DEFAULT_MAX_BYTES / 2.0**20, help="size cap of the cache, in MiB")
+	parser.add_argument("--window-days", type=float, help="compare lending rates with a statistic of their trailing window of this many days instead of the average of fixed intervals")
+	parser.add_argument("--statistic", default=rolling.MEAN, choices=rolling.STATISTICS, help="statistic of the trailing window (half-life of weights for ewma)")
+	parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"], help="level of logged messages")
+	args = parser.parse_args()
+	logging.basicConfig(level=args.log_level, format="%(message)s")
+	if args.all:
+		main_all()
+	else:
+		window = int(args.window_days * 24*60*60) if args.window_days else None
+		main(args.metrics, args.trace_memory, args.cache_dir, int(args.cache_max_mb * 2**20), window, args.statistic)
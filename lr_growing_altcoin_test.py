@@ -1,5 +1,6 @@
 import pytest
 import math
+import numpy as np
 import lr_growing_altcoin as test_tgt
 import structures
 from utils import generate_sample_lending_intervals
@@ -107,4 +108,125 @@ def test_get_intervals_valid_duration():
 		for filtered_interval in filtered_intervals:
 			assert filtered_interval.start_date >= lending_interval.start_date and filtered_interval <= lending_interval.end_date
 		for filteredout_interval in filteredout_intervals:
-			assert filteredout_interval.start_date >= lending_interval.start_date and filteredout_interval <= lending_interval.end_date
\ No newline at end of file
+			assert filteredout_interval.start_date >= lending_interval.start_date and filteredout_interval <= lending_interval.end_date
+
+def test_generate_lending_intervals_boundary_entries():
+	""" Tests whether 'generate_lending_intervals' puts an entry with timestamp exactly at the boundary of two intervals into both of them """
+	entries = [structures.LendingTickerEntry("Test", 1500000000 + i * 10, 1.0 + i) for i in range(7)]
+	intervals = test_tgt.generate_lending_intervals(20, entries)
+	assert [(interval.start_date, interval.end_date) for interval in intervals] == [(1500000000, 1500000020), (1500000020, 1500000040), (1500000040, 1500000060)]
+	assert [[entry.timestamp for entry in interval.lending_entries] for interval in intervals] == [
+		[1500000000, 1500000010, 1500000020],
+		[1500000020, 1500000030, 1500000040],
+		[1500000040, 1500000050, 1500000060]]
+
+def test_generate_lending_intervals_unsorted_entries():
+	""" Tests whether 'generate_lending_intervals' keeps input order of entries within each interval when input entries are not sorted """
+	timestamps = [1500000050, 1500000000, 1500000030, 1500000010, 1500000060, 1500000020, 1500000040]
+	entries = [structures.LendingTickerEntry("Test", timestamp, 1.0) for timestamp in timestamps]
+	intervals = test_tgt.generate_lending_intervals(30, entries)
+	assert [[entry.timestamp for entry in interval.lending_entries] for interval in intervals] == [
+		[1500000000, 1500000030, 1500000010, 1500000020],
+		[1500000050, 1500000030, 1500000060, 1500000040]]
+
+def test_generate_lending_intervals_series_slices():
+	""" Tests whether 'generate_lending_intervals' given LendingSeries returns intervals holding slices of it with same entries as for a list input """
+	series = structures.LendingSeries("Test", [1500000000 + i * 10 for i in range(50)], [1.0 + (i % 7) for i in range(50)])
+	from_series = test_tgt.generate_lending_intervals(70, series)
+	from_entries = test_tgt.generate_lending_intervals(70, series.to_entries())
+	assert len(from_series) == len(from_entries)
+	for series_interval, entries_interval in zip(from_series, from_entries):
+		assert isinstance(series_interval.lending_entries, structures.LendingSeries)
+		assert (series_interval.start_date, series_interval.end_date) == (entries_interval.start_date, entries_interval.end_date)
+		assert series_interval.lending_entries.timestamps.tolist() == [entry.timestamp for entry in entries_interval.lending_entries]
+
+def make_lending_interval(lending_rates, start=1500000000, step=3600):
+	""" Returns LendingInterval made of LendingTickerEntry instances with given lending rates spaced by 'step' seconds """
+	entries = [structures.LendingTickerEntry("Test", start + idx * step, lending_rate) for idx, lending_rate in enumerate(lending_rates)]
+	return structures.LendingInterval("Test", entries[0].timestamp, entries[-1].timestamp, entries)
+
+def test_get_intervals_runs_and_growth():
+	""" Tests that 'get_interest_intervals' returns runs of entries above average closed by an entry below average and splits them by growth """
+	# average lending rate is 4.0: run [5.0, 6.0, 7.0] is growing, run [7.0, 6.0, 5.0] isn't, run [8.0] is still open at the end and is dropped
+	lending_interval = make_lending_interval([1.0, 5.0, 6.0, 7.0, 1.0, 7.0, 6.0, 5.0, 1.0, 1.0, 1.0, 8.0])
+	filtered_intervals, filteredout_intervals = test_tgt.get_interest_intervals([lending_interval], min_num_tickers=3)
+	assert [[entry.lending_rate for entry in interval.lending_entries] for interval in filtered_intervals] == [[5.0, 6.0, 7.0]]
+	assert [[entry.lending_rate for entry in interval.lending_entries] for interval in filteredout_intervals] == [[7.0, 6.0, 5.0]]
+	assert (filtered_intervals[0].start_date, filtered_intervals[0].end_date) == (1500003600, 1500010800)
+
+def test_get_intervals_min_num_tickers():
+	""" Tests that 'get_interest_intervals' drops runs with less entries than 'min_num_tickers' """
+	lending_interval = make_lending_interval([1.0, 5.0, 6.0, 7.0, 1.0, 7.0, 8.0, 1.0, 1.0])
+	filtered_intervals, filteredout_intervals = test_tgt.get_interest_intervals([lending_interval], min_num_tickers=3)
+	assert len(filtered_intervals) == 1 and len(filtered_intervals[0].lending_entries) == 3
+	assert filteredout_intervals == list()
+
+def test_get_intervals_series_matches_entries():
+	""" Tests that 'get_interest_intervals' returns same InterestInterval instances for LendingInterval instances holding LendingSeries as for ones holding entry lists """
+	lending_intervals = generate_sample_lending_intervals(10, 40, 1480000000, 1510000000)
+	series_intervals = [structures.LendingInterval("Test", interval.start_date, interval.end_date, structures.LendingSeries.from_entries(interval.lending_entries)) for interval in lending_intervals]
+	for from_entries, from_series in zip(test_tgt.get_interest_intervals(lending_intervals, 3), test_tgt.get_interest_intervals(series_intervals, 3)):
+		assert [(interval.start_date, interval.end_date) for interval in from_entries] == [(interval.start_date, interval.end_date) for interval in from_series]
+		assert all(isinstance(interval.lending_entries, structures.LendingSeries) for interval in from_series)
+
+def test_set_interest_entries_aligns_lending_rates():
+	""" Tests that 'set_interest_entries' attaches prices within the interval and aligns its lending rates and dates to the price timestamps """
+	import alignment
+	lending_series = structures.LendingSeries("BTC", [1500000000 + i * 3600 for i in range(10)], [1.0 + i for i in range(10)])
+	price_series = structures.PriceSeries("LTC", [1500000900 + i * 900 for i in range(40)], [1.0] * 40, [1.0] * 40)
+	interval = structures.InterestInterval("BTC", 1500003600, 1500014400, lending_series[1:5])
+	interval = test_tgt.set_interest_entries(interval, alignment.align_lending_to_prices(lending_series, price_series))
+	assert (interval.start_date, interval.end_date) == (1500003600, 1500014400)
+	assert len(interval.interest_entries) == 13
+	assert interval.lending_entries.lending_rates.tolist() == [2.0 + i * 0.25 for i in range(13)]
+
+def test_set_interest_entries_drops_unaligned_prices():
+	""" Tests that 'set_interest_entries' leaves out prices without aligned lending rate, so that prices, lending entries and dates cover the same timestamps """
+	import alignment
+	lending_series = structures.LendingSeries("BTC", [1500000000 + i * 3600 for i in range(4)] + [1500050400 + i * 3600 for i in range(4)], [1.0 + i for i in range(8)])
+	price_series = structures.PriceSeries("LTC", [1500000000 + i * 900 for i in range(80)], [1.0] * 80, [1.0] * 80)
+	aligned = alignment.align_lending_to_prices(lending_series, price_series, alignment.LINEAR, test_tgt.MAX_LENDING_GAP)
+	interval = structures.InterestInterval("BTC", 1500000000, 1500061200, lending_series)
+	num_aligned = int((~np.isnan(aligned.slice_by_time(1500000000, 1500061200).lending_rates)).sum())
+	assert num_aligned < 69
+	interval = test_tgt.set_interest_entries(interval, aligned)
+	assert interval.interest_entries.timestamps.tolist() == interval.lending_entries.timestamps.tolist()
+	assert len(interval.interest_entries) == num_aligned
+	assert (interval.start_date, interval.end_date) == (int(interval.interest_entries.timestamps[0]), int(interval.interest_entries.timestamps[-1]))
+
+def test_analyze_all_targets(tmp_path):
+	""" Tests that 'analyze_all_targets' returns a summary row per target currency and same results in worker processes as in the current process """
+	lending_path = str(tmp_path / "btc_lending_rates.csv")
+	with open(lending_path, "w") as f:
+		f.write("timestamp,amount_lent,amount_used,rate\n")
+		for i in range(24 * 30):
+			f.write("%d,1.0,1.0,%f\n" % (1500000000 + i * 3600, 10.0 + 5.0 * math.sin(i / 10.0)))
+	for ticker, slope in (("ltc", 1000.0), ("eth", -2000.0)):
+		with open(str(tmp_path / (ticker + "_bitfinex_data.csv")), "w") as f:
+			for i in range(4 * 24 * 30):
+				f.write("%d,1.0,%f,1.0,1.0,10.0\n" % (1500000000 + i * 900, 10.0 + i / slope))
+	inline = test_tgt.analyze_all_targets(1500000000, 1502592000, 86400 * 5, 5, data_dir=str(tmp_path), lending_path=lending_path, max_workers=0)
+	pooled = test_tgt.analyze_all_targets(1500000000, 1502592000, 86400 * 5, 5, data_dir=str(tmp_path), lending_path=lending_path, max_workers=2)
+	assert list(inline["ticker"]) == ["ETH", "LTC"]
+	assert inline.equals(pooled)
+	assert all(inline.loc[inline["ticker"] == "LTC", "price_rise_ratio_growing"] == 1.0)
+	assert all(inline.loc[inline["ticker"] == "ETH", "price_rise_ratio_growing"] == 0.0)
+
+def test_get_rolling_intervals_runs_and_growth():
+	""" Tests that 'get_rolling_interest_intervals' returns runs of entries above the mean of their trailing window closed by an entry below it """
+	# means of windows of 4 entries from the fourth entry on: 1.5, 2.25, 3.5, 4.75, 4.75, 4.0, 2.75, 3.25, 5.0, 6.25, 6.25
+	lending_interval = make_lending_interval([2.0, 1.0, 2.0, 1.0, 5.0, 6.0, 7.0, 1.0, 2.0, 1.0, 9.0, 8.0, 7.0, 1.0])
+	series = structures.LendingSeries.from_entries(lending_interval.lending_entries)
+	filtered_intervals, filteredout_intervals = test_tgt.get_rolling_interest_intervals(series, 4, "mean", False, min_num_tickers=3)
+	assert [interval.lending_entries.lending_rates.tolist() for interval in filtered_intervals] == [[5.0, 6.0, 7.0]]
+	assert [interval.lending_entries.lending_rates.tolist() for interval in filteredout_intervals] == [[9.0, 8.0, 7.0]]
+	assert (filtered_intervals[0].start_date, filtered_intervals[0].end_date) == (1500014400, 1500021600)
+	# same window in seconds, given a list of entries
+	from_entries = test_tgt.get_rolling_interest_intervals(lending_interval.lending_entries, 3 * 3600, "mean", True, min_num_tickers=3)
+	assert [[entry.lending_rate for entry in interval.lending_entries] for interval in from_entries[0]] == [[5.0, 6.0, 7.0]]
+
+def test_get_rolling_intervals_asserts_ascending_timestamps():
+	""" Tests whether 'get_rolling_interest_intervals' throws ValueError given entries which aren't sorted by timestamp in ascending order """
+	lending_interval = make_lending_interval([1.0, 2.0, 3.0])
+	with pytest.raises(ValueError):
+		test_tgt.get_rolling_interest_intervals(lending_interval.lending_entries[::-1], 3600)
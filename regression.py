@@ -0,0 +1,154 @@
+import numpy as np
+
+'''
+Closed-form ordinary least squares over many segments of a series at once.
+
+Prefix sums of t, y, t^2, t*y and y^2 are computed once in O(N), after which slope (and optionally correlation coefficient and p-value)
+of the line fitted to any segment costs O(1). Timestamps are centered before squaring so that prefix sums of Unix timestamps (~1.5e9)
+don't lose precision, lending rates are centered as well for the same reason. Prefix sums are accumulated in extended precision
+(np.longdouble) since centered sums of a segment are obtained as a difference of two large prefix sums.
+
+Slopes of segments regressed only once and covering a small part of the series are cheaper to compute directly, see 'direct_segment_slopes':
+it visits elements of the segments only and needs no extended precision, as each segment is centered on its own means.
+'''
+
+class PrefixSums(object):
+	""" Prefix sums of a series used to compute regression of any of its segments in O(1)
+
+		Each array has N + 1 elements, element i holds the sum over the first i elements of the series.
+	"""
+
+	def __init__(self, timestamps, values, time_origin=None):
+		timestamps = np.asarray(timestamps)
+		values = np.asarray(values, dtype=np.float64)
+		if timestamps.shape != values.shape or timestamps.ndim != 1:
+			raise ValueError("timestamps and values should be one-dimensional arrays of same length")
+		if time_origin is None:
+			time_origin = 0.5 * (float(timestamps[0]) + float(timestamps[-1])) if len(timestamps) else 0.0
+		self.time_origin = time_origin
+		self.value_origin = float(values.mean()) if len(values) else 0.0
+		t = timestamps.astype(np.float64) - time_origin
+		y = values - self.value_origin
+		self.t = self._prefix(t)
+		self.y = self._prefix(y)
+		self.tt = self._prefix(t * t)
+		self.ty = self._prefix(t * y)
+		self.yy = self._prefix(y * y)
+		# number of changes of value, used to detect segments where all values are equal
+		self.changes = np.concatenate(([0, 0], np.cumsum(values[1:] != values[:-1])))
+
+	@staticmethod
+	def _prefix(values):
+		return np.concatenate(([0.0], np.cumsum(values, dtype=np.longdouble)))
+
+	def __len__(self):
+		return len(self.t) - 1
+
+def _segment_moments(prefix, starts, ends):
+	""" Returns count and centered sums of squares (Sxx, Sxy, Syy) of segments [start, end] (inclusive) together with a mask of segments where all values are equal """
+	starts = np.asarray(starts, dtype=np.int64)
+	hi = np.asarray(ends, dtype=np.int64) + 1
+	n = (hi - starts).astype(np.longdouble)
+	sum_t = prefix.t[hi] - prefix.t[starts]
+	sum_y = prefix.y[hi] - prefix.y[starts]
+	ss_t = (prefix.tt[hi] - prefix.tt[starts]) - sum_t * sum_t / n
+	ss_ty = (prefix.ty[hi] - prefix.ty[starts]) - sum_t * sum_y / n
+	ss_y = (prefix.yy[hi] - prefix.yy[starts]) - sum_y * sum_y / n
+	# first element of a segment doesn't count as a change within it
+	is_flat = (prefix.changes[hi] - prefix.changes[starts + 1]) == 0
+	return n, ss_t, ss_ty, ss_y, is_flat
+
+def segment_slopes(timestamps, values, starts, ends, prefix=None):
+	""" Computes slopes of least squares lines fitted to segments [start, end] (inclusive) of a series, all segments in a single call
+
+		Note: segments where all values are equal (including single-element segments) get slope of 0.0.
+
+		Args:
+			timestamps - NumPy array of timestamps (x values) sorted in ascending order
+			values - NumPy array of values (y values)
+			starts - indices of the first element of each segment
+			ends - indices of the last element of each segment
+			prefix - PrefixSums of the series, computed if not given. Pass it to reuse prefix sums across calls.
+
+		Returns:
+			NumPy array of slopes, one per segment
+	"""
+	if not len(starts):
+		return np.empty(0, dtype=np.float64)
+	if prefix is None:
+		prefix = PrefixSums(timestamps, values)
+	n, ss_t, ss_ty, ss_y, is_flat = _segment_moments(prefix, starts, ends)
+	with np.errstate(divide="ignore", invalid="ignore"):
+		slopes = (ss_ty / ss_t).astype(np.float64)
+	slopes[is_flat] = 0.0
+	return slopes
+
+def direct_segment_slopes(timestamps, values, starts, ends):
+	""" Computes slopes like 'segment_slopes', with sums of each segment centered on its own means instead of prefix sums of the whole series
+
+		Note: costs O(total length of the segments) in float64, while 'PrefixSums' cost O(N) in extended precision once and then O(1) per segment.
+		Prefer 'segment_slopes' with shared PrefixSums when many segments of the same series are regressed.
+
+		Args:
+			timestamps - NumPy array of timestamps (x values) sorted in ascending order
+			values - NumPy array of values (y values)
+			starts - indices of the first element of each segment
+			ends - indices of the last element of each segment
+
+		Returns:
+			NumPy array of slopes, one per segment
+	"""
+	if not len(starts):
+		return np.empty(0, dtype=np.float64)
+	starts = np.asarray(starts, dtype=np.int64)
+	lengths = np.asarray(ends, dtype=np.int64) - starts + 1
+	if (lengths <= 0).any():
+		raise ValueError("segments should have at least one element")
+	# elements of the segments placed one segment after another
+	offsets = np.cumsum(lengths) - lengths
+	rows = np.repeat(starts - offsets, lengths) + np.arange(int(lengths.sum()))
+	t = np.asarray(timestamps)[rows].astype(np.float64)
+	y = np.asarray(values, dtype=np.float64)[rows]
+	t -= np.repeat(np.add.reduceat(t, offsets) / lengths, lengths)
+	y_centered = y - np.repeat(np.add.reduceat(y, offsets) / lengths, lengths)
+	with np.errstate(divide="ignore", invalid="ignore"):
+		slopes = np.add.reduceat(t * y_centered, offsets) / np.add.reduceat(t * t, offsets)
+	slopes[np.maximum.reduceat(y, offsets) == np.minimum.reduceat(y, offsets)] = 0.0
+	return slopes
+
+def segment_regressions(timestamps, values, starts, ends, prefix=None):
+	""" Computes slope, correlation coefficient and two-sided p-value (null hypothesis: slope is zero) of least squares lines fitted to segments [start, end] (inclusive) of a series
+
+		Note: p-values require scipy, which is imported only when this function is called.
+		Segments where all values are equal get slope and correlation coefficient of 0.0 and p-value of 1.0.
+
+		Args:
+			timestamps - NumPy array of timestamps (x values) sorted in ascending order
+			values - NumPy array of values (y values)
+			starts - indices of the first element of each segment
+			ends - indices of the last element of each segment
+			prefix - PrefixSums of the series, computed if not given
+
+		Returns:
+			a tuple of NumPy arrays: slopes, correlation coefficients and p-values, one element per segment
+	"""
+	from scipy.stats import t as student_t
+	if not len(starts):
+		empty = np.empty(0, dtype=np.float64)
+		return empty, empty.copy(), empty.copy()
+	if prefix is None:
+		prefix = PrefixSums(timestamps, values)
+	n, ss_t, ss_ty, ss_y, is_flat = _segment_moments(prefix, starts, ends)
+	n, ss_t, ss_ty, ss_y = [value.astype(np.float64) for value in (n, ss_t, ss_ty, ss_y)]
+	with np.errstate(divide="ignore", invalid="ignore"):
+		slopes = ss_ty / ss_t
+		r_values = np.clip(ss_ty / np.sqrt(ss_t * np.maximum(ss_y, 0.0)), -1.0, 1.0)
+		dof = n - 2
+		t_stats = r_values * np.sqrt(dof / ((1.0 - r_values) * (1.0 + r_values)))
+		p_values = 2.0 * student_t.sf(np.abs(t_stats), np.maximum(dof, 1))
+	slopes[is_flat] = 0.0
+	r_values[is_flat] = 0.0
+	p_values[is_flat] = 1.0
+	# a line through two points fits perfectly
+	p_values[(dof <= 0) & ~is_flat] = 0.0
+	return slopes, r_values, p_values
@@ -0,0 +1,57 @@
+import pytest
+import numpy as np
+from scipy import stats
+import regression
+
+def sample_series(num_entries=500, seed=7):
+	""" Returns timestamps around 1.5e9 with irregular spacing and noisy lending rates """
+	rng = np.random.RandomState(seed)
+	timestamps = 1500000000 + np.cumsum(rng.randint(600, 7200, num_entries))
+	values = 10.0 + np.cumsum(rng.normal(0.0, 0.1, num_entries))
+	return timestamps, values
+
+def test_segment_slopes_match_linregress():
+	""" Tests whether 'segment_slopes' returns same slopes as scipy.stats.linregress applied to each segment """
+	timestamps, values = sample_series()
+	starts = np.array([0, 10, 100, 250, 400])
+	ends = np.array([9, 60, 180, 251, 499])
+	slopes = regression.segment_slopes(timestamps, values, starts, ends)
+	for slope, start, end in zip(slopes, starts, ends):
+		expected = stats.linregress(timestamps[start:end + 1], values[start:end + 1]).slope
+		assert slope == pytest.approx(expected, rel=1e-7)
+
+def test_segment_regressions_match_linregress():
+	""" Tests whether 'segment_regressions' returns same slopes, correlation coefficients and p-values as scipy.stats.linregress """
+	timestamps, values = sample_series()
+	starts = np.array([0, 30, 200])
+	ends = np.array([29, 120, 260])
+	slopes, r_values, p_values = regression.segment_regressions(timestamps, values, starts, ends)
+	for idx, (start, end) in enumerate(zip(starts, ends)):
+		expected = stats.linregress(timestamps[start:end + 1], values[start:end + 1])
+		assert slopes[idx] == pytest.approx(expected.slope, rel=1e-7)
+		assert r_values[idx] == pytest.approx(expected.rvalue, rel=1e-6)
+		assert p_values[idx] == pytest.approx(expected.pvalue, rel=1e-5, abs=1e-12)
+
+def test_segment_slopes_flat_segments():
+	""" Tests whether 'segment_slopes' returns slope of 0.0 for segments with equal values and single-element segments """
+	timestamps = np.arange(8) * 3600 + 1500000000
+	values = np.array([0.1, 0.1, 0.1, 0.3, 0.3, 0.3, 0.3, 0.2])
+	slopes = regression.segment_slopes(timestamps, values, [0, 3, 7, 0], [2, 6, 7, 7])
+	assert slopes[:3].tolist() == [0.0, 0.0, 0.0]
+	assert slopes[3] > 0.0
+
+def test_segment_slopes_reuse_prefix_sums():
+	""" Tests whether 'segment_slopes' gives same result with precomputed PrefixSums as without them """
+	timestamps, values = sample_series()
+	prefix = regression.PrefixSums(timestamps, values)
+	starts, ends = np.array([5, 50]), np.array([40, 300])
+	assert regression.segment_slopes(timestamps, values, starts, ends).tolist() == regression.segment_slopes(None, None, starts, ends, prefix=prefix).tolist()
+
+def test_direct_segment_slopes_match_segment_slopes():
+	""" Tests whether 'direct_segment_slopes' returns same slopes as 'segment_slopes', including 0.0 for flat and single-element segments """
+	timestamps, values = sample_series()
+	starts, ends = np.array([0, 10, 100, 250, 400, 7]), np.array([9, 60, 180, 251, 499, 7])
+	assert regression.direct_segment_slopes(timestamps, values, starts, ends) == pytest.approx(regression.segment_slopes(timestamps, values, starts, ends), rel=1e-9)
+	flat = np.array([0.1, 0.1, 0.1, 0.3, 0.3, 0.3, 0.3, 0.2])
+	assert regression.direct_segment_slopes(np.arange(8) * 3600 + 1500000000, flat, [0, 3, 7], [2, 6, 7]).tolist() == [0.0, 0.0, 0.0]
+	assert len(regression.direct_segment_slopes(timestamps, values, [], [])) == 0
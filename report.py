@@ -0,0 +1,239 @@
+import os
+import html
+import collections
+import numpy as np
+import ticker_cache
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
+from structures import *
+
+'''
+Offline report of a run: all intervals rendered into one self-contained HTML file with inline SVG charts, no network access needed.
+
+Each chart is downsampled with largest-triangle-three-buckets (LTTB), which keeps the visual shape of a series (peaks and troughs)
+with a fixed number of points. Sections of the report are rendered in parallel by a process pool, only a bounded number of them is
+in flight at once, and each finished section is written to the file right away, so memory stays flat regardless of the number of intervals.
+The report is written to a temporary file which replaces the target once complete.
+'''
+
+"""
+Constants
+"""
+MAX_POINTS = 500
+CHART_WIDTH = 800
+CHART_HEIGHT = 240
+CHART_MARGIN = 50
+# number of sections rendered ahead of the one being written, per worker
+SECTIONS_IN_FLIGHT_PER_WORKER = 4
+HTML_HEADER = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>%s</title>
+<style>
+body { font-family: sans-serif; margin: 2em; }
+table { border-collapse: collapse; margin-bottom: 1em; }
+td { border: 1px solid #ccc; padding: 2px 8px; }
+svg { display: block; margin-bottom: 1em; }
+.growing { color: #2a7; }
+.not-growing { color: #c44; }
+</style>
+</head>
+<body>
+<h1>%s</h1>
+"""
+HTML_FOOTER = """</body>
+</html>
+"""
+
+
+def lttb(x, y, num_points):
+	""" Downsamples a series with largest-triangle-three-buckets algorithm
+
+		The first and the last point are kept, remaining points are split into 'num_points' - 2 buckets of equal size. From each bucket
+		the point forming the largest triangle with the point selected from the previous bucket and the average of the next bucket is selected.
+
+		Args:
+			x - NumPy array of x values sorted in ascending order
+			y - NumPy array of y values
+			num_points - number of points to keep
+
+		Returns:
+			int64 NumPy array of indices of selected points, all indices if the series has no more than 'num_points' points
+	"""
+	x = np.asarray(x, dtype=np.float64)
+	y = np.asarray(y, dtype=np.float64)
+	num_total = len(x)
+	if num_points >= num_total or num_points < 3:
+		return np.arange(num_total, dtype=np.int64)
+	num_buckets = num_points - 2
+	# bucket i spans [edges[i], edges[i + 1]), points between the first and the last one are split evenly
+	edges = (np.arange(num_buckets + 1) * ((num_total - 2) / float(num_buckets))).astype(np.int64) + 1
+	edges[-1] = num_total - 1
+	# average of each bucket, the last point stands for the bucket after the last one
+	counts = np.diff(edges)
+	avg_x = np.append(np.add.reduceat(x[1:-1], edges[:-1] - 1) / counts, x[-1])
+	avg_y = np.append(np.add.reduceat(y[1:-1], edges[:-1] - 1) / counts, y[-1])
+	selected = np.empty(num_points, dtype=np.int64)
+	selected[0] = 0
+	selected[-1] = num_total - 1
+	prev = 0
+	for bucket in range(num_buckets):
+		lo, hi = edges[bucket], edges[bucket + 1]
+		next_x, next_y = avg_x[bucket + 1], avg_y[bucket + 1]
+		areas = np.abs((x[prev] - next_x) * (y[lo:hi] - y[prev]) - (x[prev] - x[lo:hi]) * (next_y - y[prev]))
+		prev = lo + int(np.argmax(areas))
+		selected[bucket + 1] = prev
+	return selected
+
+def _format_date(timestamp):
+	return datetime.fromtimestamp(int(timestamp), timezone.utc).strftime("%Y-%m-%d %H:%M")
+
+def render_svg_chart(timestamps, values, title, y_title, max_points=MAX_POINTS):
+	""" Renders a line chart of a series as an inline SVG element, the series is downsampled to at most 'max_points' points
+
+		Args:
+			timestamps - NumPy array of Unix timestamps sorted in ascending order
+			values - NumPy array of values
+			title - title of the chart
+			y_title - title of y-axis
+			max_points - maximum number of points of the line. Default value is 500.
+
+		Returns:
+			SVG markup as a string
+	"""
+	timestamps = np.asarray(timestamps, dtype=np.float64)
+	values = np.asarray(values, dtype=np.float64)
+	valid = ~np.isnan(values)
+	timestamps, values = timestamps[valid], values[valid]
+	parts = ['<svg xmlns="http://www.w3.org/2000/svg" width="%d" height="%d">' % (CHART_WIDTH, CHART_HEIGHT),
+		'<text x="%d" y="16" font-size="14">%s</text>' % (CHART_MARGIN, html.escape(title))]
+	if len(timestamps):
+		selected = lttb(timestamps, values, max_points)
+		x, y = timestamps[selected], values[selected]
+		x_min, x_max, y_min, y_max = x[0], x[-1], y.min(), y.max()
+		plot_width, plot_height = CHART_WIDTH - 2 * CHART_MARGIN, CHART_HEIGHT - 2 * CHART_MARGIN
+		px = CHART_MARGIN + (x - x_min) / ((x_max - x_min) or 1.0) * plot_width
+		py = CHART_HEIGHT - CHART_MARGIN - (y - y_min) / ((y_max - y_min) or 1.0) * plot_height
+		points = " ".join("%.1f,%.1f" % point for point in zip(px.tolist(), py.tolist()))
+		parts.extend([
+			'<rect x="%d" y="%d" width="%d" height="%d" fill="none" stroke="#ccc"/>' % (CHART_MARGIN, CHART_MARGIN, plot_width, plot_height),
+			'<polyline fill="none" stroke="#36c" stroke-width="1.5" points="%s"/>' % (points),
+			'<text x="%d" y="%d" font-size="11">%s</text>' % (CHART_MARGIN, CHART_HEIGHT - CHART_MARGIN + 16, _format_date(x_min)),
+			'<text x="%d" y="%d" font-size="11" text-anchor="end">%s</text>' % (CHART_WIDTH - CHART_MARGIN, CHART_HEIGHT - CHART_MARGIN + 16, _format_date(x_max)),
+			'<text x="%d" y="%d" font-size="11" text-anchor="end">%.6g</text>' % (CHART_MARGIN - 4, CHART_MARGIN + 4, y_max),
+			'<text x="%d" y="%d" font-size="11" text-anchor="end">%.6g</text>' % (CHART_MARGIN - 4, CHART_HEIGHT - CHART_MARGIN, y_min),
+			'<text x="%d" y="%d" font-size="11">%s</text>' % (CHART_MARGIN, CHART_MARGIN - 6, html.escape(y_title))])
+	else:
+		parts.append('<text x="%d" y="%d" font-size="12">no data</text>' % (CHART_MARGIN, CHART_HEIGHT // 2))
+	parts.append("</svg>")
+	return "\n".join(parts)
+
+def _series_columns(entries, value_attr):
+	""" Returns timestamps and values of entries given either as a series or as a list of entry objects """
+	if isinstance(entries, TickerSeries):
+		return entries.timestamps, getattr(entries, value_attr + "s")
+	return np.array([entry.timestamp for entry in entries], dtype=np.int64), np.array([getattr(entry, value_attr) for entry in entries], dtype=np.float64)
+
+def make_section(interval, title, ticker=None, is_growing=None):
+	""" Collects everything needed to render a section of the report for an interval into plain (picklable) values
+
+		Args:
+			interval - LendingInterval or InterestInterval instance
+			title - title of the section
+			ticker - target currency ticker used in chart titles. Default value is None (ticker of interest entries).
+			is_growing - whether lending rate is growing within the interval. Default value is None (computed from the interval).
+
+		Returns:
+			a dictionary describing the section, see 'render_section'
+	"""
+	charts = list()
+	if isinstance(interval, InterestInterval) and len(interval.interest_entries):
+		price_ticker = ticker or interval.interest_entries[0].ticker
+		timestamps, close_prices = _series_columns(interval.interest_entries, "close_price")
+		charts.append(("%s price" % (price_ticker), "%s/BTC" % (price_ticker), np.asarray(timestamps), np.asarray(close_prices)))
+	if isinstance(interval, LendingInterval):
+		timestamps, lending_rates = _series_columns(interval.lending_entries, "lending_rate")
+		charts.append(("%s lending rate" % (interval.ticker_name), "Lending rate", np.asarray(timestamps), np.asarray(lending_rates)))
+	if is_growing is None and isinstance(interval, LendingInterval):
+		is_growing = interval.is_growing()
+	return {"title": title, "summary": [(label, str(value)) for label, value in interval.get_summary()], "charts": charts, "is_growing": is_growing}
+
+def render_section(section, max_points=MAX_POINTS):
+	""" Renders a section of the report as an HTML fragment
+
+		Args:
+			section - dictionary returned by 'make_section'
+			max_points - maximum number of points of each chart. Default value is 500.
+
+		Returns:
+			HTML fragment as a string
+	"""
+	css_class = "" if section["is_growing"] is None else (' class="growing"' if section["is_growing"] else ' class="not-growing"')
+	parts = ["<section>", "<h2%s>%s</h2>" % (css_class, html.escape(section["title"])), "<table>"]
+	for label, value in section["summary"]:
+		parts.append("<tr><td>%s</td><td>%s</td></tr>" % (html.escape(label), html.escape(value)))
+	parts.append("</table>")
+	for title, y_title, timestamps, values in section["charts"]:
+		parts.append(render_svg_chart(timestamps, values, title, y_title, max_points))
+	parts.append("</section>\n")
+	return "\n".join(parts)
+
+def _render_sections(sections, max_points, max_workers):
+	""" Yields rendered sections in order, rendering up to a bounded number of them ahead in worker processes """
+	if max_workers == 0:
+		for section in sections:
+			yield render_section(section, max_points)
+		return
+	max_in_flight = SECTIONS_IN_FLIGHT_PER_WORKER * (max_workers or os.cpu_count() or 1)
+	with ProcessPoolExecutor(max_workers=max_workers) as executor:
+		in_flight = collections.deque()
+		for section in sections:
+			in_flight.append(executor.submit(render_section, section, max_points))
+			if len(in_flight) >= max_in_flight:
+				yield in_flight.popleft().result()
+		while in_flight:
+			yield in_flight.popleft().result()
+
+def write_report(path, sections, title="Report", max_points=MAX_POINTS, max_workers=None):
+	""" Renders sections into a self-contained HTML report, writing each section as soon as it is rendered
+
+		Args:
+			path - path to the resulting .html file
+			sections - iterable of sections (see 'make_section'), may be a generator so that sections are created lazily
+			title - title of the report. Default value is "Report".
+			max_points - maximum number of points of each chart. Default value is 500.
+			max_workers - number of worker processes, 0 renders in the current process. Default value is None (number of CPUs).
+
+		Returns:
+			number of written sections
+	"""
+	num_sections = [0]
+
+	def write(tmp_path):
+		with open(tmp_path, "w") as f:
+			f.write(HTML_HEADER % (html.escape(title), html.escape(title)))
+			for fragment in _render_sections(sections, max_points, max_workers):
+				f.write(fragment)
+				num_sections[0] += 1
+			f.write(HTML_FOOTER)
+
+	ticker_cache.write_atomically(path, write)
+	return num_sections[0]
+
+def write_docx_report(path, intervals, title="Report"):
+	""" Writes summaries of intervals into a .docx document using their 'to_docx' method
+
+		Note: requires python-docx, which is imported only when this function is called. The document is kept in memory until it is saved.
+
+		Args:
+			path - path to the resulting .docx file
+			intervals - list of Interval instances
+			title - title of the document. Default value is "Report".
+	"""
+	import docx
+	doc = docx.Document()
+	doc.add_heading(title, level=1)
+	for interval in intervals:
+		interval.to_docx(doc)
+	doc.save(path)
@@ -0,0 +1,67 @@
+import os
+import pytest
+import numpy as np
+import report
+import sample_data
+from structures import *
+
+def reference_lttb(x, y, num_points):
+	""" Straightforward point by point implementation of largest-triangle-three-buckets used to check the vectorized one """
+	every = (len(x) - 2) / float(num_points - 2)
+	selected = [0]
+	prev = 0
+	for bucket in range(num_points - 2):
+		lo, hi = int(bucket * every) + 1, int((bucket + 1) * every) + 1
+		if bucket == num_points - 3:
+			hi = len(x) - 1
+		next_lo, next_hi = hi, (int((bucket + 2) * every) + 1 if bucket < num_points - 4 else len(x) - 1)
+		next_x, next_y = (np.mean(x[next_lo:next_hi]), np.mean(y[next_lo:next_hi])) if bucket < num_points - 3 else (x[-1], y[-1])
+		areas = [abs((x[prev] - next_x) * (y[idx] - y[prev]) - (x[prev] - x[idx]) * (next_y - y[prev])) for idx in range(lo, hi)]
+		prev = lo + int(np.argmax(areas))
+		selected.append(prev)
+	return selected + [len(x) - 1]
+
+def make_interest_interval(num_entries=300, start=1500000000, step=900):
+	""" Returns InterestInterval with lending rates and prices following a sine wave """
+	values = np.sin(np.arange(num_entries) / 20.0) + 2.0
+	return sample_data.make_interest_interval(values, start, step, close_prices=values / 100.0)
+
+def test_lttb_matches_reference():
+	""" Tests whether LTTB keeps first and last point and selects same points as the point by point implementation """
+	rng = np.random.RandomState(3)
+	x = np.cumsum(rng.rand(1000) + 0.1)
+	y = np.sin(x / 30.0) + rng.rand(1000)
+	selected = report.lttb(x, y, 50)
+	assert len(selected) == 50 and selected[0] == 0 and selected[-1] == 999
+	assert selected.tolist() == reference_lttb(x, y, 50)
+	assert report.lttb(x[:10], y[:10], 50).tolist() == list(range(10))
+
+def test_lttb_keeps_peak():
+	""" Tests whether LTTB keeps a single spike which plain decimation would skip """
+	y = np.zeros(1001)
+	y[333] = 10.0
+	selected = report.lttb(np.arange(1001), y, 20)
+	assert 333 in selected.tolist()
+
+@pytest.mark.parametrize("max_workers", [0, 2])
+def test_write_report_streams_sections(tmp_path, max_workers):
+	""" Tests whether sections produced by a generator are rendered in order into a single self-contained HTML file """
+	path = str(tmp_path / "report.html")
+	sections = (report.make_section(make_interest_interval(start=1500000000 + idx * 10**6), "Interval %d" % (idx), "LTC") for idx in range(6))
+	assert report.write_report(path, sections, "Test report", max_points=100, max_workers=max_workers) == 6
+	with open(path) as f:
+		content = f.read()
+	assert content.count("<section>") == 6 and content.count("<svg") == 12
+	assert content.index("Interval 0") < content.index("Interval 5")
+	assert "http" not in content.replace('xmlns="http://www.w3.org/2000/svg"', "")
+	# each chart line is downsampled to 'max_points' points
+	assert all(line.count(",") == 100 for line in content.splitlines() if line.startswith("<polyline"))
+
+def test_interval_to_docx(tmp_path):
+	""" Tests whether 'to_docx' of InterestInterval adds a heading and a summary table to the document """
+	docx = pytest.importorskip("docx")
+	path = str(tmp_path / "report.docx")
+	report.write_docx_report(path, [make_interest_interval(), make_interest_interval(start=1600000000)])
+	doc = docx.Document(path)
+	assert len(doc.tables) == 2
+	assert [row.cells[0].text for row in doc.tables[0].rows][-1] == "Price change"
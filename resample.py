@@ -0,0 +1,142 @@
+import re
+import numpy as np
+
+'''
+Vectorized resampling of candles and lending rates into coarser bars.
+
+Candle columns are aggregated as OHLCV bars: first open, max high, min low, last close and summed volume.
+Remaining columns (lending rates, lent and used amounts) are time-weighted averages: a value is assumed to hold from its timestamp
+until the next one, so an hour with a rate of 2.0 lasting 45 minutes and 4.0 lasting 15 minutes averages to 2.5 regardless of sampling.
+Bars are aligned to multiples of their duration since the Unix epoch (daily bars start at midnight UTC) and are labelled by their start.
+Every step is a NumPy operation over whole columns: bars are located with a single pass over the bar index of each row and reduced with 'reduceat'.
+'''
+
+"""
+Constants
+"""
+# durations of named resolutions, in seconds
+RESOLUTIONS = {"15m": 15*60, "1h": 60*60, "4h": 4*60*60, "1d": 24*60*60}
+UNIT_SECONDS = {"m": 60, "h": 60*60, "d": 24*60*60}
+# resolutions cached as levels of the bar pyramid (see 'ticker_cache')
+PYRAMID_LEVELS = ("1h", "4h", "1d")
+FIRST = "first"
+LAST = "last"
+MAX = "max"
+MIN = "min"
+SUM = "sum"
+TIME_WEIGHTED = "time_weighted"
+# aggregation of candle columns by column name, other columns are time-weighted
+COLUMN_AGGREGATIONS = {
+	"open": FIRST, "open_price": FIRST,
+	"close": LAST, "close_price": LAST,
+	"high": MAX, "low": MIN, "volume": SUM,
+}
+
+
+def get_resolution_seconds(resolution):
+	""" Returns duration of a resolution given as a name (number followed by m, h or d, e.g. "4h") or as a number of seconds """
+	if isinstance(resolution, str):
+		match = re.match(r"^(\d+)([mhd])$", resolution)
+		if not match or int(match.group(1)) <= 0:
+			raise ValueError("resolution should be number of seconds or a name such as: %s" % (", ".join(RESOLUTIONS)))
+		return int(match.group(1)) * UNIT_SECONDS[match.group(2)]
+	if isinstance(resolution, bool) or not isinstance(resolution, (int, np.integer)) or resolution <= 0:
+		raise ValueError("resolution should be positive number of seconds")
+	return int(resolution)
+
+def get_bar_bounds(timestamps, period):
+	""" Locates bars of given duration within sorted timestamps
+
+		Args:
+			timestamps - int64 NumPy array sorted in ascending order
+			period - duration of bars, in seconds
+
+		Returns:
+			a tuple of NumPy arrays: start timestamp of each non-empty bar and index of its first row
+	"""
+	bar_starts = (timestamps // period) * period
+	first_rows = np.flatnonzero(np.concatenate(([True], bar_starts[1:] != bar_starts[:-1])))
+	return bar_starts[first_rows], first_rows
+
+def time_weighted_average(timestamps, values, bar_starts, period):
+	""" Computes time-weighted average of a step function (each value holds until the next timestamp) within each bar
+
+		Note: the function is known only between the first and the last timestamp, averages of bars at the edges cover only that part of them.
+		A bar which contains nothing but the last timestamp gets its value.
+
+		Args:
+			timestamps - int64 NumPy array sorted in ascending order
+			values - float64 NumPy array of values
+			bar_starts - start timestamps of bars
+			period - duration of bars, in seconds
+
+		Returns:
+			float64 NumPy array with average per bar
+	"""
+	timestamps = timestamps.astype(np.float64)
+	durations = np.diff(timestamps)
+	# integral of the step function from the first timestamp up to each timestamp
+	integrals = np.concatenate(([0.0], np.cumsum(values[:-1] * durations)))
+
+	def integral_at(t):
+		idx = np.searchsorted(timestamps, t, side="right") - 1
+		return integrals[idx] + values[idx] * (t - timestamps[idx])
+
+	lo = np.maximum(bar_starts.astype(np.float64), timestamps[0])
+	hi = np.minimum(bar_starts.astype(np.float64) + period, timestamps[-1])
+	covered = hi - lo
+	averages = values[np.searchsorted(timestamps, lo, side="right") - 1].copy()
+	has_span = covered > 0
+	averages[has_span] = (integral_at(hi[has_span]) - integral_at(lo[has_span])) / covered[has_span]
+	return averages
+
+def resample_columns(names, columns, resolution):
+	""" Resamples columns of a data file into bars of given resolution
+
+		Args:
+			names - column names, the first column is timestamp
+			columns - NumPy arrays of the columns (int64 timestamps sorted in ascending order followed by float64 columns)
+			resolution - resolution name (e.g. "4h") or duration of bars in seconds
+
+		Returns:
+			a tuple of NumPy arrays in the same layout as 'columns', one row per non-empty bar with its start as timestamp
+	"""
+	period = get_resolution_seconds(resolution)
+	timestamps = np.asarray(columns[0], dtype=np.int64)
+	if not len(timestamps):
+		return tuple(np.asarray(column).copy() for column in columns)
+	bar_starts, first_rows = get_bar_bounds(timestamps, period)
+	last_rows = np.concatenate((first_rows[1:], [len(timestamps)])) - 1
+	resampled = [bar_starts]
+	for name, column in zip(names[1:], columns[1:]):
+		column = np.asarray(column, dtype=np.float64)
+		aggregation = COLUMN_AGGREGATIONS.get(str(name).lower(), TIME_WEIGHTED)
+		if aggregation == FIRST:
+			resampled.append(column[first_rows])
+		elif aggregation == LAST:
+			resampled.append(column[last_rows])
+		elif aggregation == MAX:
+			resampled.append(np.maximum.reduceat(column, first_rows))
+		elif aggregation == MIN:
+			resampled.append(np.minimum.reduceat(column, first_rows))
+		elif aggregation == SUM:
+			resampled.append(np.add.reduceat(column, first_rows))
+		else:
+			resampled.append(time_weighted_average(timestamps, column, bar_starts, period))
+	return tuple(resampled)
+
+def pick_level(resolution, levels=PYRAMID_LEVELS):
+	""" Picks the coarsest pyramid level from which bars of given resolution can be built
+
+		Args:
+			resolution - requested resolution name or duration of bars in seconds
+			levels - names of available pyramid levels. Default value is PYRAMID_LEVELS.
+
+		Returns:
+			name of the level whose bars evenly divide the requested ones, None if bars have to be built from the original rows
+	"""
+	period = get_resolution_seconds(resolution)
+	candidates = [level for level in levels if period % RESOLUTIONS[level] == 0]
+	if not candidates:
+		return None
+	return max(candidates, key=lambda level: RESOLUTIONS[level])
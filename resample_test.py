@@ -0,0 +1,37 @@
+import pytest
+import numpy as np
+import resample
+
+CANDLE_NAMES = ("timestamp", "open_price", "close_price", "high", "low", "volume")
+
+def test_resample_ohlcv_bars():
+	""" Tests whether candles are aggregated into bars of first open, last close, max high, min low and summed volume, labelled by the start of the bar """
+	timestamps = np.array([3600, 4500, 5400, 6300, 7200, 9000], dtype=np.int64)
+	columns = (timestamps, np.array([1.0, 2.0, 3.0, 4.0, 5.0, 6.0]), np.array([1.5, 2.5, 3.5, 4.5, 5.5, 6.5]), np.array([2.0, 9.0, 3.0, 4.0, 5.0, 6.0]), np.array([0.5, 1.5, 0.1, 3.0, 4.0, 5.0]), np.ones(6))
+	bars = resample.resample_columns(CANDLE_NAMES, columns, "1h")
+	assert bars[0].tolist() == [3600, 7200]
+	assert bars[1].tolist() == [1.0, 5.0]
+	assert bars[2].tolist() == [4.5, 6.5]
+	assert bars[3].tolist() == [9.0, 6.0]
+	assert bars[4].tolist() == [0.1, 4.0]
+	assert bars[5].tolist() == [4.0, 2.0]
+
+def test_time_weighted_lending_rates():
+	""" Tests whether lending rates are averaged by time each rate lasted rather than by number of samples """
+	# 2.0 lasts 45 minutes and 4.0 lasts 15 minutes of the first hour, 4.0 lasts the whole second hour
+	timestamps = np.array([0, 2700, 3600, 7200], dtype=np.int64)
+	bars = resample.resample_columns(("timestamp", "lending_rate"), (timestamps, np.array([2.0, 4.0, 4.0, 8.0])), 3600)
+	assert bars[0].tolist() == [0, 3600, 7200]
+	# last bar contains only the last sample
+	assert bars[1].tolist() == pytest.approx([2.5, 4.0, 8.0])
+
+def test_resolution_names_and_levels():
+	""" Tests whether resolutions are parsed from names and the coarsest pyramid level evenly dividing them is picked """
+	assert resample.get_resolution_seconds("4h") == 4 * 3600
+	assert resample.get_resolution_seconds(900) == 900
+	with pytest.raises(ValueError):
+		resample.get_resolution_seconds("4w")
+	assert resample.pick_level("1d") == "1d"
+	assert resample.pick_level("8h") == "4h"
+	assert resample.pick_level("3h") == "1h"
+	assert resample.pick_level("30m") is None
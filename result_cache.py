@@ -0,0 +1,236 @@
+import os
+import json
+import hashlib
+import numpy as np
+import ticker_cache
+from structures import *
+
+'''
+Persistent, content-addressed cache of intermediate results of the analysis (lending intervals, interest intervals, aligned series).
+
+A result is stored under a key hashed from everything it depends on: name of the stage, hashes of the input files, parameters of the stage,
+keys of the results it was computed from and the version of the code (hash of the source of the modules computing it). A changed input
+therefore never hits a stale result, and a run whose inputs changed only for later stages reuses the results of the earlier ones.
+
+Each result is a single .npz file of flat NumPy arrays: intervals are stored as their concatenated lending entries plus lengths and dates,
+so they are decoded into slices of one series without an object per entry. Files are written atomically. Reading a result refreshes
+its modification time, and once the cache grows over its size cap the least recently used results are removed.
+'''
+
+"""
+Constants
+"""
+DEFAULT_CACHE_DIR = ".result_cache"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+RESULT_SUFFIX = ".npz"
+LENDING_INTERVAL = "lending"
+INTEREST_INTERVAL = "interest"
+
+_code_versions = dict()
+
+
+def get_code_version(modules):
+	""" Returns hash of the source files of given modules, computed once per process
+
+		Args:
+			modules - module objects (e.g. [structures, alignment]) whose code produces a cached result
+	"""
+	paths = tuple(sorted(os.path.abspath(module.__file__) for module in modules))
+	if paths not in _code_versions:
+		sha1 = hashlib.sha1()
+		for path in paths:
+			with open(path, "rb") as f:
+				sha1.update(f.read())
+		_code_versions[paths] = sha1.hexdigest()
+	return _code_versions[paths]
+
+def make_key(stage, **inputs):
+	""" Returns content-addressed key of a result of given stage computed from given inputs (JSON serializable values such as hashes and parameters) """
+	description = json.dumps({"stage": stage, "inputs": inputs}, sort_keys=True)
+	return "%s-%s" % (stage, hashlib.sha1(description.encode("utf-8")).hexdigest())
+
+def _get_lending_ticker(intervals):
+	if not intervals:
+		return ""
+	lending_entries = intervals[0].lending_entries
+	return lending_entries.ticker if isinstance(lending_entries, LendingSeries) else lending_entries[0].ticker
+
+def encode_intervals(intervals, prefix=""):
+	""" Encodes LendingInterval (or InterestInterval) instances into flat NumPy arrays, see 'decode_intervals'
+
+		Args:
+			intervals - list of LendingInterval instances of the same ticker
+			prefix - prefix of names of the arrays, so that several lists can be stored in one result. Default value is "".
+
+		Returns:
+			dictionary of NumPy arrays
+	"""
+	batch = IntervalBatch(intervals)
+	return {
+		prefix + "ticker": np.array(intervals[0].ticker_name if intervals else ""),
+		prefix + "lending_ticker": np.array(_get_lending_ticker(intervals)),
+		prefix + "timestamps": batch.timestamps,
+		prefix + "lending_rates": batch.lending_rates,
+		prefix + "lengths": batch.lengths,
+		prefix + "start_dates": np.array([interval.start_date for interval in intervals], dtype=np.int64),
+		prefix + "end_dates": np.array([interval.end_date for interval in intervals], dtype=np.int64),
+	}
+
+def decode_intervals(arrays, kind=LENDING_INTERVAL, prefix=""):
+	""" Decodes intervals encoded by 'encode_intervals', lending entries of all intervals are slices of a single LendingSeries
+
+		Args:
+			arrays - dictionary (or NpzFile) of NumPy arrays
+			kind - "lending" for LendingInterval or "interest" for InterestInterval instances. Default value is "lending".
+			prefix - prefix of names of the arrays. Default value is "".
+
+		Returns:
+			list of LendingInterval or InterestInterval instances
+	"""
+	interval_class = InterestInterval if kind == INTEREST_INTERVAL else LendingInterval
+	lengths = arrays[prefix + "lengths"]
+	if not len(lengths):
+		return list()
+	series = LendingSeries(str(arrays[prefix + "lending_ticker"]), arrays[prefix + "timestamps"], arrays[prefix + "lending_rates"])
+	ticker = str(arrays[prefix + "ticker"])
+	ends = np.cumsum(lengths).tolist()
+	starts = [end - length for end, length in zip(ends, lengths.tolist())]
+	return [interval_class(ticker, start_date, end_date, series[lo:hi]) for start_date, end_date, lo, hi in
+		zip(arrays[prefix + "start_dates"].tolist(), arrays[prefix + "end_dates"].tolist(), starts, ends)]
+
+def encode_interest_intervals(intervals):
+	""" Encodes a tuple of growing and not growing InterestInterval lists returned by 'get_interest_intervals' into a dictionary of NumPy arrays """
+	arrays = encode_intervals(intervals[0], "growing_")
+	arrays.update(encode_intervals(intervals[1], "not_growing_"))
+	return arrays
+
+def decode_interest_intervals(arrays):
+	""" Decodes a tuple of growing and not growing InterestInterval lists encoded by 'encode_interest_intervals' """
+	return decode_intervals(arrays, INTEREST_INTERVAL, "growing_"), decode_intervals(arrays, INTEREST_INTERVAL, "not_growing_")
+
+def encode_aligned(aligned):
+	""" Encodes AlignedSeries into a dictionary of NumPy arrays """
+	arrays = dict((name, getattr(aligned, name)) for name in ("timestamps",) + AlignedSeries.columns)
+	arrays.update(ticker=np.array(aligned.ticker), lending_ticker=np.array(aligned.lending_ticker))
+	return arrays
+
+def decode_aligned(arrays):
+	""" Decodes AlignedSeries encoded by 'encode_aligned' """
+	return AlignedSeries(str(arrays["ticker"]), arrays["timestamps"], arrays["close_prices"], arrays["volumes"], arrays["lending_rates"], str(arrays["lending_ticker"]))
+
+'''
+Directory of cached results with a size cap and least recently used eviction
+'''
+class ResultCache(object):
+	""" Persistent cache of results
+
+		Args:
+			directory - directory of cached results, created if missing. Default value is ".result_cache".
+			max_bytes - maximum total size of cached results, in bytes. Default value is 256 MiB.
+	"""
+
+	def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+		if max_bytes <= 0:
+			raise ValueError("size cap of the cache must be positive")
+		self.directory = directory
+		self.max_bytes = max_bytes
+		self.hits = 0
+		self.misses = 0
+		if not os.path.isdir(directory):
+			os.makedirs(directory)
+
+	def get_path(self, key):
+		return os.path.join(self.directory, key + RESULT_SUFFIX)
+
+	def get(self, key):
+		""" Returns dictionary of NumPy arrays stored under the key, None if there is no such result """
+		path = self.get_path(key)
+		try:
+			with np.load(path, allow_pickle=False) as npz:
+				arrays = dict((name, npz[name]) for name in npz.files)
+			# mark the result as recently used
+			os.utime(path, None)
+		except (IOError, OSError, ValueError):
+			self.misses += 1
+			return None
+		self.hits += 1
+		return arrays
+
+	def put(self, key, arrays):
+		""" Stores dictionary of NumPy arrays under the key and evicts least recently used results if the cache exceeds its size cap """
+		def write(tmp_path):
+			with open(tmp_path, "wb") as f:
+				np.savez(f, **arrays)
+		ticker_cache.write_atomically(self.get_path(key), write)
+		self.evict(keep=key)
+
+	def lookup(self, key, decode):
+		""" Returns a tuple of a flag telling whether a result is stored under the key and the decoded result (None if there is none) """
+		arrays = self.get(key)
+		if arrays is None:
+			return False, None
+		return True, decode(arrays)
+
+	def get_or_compute(self, key, compute, encode, decode):
+		""" Returns decoded result stored under the key, or computes, stores and returns it
+
+			Args:
+				key - key of the result, see 'make_key'
+				compute - callable computing the result
+				encode - callable converting the result into a dictionary of NumPy arrays
+				decode - callable converting the dictionary back into the result
+		"""
+		found, value = self.lookup(key, decode)
+		if found:
+			return value
+		value = compute()
+		self.put(key, encode(value))
+		return value
+
+	def get_size(self):
+		""" Returns total size of cached results, in bytes """
+		return sum(size for path, size, mtime in self._list_results())
+
+	def _list_results(self):
+		results = list()
+		for filename in os.listdir(self.directory):
+			if not filename.endswith(RESULT_SUFFIX):
+				continue
+			path = os.path.join(self.directory, filename)
+			try:
+				stat = os.stat(path)
+			except OSError:
+				continue
+			results.append((path, stat.st_size, stat.st_mtime))
+		return results
+
+	def evict(self, keep=None):
+		""" Removes least recently used results until the cache fits its size cap
+
+			Args:
+				keep - key of a result which is never removed, e.g. the one just stored. Default value is None.
+
+			Returns:
+				number of removed results
+		"""
+		results = sorted(self._list_results(), key=lambda result: result[2])
+		total_size = sum(size for path, size, mtime in results)
+		keep_path = self.get_path(keep) if keep is not None else None
+		num_removed = 0
+		for path, size, mtime in results:
+			if total_size <= self.max_bytes:
+				break
+			if path == keep_path:
+				continue
+			try:
+				os.remove(path)
+			except OSError:
+				continue
+			total_size -= size
+			num_removed += 1
+		return num_removed
+
+	def clear(self):
+		""" Removes all cached results """
+		for path, size, mtime in self._list_results():
+			os.remove(path)
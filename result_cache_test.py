@@ -0,0 +1,66 @@
+import os
+import time
+import pytest
+import numpy as np
+import result_cache
+import instrumentation
+import synthetic
+import lr_growing_altcoin as analysis
+from structures import *
+
+def write_data(tmpdir):
+	""" Writes synthetic lending rates and candles into 'tmpdir' and returns their paths """
+	lending_path = synthetic.write_csv(str(tmpdir.join("lending.csv")), *synthetic.generate_lending_columns(3000, seed=11))
+	price_path = synthetic.write_csv(str(tmpdir.join("syn_bitfinex_data.csv")), *synthetic.generate_candle_columns(12000, seed=11))
+	return lending_path, price_path
+
+def test_intervals_round_trip():
+	""" Tests whether encoded intervals are decoded with the same dates and lending entries """
+	series = LendingSeries("BTC", np.arange(1, 101) * 60, np.linspace(1.0, 2.0, 100))
+	intervals = [LendingInterval("BTC", 60, 3000, series[0:50]), LendingInterval("BTC", 3000, 6000, series[49:100])]
+	decoded = result_cache.decode_intervals(result_cache.encode_intervals(intervals))
+	assert [(interval.start_date, interval.end_date) for interval in decoded] == [(60, 3000), (3000, 6000)]
+	assert all((a.lending_entries.lending_rates == b.lending_entries.lending_rates).all() for a, b in zip(intervals, decoded))
+	assert result_cache.decode_interest_intervals(result_cache.encode_interest_intervals((list(), list()))) == (list(), list())
+
+def test_least_recently_used_eviction(tmpdir):
+	""" Tests whether results over the size cap are evicted starting with the least recently used one """
+	cache = result_cache.ResultCache(str(tmpdir), max_bytes=2500)
+	arrays = {"values": np.zeros(100)}
+	cache.put("first", arrays)
+	cache.put("second", arrays)
+	# reading the first result makes the second one the least recently used
+	os.utime(cache.get_path("second"), (time.time() - 60, time.time() - 60))
+	assert cache.get("first") is not None
+	cache.put("third", arrays)
+	assert cache.get("second") is None
+	assert cache.get("first") is not None and cache.get("third") is not None
+	assert cache.get_size() <= 2500
+
+def test_keys_cover_inputs():
+	""" Tests whether keys differ by stage and inputs and are stable otherwise """
+	assert result_cache.make_key("stage", a=1, b=[1, 2]) == result_cache.make_key("stage", b=[1, 2], a=1)
+	assert result_cache.make_key("stage", a=1) != result_cache.make_key("stage", a=2)
+	assert result_cache.make_key("stage", a=1) != result_cache.make_key("other", a=1)
+
+def test_run_analysis_skips_cached_stages(tmpdir):
+	""" Tests whether a repeated run only decodes cached results and a run with another 'min_num_tickers' reuses cached lending intervals """
+	lending_path, price_path = write_data(tmpdir)
+	cache = result_cache.ResultCache(str(tmpdir.join("cache")))
+	start, end = synthetic.DEFAULT_START_DATE, synthetic.DEFAULT_START_DATE + 3000 * synthetic.LENDING_STEP
+	expected = analysis.run_analysis("SYN", start, end, lending_path, price_path)
+	analysis.run_analysis("SYN", start, end, lending_path, price_path, cache=cache)
+	metrics = instrumentation.Metrics()
+	cached = analysis.run_analysis("SYN", start, end, lending_path, price_path, metrics=metrics, cache=cache)
+	summary = metrics.summary()
+	assert [item["stage"] for item in summary] == ["cache_lookup", "report"]
+	# interest intervals and aligned series are both found
+	assert (summary[0]["calls"], summary[0]["rows_out"]) == (2, 2)
+	for expected_intervals, cached_intervals in zip(expected, cached):
+		assert [(i.start_date, i.end_date, len(i.interest_entries)) for i in expected_intervals] == [(i.start_date, i.end_date, len(i.interest_entries)) for i in cached_intervals]
+	metrics = instrumentation.Metrics()
+	analysis.run_analysis("SYN", start, end, lending_path, price_path, metrics=metrics, cache=cache, min_num_tickers=5)
+	summary = metrics.summary()
+	assert [item["stage"] for item in summary] == ["cache_lookup", "detect", "report"]
+	# interest intervals are missed, lending intervals and aligned series are found
+	assert (summary[0]["calls"], summary[0]["rows_out"]) == (3, 2)
@@ -0,0 +1,173 @@
+import heapq
+import numpy as np
+import pandas as pd
+
+'''
+Trailing-window statistics of a series: mean, median and exponentially weighted mean, evaluated at every entry.
+
+A trailing window of an entry covers either the entries within 'window' seconds before it (time window, both ends inclusive) or
+the last 'window' entries (count window), the entry itself included. Start of the window of each entry is located once with a binary search
+over sorted timestamps, so windows of irregularly spaced data cost the same as those of regular data.
+
+Each statistic is maintained incrementally rather than recomputed over the whole window: the mean is a difference of two prefix sums (O(1) per entry),
+the median is kept by two heaps with lazy removal of entries leaving the window (O(log W) per entry) and the exponentially weighted
+mean is updated by a recurrence (O(1) per entry, computed by pandas).
+'''
+
+"""
+Constants
+"""
+MEAN = "mean"
+MEDIAN = "median"
+EWMA = "ewma"
+STATISTICS = (MEAN, MEDIAN, EWMA)
+
+
+def get_window_starts(timestamps, window, time_window=True):
+	""" Returns index of the first entry of the trailing window of each entry
+
+		Args:
+			timestamps - NumPy array of timestamps sorted in ascending order
+			window - length of the window: seconds for a time window, number of entries for a count window
+			time_window - if True, the window covers entries within 'window' seconds before an entry, otherwise the last 'window' entries. Default value is True.
+
+		Returns:
+			int64 NumPy array, window of entry i covers entries from starts[i] to i (inclusive)
+	"""
+	if window <= 0:
+		raise ValueError("window must be positive")
+	timestamps = np.asarray(timestamps)
+	if time_window:
+		return np.searchsorted(timestamps, timestamps - window, side="left").astype(np.int64)
+	return np.maximum(np.arange(len(timestamps), dtype=np.int64) - (int(window) - 1), 0)
+
+def get_full_windows(timestamps, window, time_window=True):
+	""" Returns boolean mask of entries whose trailing window is fully covered by the data (it doesn't reach before the first entry) """
+	timestamps = np.asarray(timestamps)
+	if time_window:
+		return timestamps - window >= timestamps[0] if len(timestamps) else np.zeros(0, dtype=bool)
+	return np.arange(len(timestamps)) >= int(window) - 1
+
+def rolling_mean(values, starts):
+	""" Computes mean of each trailing window as a difference of prefix sums
+
+		Note: values are centered and accumulated in extended precision (np.longdouble), so that windows far from the start of a long series don't lose precision.
+
+		Args:
+			values - NumPy array of values
+			starts - index of the first entry of the window of each entry, see 'get_window_starts'
+
+		Returns:
+			float64 NumPy array of means
+	"""
+	values = np.asarray(values, dtype=np.float64)
+	origin = float(values.mean()) if len(values) else 0.0
+	prefix = np.concatenate(([0.0], np.cumsum(values - origin, dtype=np.longdouble)))
+	hi = np.arange(1, len(values) + 1)
+	return ((prefix[hi] - prefix[starts]) / (hi - starts)).astype(np.float64) + origin
+
+def rolling_median(values, starts):
+	""" Computes median of each trailing window with two heaps: a max-heap of the lower half and a min-heap of the upper half of the window
+
+		Entries leaving the window are only marked as removed and are popped once they reach the top of their heap.
+
+		Args:
+			values - NumPy array of values
+			starts - index of the first entry of the window of each entry, non-decreasing, see 'get_window_starts'
+
+		Returns:
+			float64 NumPy array of medians
+	"""
+	values = np.asarray(values, dtype=np.float64).tolist()
+	starts = np.asarray(starts, dtype=np.int64).tolist()
+	medians = np.empty(len(values), dtype=np.float64)
+	# lower half holds (-value, index), upper half (value, index)
+	lower, upper = list(), list()
+	in_lower = [False] * len(values)
+	num_lower = num_upper = 0
+	window_start = 0
+
+	def prune(heap):
+		while heap and heap[0][1] < window_start:
+			heapq.heappop(heap)
+
+	for idx, (value, start) in enumerate(zip(values, starts)):
+		if start < window_start:
+			raise ValueError("starts of windows must be non-decreasing")
+		for removed in range(window_start, start):
+			if in_lower[removed]:
+				num_lower -= 1
+			else:
+				num_upper -= 1
+		window_start = start
+		prune(lower)
+		if num_lower and value <= -lower[0][0]:
+			heapq.heappush(lower, (-value, idx))
+			in_lower[idx] = True
+			num_lower += 1
+		else:
+			heapq.heappush(upper, (value, idx))
+			num_upper += 1
+		# keep the lower half equal to or one entry larger than the upper half
+		while num_lower > num_upper + 1 or num_upper > num_lower:
+			if num_lower > num_upper + 1:
+				prune(lower)
+				moved_value, moved_idx = heapq.heappop(lower)
+				heapq.heappush(upper, (-moved_value, moved_idx))
+				in_lower[moved_idx] = False
+				num_lower, num_upper = num_lower - 1, num_upper + 1
+			else:
+				prune(upper)
+				moved_value, moved_idx = heapq.heappop(upper)
+				heapq.heappush(lower, (-moved_value, moved_idx))
+				in_lower[moved_idx] = True
+				num_lower, num_upper = num_lower + 1, num_upper - 1
+		prune(lower)
+		prune(upper)
+		medians[idx] = -lower[0][0] if num_lower > num_upper else 0.5 * (-lower[0][0] + upper[0][0])
+	return medians
+
+def ewma(values, timestamps, window, time_window=True):
+	""" Computes exponentially weighted mean of each entry and all entries before it
+
+		Weight of an entry halves every 'window' seconds (time window, irregular spacing is accounted for) or every 'window' entries (count window).
+
+		Args:
+			values - NumPy array of values
+			timestamps - NumPy array of timestamps sorted in ascending order, in seconds
+			window - half-life of weights: seconds for a time window, number of entries for a count window
+			time_window - see 'get_window_starts'. Default value is True.
+
+		Returns:
+			float64 NumPy array of exponentially weighted means
+	"""
+	if window <= 0:
+		raise ValueError("window must be positive")
+	series = pd.Series(np.asarray(values, dtype=np.float64))
+	if time_window:
+		weighted = series.ewm(halflife=pd.Timedelta(seconds=window), times=pd.to_datetime(np.asarray(timestamps, dtype=np.int64), unit="s"))
+	else:
+		weighted = series.ewm(halflife=window)
+	return weighted.mean().to_numpy(dtype=np.float64)
+
+def rolling_statistic(timestamps, values, window, statistic=MEAN, time_window=True):
+	""" Computes given statistic of the trailing window of each entry
+
+		Args:
+			timestamps - NumPy array of timestamps sorted in ascending order
+			values - NumPy array of values
+			window - length of the window (half-life for "ewma"): seconds for a time window, number of entries for a count window
+			statistic - "mean", "median" or "ewma". Default value is "mean".
+			time_window - see 'get_window_starts'. Default value is True.
+
+		Returns:
+			float64 NumPy array with the statistic of each entry
+	"""
+	if statistic not in STATISTICS:
+		raise ValueError("statistic should be one of: %s" % (", ".join(STATISTICS)))
+	if statistic == EWMA:
+		return ewma(values, timestamps, window, time_window)
+	starts = get_window_starts(timestamps, window, time_window)
+	if statistic == MEDIAN:
+		return rolling_median(values, starts)
+	return rolling_mean(values, starts)
@@ -0,0 +1,42 @@
+import pytest
+import numpy as np
+import rolling
+
+def sample_series(num_entries=400, seed=3):
+	""" Returns timestamps with irregular spacing and noisy values with ties """
+	rng = np.random.RandomState(seed)
+	timestamps = 1500000000 + np.cumsum(rng.randint(600, 7200, num_entries))
+	values = np.round(1.0 + np.cumsum(rng.normal(0.0, 0.05, num_entries)), 2)
+	return timestamps, values
+
+def test_window_starts():
+	""" Tests that windows cover entries within 'window' seconds before an entry (both ends inclusive) or the last 'window' entries """
+	timestamps = np.array([0, 10, 20, 35, 40])
+	assert rolling.get_window_starts(timestamps, 20).tolist() == [0, 0, 0, 2, 2]
+	assert rolling.get_window_starts(timestamps, 2, time_window=False).tolist() == [0, 0, 1, 2, 3]
+	assert rolling.get_full_windows(timestamps, 20).tolist() == [False, False, True, True, True]
+	with pytest.raises(ValueError):
+		rolling.get_window_starts(timestamps, 0)
+
+@pytest.mark.parametrize("time_window", [True, False])
+def test_rolling_mean_and_median_match_naive(time_window):
+	""" Tests that rolling mean and median match the mean and median computed over each window from scratch """
+	timestamps, values = sample_series()
+	window = 12 * 3600 if time_window else 15
+	starts = rolling.get_window_starts(timestamps, window, time_window)
+	means = rolling.rolling_statistic(timestamps, values, window, rolling.MEAN, time_window)
+	medians = rolling.rolling_statistic(timestamps, values, window, rolling.MEDIAN, time_window)
+	for idx, start in enumerate(starts):
+		assert means[idx] == pytest.approx(values[start:idx + 1].mean(), rel=1e-12)
+		assert medians[idx] == np.median(values[start:idx + 1])
+
+def test_ewma_matches_weighted_mean():
+	""" Tests that exponentially weighted mean weights each entry by 0.5 to the power of its age in half-lives """
+	timestamps, values = sample_series(50)
+	halflife = 5 * 3600
+	means = rolling.ewma(values, timestamps, halflife)
+	for idx in (0, 10, 49):
+		weights = 0.5 ** ((timestamps[idx] - timestamps[:idx + 1]) / float(halflife))
+		assert means[idx] == pytest.approx((weights * values[:idx + 1]).sum() / weights.sum(), rel=1e-9)
+	with pytest.raises(ValueError):
+		rolling.rolling_statistic(timestamps, values, halflife, "mode")
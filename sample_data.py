@@ -0,0 +1,61 @@
+import os
+import numpy as np
+import synthetic
+import ticker_cache
+import lr_growing_altcoin as analysis
+from structures import *
+
+'''
+Factories of small in-memory series and intervals shared by the tests: values are given explicitly and spaced by a fixed step.
+Data files with given lending rates and prices are written through 'synthetic.write_csv', see 'write_data_files'.
+'''
+
+"""
+Constants
+"""
+LENDING_FILE = "btc_lending_rates.csv"
+
+
+def get_timestamps(num_entries, start=1500000000, step=3600):
+	""" Returns int64 NumPy array of 'num_entries' timestamps from 'start' spaced by 'step' seconds """
+	return np.arange(num_entries, dtype=np.int64) * step + start
+
+def make_lending_series(lending_rates, start=1500000000, step=3600, ticker="BTC"):
+	""" Returns LendingSeries with given lending rates spaced by 'step' seconds """
+	return LendingSeries(ticker, get_timestamps(len(lending_rates), start, step), np.array(lending_rates, dtype=np.float64))
+
+def make_price_series(ticker, close_prices, start=1500000000, step=3600):
+	""" Returns PriceSeries with given close prices spaced by 'step' seconds and unit volumes """
+	return PriceSeries(ticker, get_timestamps(len(close_prices), start, step), np.array(close_prices, dtype=np.float64), np.ones(len(close_prices)))
+
+def make_interest_interval(lending_rates, start=1500000000, step=3600, ticker="BTC", close_prices=None, price_ticker="LTC"):
+	""" Returns InterestInterval holding a LendingSeries with given lending rates spaced by 'step' seconds,
+		and a PriceSeries with given close prices at the same timestamps as its interest entries if 'close_prices' is set
+	"""
+	lending_series = make_lending_series(lending_rates, start, step, ticker)
+	timestamps = lending_series.timestamps
+	if close_prices is None:
+		return InterestInterval(ticker, int(timestamps[0]), int(timestamps[-1]), lending_series)
+	return InterestInterval(ticker, int(timestamps[0]), int(timestamps[-1]), lending_series, make_price_series(price_ticker, close_prices, start, step))
+
+def write_data_files(data_dir, timestamps, lending_rates, prices):
+	""" Writes BTC lending rates and prices of target currencies into 'data_dir', in the layout of the files in 'data'
+
+		Args:
+			data_dir - directory of the files
+			timestamps - NumPy array of timestamps of lending rates
+			lending_rates - NumPy array of lending rates
+			prices - dictionary mapping target currency ticker to a tuple of NumPy arrays of timestamps and close prices
+
+		Returns:
+			path to the lending rates file, price files are named as 'lr_growing_altcoin.get_target_data_path' expects
+	"""
+	data_dir = str(data_dir)
+	ones = np.ones(len(timestamps))
+	lending_path = synthetic.write_csv(os.path.join(data_dir, LENDING_FILE), ticker_cache.LENDING_COLUMNS,
+		(np.asarray(timestamps, dtype=np.int64), ones, ones, np.asarray(lending_rates, dtype=np.float64)))
+	for ticker, (price_timestamps, close_prices) in sorted(prices.items()):
+		ones = np.ones(len(price_timestamps))
+		synthetic.write_csv(analysis.get_target_data_path(ticker, data_dir), ticker_cache.CANDLE_COLUMNS,
+			(np.asarray(price_timestamps, dtype=np.int64), ones, np.asarray(close_prices, dtype=np.float64), ones, ones, ones * 10.0))
+	return lending_path
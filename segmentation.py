@@ -0,0 +1,206 @@
+import math
+import numpy as np
+from structures import *
+
+'''
+Changepoint segmentation of lending rates into LendingInterval instances driven by the data rather than by a fixed duration.
+
+A series is split where its mean (or its mean and variance) shifts, by minimizing the sum of costs of segments plus a penalty per changepoint.
+Costs are Gaussian negative log-likelihoods of a segment, each computed in O(1) from prefix sums of values and squared values.
+Two search methods are available: PELT (exact minimum, linear time in practice since candidates which can't start an optimal segment are pruned)
+and binary segmentation (approximate, splits a segment in two at its best point while the gain exceeds the penalty, every split evaluated in a single vectorized pass).
+
+Resulting segments don't overlap and cover the whole series, each of them becomes a LendingInterval which can be passed to 'get_interest_intervals'.
+'''
+
+"""
+Constants
+"""
+PELT = "pelt"
+BINSEG = "binseg"
+METHODS = (PELT, BINSEG)
+# shift of the mean, variance is assumed constant
+MEAN = "mean"
+# shift of the mean and/or variance
+MEAN_VAR = "mean_var"
+COSTS = (MEAN, MEAN_VAR)
+# minimum number of entries within a segment, a day of hourly lending rates
+MIN_SIZE = 24
+# this fraction of the variance of the whole series is added to the variance of each segment, so that flat segments don't have infinitely small cost
+MIN_VARIANCE_RATIO = 1e-3
+
+
+def estimate_noise_variance(values):
+	""" Estimates variance of noise of a series from median absolute difference of consecutive values, which is robust to shifts of the mean """
+	diffs = np.abs(np.diff(values))
+	if not len(diffs):
+		return 1.0
+	mad = float(np.median(diffs))
+	variance = (mad / 0.6745)**2 / 2.0 if mad > 0.0 else float(diffs.var()) / 2.0
+	return variance if variance > 0.0 else 1.0
+
+'''
+Cost of any segment of a series computed in O(1) from prefix sums
+'''
+class SegmentCost(object):
+	""" Gaussian cost of segments of a series
+
+		Args:
+			values - NumPy array of values
+			cost - "mean" (cost of a segment is its sum of squared deviations from its mean divided by variance of noise) or
+				"mean_var" (cost is number of entries times the logarithm of the variance of the segment plus a small fraction of the variance of the series,
+				see MIN_VARIANCE_RATIO). Default value is "mean_var".
+
+		Note: cost of a segment is never smaller than the sum of costs of its parts, which pruning of PELT relies on. This is why the variance
+		of a segment is regularized by adding a constant rather than by a floor, a floor breaks the inequality for segments flatter than it.
+	"""
+
+	def __init__(self, values, cost=MEAN_VAR):
+		if cost not in COSTS:
+			raise ValueError("cost should be one of: %s" % (", ".join(COSTS)))
+		values = np.asarray(values, dtype=np.float64)
+		self.cost = cost
+		# centered, so that sums of long segments don't lose precision
+		centered = values - (values.mean() if len(values) else 0.0)
+		self.sums = np.concatenate(([0.0], np.cumsum(centered)))
+		self.squares = np.concatenate(([0.0], np.cumsum(centered * centered)))
+		if cost == MEAN:
+			self.scale = estimate_noise_variance(values)
+		else:
+			total_variance = float(values.var()) if len(values) else 0.0
+			self.min_variance = total_variance * MIN_VARIANCE_RATIO if total_variance > 0.0 else 1e-12
+
+	def __len__(self):
+		return len(self.sums) - 1
+
+	def get_num_parameters(self):
+		""" Returns number of parameters of a segment: its mean (and variance) """
+		return 1 if self.cost == MEAN else 2
+
+	def __call__(self, starts, ends):
+		""" Returns costs of segments [start, end) (end exclusive), 'starts' and 'ends' are NumPy arrays or integers """
+		n = ends - starts
+		sums = self.sums[ends] - self.sums[starts]
+		squared_deviations = np.maximum((self.squares[ends] - self.squares[starts]) - sums * sums / n, 0.0)
+		if self.cost == MEAN:
+			return squared_deviations / self.scale
+		return n * np.log(squared_deviations / n + self.min_variance)
+
+def get_default_penalty(cost):
+	""" Returns penalty per changepoint by the Bayesian information criterion: number of parameters of a segment plus its location times the logarithm of number of entries """
+	return (cost.get_num_parameters() + 1) * math.log(max(len(cost), 2))
+
+def pelt(cost, penalty, min_size=MIN_SIZE):
+	""" Finds changepoints minimizing the total penalized cost with Pruned Exact Linear Time search
+
+		Since a segment has at least 'min_size' entries, optimal costs of 'min_size' consecutive ends depend only on optimal costs of ends before them,
+		so they are computed together as a single (candidates x ends) array operation. Candidates which can't start the last segment of an optimal
+		segmentation anymore are pruned.
+
+		Args:
+			cost - SegmentCost of the series
+			penalty - penalty per changepoint
+			min_size - minimum number of entries within a segment. Default value is MIN_SIZE.
+
+		Returns:
+			sorted list of indices where segments start, without the first segment (which starts at 0)
+	"""
+	n = len(cost)
+	min_size = max(int(min_size), 1)
+	if n < 2 * min_size:
+		return list()
+	# optimal cost of the first t entries and start of the last segment of the optimal segmentation
+	total_costs = np.full(n + 1, np.inf)
+	total_costs[0] = -penalty
+	last_starts = np.zeros(n + 1, dtype=np.int64)
+	candidates = np.zeros(1, dtype=np.int64)
+	pruned = list()
+	for block_start in range(min_size, n + 1, min_size):
+		ends = np.arange(block_start, min(block_start + min_size, n + 1))
+		# entries which can start a segment ending within the block, optimal costs of the entries before them are known by now
+		new_candidates = np.arange(max(block_start - min_size, min_size), ends[-1] - min_size + 1)
+		candidates = np.concatenate((candidates, new_candidates))
+		# candidates pruned at end e can't start the last segment of ends from e + min_size on, which are all in the blocks after the next one
+		if len(pruned) == 2:
+			candidates = candidates[~np.isin(candidates, pruned.pop(0))]
+		costs = total_costs[candidates][:, None] + cost(candidates[:, None], ends[None, :])
+		valid = ends[None, :] - candidates[:, None] >= min_size
+		costs[~valid] = np.inf
+		best = np.argmin(costs, axis=0)
+		total_costs[ends] = costs[best, np.arange(len(ends))] + penalty
+		last_starts[ends] = candidates[best]
+		# a candidate which can't beat the optimum at some end can't beat it later either
+		pruned.append(candidates[(valid & (costs > total_costs[ends][None, :])).any(axis=1)])
+	changepoints = list()
+	start = last_starts[n]
+	while start > 0:
+		changepoints.append(int(start))
+		start = last_starts[start]
+	return changepoints[::-1]
+
+def binary_segmentation(cost, penalty, min_size=MIN_SIZE):
+	""" Finds changepoints by splitting segments in two at the point with the largest decrease of cost, as long as the decrease exceeds the penalty
+
+		Args: see 'pelt'
+
+		Returns:
+			sorted list of indices where segments start, without the first segment (which starts at 0)
+	"""
+	min_size = max(int(min_size), 1)
+	changepoints = list()
+	segments = [(0, len(cost))]
+	while segments:
+		start, end = segments.pop()
+		if end - start < 2 * min_size:
+			continue
+		splits = np.arange(start + min_size, end - min_size + 1)
+		gains = cost(start, end) - (cost(start, splits) + cost(splits, end))
+		best = int(np.argmax(gains))
+		if gains[best] <= penalty:
+			continue
+		split = int(splits[best])
+		changepoints.append(split)
+		segments.extend(((start, split), (split, end)))
+	return sorted(changepoints)
+
+def find_changepoints(values, method=PELT, cost=MEAN_VAR, penalty=None, min_size=MIN_SIZE):
+	""" Finds indices where mean (or mean and variance) of a series shifts
+
+		Args:
+			values - NumPy array of values
+			method - "pelt" or "binseg". Default value is "pelt".
+			cost - "mean" or "mean_var", see 'SegmentCost'. Default value is "mean_var".
+			penalty - penalty per changepoint, larger penalty yields less segments. Default value is None (see 'get_default_penalty').
+			min_size - minimum number of entries within a segment. Default value is MIN_SIZE.
+
+		Returns:
+			sorted list of indices where segments start, without the first segment (which starts at 0)
+	"""
+	if method not in METHODS:
+		raise ValueError("method should be one of: %s" % (", ".join(METHODS)))
+	segment_cost = SegmentCost(values, cost)
+	if penalty is None:
+		penalty = get_default_penalty(segment_cost)
+	search = pelt if method == PELT else binary_segmentation
+	return search(segment_cost, penalty, min_size)
+
+def generate_segment_intervals(entries, method=PELT, cost=MEAN_VAR, penalty=None, min_size=MIN_SIZE):
+	""" Breaks lending entries into LendingInterval instances at changepoints of lending rate, see 'find_changepoints'
+
+		Args:
+			entries - LendingSeries or list of LendingTickerEntry instances, sorted by timestamp in ascending order
+			method, cost, penalty, min_size - see 'find_changepoints'
+
+		Returns:
+			list of LendingInterval instances which don't overlap and cover all entries, lending entries of each are a slice of the input
+	"""
+	if entries is None or not isinstance(entries, (list, LendingSeries)):
+		raise TypeError("input type should be LendingSeries or list containing LendingTickerEntry objects")
+	if not len(entries):
+		raise ValueError("number of LendingEntry instances must be more than 0")
+	series = entries if isinstance(entries, LendingSeries) else LendingSeries.from_entries(entries)
+	if (np.diff(series.timestamps) <= 0).any():
+		raise ValueError("LendingTickerEntry objects must be sorted by timestamp in ascending order")
+	bounds = [0] + find_changepoints(series.lending_rates, method, cost, penalty, min_size) + [len(series)]
+	timestamps = series.timestamps
+	return [LendingInterval(series.ticker, int(timestamps[lo]), int(timestamps[hi - 1]), entries[lo:hi]) for lo, hi in zip(bounds[:-1], bounds[1:])]
@@ -0,0 +1,82 @@
+import pytest
+import numpy as np
+import segmentation
+import structures
+import lr_growing_altcoin as analysis
+
+def shifted_series(seed=5):
+	""" Returns noisy values whose mean shifts at entries 100 and 250 and whose variance grows at entry 400 """
+	rng = np.random.RandomState(seed)
+	return np.concatenate((rng.normal(1.0, 0.1, 100), rng.normal(2.0, 0.1, 150), rng.normal(1.5, 0.1, 150), rng.normal(1.5, 1.0, 100)))
+
+def optimal_partitioning(cost, penalty, min_size):
+	""" Returns changepoints minimizing the penalized cost found by trying every start of the last segment for every end (no pruning) """
+	n = len(cost)
+	total_costs = [0.0 - penalty] + [np.inf] * n
+	last_starts = [0] * (n + 1)
+	for end in range(min_size, n + 1):
+		for start in [0] + list(range(min_size, end - min_size + 1)):
+			total_cost = total_costs[start] + float(cost(start, end)) + penalty
+			if total_cost < total_costs[end]:
+				total_costs[end], last_starts[end] = total_cost, start
+	changepoints = list()
+	start = last_starts[n]
+	while start > 0:
+		changepoints.append(start)
+		start = last_starts[start]
+	return changepoints[::-1]
+
+def flat_segments_series(seed):
+	""" Returns short segments at random levels, some of them nearly or exactly constant, others noisy """
+	rng = np.random.RandomState(seed)
+	segments = list()
+	for _ in range(rng.randint(2, 8)):
+		num_entries = rng.randint(2, 25)
+		segments.append(rng.normal(rng.normal(0.0, 1.0), rng.choice([0.0, 1e-4, 0.01, 0.03, 0.1, 0.3]), num_entries))
+	return np.concatenate(segments)
+
+def penalized_cost(cost, changepoints, penalty):
+	""" Returns sum of costs of segments between given changepoints plus penalty per changepoint """
+	bounds = [0] + list(changepoints) + [len(cost)]
+	return sum(float(cost(start, end)) for start, end in zip(bounds[:-1], bounds[1:])) + penalty * len(changepoints)
+
+@pytest.mark.parametrize("cost", segmentation.COSTS)
+@pytest.mark.parametrize("min_size", [1, 5, 24])
+def test_pelt_matches_optimal_partitioning(cost, min_size):
+	""" Tests that PELT finds the same changepoints as the optimal partitioning without pruning """
+	values = shifted_series()[::3]
+	segment_cost = segmentation.SegmentCost(values, cost)
+	penalty = segmentation.get_default_penalty(segment_cost)
+	assert segmentation.pelt(segment_cost, penalty, min_size) == optimal_partitioning(segment_cost, penalty, min_size)
+
+@pytest.mark.parametrize("seed", range(470, 490))
+def test_pelt_optimal_with_flat_segments(seed):
+	""" Tests that pruning doesn't lose the optimum when segments are flatter than the regularization of their variance """
+	segment_cost = segmentation.SegmentCost(flat_segments_series(seed), segmentation.MEAN_VAR)
+	penalty = segmentation.get_default_penalty(segment_cost)
+	for min_size in (1, 2, 5):
+		expected = penalized_cost(segment_cost, optimal_partitioning(segment_cost, penalty, min_size), penalty)
+		assert penalized_cost(segment_cost, segmentation.pelt(segment_cost, penalty, min_size), penalty) == pytest.approx(expected, rel=1e-9, abs=1e-9)
+
+@pytest.mark.parametrize("method", segmentation.METHODS)
+def test_find_changepoints_shifts(method):
+	""" Tests that shifts of the mean are found by both costs and the shift of the variance only by the mean and variance cost """
+	values = shifted_series()
+	changepoints = segmentation.find_changepoints(values, method, segmentation.MEAN_VAR)
+	assert len(changepoints) == 3
+	assert np.abs(np.array(changepoints) - [100, 250, 400]).max() <= 2
+	assert segmentation.find_changepoints(values[:400], method, segmentation.MEAN) == [100, 250]
+	with pytest.raises(ValueError):
+		segmentation.find_changepoints(values, "dynp")
+
+def test_generate_segment_intervals():
+	""" Tests that segments cover all entries without overlaps and can be searched for interest intervals """
+	values = shifted_series()
+	series = structures.LendingSeries("BTC", 1500000000 + np.arange(len(values)) * 3600, values)
+	intervals = segmentation.generate_segment_intervals(series)
+	assert sum(len(interval.lending_entries) for interval in intervals) == len(series)
+	assert all(prev.end_date < interval.start_date for prev, interval in zip(intervals[:-1], intervals[1:]))
+	assert (intervals[0].start_date, intervals[-1].end_date) == (1500000000, int(series.timestamps[-1]))
+	growing, not_growing = analysis.get_interest_intervals(intervals, 5)
+	assert len(growing) + len(not_growing) > 0
+	assert analysis.get_lending_intervals(analysis.CHANGEPOINTS, series)[1].start_date == intervals[1].start_date
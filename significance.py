@@ -0,0 +1,224 @@
+import zlib
+import argparse
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+import utils
+import resample
+import alignment
+import ticker_cache
+import lr_growing_altcoin as analysis
+
+'''
+Monte Carlo significance test of price changes of a target currency during "growing" InterestInterval instances.
+
+The statistic is the mean relative price change over the intervals. Its null distribution is estimated by replicates of one of two kinds:
+	"shift" - all intervals are shifted together by a random offset (circularly) over the price series, which keeps their lengths and spacing
+	"block_bootstrap" - intervals stay in place and the price series is rebuilt from randomly drawn blocks of its returns, which keeps short-term dependence of returns
+The p-value is the share of replicates whose statistic is at least the observed one.
+
+Prices are bars of a regular grid carried forward over gaps, so cumulative log returns form a prefix array and the log return of any interval
+in any replicate is a difference of two of its elements. Each replicate is thus evaluated as a few array operations over all intervals, and replicates
+are evaluated in chunks of (replicates x intervals) arrays. Chunks are spread across a process pool. Each chunk draws from its own random generator
+seeded by the seed of the run, the ticker and the index of the chunk, so results don't depend on the number of workers or on order of completion.
+'''
+
+"""
+Constants
+"""
+SHIFT = "shift"
+BLOCK_BOOTSTRAP = "block_bootstrap"
+METHODS = (SHIFT, BLOCK_BOOTSTRAP)
+DEFAULT_NUM_REPLICATES = 10000
+# number of replicates evaluated by a single task of the process pool
+CHUNK_SIZE = 1000
+DEFAULT_RESOLUTION = "1h"
+SUMMARY_COLUMNS = ["ticker", "method", "num_intervals", "num_replicates", "statistic", "null_mean", "null_std", "p_value"]
+
+
+def get_log_price_prefix(path, period_start, period_end, resolution=DEFAULT_RESOLUTION):
+	""" Loads close prices as bars on a regular grid and returns their cumulative log returns
+
+		The grid spans bars from the first to the last price within the period, a missing bar takes the close price of the latest bar before it.
+
+		Args:
+			path - path to price data file
+			period_start - start of the period
+			period_end - end of the period
+			resolution - resolution of bars. Default value is "1h".
+
+		Returns:
+			a tuple of int64 NumPy array of bar start timestamps (N) and float64 NumPy array of log prices relative to the first bar (N),
+			log return from bar a to bar e is prefix[e] - prefix[a]
+	"""
+	period = resample.get_resolution_seconds(resolution)
+	columns = utils.get_ticker_columns(path, int(period_start) // period * period, period_end, 0, resolution=resolution)
+	if not len(columns) or len(columns[0]) < 2:
+		raise ValueError("at least two bars of prices are needed within given period of time")
+	grid = np.arange(columns[0][0], columns[0][-1] + 1, period, dtype=np.int64)
+	log_prices = alignment.asof_join(grid, columns[0], np.log(columns[analysis.CLOSE_PRICE_IDX]), alignment.PREVIOUS)
+	return grid, log_prices - log_prices[0]
+
+def get_interval_bars(grid, starts, ends):
+	""" Returns indices of the first and the last bar within each interval, intervals within a single bar or outside of the grid are left out """
+	first_bars = np.searchsorted(grid, np.asarray(starts), side="left")
+	last_bars = np.searchsorted(grid, np.asarray(ends), side="right") - 1
+	keep = last_bars > first_bars
+	return first_bars[keep], last_bars[keep]
+
+def get_statistic(log_returns):
+	""" Returns mean relative price change over intervals (last axis) given their log returns """
+	return np.expm1(log_returns).mean(axis=-1)
+
+def shift_replicates(prefix, first_bars, last_bars, rng, num_replicates):
+	""" Computes statistics of intervals shifted together by random offsets, circularly over the returns of the grid
+
+		Returns:
+			float64 NumPy array with a statistic per replicate
+	"""
+	num_returns = len(prefix) - 1
+	offsets = rng.integers(0, num_returns, size=(num_replicates, 1))
+
+	# cumulative log return of the circularly repeated returns
+	def cumulative(idx):
+		return prefix[idx % num_returns] + (idx // num_returns) * prefix[num_returns]
+
+	return get_statistic(cumulative(last_bars + offsets) - cumulative(first_bars + offsets))
+
+def block_bootstrap_replicates(prefix, first_bars, last_bars, rng, num_replicates, block_length):
+	""" Computes statistics of intervals over price series rebuilt from random blocks of 'block_length' returns (moving block bootstrap)
+
+		Returns:
+			float64 NumPy array with a statistic per replicate
+	"""
+	num_returns = len(prefix) - 1
+	block_length = int(min(max(block_length, 1), num_returns))
+	num_blocks = num_returns // block_length + 1
+	block_starts = rng.integers(0, num_returns - block_length + 1, size=(num_replicates, num_blocks))
+	# cumulative log return of the rebuilt series at the start of each block
+	block_returns = prefix[block_starts + block_length] - prefix[block_starts]
+	block_prefix = np.concatenate((np.zeros((num_replicates, 1)), np.cumsum(block_returns, axis=1)), axis=1)
+	rows = np.arange(num_replicates)[:, None]
+
+	def cumulative(idx):
+		blocks, offsets = idx // block_length, idx % block_length
+		starts = block_starts[rows, blocks]
+		return block_prefix[rows, blocks] + prefix[starts + offsets] - prefix[starts]
+
+	return get_statistic(cumulative(last_bars[None, :]) - cumulative(first_bars[None, :]))
+
+def get_default_block_length(num_returns):
+	""" Returns block length of the bootstrap growing with the cube root of number of returns """
+	return max(int(round(num_returns ** (1.0 / 3.0))), 1)
+
+def run_chunk(prefix, first_bars, last_bars, method, num_replicates, seed, key, chunk_idx, block_length=None):
+	""" Computes statistics of a chunk of replicates, see 'shift_replicates' and 'block_bootstrap_replicates'
+
+		Args:
+			prefix - cumulative log returns of the grid, see 'get_log_price_prefix'
+			first_bars - NumPy array of indices of the first bar of each interval
+			last_bars - NumPy array of indices of the last bar of each interval
+			method - "shift" or "block_bootstrap"
+			num_replicates - number of replicates of the chunk
+			seed - seed of the run
+			key - integer identifying the tested series (e.g. hash of the ticker), so that series don't share random numbers
+			chunk_idx - index of the chunk, random generator of the chunk is seeded by (seed, key, chunk_idx)
+			block_length - length of blocks of the bootstrap, in bars. Default value is None (see 'get_default_block_length').
+
+		Returns:
+			float64 NumPy array with a statistic per replicate
+	"""
+	rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(key, chunk_idx)))
+	if method == SHIFT:
+		return shift_replicates(prefix, first_bars, last_bars, rng, num_replicates)
+	return block_bootstrap_replicates(prefix, first_bars, last_bars, rng, num_replicates, block_length or get_default_block_length(len(prefix) - 1))
+
+def get_chunks(num_replicates, chunk_size=CHUNK_SIZE):
+	""" Returns numbers of replicates of consecutive chunks """
+	return [min(chunk_size, num_replicates - start) for start in range(0, num_replicates, chunk_size)]
+
+def get_ticker_key(ticker):
+	""" Returns integer identifying a ticker within seeds of random generators, stable across processes """
+	return zlib.crc32(ticker.encode("utf-8"))
+
+def summarize(ticker, method, observed, replicates, num_intervals):
+	""" Returns a dictionary with the observed statistic, mean and standard deviation of replicates and one-sided p-value, see SUMMARY_COLUMNS """
+	return dict(ticker=ticker, method=method, num_intervals=num_intervals, num_replicates=len(replicates), statistic=float(observed),
+		null_mean=float(replicates.mean()) if len(replicates) else float("nan"), null_std=float(replicates.std()) if len(replicates) else float("nan"),
+		p_value=float((1 + np.count_nonzero(replicates >= observed)) / (1.0 + len(replicates))) if len(replicates) else float("nan"))
+
+def analyze_significance(period_start, period_end, num_replicates=DEFAULT_NUM_REPLICATES, method=SHIFT, duration=analysis.TEN_DAYS, min_num_tickers=10,
+	tickers=None, data_dir=analysis.DATA_DIR, lending_path=analysis.BTC_LENDING_DATA, resolution=DEFAULT_RESOLUTION, block_length=None, seed=0, max_workers=None):
+	""" Tests whether prices of target currencies rise during growing InterestInterval instances more than by chance
+
+		Interest intervals are discovered once from BTC lending rates, replicates of all target currencies are then spread across a process pool in chunks.
+
+		Args:
+			period_start - start of the analyzed period
+			period_end - end of the analyzed period
+			num_replicates - number of replicates per target currency. Default value is DEFAULT_NUM_REPLICATES.
+			method - "shift" or "block_bootstrap". Default value is "shift".
+			duration - duration of lending intervals, in seconds, or "changepoints" (see 'lr_growing_altcoin.get_lending_intervals'). Default value is TEN_DAYS.
+			min_num_tickers - minimum number of entries within InterestInterval. Default value is 10.
+			tickers - target currency tickers. Default value is None (all tickers with price data in 'data_dir').
+			data_dir - directory containing price data files of target currencies
+			lending_path - path to BTC lending rates file
+			resolution - resolution of price bars. Default value is "1h".
+			block_length - length of blocks of the bootstrap, in bars. Default value is None (see 'get_default_block_length').
+			seed - seed of random generators. Default value is 0.
+			max_workers - number of worker processes, 0 runs everything in the current process. Default value is None (number of CPUs).
+
+		Returns:
+			Pandas dataframe with a summary row per target currency, see SUMMARY_COLUMNS
+	"""
+	if method not in METHODS:
+		raise ValueError("method should be one of: %s" % (", ".join(METHODS)))
+	tickers = tickers or analysis.get_target_tickers(data_dir)
+	paths = dict((ticker, analysis.get_target_data_path(ticker, data_dir)) for ticker in tickers)
+	ticker_cache.ensure_cached([lending_path] + list(paths.values()))
+	lending_series = analysis.load_lending_series(period_start, period_end, lending_path)
+	growing = analysis.get_interest_intervals(analysis.get_lending_intervals(duration, lending_series), min_num_tickers)[0]
+	starts = np.array([interval.start_date for interval in growing], dtype=np.int64)
+	ends = np.array([interval.end_date for interval in growing], dtype=np.int64)
+	inputs = dict()
+	tasks = list()
+	for ticker in tickers:
+		grid, prefix = get_log_price_prefix(paths[ticker], period_start, period_end, resolution)
+		first_bars, last_bars = get_interval_bars(grid, starts, ends)
+		inputs[ticker] = (prefix, first_bars, last_bars)
+		if len(first_bars):
+			tasks.extend((ticker, chunk_idx, size) for chunk_idx, size in enumerate(get_chunks(num_replicates)))
+	args = [inputs[ticker] + (method, size, seed, get_ticker_key(ticker), chunk_idx, block_length) for ticker, chunk_idx, size in tasks]
+	if max_workers == 0:
+		results = [run_chunk(*task_args) for task_args in args]
+	else:
+		with ProcessPoolExecutor(max_workers=max_workers) as executor:
+			results = list(executor.map(run_chunk, *zip(*args))) if args else list()
+	replicates = dict((ticker, list()) for ticker in tickers)
+	for (ticker, chunk_idx, size), chunk in zip(tasks, results):
+		replicates[ticker].append(chunk)
+	summaries = list()
+	for ticker in tickers:
+		prefix, first_bars, last_bars = inputs[ticker]
+		observed = get_statistic(prefix[last_bars] - prefix[first_bars]) if len(first_bars) else float("nan")
+		ticker_replicates = np.concatenate(replicates[ticker]) if replicates[ticker] else np.empty(0)
+		summaries.append(summarize(ticker, method, observed, ticker_replicates, len(first_bars)))
+	return pd.DataFrame(summaries, columns=SUMMARY_COLUMNS)
+
+def main():
+	parser = argparse.ArgumentParser(description="Monte Carlo significance of target currency price changes during growing BTC lending rate")
+	parser.add_argument("--period", type=float, nargs=2, default=[1480530600.0, 1507062600.0], help="period start and end")
+	parser.add_argument("--replicates", type=int, default=DEFAULT_NUM_REPLICATES, help="number of replicates per target currency")
+	parser.add_argument("--method", default=SHIFT, choices=METHODS, help="random shifts of intervals or block bootstrap of returns")
+	parser.add_argument("--block-length", type=int, help="length of bootstrap blocks, in bars")
+	parser.add_argument("--resolution", default=DEFAULT_RESOLUTION, help="resolution of price bars, e.g. 15m, 1h or 1d")
+	parser.add_argument("--tickers", nargs="+", help="target currency tickers, all tickers in data directory by default")
+	parser.add_argument("--seed", type=int, default=0, help="seed of random generators")
+	parser.add_argument("--workers", type=int, help="number of worker processes")
+	args = parser.parse_args()
+	summary = analyze_significance(args.period[0], args.period[1], args.replicates, args.method, tickers=args.tickers, resolution=args.resolution,
+		block_length=args.block_length, seed=args.seed, max_workers=args.workers)
+	print(summary.to_string(index=False))
+
+if __name__ == "__main__":
+	main()
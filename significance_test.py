@@ -0,0 +1,46 @@
+import math
+import pytest
+import numpy as np
+import significance
+import sample_data
+
+def write_sample_data(data_dir):
+	""" Writes BTC lending rates with a sawtooth-shaped rate and LTC prices which rise only while the rate is above its average, returns path to lending rates file """
+	timestamps = sample_data.get_timestamps(24 * 60, start=1500004800)
+	phases = np.arange(len(timestamps)) % 100
+	prices = 1.0 + 0.01 * np.concatenate(([0], np.cumsum(phases >= 50)[:-1]))
+	return sample_data.write_data_files(data_dir, timestamps, 10.0 + phases / 10.0, {"LTC": (timestamps, prices)})
+
+def test_shift_replicates_match_shifted_intervals():
+	""" Tests that shifted intervals wrap around the end of the series, their returns continuing with returns from its start """
+	prefix = np.log(np.array([1.0, 2.0, 1.0, 4.0, 2.0]))
+	returns = np.diff(prefix)
+	first_bars, last_bars = np.array([0, 1]), np.array([2, 3])
+	rng = np.random.default_rng(1)
+	statistics = significance.shift_replicates(prefix, first_bars, last_bars, np.random.default_rng(1), 20)
+	offsets = rng.integers(0, len(returns), size=20)
+	for statistic, offset in zip(statistics, offsets):
+		changes = [math.expm1(sum(returns[(idx + offset) % len(returns)] for idx in range(first, last))) for first, last in zip(first_bars, last_bars)]
+		assert statistic == pytest.approx(np.mean(changes))
+
+def test_block_bootstrap_replicates_match_rebuilt_series():
+	""" Tests that bootstrap statistics equal statistics of intervals over a series concatenated from the drawn blocks of returns """
+	prefix = np.concatenate(([0.0], np.cumsum(np.random.default_rng(3).normal(0.0, 0.01, 50))))
+	first_bars, last_bars = np.array([0, 7, 20]), np.array([5, 30, 50])
+	statistics = significance.block_bootstrap_replicates(prefix, first_bars, last_bars, np.random.default_rng(2), 10, 4)
+	block_starts = np.random.default_rng(2).integers(0, 50 - 4 + 1, size=(10, 50 // 4 + 1))
+	for statistic, starts in zip(statistics, block_starts):
+		rebuilt = np.concatenate([np.diff(prefix[start:start + 5]) for start in starts])
+		changes = [math.expm1(rebuilt[first:last].sum()) for first, last in zip(first_bars, last_bars)]
+		assert statistic == pytest.approx(np.mean(changes))
+
+def test_analyze_significance(tmp_path):
+	""" Tests that prices rising with the lending rate are significant and that results don't depend on the number of workers """
+	lending_path = write_sample_data(tmp_path)
+	kwargs = dict(num_replicates=2500, duration=86400 * 20, min_num_tickers=5, tickers=["LTC"], data_dir=str(tmp_path), lending_path=lending_path, seed=7)
+	summary = significance.analyze_significance(1500000000, 1500000000 + 60 * 86400, max_workers=0, **kwargs)
+	assert summary["num_intervals"][0] > 0 and summary["num_replicates"][0] == 2500
+	assert summary["p_value"][0] < 0.05
+	assert summary.equals(significance.analyze_significance(1500000000, 1500000000 + 60 * 86400, max_workers=2, **kwargs))
+	bootstrap = significance.analyze_significance(1500000000, 1500000000 + 60 * 86400, method=significance.BLOCK_BOOTSTRAP, max_workers=0, **kwargs)
+	assert bootstrap["p_value"][0] < 0.05
@@ -0,0 +1,171 @@
+import collections
+import numpy as np
+from regression import segment_slopes
+from structures import *
+
+'''
+Online discovery of InterestInterval instances from live lending ticks.
+
+Ticks are consumed one at a time and bucketed into LendingInterval periods the same way 'generate_lending_intervals' does
+(buckets of fixed duration counted from the first tick, both ends inclusive, so a tick exactly at the boundary belongs to both buckets).
+For the current bucket only the count and the sum of lending rates are kept together with the entries of the current above-average run,
+so each tick costs O(1) (the slope of a closed run is computed once when it closes, which is O(1) amortized per tick) and memory is bounded by the length of a bucket.
+
+Difference from the batch 'get_interest_intervals': the batch version compares each entry with the final average of its LendingInterval,
+whereas a live detector can't know it before the bucket ends. Unless final averages are supplied (see 'bucket_means'), a tick is compared with
+the running average of its bucket including the tick itself. In particular the first tick of a bucket is always above its running average, and a
+run may start or close earlier or later than in the batch version. Given the final averages, the detector reports exactly the same intervals as the batch version.
+'''
+
+DetectorEvent = collections.namedtuple("DetectorEvent", ["kind", "timestamp", "interval", "is_growing"])
+
+"""
+Constants
+"""
+# a run of above-average ticks reached 'min_num_tickers' ticks, 'interval' holds the entries so far
+OPEN_EVENT = "open"
+# an open run was closed by a tick below the average, 'interval' holds the final InterestInterval
+CLOSE_EVENT = "close"
+# an open run lasted till the end of its bucket and is discarded, the batch version drops such runs as well
+DROP_EVENT = "drop"
+
+
+class InterestIntervalDetector(object):
+	""" Incremental detector of InterestInterval instances
+
+		Args:
+			duration - duration of buckets (LendingInterval instances), in seconds
+			min_num_tickers - minimum number of ticks within reported InterestInterval. Default value is 10.
+			start_date - start of the first bucket. Default value is None (timestamp of the first tick).
+			bucket_means - sequence or dictionary mapping bucket index to the final average lending rate of the bucket, e.g. known from a previous pass over the data.
+				Default value is None (running average of the bucket is used).
+	"""
+
+	def __init__(self, duration, min_num_tickers=10, start_date=None, bucket_means=None):
+		if duration <= 0:
+			raise ValueError("duration of buckets must be positive integer")
+		self.duration = duration
+		self.min_num_tickers = min_num_tickers
+		self.start_date = start_date
+		self.bucket_means = bucket_means
+		self.ticker = None
+		self.last_timestamp = None
+		self.bucket_idx = None
+		self.boundary_tick = None
+		self.bucket_count = 0
+		self.bucket_sum = 0.0
+		self.run_timestamps = list()
+		self.run_lending_rates = list()
+
+	def get_bucket_end(self):
+		""" Returns end date (inclusive) of the current bucket """
+		return self.start_date + (self.bucket_idx + 1) * self.duration
+
+	def update(self, entry):
+		""" Consumes a single tick
+
+			Args:
+				entry - LendingTickerEntry (or any object with 'ticker', 'timestamp' and 'lending_rate'), ticks must come in ascending order of timestamps
+
+			Returns:
+				list of DetectorEvent instances triggered by the tick, usually empty
+		"""
+		timestamp, lending_rate = int(entry.timestamp), float(entry.lending_rate)
+		if self.last_timestamp is not None and timestamp <= self.last_timestamp:
+			raise ValueError("ticks must come in ascending order of timestamps")
+		self.last_timestamp = timestamp
+		if self.ticker is None:
+			self.ticker = entry.ticker
+		if self.start_date is None:
+			self.start_date = timestamp
+		if timestamp < self.start_date:
+			raise ValueError("tick precedes start date of the first bucket")
+		events = list()
+		bucket_idx = max((timestamp - self.start_date - 1) // self.duration, 0)
+		if self.bucket_idx is not None and bucket_idx != self.bucket_idx:
+			events.extend(self._end_bucket())
+		if self.bucket_idx is None:
+			self._start_bucket(bucket_idx)
+			# tick at the boundary of the previous bucket is the first tick of this one, unless there was a gap
+			if self.boundary_tick is not None and self.boundary_tick[0] == bucket_idx:
+				events.extend(self._add_tick(self.boundary_tick[1], self.boundary_tick[2]))
+		self.boundary_tick = None
+		events.extend(self._add_tick(timestamp, lending_rate))
+		if timestamp == self.get_bucket_end():
+			# the tick is the last tick of the current bucket, the next bucket starts with it once (and if) further ticks come
+			events.extend(self._end_bucket())
+			self.boundary_tick = (bucket_idx + 1, timestamp, lending_rate)
+		return events
+
+	def flush(self):
+		""" Ends the current bucket, e.g. once the stream is over
+
+			Returns:
+				list of DetectorEvent instances, DROP_EVENT if a run was open
+		"""
+		return self._end_bucket() if self.bucket_idx is not None else list()
+
+	def _start_bucket(self, bucket_idx):
+		self.bucket_idx = bucket_idx
+		self.bucket_count = 0
+		self.bucket_sum = 0.0
+
+	def _end_bucket(self):
+		events = list()
+		if len(self.run_timestamps) >= self.min_num_tickers:
+			events.append(DetectorEvent(DROP_EVENT, self.run_timestamps[-1], self._make_interval(), None))
+		del self.run_timestamps[:]
+		del self.run_lending_rates[:]
+		self.bucket_idx = None
+		return events
+
+	def _get_mean(self):
+		if self.bucket_means is not None:
+			return self.bucket_means[self.bucket_idx]
+		return self.bucket_sum/float(self.bucket_count)
+
+	def _add_tick(self, timestamp, lending_rate):
+		self.bucket_count += 1
+		self.bucket_sum += lending_rate
+		if lending_rate >= self._get_mean():
+			self.run_timestamps.append(timestamp)
+			self.run_lending_rates.append(lending_rate)
+			if len(self.run_timestamps) == self.min_num_tickers:
+				return [DetectorEvent(OPEN_EVENT, timestamp, self._make_interval(), None)]
+			return list()
+		if not self.run_timestamps:
+			return list()
+		events = list()
+		if len(self.run_timestamps) >= self.min_num_tickers:
+			interval = self._make_interval()
+			is_growing = segment_slopes(interval.lending_entries.timestamps, interval.lending_entries.lending_rates, [0], [len(interval.lending_entries) - 1])[0] > 0.0
+			events.append(DetectorEvent(CLOSE_EVENT, timestamp, interval, bool(is_growing)))
+		del self.run_timestamps[:]
+		del self.run_lending_rates[:]
+		return events
+
+	def _make_interval(self):
+		lending_entries = LendingSeries(self.ticker, np.array(self.run_timestamps, dtype=np.int64), np.array(self.run_lending_rates, dtype=np.float64))
+		return InterestInterval(self.ticker, self.run_timestamps[0], self.run_timestamps[-1], lending_entries)
+
+def detect_interest_intervals(entries, duration, min_num_tickers=10, bucket_means=None):
+	""" Feeds ticks through InterestIntervalDetector and collects closed InterestInterval instances
+
+	Args:
+		entries - iterable of LendingTickerEntry instances (or LendingSeries) in ascending order of timestamps
+		duration - duration of buckets, in seconds
+		min_num_tickers - minimum number of ticks within resulting InterestInterval. Default value is 10.
+		bucket_means - final average lending rates of buckets, see InterestIntervalDetector. Default value is None (running averages).
+
+	Returns:
+		a tuple of two lists: InterestInterval instances where lending rate is growing and InterestInterval instances where it isn't
+	"""
+	detector = InterestIntervalDetector(duration, min_num_tickers, bucket_means=bucket_means)
+	growing = list()
+	not_growing = list()
+	for entry in entries:
+		for event in detector.update(entry):
+			if event.kind == CLOSE_EVENT:
+				(growing if event.is_growing else not_growing).append(event.interval)
+	detector.flush()
+	return growing, not_growing
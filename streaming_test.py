@@ -0,0 +1,54 @@
+import pytest
+import numpy as np
+import streaming
+from sample_data import make_lending_series
+import lr_growing_altcoin
+from structures import *
+
+def interval_bounds(intervals):
+	""" Returns start date, end date and number of entries of each interval """
+	return [(interval.start_date, interval.end_date, len(interval.lending_entries)) for interval in intervals]
+
+def test_detector_matches_batch_given_final_means():
+	""" Tests whether the online detector reports the same intervals as 'get_interest_intervals' once it is given final averages of buckets """
+	rng = np.random.RandomState(7)
+	series = make_lending_series(np.round(rng.rand(2000) * 3.0, 1) + np.sin(np.arange(2000) / 40.0))
+	for duration, min_num_tickers in ((24 * 3600, 3), (3 * 24 * 3600, 5), (100 * 3600, 1)):
+		lending_intervals = lr_growing_altcoin.generate_lending_intervals(duration, series)
+		growing, not_growing = lr_growing_altcoin.get_interest_intervals(lending_intervals, min_num_tickers)
+		bucket_means = [interval.get_avg_lending_rate() for interval in lending_intervals]
+		online_growing, online_not_growing = streaming.detect_interest_intervals(series, duration, min_num_tickers, bucket_means)
+		assert interval_bounds(online_growing) == interval_bounds(growing)
+		assert interval_bounds(online_not_growing) == interval_bounds(not_growing)
+
+def test_detector_running_mean_differs_from_batch():
+	""" Tests the documented difference: with running averages a run is compared with the average known so far rather than the final one
+
+	Final average of the bucket is 0.8, so the batch version finds a run of the first four entries. Running average after the second entry is 2.0,
+	so the online detector closes the first run there and starts a new one at the third entry.
+	"""
+	series = make_lending_series([3.0, 1.0, 2.0, 2.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0])
+	duration = 100 * 3600
+	growing, not_growing = lr_growing_altcoin.get_interest_intervals(lr_growing_altcoin.generate_lending_intervals(duration, series), 2)
+	assert interval_bounds(growing + not_growing) == [(1500000000, 1500000000 + 3 * 3600, 4)]
+	online_growing, online_not_growing = streaming.detect_interest_intervals(series, duration, 2)
+	assert interval_bounds(online_growing + online_not_growing) == [(1500000000 + 2 * 3600, 1500000000 + 3 * 3600, 2)]
+
+def test_detector_events():
+	""" Tests whether the detector opens a run once it reaches minimum length, closes it on a tick below average and drops a run open at the end of a bucket """
+	series = make_lending_series([1.5, 1.5, 2.0, 3.0, 0.0, 5.0, 6.0, 7.0])
+	detector = streaming.InterestIntervalDetector(4 * 3600, min_num_tickers=3, bucket_means=[1.4, 5.0])
+	events = [event for entry in series for event in detector.update(entry)]
+	assert [(event.kind, event.timestamp) for event in events] == [
+		("open", 1500000000 + 2 * 3600),
+		("close", 1500000000 + 4 * 3600),
+		("open", 1500000000 + 7 * 3600)]
+	assert events[1].is_growing and interval_bounds([events[1].interval]) == [(1500000000, 1500000000 + 3 * 3600, 4)]
+	assert [event.kind for event in detector.flush()] == ["drop"]
+
+def test_detector_rejects_unsorted_ticks():
+	""" Tests whether the detector throws ValueError given ticks out of order """
+	detector = streaming.InterestIntervalDetector(3600)
+	detector.update(LendingTickerEntry("BTC", 1500003600, 1.0))
+	with pytest.raises(ValueError):
+		detector.update(LendingTickerEntry("BTC", 1500000000, 1.0))
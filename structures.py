@@ -1,6 +1,9 @@
 import operator
-from scipy import stats
 import abc
+import validation
+import numpy as np
+from datetime import datetime, timezone
+from regression import segment_slopes
 
 '''
 Base class representing simple ticker entry storing timestamp and ticker name
@@ -16,7 +19,7 @@ class TickerEntry(object):
     @ticker.setter
     def ticker(self, t):
         if not t: raise Exception("ticker cannot be null")
-        if not isinstance(t, (basestring)): raise Exception("ticker should be str")
+        if not isinstance(t, (str)): raise Exception("ticker should be str")
         self._ticker = t
 
     timestamp = property(operator.attrgetter('_timestamp'))
@@ -24,8 +27,8 @@ class TickerEntry(object):
     @timestamp.setter
     def timestamp(self, t):
         if not t: raise Exception("timestamp cannot be null")
-        if not isinstance(t, (basestring, int)): raise Exception("timestamp should be str or int")
-        if isinstance(t, (basestring)):
+        if not isinstance(t, (str, int)): raise Exception("timestamp should be str or int")
+        if isinstance(t, (str)):
             try:
                 timestamp = int(t)
                 if timestamp > 0:
@@ -59,8 +62,8 @@ class LendingTickerEntry(TickerEntry):
     @lending_rate.setter
     def lending_rate(self, lr):
         if not lr: raise Exception("lending rate cannot be null")
-        if not isinstance(lr, (basestring, float)): raise Exception("lending rate should be str or float")
-        if isinstance(lr, (basestring)):
+        if not isinstance(lr, (str, float)): raise Exception("lending rate should be str or float")
+        if isinstance(lr, (str)):
             try:
                 lending_rate = float(lr)
                 if lending_rate > 0.0:
@@ -73,6 +76,13 @@ class LendingTickerEntry(TickerEntry):
             if lr <= 0.0: raise Exception("value of lending rate should be non-negative")
             self._lending_rate = lr
 
+    @classmethod
+    def from_validated(cls, ticker, timestamp, lending_rate):
+        """ Creates an entry out of values which were already checked in bulk (see 'validation.require_valid'), skipping the checks of the setters """
+        entry = cls.__new__(cls)
+        entry._ticker, entry._timestamp, entry._lending_rate = ticker, timestamp, lending_rate
+        return entry
+
     def to_string(self):
         return "[LendingTickerEntry] %s - timestamp: %d, lending_rate: %f" % (self.ticker, self.timestamp, self.lending_rate)
 
@@ -92,8 +102,8 @@ class DetailedTickerEntry(TickerEntry):
     @close_price.setter
     def close_price(self, cp):
         if not cp: raise Exception("close price cannot be null")
-        if not isinstance(cp, (basestring, float)): raise Exception("close price should be str or float")
-        if isinstance(cp, (basestring)):
+        if not isinstance(cp, (str, float)): raise Exception("close price should be str or float")
+        if isinstance(cp, (str)):
             try:
                 close_price = float(cp)
                 if close_price > 0.0:
@@ -111,8 +121,8 @@ class DetailedTickerEntry(TickerEntry):
     @volume.setter
     def volume(self, v):
         if not v: raise Exception("volume cannot be null")
-        if not isinstance(v, (basestring, float)): raise Exception("volume should be str or float")
-        if isinstance(v, (basestring)):
+        if not isinstance(v, (str, float)): raise Exception("volume should be str or float")
+        if isinstance(v, (str)):
             try:
                 volume = float(v)
                 if volume > 0.0:
@@ -125,9 +135,235 @@ class DetailedTickerEntry(TickerEntry):
             if v <= 0.0: raise Exception("value of volume should be non-negative")
             self._volume = v
 
+    @classmethod
+    def from_validated(cls, ticker, timestamp, close_price, volume):
+        """ Creates an entry out of values which were already checked in bulk (see 'validation.require_valid'), skipping the checks of the setters """
+        entry = cls.__new__(cls)
+        entry._ticker, entry._timestamp, entry._close_price, entry._volume = ticker, timestamp, close_price, volume
+        return entry
+
+    def to_string(self):
+        return "[DetailedTickerEntry] %s - timestamp: %d, volume: %f, close_price: %f" % (self.ticker, self.timestamp, self.volume, self.close_price)
+
+'''
+Lightweight read-only view of a single entry of LendingSeries.
+Exposes same attributes as LendingTickerEntry, values are read from the columns of the series on access
+'''
+class LendingEntryView(object):
+    __slots__ = ('_series', '_idx')
+
+    def __init__(self, series, idx):
+        self._series = series
+        self._idx = idx
+
+    @property
+    def ticker(self):
+        return self._series.ticker
+
+    @property
+    def timestamp(self):
+        return int(self._series.timestamps[self._idx])
+
+    @property
+    def lending_rate(self):
+        return float(self._series.lending_rates[self._idx])
+
+    def to_string(self):
+        return "[LendingTickerEntry] %s - timestamp: %d, lending_rate: %f" % (self.ticker, self.timestamp, self.lending_rate)
+
+    def is_equal(self, other):
+        return (other.timestamp == self.timestamp) and (other.ticker == self.ticker)
+
+'''
+Lightweight read-only view of a single entry of PriceSeries.
+Exposes same attributes as DetailedTickerEntry, values are read from the columns of the series on access
+'''
+class PriceEntryView(object):
+    __slots__ = ('_series', '_idx')
+
+    def __init__(self, series, idx):
+        self._series = series
+        self._idx = idx
+
+    @property
+    def ticker(self):
+        return self._series.ticker
+
+    @property
+    def timestamp(self):
+        return int(self._series.timestamps[self._idx])
+
+    @property
+    def close_price(self):
+        return float(self._series.close_prices[self._idx])
+
+    @property
+    def volume(self):
+        return float(self._series.volumes[self._idx])
+
     def to_string(self):
         return "[DetailedTickerEntry] %s - timestamp: %d, volume: %f, close_price: %f" % (self.ticker, self.timestamp, self.volume, self.close_price)
 
+    def is_equal(self, other):
+        return (other.timestamp == self.timestamp) and (other.ticker == self.ticker)
+
+'''
+Base class representing a series of ticker entries stored as contiguous NumPy columns (struct of arrays) rather than one object per entry.
+Timestamps are expected to be sorted in ascending order. Slicing a series returns a series sharing memory with the original one,
+indexing it by an integer returns a lightweight view of the respective entry
+'''
+class TickerSeries(object):
+
+    # names of value columns, in addition to 'timestamps', defined by subclasses
+    columns = ()
+    entry_view = None
+
+    def __init__(self, ticker, timestamps):
+        if not ticker: raise Exception("ticker cannot be null")
+        if not isinstance(ticker, (str)): raise Exception("ticker should be str")
+        self.ticker = ticker
+        self.timestamps = np.asarray(timestamps, dtype=np.int64)
+        if self.timestamps.ndim != 1: raise ValueError("timestamps should be one-dimensional")
+
+    def _set_column(self, name, values):
+        column = np.asarray(values, dtype=np.float64)
+        if column.shape != self.timestamps.shape: raise ValueError("%s should have same length as timestamps" % (name))
+        setattr(self, name, column)
+
+    def _from_columns(self, timestamps, columns):
+        series = self.__class__.__new__(self.__class__)
+        series.ticker = self.ticker
+        series.timestamps = timestamps
+        for name, column in zip(self.columns, columns):
+            setattr(series, name, column)
+        return series
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __getitem__(self, key):
+        # slices share memory with this series, integer index arrays select a copy
+        if isinstance(key, (slice, np.ndarray)):
+            return self._from_columns(self.timestamps[key], [getattr(self, name)[key] for name in self.columns])
+        idx = int(key)
+        if idx < 0:
+            idx += len(self)
+        if idx < 0 or idx >= len(self):
+            raise IndexError("series index out of range")
+        return self.entry_view(self, idx)
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self.entry_view(self, idx)
+
+    def index_range(self, start_date, end_date):
+        """ Returns a pair of indices (lo, hi) such that series[lo:hi] contains entries with timestamp within [start_date, end_date] """
+        lo = int(np.searchsorted(self.timestamps, start_date, side='left'))
+        hi = int(np.searchsorted(self.timestamps, end_date, side='right'))
+        return lo, hi
+
+    def slice_by_time(self, start_date, end_date):
+        """ Returns a series (sharing memory with this one) of entries with timestamp within [start_date, end_date] """
+        lo, hi = self.index_range(start_date, end_date)
+        return self[lo:hi]
+
+    def to_string(self):
+        return "[%s] %s - number of entries: %d" % (self.__class__.__name__, self.ticker, len(self))
+
+'''
+Series of lending rates stored as 'timestamps' and 'lending_rates' NumPy columns, counterpart of a list of LendingTickerEntry instances
+'''
+class LendingSeries(TickerSeries):
+
+    columns = ('lending_rates',)
+    entry_view = LendingEntryView
+
+    def __init__(self, ticker, timestamps, lending_rates):
+        super(LendingSeries, self).__init__(ticker, timestamps)
+        self._set_column('lending_rates', lending_rates)
+
+    @classmethod
+    def from_entries(cls, entries):
+        """ Builds LendingSeries out of a non-empty list of LendingTickerEntry instances """
+        timestamps = np.fromiter((entry.timestamp for entry in entries), dtype=np.int64, count=len(entries))
+        lending_rates = np.fromiter((entry.lending_rate for entry in entries), dtype=np.float64, count=len(entries))
+        return cls(entries[0].ticker, timestamps, lending_rates)
+
+    def to_entries(self, validated=False):
+        """ Returns entries of the series as a list of LendingTickerEntry instances
+
+            Args:
+                validated - if True, the series is checked in bulk (see 'validation.validate_series') instead of per entry and ValueError is raised if it has issues. Default value is False.
+        """
+        if validated:
+            validation.require_valid(validation.validate_series(self))
+        make_entry = LendingTickerEntry.from_validated if validated else LendingTickerEntry
+        return [make_entry(self.ticker, timestamp, lending_rate) for timestamp, lending_rate in zip(self.timestamps.tolist(), self.lending_rates.tolist())]
+
+'''
+Series of prices stored as 'timestamps', 'close_prices' and 'volumes' NumPy columns, counterpart of a list of DetailedTickerEntry instances
+'''
+class PriceSeries(TickerSeries):
+
+    columns = ('close_prices', 'volumes')
+    entry_view = PriceEntryView
+
+    def __init__(self, ticker, timestamps, close_prices, volumes):
+        super(PriceSeries, self).__init__(ticker, timestamps)
+        self._set_column('close_prices', close_prices)
+        self._set_column('volumes', volumes)
+
+    @classmethod
+    def from_entries(cls, entries):
+        """ Builds PriceSeries out of a non-empty list of DetailedTickerEntry instances """
+        timestamps = np.fromiter((entry.timestamp for entry in entries), dtype=np.int64, count=len(entries))
+        close_prices = np.fromiter((entry.close_price for entry in entries), dtype=np.float64, count=len(entries))
+        volumes = np.fromiter((entry.volume for entry in entries), dtype=np.float64, count=len(entries))
+        return cls(entries[0].ticker, timestamps, close_prices, volumes)
+
+    def to_entries(self, validated=False):
+        """ Returns entries of the series as a list of DetailedTickerEntry instances
+
+            Args:
+                validated - if True, the series is checked in bulk (see 'validation.validate_series') instead of per entry and ValueError is raised if it has issues. Default value is False.
+        """
+        if validated:
+            validation.require_valid(validation.validate_series(self))
+        make_entry = DetailedTickerEntry.from_validated if validated else DetailedTickerEntry
+        return [make_entry(self.ticker, timestamp, close_price, volume) for timestamp, close_price, volume in zip(self.timestamps.tolist(), self.close_prices.tolist(), self.volumes.tolist())]
+
+'''
+Series of prices with lending rates aligned to the price timestamps, stored as 'timestamps', 'close_prices', 'volumes' and 'lending_rates' NumPy columns.
+Lending rates that couldn't be aligned are NaN. Typically produced by 'alignment.align_lending_to_prices' and sliced per interval
+'''
+class AlignedSeries(PriceSeries):
+
+    columns = ('close_prices', 'volumes', 'lending_rates')
+    entry_view = PriceEntryView
+
+    def __init__(self, ticker, timestamps, close_prices, volumes, lending_rates, lending_ticker):
+        super(AlignedSeries, self).__init__(ticker, timestamps, close_prices, volumes)
+        self._set_column('lending_rates', lending_rates)
+        self.lending_ticker = lending_ticker
+
+    def _from_columns(self, timestamps, columns):
+        series = super(AlignedSeries, self)._from_columns(timestamps, columns)
+        series.lending_ticker = self.lending_ticker
+        return series
+
+    def price_series(self):
+        """ Returns prices as PriceSeries sharing memory with this series """
+        series = PriceSeries.__new__(PriceSeries)
+        series.ticker, series.timestamps, series.close_prices, series.volumes = self.ticker, self.timestamps, self.close_prices, self.volumes
+        return series
+
+    def lending_series(self):
+        """ Returns aligned lending rates as LendingSeries, entries without aligned lending rate are left out """
+        aligned = ~np.isnan(self.lending_rates)
+        if aligned.all():
+            return LendingSeries(self.lending_ticker, self.timestamps, self.lending_rates)
+        return LendingSeries(self.lending_ticker, self.timestamps[aligned], self.lending_rates[aligned])
+
 '''
 Base class representing interval defined as a period of time between start date and end date
 '''
@@ -143,7 +379,7 @@ class Interval(object):
     @ticker_name.setter
     def ticker_name(self, tn):
         if not tn: raise Exception("ticker name cannot be null")
-        if not isinstance(tn, (basestring)): raise Exception("ticker name should be str")
+        if not isinstance(tn, (str)): raise Exception("ticker name should be str")
         self._ticker_name = tn
 
     start_date = property(operator.attrgetter('_start_date'))
@@ -151,8 +387,8 @@ class Interval(object):
     @start_date.setter
     def start_date(self, sd):
         if not sd: raise Exception("start date cannot be null")
-        if not isinstance(sd, (basestring, int)): raise Exception("start date should be str or int")
-        if isinstance(sd, (basestring)):
+        if not isinstance(sd, (str, int)): raise Exception("start date should be str or int")
+        if isinstance(sd, (str)):
             try:
                 start_date = int(sd)
                 if start_date > 0.0:
@@ -170,8 +406,8 @@ class Interval(object):
     @end_date.setter
     def end_date(self, ed):
         if not ed: raise Exception("end date cannot be null")
-        if not isinstance(ed, (basestring, int)): raise Exception("start date should be str or int")
-        if isinstance(ed, (basestring)):
+        if not isinstance(ed, (str, int)): raise Exception("start date should be str or int")
+        if isinstance(ed, (str)):
             try:
                 end_date = int(ed)
                 if end_date > 0.0 and end_date >= start_date:
@@ -187,13 +423,33 @@ class Interval(object):
     def to_string(self):
         return "[Interval] %s - start date: %d, end date: %d" % (self.ticker_name, self.start_date, self.end_date)
 
+    @staticmethod
+    def format_date(timestamp):
+        return datetime.fromtimestamp(int(timestamp), timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
+
+    def get_summary(self):
+        '''
+        Returns list of (label, value) pairs describing the interval, used by reports
+        '''
+        return [("Ticker", self.ticker_name), ("Start date", self.format_date(self.start_date)), ("End date", self.format_date(self.end_date))]
+
     def to_docx(self, doc):
-        print("TODO")
+        '''
+        Appends a heading and a table with the summary of the interval to python-docx Document 'doc'
+        '''
+        doc.add_heading("%s %s - %s" % (self.ticker_name, self.format_date(self.start_date), self.format_date(self.end_date)), level=2)
+        summary = self.get_summary()
+        table = doc.add_table(rows=len(summary), cols=2)
+        for row, (label, value) in zip(table.rows, summary):
+            row.cells[0].text = label
+            row.cells[1].text = str(value)
+        return doc
 
 '''
 Subclass of interval which is characterized by entries that have a lending rate value.
 Typically, input data consisting of LendingTickerEntry instances is split to lending intervals of fixed length determined by set constant.
 Obtained LendingInterval instances are used for further analysis i.e. discovery of InterestInterval
+Lending entries are either a list of LendingTickerEntry instances or a LendingSeries (typically a slice of a larger series)
 '''
 class LendingInterval(Interval):
 
@@ -205,12 +461,18 @@ class LendingInterval(Interval):
 
     @lending_entries.setter
     def lending_entries(self, le):
-        if not le: raise ValueError("lending entries cannot be null")
-        if not isinstance(le, (list)): raise TypeError("lending entries should be list")
+        if le is None or not len(le): raise ValueError("lending entries cannot be null")
+        if isinstance(le, LendingSeries):
+            self._lending_entries = le
+            return
+        if not isinstance(le, (list)): raise TypeError("lending entries should be list or LendingSeries")
         if not all(isinstance(lending_entry, LendingTickerEntry) for lending_entry in le): raise TypeError("entries in the list should be of type LendingTickerEntry")
         self._lending_entries = le
 
     def get_avg_lending_rate(self):
+        if isinstance(self.lending_entries, LendingSeries):
+            lending_rates = self.lending_entries.lending_rates
+            return float(np.add.reduce(lending_rates))/float(len(lending_rates))
         avg_lending_rate = sum(list(map(lambda x: x.lending_rate, self.lending_entries)))
         return avg_lending_rate/float(len(self.lending_entries))
 
@@ -219,21 +481,29 @@ class LendingInterval(Interval):
     Otherwise, returns False
     '''
     def is_growing(self):
-        lending_rates = list(map(lambda x: x.lending_rate, self.lending_entries))
-        timestamps = list(map(lambda x: x.timestamp, self.lending_entries))
-        slope, _, _, _, _ = stats.linregress(timestamps, lending_rates)
+        if isinstance(self.lending_entries, LendingSeries):
+            lending_rates = self.lending_entries.lending_rates
+            timestamps = self.lending_entries.timestamps
+        else:
+            lending_rates = np.fromiter((entry.lending_rate for entry in self.lending_entries), dtype=np.float64, count=len(self.lending_entries))
+            timestamps = np.fromiter((entry.timestamp for entry in self.lending_entries), dtype=np.int64, count=len(self.lending_entries))
+        slope = segment_slopes(timestamps, lending_rates, [0], [len(timestamps) - 1])[0]
         return slope > 0.0
 
     def to_string(self):
         return "[LendingInterval] %s - start date: %d, end date: %d, number of LendingTickerEntry instances: %d" % (self.ticker_name, self.start_date, self.end_date, len(self.lending_entries))
 
-    def to_docx(self, doc):
-        print("TODO")
+    def get_summary(self):
+        return super(LendingInterval, self).get_summary() + [
+            ("Number of lending entries", len(self.lending_entries)),
+            ("Average lending rate", "%.4f" % (self.get_avg_lending_rate())),
+            ("Lending rate is growing", "yes" if self.is_growing() else "no")]
 
 '''
 Subclass of LendingInterval which represents an "interest" interval: the interval that is characterized by ticker entries
 which lending rate value is higher than average
 InterestInterval stores both: lending ticker entries respective for that period and target or "interest" ticker entries for the period 
+Interest entries are either a list of DetailedTickerEntry instances or a PriceSeries
 '''
 class InterestInterval(LendingInterval):
 
@@ -241,25 +511,85 @@ class InterestInterval(LendingInterval):
         super(InterestInterval, self).__init__(ticker_name, start_date, end_date, lending_entries)
         self.interest_entries = interest_entries
 
+    @classmethod
+    def from_validated(cls, ticker_name, start_date, end_date, lending_entries):
+        """ Creates an interval without interest entries out of values which were already checked (e.g. a slice of lending entries of a LendingInterval), skipping the checks of the setters """
+        interval = cls.__new__(cls)
+        interval._ticker_name, interval._start_date, interval._end_date = ticker_name, start_date, end_date
+        interval._lending_entries, interval._interest_entries = lending_entries, list()
+        return interval
+
     interest_entries = property(operator.attrgetter('_interest_entries'))
 
     @interest_entries.setter
     def interest_entries(self, ie):
-        if not isinstance(ie, (list)): raise Exception("interest entries should be list")
+        if isinstance(ie, PriceSeries):
+            self._interest_entries = ie
+            return
+        if not isinstance(ie, (list)): raise Exception("interest entries should be list or PriceSeries")
         if not all(isinstance(entry, DetailedTickerEntry) for entry in ie): raise Exception("interest entries in the list should be of type DetailedTickerEntry")
         self._interest_entries = ie
 
     def to_string(self):
         return "[InterestInterval] %s - start date: %d, end date: %d, num LendingTickerEntry instances: %d, num InterestTickerEntry instances: %d" % (self.ticker_name, self.start_date, self.end_date, len(self.lending_entries), len(self.interest_entries))
 
-    def to_docx(self, doc):
-        print("TODO")
+    def get_summary(self):
+        summary = super(InterestInterval, self).get_summary() + [("Number of interest entries", len(self.interest_entries))]
+        if len(self.interest_entries):
+            if isinstance(self.interest_entries, PriceSeries):
+                first_price, last_price = float(self.interest_entries.close_prices[0]), float(self.interest_entries.close_prices[-1])
+            else:
+                first_price, last_price = self.interest_entries[0].close_price, self.interest_entries[-1].close_price
+            summary.append(("Price change", "%.2f%%" % ((last_price / first_price - 1.0) * 100.0)))
+        return summary
+
+'''
+Lending entries of many LendingInterval instances concatenated into flat arrays, so that statistics and strategies are computed for all intervals at once.
+Entries of interval i occupy positions from starts[i] to ends[i] (inclusive) of 'timestamps' and 'lending_rates'
+'''
+class IntervalBatch(object):
+
+    def __init__(self, intervals):
+        if intervals is None or not all(isinstance(interval, LendingInterval) for interval in intervals): raise TypeError("intervals should be a list of LendingInterval instances")
+        self.intervals = list(intervals)
+        self.lengths = np.array([len(interval.lending_entries) for interval in self.intervals], dtype=np.int64)
+        self.ends = np.cumsum(self.lengths) - 1
+        self.starts = self.ends - self.lengths + 1
+        timestamps = [np.empty(0, dtype=np.int64)]
+        lending_rates = [np.empty(0, dtype=np.float64)]
+        for interval in self.intervals:
+            entries = interval.lending_entries
+            if isinstance(entries, LendingSeries):
+                timestamps.append(entries.timestamps)
+                lending_rates.append(entries.lending_rates)
+            else:
+                timestamps.append(np.fromiter((entry.timestamp for entry in entries), dtype=np.int64, count=len(entries)))
+                lending_rates.append(np.fromiter((entry.lending_rate for entry in entries), dtype=np.float64, count=len(entries)))
+        self.timestamps = np.concatenate(timestamps)
+        self.lending_rates = np.concatenate(lending_rates).astype(np.float64, copy=False)
+
+    def __len__(self):
+        return len(self.intervals)
+
+    def reduce(self, ufunc, values):
+        """ Reduces 'values' (aligned with 'timestamps') within each interval with given NumPy ufunc, e.g. np.add or np.maximum """
+        if not len(self.intervals):
+            return np.empty(0, dtype=np.asarray(values).dtype)
+        return ufunc.reduceat(values, self.starts)
+
+    def broadcast(self, values):
+        """ Repeats one value per interval for each entry of the interval """
+        return np.repeat(values, self.lengths)
 
 '''
 Abstract base class representing a stragegy which can be derived from InterestInterval
+Strategies are evaluated either for a single InterestInterval (get_enter_time/get_close_time) or for all intervals of an IntervalBatch at once (get_enter_indices/get_close_indices).
+Vectorized methods are classmethods which take strategy parameters (see 'parameters') as keyword arguments
 '''
-class DealStrategy(object):
-    __metaclass__ = abc.ABCMeta
+class DealStrategy(object, metaclass=abc.ABCMeta):
+
+    # names of strategy parameters, they are passed to vectorized methods as keyword arguments
+    parameters = ()
 
     def __init__(self, interest_interval):
         self.interest_interval = interest_interval
@@ -272,27 +602,64 @@ class DealStrategy(object):
         if not isinstance(ii, (InterestInterval)): raise Exception("interest interval should be of type InterestInterval")
         self._interest_interval = ii
 
+    def get_parameters(self):
+        return dict((name, getattr(self, name)) for name in self.parameters)
+
     def get_max_lending_rate(self):
         return max(list(map(lambda x: x.lending_rate, self.interest_interval.lending_entries)))
 
+    def _get_batch_time(self, get_indices):
+        batch = IntervalBatch([self.interest_interval])
+        return int(batch.timestamps[get_indices(batch, **self.get_parameters())[0]])
+
+    @staticmethod
+    def first_crossing_indices(mask, starts, ends):
+        """ Finds first entry where 'mask' is True within each of segments [start, end] (inclusive), all segments at once
+
+            Args:
+                mask - boolean NumPy array over concatenated entries
+                starts - indices of the first entry of each segment
+                ends - indices of the last entry of each segment
+
+            Returns:
+                int64 NumPy array with index of the first True entry per segment, 'ends' for segments without one
+        """
+        ends = np.asarray(ends, dtype=np.int64)
+        candidates = np.flatnonzero(mask)
+        if not len(candidates):
+            return ends.copy()
+        positions = np.searchsorted(candidates, starts, side="left")
+        first = candidates[np.minimum(positions, len(candidates) - 1)]
+        found = (positions < len(candidates)) & (first <= ends)
+        return np.where(found, first, ends)
+
 '''
 Abstract base class representing a strategy when deal should be entered
 '''
 class EnterDealStrategy(DealStrategy):
-    __metaclass__ = abc.ABCMeta
 
+    @classmethod
     @abc.abstractmethod
+    def get_enter_indices(cls, batch, **parameters):
+        '''
+        Subclasses should return NumPy array with index (into arrays of IntervalBatch 'batch') of the lending entry when a deal should be entered, one per interval
+        '''
+
     def get_enter_time(self):
         '''
-        Subclasses should return Unix timestamp when a deal should be entered based on the strategy-specific behaviour
+        Returns Unix timestamp when a deal should be entered based on the strategy-specific behaviour
         '''
-        return
+        return self._get_batch_time(self.get_enter_indices)
 
 '''
 A specific instance of EnterDealStrategy which assumes that best time to enter the deal is at the start of given InterestInterval
 '''
 class IntervalStartEnterDealStrategy(EnterDealStrategy):
 
+    @classmethod
+    def get_enter_indices(cls, batch, **parameters):
+        return batch.starts.copy()
+
     def get_enter_time(self):
         return self.interest_interval.start_date
 
@@ -300,60 +667,108 @@ class IntervalStartEnterDealStrategy(EnterDealStrategy):
 Abstract base class representing a strategy when deal should be exited
 '''
 class CloseDealStrategy(DealStrategy):
-    __metaclass__ = abc.ABCMeta
 
+    @classmethod
     @abc.abstractmethod
+    def get_close_indices(cls, batch, **parameters):
+        '''
+        Subclasses should return NumPy array with index (into arrays of IntervalBatch 'batch') of the lending entry when a deal should be closed, one per interval
+        '''
+
     def get_close_time(self):
         '''
-        Subclasses should return Unix timestamp when a deal should be closed based on the strategy-specific behaviour
+        Returns Unix timestamp when a deal should be closed based on the strategy-specific behaviour
         '''
-        return
+        return self._get_batch_time(self.get_close_indices)
 
 '''
 A specific instance of CloseDealStrategy which assumes that best time to close the deal is when
 lending rate of 'lending_entries' falls below average for the interest interval
 '''
-class LrLessThanAvgCloseDealStrategy(DealStrategy):
+class LrLessThanAvgCloseDealStrategy(CloseDealStrategy):
 
-    def get_close_time(self):
-        lending_entries = self.interest_interval.lending_entries
-        avg_lending_rate = self.interest_interval.get_avg_lending_rate()
-        for entry in lending_entries:
-            if entry.lending_rate < avg_lending_rate:
-                return entry.timestamp
-        return self.interest_interval.end_date
+    @classmethod
+    def get_close_indices(cls, batch, **parameters):
+        if not len(batch):
+            return np.empty(0, dtype=np.int64)
+        avg_lending_rates = batch.reduce(np.add, batch.lending_rates) / batch.lengths
+        below_avg = batch.lending_rates < batch.broadcast(avg_lending_rates)
+        return cls.first_crossing_indices(below_avg, batch.starts, batch.ends)
 
 '''
 A specific instance of CloseDealStrategy which assumes that best time to close the deal is when
 lending rate of 'lending_entries' falls more than X% from the max lending rate for the interest interval
 '''
-class LrFallsXPercentCloseDealStrategy(DealStrategy):
+class LrFallsXPercentCloseDealStrategy(CloseDealStrategy):
+
+    parameters = ("fall_percent",)
+
+    def __init__(self, interest_interval, fall_percent):
+        super(LrFallsXPercentCloseDealStrategy, self).__init__(interest_interval)
+        self.fall_percent = fall_percent
 
     fall_percent = property(operator.attrgetter('_fall_percent'))
 
     @fall_percent.setter
     def fall_percent(self, fp):
-        if not fp: raise Exception("fall percent cannot be null")
-        if not isinstance(fp, (int, float)): raise Exception("fall percent should be int or float")
-        if not fp >= 0.0 and fp <= 100.0: raise Exception("fall percent should be in range [0.0, 100.0]")
-        self._fall_percent = fp
+        self._fall_percent = self.check_fall_percent(fp)
+
+    @staticmethod
+    def check_fall_percent(fp):
+        if fp is None: raise ValueError("fall percent cannot be null")
+        if isinstance(fp, bool) or not isinstance(fp, (int, float)): raise TypeError("fall percent should be int or float")
+        if not 0.0 <= fp <= 100.0: raise ValueError("fall percent should be in range [0.0, 100.0]")
+        return fp
+
+    @classmethod
+    def get_close_indices(cls, batch, fall_percent=None, **parameters):
+        cls.check_fall_percent(fall_percent)
+        if not len(batch):
+            return np.empty(0, dtype=np.int64)
+        max_lending_rates = batch.reduce(np.maximum, batch.lending_rates)
+        tgt_lending_rates = (100.0 - fall_percent)/100.0 * max_lending_rates
+        fallen = batch.lending_rates <= batch.broadcast(tgt_lending_rates)
+        return cls.first_crossing_indices(fallen, batch.starts, batch.ends)
 
-    def get_close_time(self):
-        if not fall_percent:
-            raise Exception("fall percent is not set")
-        max_lend_rate = get_max_lending_rate()
-        tgt_lending_rate = (100.0 - fall_percent)/100.0 * max_lend_rate
-        lending_entries = self.interest_interval.lending_entries
-        for entry in lending_entries:
-            if entry.lending_rate <= tgt_lending_rate:
-                return entry.timestamp
-        return self.interest_interval.end_date
-        
 '''
 A specific instance of CloseDealStrategy which assumes that best time to close the deal is when
 lending rate of 'lending_entries' falls for more than X time periods starting from the timestamp of max lending rate for the interest interval
+A time period is the step between two consecutive lending entries; the deal is closed at the entry completing 'num_periods' consecutive falls after the max
 '''
-class LrFallsXPeriodsCloseDealStrategy(DealStrategy):
-
-    def get_close_time(self):
-        return
+class LrFallsXPeriodsCloseDealStrategy(CloseDealStrategy):
+
+    parameters = ("num_periods",)
+
+    def __init__(self, interest_interval, num_periods):
+        super(LrFallsXPeriodsCloseDealStrategy, self).__init__(interest_interval)
+        self.num_periods = num_periods
+
+    num_periods = property(operator.attrgetter('_num_periods'))
+
+    @num_periods.setter
+    def num_periods(self, n):
+        self._num_periods = self.check_num_periods(n)
+
+    @staticmethod
+    def check_num_periods(num_periods):
+        if num_periods is None: raise ValueError("number of periods cannot be null")
+        if isinstance(num_periods, bool) or not isinstance(num_periods, (int, np.integer)): raise TypeError("number of periods should be int")
+        if num_periods < 1: raise ValueError("number of periods should be positive")
+        return int(num_periods)
+
+    @classmethod
+    def get_close_indices(cls, batch, num_periods=None, **parameters):
+        num_periods = cls.check_num_periods(num_periods)
+        if not len(batch):
+            return np.empty(0, dtype=np.int64)
+        lending_rates = batch.lending_rates
+        positions = np.arange(len(lending_rates), dtype=np.int64)
+        # first occurrence of the max lending rate within each interval
+        max_lending_rates = batch.reduce(np.maximum, lending_rates)
+        max_positions = cls.first_crossing_indices(lending_rates == batch.broadcast(max_lending_rates), batch.starts, batch.ends)
+        # length of the run of consecutive falls ending at each entry, runs don't continue across intervals
+        falling = np.concatenate(([False], lending_rates[1:] < lending_rates[:-1]))
+        falling[batch.starts] = False
+        run_starts = np.maximum.accumulate(np.where(falling, 0, positions))
+        closes = (positions - run_starts >= num_periods) & (run_starts >= batch.broadcast(max_positions))
+        return cls.first_crossing_indices(closes, batch.starts, batch.ends)
@@ -0,0 +1,102 @@
+import pytest
+import numpy as np
+import sample_data
+from structures import *
+
+def sample_lending_series(num_entries=10):
+	""" Returns LendingSeries with 'num_entries' hourly entries and linearly growing lending rate """
+	return sample_data.make_lending_series(np.arange(num_entries) + 1.0, ticker="TEST")
+
+def test_series_slice_shares_memory():
+	""" Tests whether slicing LendingSeries returns a LendingSeries sharing memory with the original one """
+	series = sample_lending_series()
+	sliced = series[2:5]
+	assert isinstance(sliced, LendingSeries)
+	assert len(sliced) == 3
+	assert np.shares_memory(sliced.lending_rates, series.lending_rates)
+	assert sliced.ticker == series.ticker
+
+def test_series_entry_view():
+	""" Tests whether indexing LendingSeries returns a view exposing same attributes as LendingTickerEntry """
+	series = sample_lending_series()
+	entry = series[-1]
+	assert entry.timestamp == 1500000000 + 9 * 3600
+	assert entry.lending_rate == 10.0
+	assert entry.ticker == "TEST"
+	assert entry.is_equal(LendingTickerEntry("TEST", 1500000000 + 9 * 3600, 10.0))
+	with pytest.raises(IndexError):
+		series[10]
+
+def test_series_slice_by_time_inclusive():
+	""" Tests whether 'slice_by_time' includes entries exactly at start and end date """
+	series = sample_lending_series()
+	sliced = series.slice_by_time(1500003600, 1500003600 * 1 + 3 * 3600)
+	assert sliced.timestamps.tolist() == [1500003600, 1500007200, 1500010800, 1500014400]
+
+def test_series_entries_round_trip():
+	""" Tests whether converting PriceSeries to DetailedTickerEntry instances and back preserves values """
+	series = PriceSeries("TEST", [1500000000, 1500000900], [1.5, 2.5], [10.0, 20.0])
+	entries = series.to_entries()
+	assert all(isinstance(entry, DetailedTickerEntry) for entry in entries)
+	restored = PriceSeries.from_entries(entries)
+	assert restored.timestamps.tolist() == series.timestamps.tolist()
+	assert restored.close_prices.tolist() == series.close_prices.tolist()
+	assert restored.volumes.tolist() == series.volumes.tolist()
+
+def test_series_column_length_mismatch():
+	""" Tests whether LendingSeries throws ValueError if lending rates and timestamps have different length """
+	with pytest.raises(ValueError):
+		LendingSeries("TEST", [1500000000, 1500000900], [1.5])
+
+def test_lending_interval_accepts_series():
+	""" Tests whether LendingInterval holding a LendingSeries slice gives same average and growth as one holding LendingTickerEntry instances """
+	series = sample_lending_series()[1:8]
+	from_series = LendingInterval("TEST", int(series.timestamps[0]), int(series.timestamps[-1]), series)
+	from_entries = LendingInterval("TEST", int(series.timestamps[0]), int(series.timestamps[-1]), series.to_entries())
+	assert from_series.get_avg_lending_rate() == pytest.approx(from_entries.get_avg_lending_rate())
+	assert from_series.is_growing() and from_entries.is_growing()
+
+def test_lending_interval_rejects_empty_series():
+	""" Tests whether LendingInterval throws ValueError given an empty LendingSeries """
+	with pytest.raises(ValueError):
+		LendingInterval("TEST", 1500000000, 1500003600, sample_lending_series()[0:0])
+
+def test_interval_batch_boundaries():
+	""" Tests whether IntervalBatch concatenates entries of intervals given as series or entries and reports inclusive boundaries of each interval """
+	first = sample_data.make_interest_interval([1.0, 2.0, 3.0])
+	second = sample_data.make_interest_interval([4.0, 5.0], start=1600000000)
+	second.lending_entries = second.lending_entries.to_entries()
+	batch = IntervalBatch([first, second])
+	assert len(batch) == 2
+	assert batch.starts.tolist() == [0, 3]
+	assert batch.ends.tolist() == [2, 4]
+	assert batch.lending_rates.tolist() == [1.0, 2.0, 3.0, 4.0, 5.0]
+	assert batch.reduce(np.maximum, batch.lending_rates).tolist() == [3.0, 5.0]
+
+def test_first_crossing_indices():
+	""" Tests whether 'first_crossing_indices' finds first True entry within each segment and falls back to the segment end """
+	mask = np.array([False, True, True, False, False, False, True])
+	indices = DealStrategy.first_crossing_indices(mask, [0, 3, 6], [2, 5, 6])
+	assert indices.tolist() == [1, 5, 6]
+
+def test_close_strategies_batch_matches_single():
+	""" Tests whether vectorized close indices over a batch give the same close times as strategies evaluated per interval """
+	intervals = [sample_data.make_interest_interval([2.5, 3.0, 2.5, 2.0, 1.0, 0.5]), sample_data.make_interest_interval([2.0, 2.0, 2.0], start=1600000000), sample_data.make_interest_interval([3.0, 4.0, 3.0, 3.5, 2.0, 1.0, 0.5], start=1700000000)]
+	batch = IntervalBatch(intervals)
+	cases = [(LrLessThanAvgCloseDealStrategy, dict()), (LrFallsXPercentCloseDealStrategy, dict(fall_percent=30.0)), (LrFallsXPeriodsCloseDealStrategy, dict(num_periods=2))]
+	for strategy, parameters in cases:
+		close_times = batch.timestamps[strategy.get_close_indices(batch, **parameters)].tolist()
+		assert close_times == [strategy(interval, **parameters).get_close_time() for interval in intervals]
+	# 30% below max of 3.0 is 2.1, first reached at the fourth entry; flat interval never falls
+	assert LrFallsXPercentCloseDealStrategy.get_close_indices(batch, fall_percent=30.0).tolist() == [3, 8, 13]
+	# two consecutive falls after the max: 4.0 -> 3.0 is interrupted by 3.5, then 3.5 -> 2.0 -> 1.0
+	assert LrFallsXPeriodsCloseDealStrategy.get_close_indices(batch, num_periods=2).tolist() == [3, 8, 14]
+
+def test_fall_percent_validation():
+	""" Tests whether LrFallsXPercentCloseDealStrategy accepts 0 and rejects missing or out of range fall percent """
+	interval = sample_data.make_interest_interval([1.0, 2.0])
+	assert LrFallsXPercentCloseDealStrategy(interval, 0).fall_percent == 0
+	with pytest.raises(ValueError):
+		LrFallsXPercentCloseDealStrategy(interval, 120.0)
+	with pytest.raises(ValueError):
+		LrFallsXPercentCloseDealStrategy.get_close_indices(IntervalBatch([interval]))
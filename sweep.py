@@ -0,0 +1,234 @@
+import os
+import sys
+import json
+import argparse
+import itertools
+import collections
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import ticker_cache
+import result_cache
+import lr_growing_altcoin as analysis
+
+'''
+Parameter sweep over interval durations, minimum number of tickers within interest interval, periods of time and target currencies.
+
+Each combination of parameters is a task which breaks BTC lending rates into LendingInterval instances, discovers InterestInterval instances
+and measures how prices of the target currency changed during them. Intervals don't depend on the target currency, so tasks differing only
+in it are grouped and run together, the intervals of a group being computed once. Groups are spread across a process pool. Data files are ingested into
+the binary cache (see 'ticker_cache') once before the pool starts, so workers memory-map the same read-only series instead of parsing .csv files.
+Finished tasks are appended to a checkpoint file, so an interrupted sweep resumes where it stopped.
+With a result cache (see 'result_cache') lending intervals and interest intervals are reused across tasks and across sweeps sharing their inputs.
+'''
+
+SweepTask = collections.namedtuple("SweepTask", ["duration", "min_num_tickers", "period_start", "period_end", "ticker"])
+
+"""
+Constants
+"""
+RESULT_COLUMNS = list(SweepTask._fields) + [
+	"num_lending_intervals", "num_growing", "num_not_growing",
+	"avg_price_change_growing", "avg_price_change_not_growing", "error"]
+
+# data files of the current worker process, set up by '_init_worker'
+_worker_paths = dict()
+
+
+def make_grid(durations, min_num_tickers, periods, tickers):
+	""" Returns list of SweepTask instances covering every combination of given parameter values
+
+		Args:
+			durations - durations of LendingInterval instances, in seconds, or "changepoints" (see 'lr_growing_altcoin.get_lending_intervals')
+			min_num_tickers - values of minimum number of entries within InterestInterval
+			periods - list of (period_start, period_end) pairs
+			tickers - target currency tickers
+
+		Returns:
+			a list of SweepTask instances
+	"""
+	return [SweepTask(duration, min_num, period[0], period[1], ticker) for duration, min_num, period, ticker in itertools.product(durations, min_num_tickers, periods, tickers)]
+
+def task_key(task):
+	""" Returns string identifying a task within a checkpoint file """
+	return json.dumps([task.duration, task.min_num_tickers, task.period_start, task.period_end, task.ticker])
+
+def group_tasks(tasks):
+	""" Groups tasks which differ only in target currency, groups and tasks within them keep the order of their first occurrence
+
+		Returns:
+			a list of lists of SweepTask instances
+	"""
+	groups = collections.OrderedDict()
+	for task in tasks:
+		groups.setdefault((task.duration, task.min_num_tickers, task.period_start, task.period_end), list()).append(task)
+	return list(groups.values())
+
+def _init_worker(lending_path, target_paths, cache_dir=None, cache_max_bytes=result_cache.DEFAULT_MAX_BYTES):
+	_worker_paths["lending"] = lending_path
+	_worker_paths["targets"] = target_paths
+	_worker_paths["cache"] = result_cache.ResultCache(cache_dir, cache_max_bytes) if cache_dir else None
+
+def _mean(values):
+	values = values[~np.isnan(values)]
+	return float(values.mean()) if len(values) else float("nan")
+
+def get_group_intervals(task):
+	""" Computes lending intervals and InterestInterval instances of a task within current worker process, they are shared by its whole group
+
+		Returns:
+			a tuple of a list of LendingInterval instances and two lists of InterestInterval instances: growing and not growing
+	"""
+	lending_series = analysis.load_lending_series(task.period_start, task.period_end, _worker_paths["lending"])
+	cache = _worker_paths.get("cache")
+	if cache is None:
+		lending_intervals = analysis.get_lending_intervals(task.duration, lending_series)
+		growing, not_growing = analysis.get_interest_intervals(lending_intervals, task.min_num_tickers)
+		return lending_intervals, growing, not_growing
+	lending_key, interest_key, aligned_key = analysis.get_result_keys(task.ticker, task.period_start, task.period_end,
+		_worker_paths["lending"], _worker_paths["targets"][task.ticker], task.duration, task.min_num_tickers)
+	lending_intervals = cache.get_or_compute(lending_key, lambda: analysis.get_lending_intervals(task.duration, lending_series),
+		result_cache.encode_intervals, result_cache.decode_intervals)
+	growing, not_growing = cache.get_or_compute(interest_key, lambda: analysis.get_interest_intervals(lending_intervals, task.min_num_tickers),
+		result_cache.encode_interest_intervals, result_cache.decode_interest_intervals)
+	return lending_intervals, growing, not_growing
+
+def run_group(tasks):
+	""" Runs a group of tasks differing only in target currency within current worker process, see 'group_tasks'
+
+		Lending rates are bucketed and searched for interest intervals once for the group, prices of each target currency are then joined against the intervals.
+
+		Args:
+			tasks - list of SweepTask instances of the group
+
+		Returns:
+			a list of dictionaries with parameters of each task and its results, see RESULT_COLUMNS
+	"""
+	rows = list()
+	for task in tasks:
+		row = dict(task._asdict())
+		row.update(num_lending_intervals=0, num_growing=0, num_not_growing=0, avg_price_change_growing=float("nan"), avg_price_change_not_growing=float("nan"), error=None)
+		rows.append(row)
+	try:
+		lending_intervals, growing, not_growing = get_group_intervals(tasks[0])
+	except ValueError as e:
+		for row in rows:
+			row["error"] = str(e)
+		return rows
+	for task, row in zip(tasks, rows):
+		try:
+			price_series = analysis.load_price_series(task.ticker, task.period_start, task.period_end, _worker_paths["targets"][task.ticker])
+		except ValueError as e:
+			row["error"] = str(e)
+			continue
+		row["num_lending_intervals"] = len(lending_intervals)
+		row["num_growing"] = len(growing)
+		row["num_not_growing"] = len(not_growing)
+		row["avg_price_change_growing"] = _mean(analysis.get_price_changes(growing, price_series))
+		row["avg_price_change_not_growing"] = _mean(analysis.get_price_changes(not_growing, price_series))
+	return rows
+
+def load_checkpoint(checkpoint_path):
+	""" Reads results of finished tasks from the checkpoint file
+
+		Returns:
+			a dictionary mapping task key to the result row, empty if there is no checkpoint file
+	"""
+	rows = dict()
+	if checkpoint_path is None or not os.path.isfile(checkpoint_path):
+		return rows
+	with open(checkpoint_path, "r") as f:
+		for line in f:
+			line = line.strip()
+			if not line:
+				continue
+			try:
+				row = json.loads(line)
+			except ValueError:
+				# last line may be incomplete if the sweep was killed while writing it
+				continue
+			rows[task_key(SweepTask(*[row[field] for field in SweepTask._fields]))] = row
+	return rows
+
+def parse_duration(value):
+	""" Parses duration given on the command line: number of seconds or "changepoints" """
+	return value if value == analysis.CHANGEPOINTS else int(value)
+
+def print_progress(done, total, row):
+	""" Default progress callback, prints number of finished tasks """
+	sys.stdout.write("\r%d/%d tasks done" % (done, total))
+	if done == total:
+		sys.stdout.write("\n")
+	sys.stdout.flush()
+
+def run_sweep(tasks, lending_path=analysis.BTC_LENDING_DATA, data_dir=analysis.DATA_DIR, checkpoint_path=None, max_workers=None, progress=print_progress, cache_dir=None, cache_max_bytes=result_cache.DEFAULT_MAX_BYTES):
+	""" Runs given tasks across a process pool and collects their results into a single table, tasks differing only in target currency run together (see 'group_tasks')
+
+		Args:
+			tasks - list of SweepTask instances, see 'make_grid'
+			lending_path - path to BTC lending rates file
+			data_dir - directory containing price data files of target currencies
+			checkpoint_path - path to a file where results are appended as tasks finish. Tasks already present in it are skipped. Default value is None (no checkpoints).
+			max_workers - number of worker processes, 0 runs tasks in the current process. Default value is None (number of CPUs).
+			progress - callable taking number of finished tasks, total number of tasks and the last result row, or None
+			cache_dir - directory of the result cache shared by workers. Default value is None (nothing is cached).
+			cache_max_bytes - size cap of the result cache, in bytes. Default value is result_cache.DEFAULT_MAX_BYTES.
+
+		Returns:
+			Pandas dataframe with a row per task, see RESULT_COLUMNS
+	"""
+	target_paths = dict((ticker, analysis.get_target_data_path(ticker, data_dir)) for ticker in set(task.ticker for task in tasks))
+	# ingest data files once, workers then only memory-map the binary cache
+	ticker_cache.ensure_cached([lending_path] + list(target_paths.values()))
+	finished = load_checkpoint(checkpoint_path)
+	pending = [task for task in tasks if task_key(task) not in finished]
+	rows = [finished[task_key(task)] for task in tasks if task_key(task) in finished]
+	checkpoint = open(checkpoint_path, "a") if checkpoint_path else None
+
+	def collect(row):
+		rows.append(row)
+		if checkpoint:
+			checkpoint.write(json.dumps(row) + "\n")
+			checkpoint.flush()
+		if progress:
+			progress(len(rows), len(tasks), row)
+
+	try:
+		if max_workers == 0:
+			_init_worker(lending_path, target_paths, cache_dir, cache_max_bytes)
+			for group in group_tasks(pending):
+				for row in run_group(group):
+					collect(row)
+		elif pending:
+			with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(lending_path, target_paths, cache_dir, cache_max_bytes)) as executor:
+				futures = [executor.submit(run_group, group) for group in group_tasks(pending)]
+				for future in as_completed(futures):
+					for row in future.result():
+						collect(row)
+	finally:
+		if checkpoint:
+			checkpoint.close()
+	order = dict((task_key(task), idx) for idx, task in enumerate(tasks))
+	rows.sort(key=lambda row: order[task_key(SweepTask(*[row[field] for field in SweepTask._fields]))])
+	return pd.DataFrame(rows, columns=RESULT_COLUMNS)
+
+def main():
+	parser = argparse.ArgumentParser(description="Parameter sweep of BTC lending rate interest intervals against target currency prices")
+	parser.add_argument("--durations", type=parse_duration, nargs="+", default=[analysis.TEN_DAYS], help="durations of lending intervals, in seconds, or \"changepoints\" for intervals between changepoints of lending rate")
+	parser.add_argument("--min-num-tickers", type=int, nargs="+", default=[10], help="minimum numbers of entries within interest interval")
+	parser.add_argument("--period", type=float, nargs=2, action="append", help="period start and end, can be repeated")
+	parser.add_argument("--tickers", nargs="+", help="target currency tickers, all tickers in data directory by default")
+	parser.add_argument("--checkpoint", help="checkpoint file to resume from and append results to")
+	parser.add_argument("--workers", type=int, help="number of worker processes")
+	parser.add_argument("--cache-dir", help="directory of cached lending and interest intervals, reused across sweeps")
+	parser.add_argument("--output", help=".csv file to write the results table to")
+	args = parser.parse_args()
+	periods = args.period or [(1480530600.0, 1507062600.0)]
+	tickers = args.tickers or analysis.get_target_tickers()
+	results = run_sweep(make_grid(args.durations, args.min_num_tickers, periods, tickers), checkpoint_path=args.checkpoint, max_workers=args.workers, cache_dir=args.cache_dir)
+	if args.output:
+		results.to_csv(args.output, index=False)
+	print(results.to_string())
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,68 @@
+import json
+import numpy as np
+import pytest
+import sweep
+import sample_data
+
+def write_sample_data(data_dir):
+	""" Writes BTC lending rates file with a sine-shaped lending rate and LTC and ETH price files into 'data_dir' and returns path to lending rates file """
+	timestamps = sample_data.get_timestamps(24 * 30)
+	price_timestamps = sample_data.get_timestamps(4 * 24 * 30, step=900)
+	quarters = np.arange(len(price_timestamps))
+	return sample_data.write_data_files(data_dir, timestamps, 10.0 + 5.0 * np.sin(np.arange(len(timestamps)) / 10.0),
+		{"LTC": (price_timestamps, 1.0 + quarters / 1000.0), "ETH": (price_timestamps, 2.0 - quarters / 10000.0)})
+
+def test_make_grid():
+	""" Tests whether 'make_grid' returns a task per combination of parameter values """
+	tasks = sweep.make_grid([86400, 172800], [5, 10, 15], [(1500000000, 1500500000)], ["LTC", "ETH"])
+	assert len(tasks) == 12
+	assert len(set(sweep.task_key(task) for task in tasks)) == 12
+
+def test_run_sweep_results(tmp_path):
+	""" Tests whether 'run_sweep' returns a row per task with counts of growing and not growing interest intervals """
+	lending_path = write_sample_data(tmp_path)
+	tasks = sweep.make_grid([86400 * 5, 86400 * 10], [5], [(1500000000, 1502592000)], ["LTC"])
+	results = sweep.run_sweep(tasks, lending_path=lending_path, data_dir=str(tmp_path), max_workers=0, progress=None)
+	assert list(results["duration"]) == [86400 * 5, 86400 * 10]
+	assert list(results["num_lending_intervals"]) == [6, 3]
+	assert all(results["num_growing"] + results["num_not_growing"] > 0)
+	assert all(results["error"].isnull())
+
+def test_run_sweep_resumes_from_checkpoint(tmp_path):
+	""" Tests whether 'run_sweep' skips tasks already present in the checkpoint file and returns their stored results """
+	lending_path = write_sample_data(tmp_path)
+	checkpoint_path = str(tmp_path / "checkpoint.jsonl")
+	tasks = sweep.make_grid([86400 * 5, 86400 * 10], [5], [(1500000000, 1502592000)], ["LTC"])
+	sweep.run_sweep(tasks[:1], lending_path=lending_path, data_dir=str(tmp_path), checkpoint_path=checkpoint_path, max_workers=0, progress=None)
+	executed = list()
+	results = sweep.run_sweep(tasks, lending_path=lending_path, data_dir=str(tmp_path), checkpoint_path=checkpoint_path, max_workers=0,
+		progress=lambda done, total, row: executed.append(row["duration"]))
+	assert executed == [86400 * 10]
+	assert len(results) == 2
+	with open(checkpoint_path) as f:
+		assert len([json.loads(line) for line in f]) == 2
+
+def test_run_sweep_with_result_cache(tmp_path):
+	""" Tests whether a sweep using the result cache returns the same results when run cold and when every task hits the cache """
+	lending_path = write_sample_data(tmp_path)
+	cache_dir = str(tmp_path / "cache")
+	tasks = sweep.make_grid([86400 * 5, 86400 * 10], [5, 10], [(1500000000, 1502592000)], ["LTC"])
+	expected = sweep.run_sweep(tasks, lending_path=lending_path, data_dir=str(tmp_path), max_workers=0, progress=None)
+	cold = sweep.run_sweep(tasks, lending_path=lending_path, data_dir=str(tmp_path), max_workers=0, progress=None, cache_dir=cache_dir)
+	warm = sweep.run_sweep(tasks, lending_path=lending_path, data_dir=str(tmp_path), max_workers=0, progress=None, cache_dir=cache_dir)
+	assert cold.equals(expected) and warm.equals(expected)
+	assert sweep._worker_paths["cache"].misses == 0
+
+def test_run_sweep_shares_intervals_across_tickers(tmp_path, monkeypatch):
+	""" Tests whether tasks differing only in target currency compute interest intervals once and get the same intervals """
+	lending_path = write_sample_data(tmp_path)
+	calls = list()
+	get_interest_intervals = sweep.analysis.get_interest_intervals
+	monkeypatch.setattr(sweep.analysis, "get_interest_intervals", lambda *args: calls.append(args[1]) or get_interest_intervals(*args))
+	tasks = sweep.make_grid([86400 * 5], [5, 10], [(1500000000, 1502592000)], ["LTC", "ETH"])
+	assert [len(group) for group in sweep.group_tasks(tasks)] == [2, 2]
+	results = sweep.run_sweep(tasks, lending_path=lending_path, data_dir=str(tmp_path), max_workers=0, progress=None)
+	assert sorted(calls) == [5, 10]
+	assert list(results["ticker"]) == ["LTC", "ETH", "LTC", "ETH"]
+	assert results["num_growing"][0] == results["num_growing"][1]
+	assert results["avg_price_change_growing"][0] > 0.0 > results["avg_price_change_growing"][1]
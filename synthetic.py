@@ -0,0 +1,186 @@
+import numpy as np
+import pandas as pd
+import ticker_cache
+
+'''
+Seeded, vectorized generator of synthetic market data for tests and stress runs.
+
+Lending rates follow a mean-reverting (discrete Ornstein-Uhlenbeck) process. Prices follow geometric Brownian motion whose volatility
+and traded volume are driven by a common, persistent "activity" process, so busy periods come in clusters as they do on real markets.
+Timestamps are spaced by a fixed step, optionally with gaps (missing ticks) and duplicate timestamps, both of which occur in the real files.
+
+Every step is a NumPy operation over whole arrays (autoregressive processes are computed by the exponentially weighted mean of pandas),
+so millions of ticks are generated within a second or two. Generated columns have the canonical layout returned by 'ticker_cache.load_columns'
+(see ticker_cache.LENDING_COLUMNS and ticker_cache.CANDLE_COLUMNS) and can be written to .csv files in the layout of the files in 'data'.
+The same seed always produces the same data.
+'''
+
+"""
+Constants
+"""
+SECONDS_PER_DAY = 24*60*60
+LENDING_STEP = 60*60
+CANDLE_STEP = 15*60
+DEFAULT_START_DATE = 1480530600
+
+
+def get_rng(seed=None):
+	""" Returns NumPy random generator for a seed, an existing generator is returned as it is """
+	return np.random.default_rng(seed)
+
+def autoregressive(noise, phi):
+	""" Computes first-order autoregressive process x[t] = phi * x[t-1] + noise[t] starting with x[0] = noise[0]
+
+		Args:
+			noise - float64 NumPy array of innovations
+			phi - persistence of the process, 0 <= phi < 1
+
+		Returns:
+			float64 NumPy array
+	"""
+	if not 0.0 <= phi < 1.0:
+		raise ValueError("persistence of the process must be within [0, 1)")
+	if not len(noise):
+		return np.empty(0, dtype=np.float64)
+	alpha = 1.0 - phi
+	# recursive exponentially weighted mean computes y[t] = phi * y[t-1] + alpha * x[t], x[0] is taken as it is
+	values = np.asarray(noise, dtype=np.float64) / alpha
+	values[0] = noise[0]
+	return pd.Series(values).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+
+def generate_timestamps(num_entries, start_date=DEFAULT_START_DATE, step=LENDING_STEP, seed=None, gap_probability=0.0, mean_gap=10, duplicate_probability=0.0):
+	""" Generates timestamps spaced by a fixed step with optional gaps and duplicates
+
+		Args:
+			num_entries - number of timestamps
+			start_date - the first timestamp. Default value is DEFAULT_START_DATE.
+			step - distance between consecutive timestamps, in seconds. Default value is 1 hour.
+			seed - seed or NumPy random generator. Default value is None (unseeded).
+			gap_probability - probability that ticks are missing before a timestamp. Default value is 0.0.
+			mean_gap - average number of missing ticks within a gap. Default value is 10.
+			duplicate_probability - probability that a timestamp repeats the previous one. Default value is 0.0.
+
+		Returns:
+			int64 NumPy array sorted in ascending order
+	"""
+	if type(num_entries) is not int:
+		raise TypeError("num_entries must be a non-negative integer")
+	if num_entries < 0 or step <= 0:
+		raise ValueError("num_entries must be non-negative and step positive")
+	if not 0.0 <= gap_probability <= 1.0 or not 0.0 <= duplicate_probability <= 1.0:
+		raise ValueError("probabilities must be within [0, 1]")
+	rng = get_rng(seed)
+	steps = np.full(num_entries, step, dtype=np.int64)
+	if gap_probability > 0.0:
+		gaps = rng.random(num_entries) < gap_probability
+		steps[gaps] += step * rng.geometric(1.0 / max(mean_gap, 1), int(gaps.sum()))
+	if duplicate_probability > 0.0:
+		steps[rng.random(num_entries) < duplicate_probability] = 0
+	if num_entries:
+		steps[0] = 0
+	return int(start_date) + np.cumsum(steps)
+
+def generate_lending_rates(num_entries, seed=None, mean=20.0, reversion=0.01, volatility=0.5, min_lending_rate=0.01):
+	""" Generates mean-reverting lending rates
+
+		Args:
+			num_entries - number of lending rates
+			seed - seed or NumPy random generator. Default value is None (unseeded).
+			mean - long-term average lending rate. Default value is 20.0.
+			reversion - fraction of the deviation from the mean removed each tick. Default value is 0.01.
+			volatility - standard deviation of the change of lending rate each tick. Default value is 0.5.
+			min_lending_rate - lending rates are kept at or above this value. Default value is 0.01.
+
+		Returns:
+			float64 NumPy array
+	"""
+	rng = get_rng(seed)
+	deviations = autoregressive(rng.standard_normal(num_entries) * volatility, 1.0 - reversion)
+	return np.maximum(mean + deviations, min_lending_rate)
+
+def generate_prices(timestamps, seed=None, start_price=0.01, drift=0.0, volatility=0.05, base_volume=100.0, activity_persistence=0.99, activity_volatility=0.1):
+	""" Generates close prices as geometric Brownian motion with clustered volatility and volumes
+
+		Volatility and volume of each tick are scaled by exp(activity), where activity is a persistent autoregressive process,
+		so that periods of high volume are also periods of large price moves.
+
+		Args:
+			timestamps - int64 NumPy array sorted in ascending order, time elapsed between them scales the price moves
+			seed - seed or NumPy random generator. Default value is None (unseeded).
+			start_price - price at the first timestamp. Default value is 0.01.
+			drift - expected daily log return. Default value is 0.0.
+			volatility - standard deviation of daily log returns at average activity. Default value is 0.05.
+			base_volume - median volume of a tick at average activity. Default value is 100.0.
+			activity_persistence - persistence of the activity process per tick. Default value is 0.99.
+			activity_volatility - standard deviation of the change of activity each tick. Default value is 0.1.
+
+		Returns:
+			a tuple of float64 NumPy arrays: close prices and volumes
+	"""
+	rng = get_rng(seed)
+	num_entries = len(timestamps)
+	activity = autoregressive(rng.standard_normal(num_entries) * activity_volatility, activity_persistence)
+	days = np.diff(np.asarray(timestamps, dtype=np.float64), prepend=float(timestamps[0]) if num_entries else 0.0) / SECONDS_PER_DAY
+	sigma = volatility * np.exp(activity)
+	log_returns = (drift - 0.5 * sigma**2) * days + sigma * np.sqrt(days) * rng.standard_normal(num_entries)
+	close_prices = start_price * np.exp(np.cumsum(log_returns))
+	volumes = base_volume * np.exp(activity + 0.5 * rng.standard_normal(num_entries))
+	return close_prices, volumes
+
+def generate_lending_columns(num_entries, start_date=DEFAULT_START_DATE, step=LENDING_STEP, seed=None, gap_probability=0.0, mean_gap=10, duplicate_probability=0.0, **rate_args):
+	""" Generates BTC lending data in the canonical layout of lending rates files (see ticker_cache.LENDING_COLUMNS)
+
+		Args:
+			num_entries - number of rows
+			start_date, step, gap_probability, mean_gap, duplicate_probability - see 'generate_timestamps'
+			seed - seed or NumPy random generator. Default value is None (unseeded).
+			rate_args - keyword arguments of 'generate_lending_rates'
+
+		Returns:
+			a tuple of column names and a tuple of NumPy arrays, int64 timestamps followed by float64 columns
+	"""
+	rng = get_rng(seed)
+	timestamps = generate_timestamps(num_entries, start_date, step, rng, gap_probability, mean_gap, duplicate_probability)
+	lending_rates = generate_lending_rates(num_entries, rng, **rate_args)
+	amounts_lent = 1000.0 * np.exp(autoregressive(rng.standard_normal(num_entries) * 0.01, 0.999))
+	amounts_used = amounts_lent * rng.uniform(0.9, 1.0, num_entries)
+	return ticker_cache.LENDING_COLUMNS, (timestamps, amounts_lent, amounts_used, lending_rates)
+
+def generate_candle_columns(num_entries, start_date=DEFAULT_START_DATE, step=CANDLE_STEP, seed=None, gap_probability=0.0, mean_gap=10, duplicate_probability=0.0, **price_args):
+	""" Generates OHLCV candles in the canonical layout of candle files (see ticker_cache.CANDLE_COLUMNS)
+
+		Each candle opens at the close of the previous one, high and low extend beyond open and close by a random fraction of the price move.
+
+		Args:
+			num_entries - number of rows
+			start_date, step, gap_probability, mean_gap, duplicate_probability - see 'generate_timestamps'
+			seed - seed or NumPy random generator. Default value is None (unseeded).
+			price_args - keyword arguments of 'generate_prices'
+
+		Returns:
+			a tuple of column names and a tuple of NumPy arrays, int64 timestamps followed by float64 columns
+	"""
+	rng = get_rng(seed)
+	timestamps = generate_timestamps(num_entries, start_date, step, rng, gap_probability, mean_gap, duplicate_probability)
+	close_prices, volumes = generate_prices(timestamps, rng, **price_args)
+	open_prices = np.concatenate((close_prices[:1], close_prices[:-1]))
+	moves = np.abs(close_prices - open_prices)
+	high_prices = np.maximum(open_prices, close_prices) + moves * rng.random(num_entries)
+	low_prices = np.maximum(np.minimum(open_prices, close_prices) - moves * rng.random(num_entries), 0.0)
+	return ticker_cache.CANDLE_COLUMNS, (timestamps, open_prices, close_prices, high_prices, low_prices, volumes)
+
+def write_csv(path, names, columns, float_format="%.8g"):
+	""" Writes columns to a .csv file with header, in the layout of the files in 'data'
+
+		Args:
+			path - path to the resulting .csv file
+			names - column names
+			columns - NumPy arrays of the columns
+			float_format - format of float values. Default value is "%.8g".
+
+		Returns:
+			the input path
+	"""
+	frame = pd.DataFrame(dict(zip(names, columns)), columns=list(names))
+	ticker_cache.write_atomically(path, lambda tmp_path: frame.to_csv(tmp_path, index=False, float_format=float_format))
+	return path
@@ -0,0 +1,60 @@
+import pytest
+import numpy as np
+import synthetic
+import ticker_cache
+import utils
+
+def test_same_seed_same_data():
+	""" Tests whether generated columns depend only on the seed """
+	first = synthetic.generate_candle_columns(1000, seed=7, gap_probability=0.01, duplicate_probability=0.01)[1]
+	second = synthetic.generate_candle_columns(1000, seed=7, gap_probability=0.01, duplicate_probability=0.01)[1]
+	other = synthetic.generate_candle_columns(1000, seed=8, gap_probability=0.01, duplicate_probability=0.01)[1]
+	assert all((a == b).all() for a, b in zip(first, second))
+	assert not (first[2] == other[2]).all()
+
+def test_timestamps_with_gaps_and_duplicates():
+	""" Tests whether timestamps are sorted, spaced by multiples of the step and contain gaps and duplicates at requested rates """
+	timestamps = synthetic.generate_timestamps(100000, 1000, 60, seed=1, gap_probability=0.01, mean_gap=5, duplicate_probability=0.05)
+	steps = np.diff(timestamps)
+	assert timestamps[0] == 1000
+	assert (steps >= 0).all() and (steps % 60 == 0).all()
+	assert np.mean(steps == 0) == pytest.approx(0.05, abs=0.005)
+	assert np.mean(steps > 60) == pytest.approx(0.01 * 0.95, abs=0.002)
+	with pytest.raises(ValueError):
+		synthetic.generate_timestamps(10, step=0)
+
+def test_autoregressive_process():
+	""" Tests whether the autoregressive process matches its recursive definition """
+	noise = np.random.default_rng(0).standard_normal(100)
+	expected = [noise[0]]
+	for value in noise[1:]:
+		expected.append(0.9 * expected[-1] + value)
+	assert synthetic.autoregressive(noise, 0.9) == pytest.approx(expected)
+
+def test_lending_rates_revert_to_mean():
+	""" Tests whether lending rates stay positive and average out to the long-term mean """
+	lending_rates = synthetic.generate_lending_rates(200000, seed=3, mean=15.0, reversion=0.05, volatility=0.5)
+	assert lending_rates.min() > 0.0
+	assert lending_rates.mean() == pytest.approx(15.0, abs=0.2)
+
+def test_candles_are_consistent():
+	""" Tests whether each candle opens at the previous close and its high and low enclose open and close """
+	names, columns = synthetic.generate_candle_columns(5000, seed=2)
+	timestamps, open_prices, close_prices, high_prices, low_prices, volumes = columns
+	assert names == ticker_cache.CANDLE_COLUMNS
+	assert (open_prices[1:] == close_prices[:-1]).all()
+	assert (high_prices >= np.maximum(open_prices, close_prices)).all()
+	assert (low_prices <= np.minimum(open_prices, close_prices)).all()
+	assert (volumes > 0).all() and (close_prices > 0).all()
+
+def test_written_csv_is_loaded(tmpdir):
+	""" Tests whether a written .csv file is loaded back into the same columns """
+	path = str(tmpdir.join("btc_lending.csv"))
+	names, columns = synthetic.generate_lending_columns(500, seed=4, duplicate_probability=0.1)
+	synthetic.write_csv(path, names, columns)
+	loaded_names, loaded_columns = ticker_cache.load_columns(path)
+	assert tuple(loaded_names) == names
+	assert loaded_columns[0].tolist() == columns[0].tolist()
+	assert loaded_columns[3] == pytest.approx(columns[3], rel=1e-7)
+	series = utils.columns_to_lending_series("BTC", loaded_columns, 3)
+	assert len(series) == 500
@@ -0,0 +1,363 @@
+import os
+import sys
+import json
+import hashlib
+import calendar
+import numpy as np
+import pandas as pd
+import resample
+import validation
+from datetime import datetime
+
+'''
+Normalized binary cache for the .csv files in 'data' directory.
+
+Files in 'data' directory come in different layouts: with or without header, with timestamps in seconds or milliseconds,
+with "03.12.17 15:05" date strings instead of timestamps, sorted in ascending or descending order.
+Ingest step parses such file once, normalizes it to a canonical schema (ascending Unix timestamps in seconds as the first column,
+fixed order of remaining columns) and writes the result to a binary file next to the .csv file.
+Later loads memory-map the binary file, so they cost near zero and share pages across processes.
+The cache is rebuilt once modification time or hash of the .csv file changes.
+Data quality of the file as it is stored (see 'validation') is checked during ingest and kept in the metadata, see 'get_validation_report'.
+
+On top of the canonical columns a pyramid of coarser bars (1h, 4h, 1d, see 'resample') is cached in the same way, one binary file per level.
+Requests for a coarse resolution read the coarsest level that can serve them, so sweeps over long periods touch far fewer rows.
+'''
+
+"""
+Constants
+"""
+CACHE_VERSION = 3
+CACHE_DATA_SUFFIX = ".cache.bin"
+CACHE_META_SUFFIX = ".cache.json"
+# canonical column order of the known layouts, timestamp column always goes first
+CANDLE_COLUMNS = ("timestamp", "open_price", "close_price", "high", "low", "volume")
+LENDING_COLUMNS = ("timestamp", "amount_lent", "amount_used", "rate")
+LENDING_RATE_COLUMNS = ("timestamp", "lending_rate")
+# format of date strings used by *_lr.csv files, dates are assumed to be in UTC
+LR_DATE_FORMAT = "%d.%m.%y %H:%M"
+# timestamps larger than this value are assumed to be in milliseconds
+MILLISECONDS_THRESHOLD = validation.MILLISECONDS_THRESHOLD
+
+
+def get_cache_paths(path, level=None):
+	""" Returns paths of the binary data file and the metadata file caching given .csv file
+
+		Args:
+			path - path to .csv file
+			level - name of pyramid level, e.g. "4h". Default value is None (canonical columns).
+
+		Returns:
+			a tuple of path to binary data file and path to metadata file
+	"""
+	if level is not None:
+		return "%s.cache.%s.bin" % (path, level), "%s.cache.%s.json" % (path, level)
+	return path + CACHE_DATA_SUFFIX, path + CACHE_META_SUFFIX
+
+def file_hash(path, block_size=1 << 20):
+	""" Computes SHA-1 hash of the file content
+
+		Args:
+			path - path to the file
+			block_size - number of bytes read at once. Default value is 1 MiB.
+
+		Returns:
+			hex digest of SHA-1 hash of the file
+	"""
+	sha1 = hashlib.sha1()
+	with open(path, "rb") as f:
+		block = f.read(block_size)
+		while block:
+			sha1.update(block)
+			block = f.read(block_size)
+	return sha1.hexdigest()
+
+def _is_number(value):
+	try:
+		float(value)
+		return True
+	except ValueError:
+		return False
+
+def _has_header(path):
+	""" Returns True if first line of the .csv file contains column names rather than values, otherwise returns False """
+	with open(path, "r") as f:
+		first_line = f.readline().strip()
+	fields = first_line.split(",")
+	# a data row of any known layout contains at least one number, whereas header consists of names only
+	return not any(_is_number(field) for field in fields)
+
+def _date_strings_to_unix(values):
+	""" Converts "03.12.17 15:05" date strings (UTC) into Unix timestamps
+
+		Args:
+			values - sequence of date strings
+
+		Returns:
+			int64 NumPy array of Unix timestamps
+	"""
+	try:
+		dates = pd.to_datetime(pd.Series(values).astype(str).str.strip(), format=LR_DATE_FORMAT)
+		return ((dates - pd.Timestamp(0)) // pd.Timedelta(seconds=1)).to_numpy(dtype=np.int64)
+	except (ValueError, TypeError):
+		# fall back to element-wise parsing which reports the offending value
+		return np.array([calendar.timegm(datetime.strptime(str(value).strip(), LR_DATE_FORMAT).timetuple()) for value in values], dtype=np.int64)
+
+def read_csv_columns(path):
+	""" Parses .csv file of any layout used in 'data' directory into columns, keeping order of rows and units of timestamps as they are in the file
+
+		Names of the columns are taken from the header if present, otherwise from the known layout with the same number of columns.
+
+		Args:
+			path - path to .csv file
+
+		Returns:
+			a tuple of column names and a tuple of NumPy arrays (int64 timestamp column followed by float64 columns)
+	"""
+	return _read_csv_columns(path)[:2]
+
+def _read_csv_columns(path):
+	""" Same as 'read_csv_columns', returns index of the timestamp column in the file as the third item """
+	header = _has_header(path)
+	dataframe = pd.read_csv(path, header=0 if header else None)
+	num_columns = len(dataframe.columns)
+	# locate timestamp column: either a column of date strings or a numeric column named 'timestamp' or the first one
+	time_col_idx = None
+	for idx in range(num_columns):
+		if not pd.api.types.is_numeric_dtype(dataframe.iloc[:, idx]):
+			time_col_idx = idx
+			timestamps = _date_strings_to_unix(dataframe.iloc[:, idx].tolist())
+			break
+	if time_col_idx is None:
+		names = [str(name).strip().lower() for name in dataframe.columns] if header else list()
+		time_col_idx = names.index("timestamp") if "timestamp" in names else 0
+		timestamps = pd.to_numeric(dataframe.iloc[:, time_col_idx]).to_numpy(dtype=np.float64).astype(np.int64)
+	value_idxs = [idx for idx in range(num_columns) if idx != time_col_idx]
+	if header:
+		names = ["timestamp"] + [str(dataframe.columns[idx]).strip() for idx in value_idxs]
+	else:
+		known_layouts = dict((len(layout), layout) for layout in (CANDLE_COLUMNS, LENDING_COLUMNS, LENDING_RATE_COLUMNS))
+		names = list(known_layouts.get(num_columns, ["timestamp"] + ["column_%d" % idx for idx in value_idxs]))
+	columns = [timestamps]
+	for idx in value_idxs:
+		columns.append(pd.to_numeric(dataframe.iloc[:, idx], errors="coerce").to_numpy(dtype=np.float64))
+	return tuple(names), tuple(columns), time_col_idx
+
+def _normalize_columns(names, columns):
+	""" Rescales timestamps to seconds and sorts rows in ascending order, invalid and duplicate rows are kept. Returns repaired columns and ValidationReport of the input """
+	return validation.repair_columns(names, columns, rescale=True, drop_invalid=False, dedupe=False)
+
+def normalize_csv(path):
+	""" Parses .csv file of any layout used in 'data' directory and converts it to the canonical schema
+
+		Canonical schema: Unix timestamps in seconds sorted in ascending order as the first column, float64 value columns after it.
+		Names of the columns are taken from the header if present, otherwise from the known layout with the same number of columns.
+
+		Args:
+			path - path to .csv file
+
+		Returns:
+			a tuple of column names and a tuple of NumPy arrays (int64 timestamp column followed by float64 columns)
+	"""
+	names, columns = read_csv_columns(path)
+	return names, _normalize_columns(names, columns)[0]
+
+def write_atomically(path, write):
+	""" Writes a file through a temporary file next to it which then replaces the target, so readers never see a partially written file
+
+		Args:
+			path - path to the target file
+			write - callable taking path to the temporary file and writing the content into it
+	"""
+	tmp_path = "%s.%d.tmp" % (path, os.getpid())
+	try:
+		write(tmp_path)
+		os.replace(tmp_path, path)
+	finally:
+		if os.path.exists(tmp_path):
+			os.remove(tmp_path)
+
+def ingest_csv(path):
+	""" Normalizes .csv file and writes it to the binary cache next to it
+
+		Binary file stores the columns one after another: int64 timestamps followed by float64 value columns.
+		Metadata file stores column names, index of the timestamp column in the .csv file, number of rows as well as modification time, size and hash of the source .csv file.
+
+		Args:
+			path - path to .csv file
+
+		Returns:
+			metadata of the written cache as a dictionary
+	"""
+	if not os.path.isfile(path):
+		raise ValueError("first parameter must be a path to file")
+	stat = os.stat(path)
+	names, columns, time_col_idx = _read_csv_columns(path)
+	columns, report = _normalize_columns(names, columns)
+	data_path, meta_path = get_cache_paths(path)
+	# invalidate metadata first so that readers never pair it with a data file of another layout
+	if os.path.exists(meta_path):
+		os.remove(meta_path)
+
+	_write_columns(data_path, columns)
+	meta = {
+		"version": CACHE_VERSION,
+		"columns": list(names),
+		"time_col_idx": time_col_idx,
+		"num_rows": int(len(columns[0])),
+		"source_mtime": stat.st_mtime,
+		"source_size": stat.st_size,
+		"source_sha1": file_hash(path),
+		"validation": report.to_dict(),
+	}
+	_write_meta(meta_path, meta)
+	return meta
+
+def _write_columns(data_path, columns):
+	def write_data(tmp_path):
+		with open(tmp_path, "wb") as f:
+			for column in columns:
+				f.write(np.ascontiguousarray(column).tobytes())
+	write_atomically(data_path, write_data)
+
+def _write_meta(meta_path, meta):
+	def write_json(tmp_path):
+		with open(tmp_path, "w") as f:
+			json.dump(meta, f)
+	write_atomically(meta_path, write_json)
+
+def _read_meta(meta_path):
+	try:
+		with open(meta_path, "r") as f:
+			return json.load(f)
+	except (IOError, OSError, ValueError):
+		return None
+
+def is_cache_fresh(path):
+	""" Checks whether binary cache of given .csv file exists and matches its current content
+
+		Note: modification time and size are compared first, hash is computed only if they changed.
+		If only the modification time changed but the content didn't, the cache is kept and its metadata is updated.
+
+		Args:
+			path - path to .csv file
+
+		Returns:
+			True if the cache can be used, otherwise False
+	"""
+	data_path, meta_path = get_cache_paths(path)
+	meta = _read_meta(meta_path)
+	if meta is None or meta.get("version") != CACHE_VERSION or not os.path.isfile(data_path):
+		return False
+	stat = os.stat(path)
+	if stat.st_mtime == meta["source_mtime"] and stat.st_size == meta["source_size"]:
+		return True
+	if stat.st_size != meta["source_size"] or file_hash(path) != meta["source_sha1"]:
+		return False
+	meta["source_mtime"] = stat.st_mtime
+	_write_meta(meta_path, meta)
+	return True
+
+def _map_columns(data_path, meta):
+	""" Memory-maps columns of a binary cache file described by its metadata """
+	names = tuple(meta["columns"])
+	num_rows = meta["num_rows"]
+	if num_rows == 0:
+		return names, tuple([np.empty(0, dtype=np.int64)] + [np.empty(0, dtype=np.float64) for i in range(len(names) - 1)])
+	columns = list()
+	offset = 0
+	for idx in range(len(names)):
+		dtype = np.int64 if idx == 0 else np.float64
+		columns.append(np.memmap(data_path, dtype=dtype, mode="r", offset=offset, shape=(num_rows,)))
+		offset += num_rows * np.dtype(dtype).itemsize
+	return names, tuple(columns)
+
+def _load_base_columns(path):
+	if not is_cache_fresh(path):
+		meta = ingest_csv(path)
+	else:
+		meta = _read_meta(get_cache_paths(path)[1])
+	return meta, _map_columns(get_cache_paths(path)[0], meta)
+
+def _load_level(path, level, base_meta, base_columns):
+	""" Memory-maps a pyramid level, building it from the canonical columns if it is missing or was built from another version of the .csv file """
+	data_path, meta_path = get_cache_paths(path, level)
+	meta = _read_meta(meta_path)
+	if meta is None or meta.get("version") != CACHE_VERSION or meta.get("source_sha1") != base_meta["source_sha1"] or not os.path.isfile(data_path):
+		names, columns = base_columns
+		if os.path.exists(meta_path):
+			os.remove(meta_path)
+		bars = resample.resample_columns(names, columns, level)
+		_write_columns(data_path, bars)
+		meta = {"version": CACHE_VERSION, "columns": list(names), "num_rows": int(len(bars[0])), "level": level, "source_sha1": base_meta["source_sha1"]}
+		_write_meta(meta_path, meta)
+	return _map_columns(data_path, meta)
+
+def load_columns(path, resolution=None):
+	""" Returns canonical columns of given .csv file memory-mapped from its binary cache, ingesting the file first if the cache is missing or stale
+
+		If 'resolution' is given, bars of that resolution are returned instead of rows of the file (see 'resample'). They are read from the coarsest
+		pyramid level which evenly divides the resolution (built on first access) and resampled further only if the level doesn't match it exactly.
+		Note: bars resampled from a level treat its time-weighted averages as constant within each level bar, which is exact except for bars at gaps and edges of the data.
+
+		Args:
+			path - path to .csv file
+			resolution - resolution name (e.g. "4h") or duration of bars in seconds. Default value is None (rows of the file).
+
+		Returns:
+			a tuple of column names and a tuple of read-only NumPy arrays (int64 timestamps sorted in ascending order followed by float64 columns)
+	"""
+	meta, base_columns = _load_base_columns(path)
+	if resolution is None:
+		return base_columns
+	level = resample.pick_level(resolution)
+	names, columns = base_columns if level is None else _load_level(path, level, meta, base_columns)
+	if level is not None and resample.RESOLUTIONS[level] == resample.get_resolution_seconds(resolution):
+		return names, columns
+	return names, resample.resample_columns(names, columns, resolution)
+
+def get_source_hash(path):
+	""" Returns SHA-1 hash of the content of given .csv file, kept in the cache metadata so that it is recomputed only when the file changes """
+	return _load_base_columns(path)[0]["source_sha1"]
+
+def get_time_column_index(path):
+	""" Returns index of the timestamp column in given .csv file as detected during ingest (the cached columns have it first) """
+	return _load_base_columns(path)[0]["time_col_idx"]
+
+def get_validation_report(path):
+	""" Returns ValidationReport of given .csv file as it is stored (before normalization), ingesting the file first if the cache is missing or stale """
+	meta = _load_base_columns(path)[0]
+	return validation.ValidationReport.from_dict(meta["validation"])
+
+def build_pyramid(path, levels=resample.PYRAMID_LEVELS):
+	""" Builds missing or stale pyramid levels of given .csv file
+
+		Args:
+			path - path to .csv file
+			levels - names of levels to build. Default value is PYRAMID_LEVELS.
+	"""
+	meta, base_columns = _load_base_columns(path)
+	for level in levels:
+		_load_level(path, level, meta, base_columns)
+
+def ensure_cached(paths, levels=()):
+	""" Ingests given .csv files whose cache is missing or stale, so that processes started afterwards only memory-map them
+
+		Args:
+			paths - paths to .csv files
+			levels - names of pyramid levels to build as well. Default value is empty tuple (no levels).
+	"""
+	for path in paths:
+		if not is_cache_fresh(path):
+			ingest_csv(path)
+		if levels:
+			build_pyramid(path, levels)
+
+def main():
+	for path in sys.argv[1:]:
+		meta = ingest_csv(path)
+		build_pyramid(path)
+		print("%s: %d rows, columns: %s" % (path, meta["num_rows"], ", ".join(meta["columns"])))
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,68 @@
+import os
+import pytest
+import ticker_cache
+
+def write_lines(path, lines):
+	""" Writes given lines into a file and returns its path as a string """
+	with open(str(path), "w") as f:
+		f.write("\n".join(lines) + "\n")
+	return str(path)
+
+def test_normalize_csv_headerless_descending(tmp_path):
+	""" Tests whether 'normalize_csv' assigns candle column names to a headerless file and sorts its rows in ascending order """
+	path = write_lines(tmp_path / "sample.csv", ["1500001800,1.0,2.0,3.0,0.5,30.0", "1500000900,1.0,2.0,3.0,0.5,20.0", "1500000000,1.0,2.0,3.0,0.5,10.0"])
+	names, columns = ticker_cache.normalize_csv(path)
+	assert names == ticker_cache.CANDLE_COLUMNS
+	assert columns[0].tolist() == [1500000000, 1500000900, 1500001800]
+	assert columns[5].tolist() == [10.0, 20.0, 30.0]
+
+def test_normalize_csv_millisecond_timestamps(tmp_path):
+	""" Tests whether 'normalize_csv' converts millisecond timestamps to seconds """
+	path = write_lines(tmp_path / "sample.csv", ["1500000900000,1.0,2.0,3.0,0.5,20.0", "1500000000000,1.0,2.0,3.0,0.5,10.0"])
+	names, columns = ticker_cache.normalize_csv(path)
+	assert columns[0].tolist() == [1500000000, 1500000900]
+
+def test_normalize_csv_date_strings(tmp_path):
+	""" Tests whether 'normalize_csv' converts "03.12.17 15:05" date strings into Unix timestamps and moves them to the first column """
+	path = write_lines(tmp_path / "sample_lr.csv", ["lending_rate,timestamp", "11.3065,03.12.17 15:05", "11.3204,03.12.17 14:05"])
+	names, columns = ticker_cache.normalize_csv(path)
+	assert names == ("timestamp", "lending_rate")
+	assert columns[0].tolist() == [1512313500 - 3600, 1512313500]
+	assert columns[1].tolist() == [11.3204, 11.3065]
+
+def test_load_columns_uses_cache(tmp_path):
+	""" Tests whether 'load_columns' writes the cache next to the .csv file and memory-maps it on later loads """
+	path = write_lines(tmp_path / "sample.csv", ["timestamp,rate", "1500000000,1.5", "1500000900,2.5"])
+	names, columns = ticker_cache.load_columns(path)
+	data_path, meta_path = ticker_cache.get_cache_paths(path)
+	assert os.path.isfile(data_path) and os.path.isfile(meta_path)
+	assert ticker_cache.is_cache_fresh(path)
+	names, columns = ticker_cache.load_columns(path)
+	assert names == ("timestamp", "rate")
+	assert columns[1].tolist() == [1.5, 2.5]
+	assert not columns[0].flags.writeable
+
+def test_cache_invalidated_on_content_change(tmp_path):
+	""" Tests whether the cache is rebuilt once content of the .csv file changes """
+	path = write_lines(tmp_path / "sample.csv", ["timestamp,rate", "1500000000,1.5", "1500000900,2.5"])
+	ticker_cache.load_columns(path)
+	write_lines(path, ["timestamp,rate", "1500000000,1.5", "1500000900,3.5"])
+	os.utime(path, (0, 0))
+	assert not ticker_cache.is_cache_fresh(path)
+	names, columns = ticker_cache.load_columns(path)
+	assert columns[1].tolist() == [1.5, 3.5]
+
+def test_cache_kept_on_mtime_change_only(tmp_path):
+	""" Tests whether the cache is kept if only modification time of the .csv file changes but its content doesn't """
+	path = write_lines(tmp_path / "sample.csv", ["timestamp,rate", "1500000000,1.5", "1500000900,2.5"])
+	ticker_cache.load_columns(path)
+	os.utime(path, (0, 0))
+	assert ticker_cache.is_cache_fresh(path)
+
+def test_validation_report_of_stored_file(tmp_path):
+	""" Tests whether issues of the file as it is stored are kept in the cache while the loaded columns are normalized """
+	path = write_lines(tmp_path / "sample.csv", ["1500000900000,1.0,2.0,3.0,0.5,20.0", "1500000000000,1.0,2.0,3.0,0.5,10.0", "1500000000000,1.0,2.0,3.0,0.5,15.0"])
+	report = ticker_cache.get_validation_report(path)
+	assert [issue.check for issue in report.issues] == ["milliseconds", "descending", "duplicates"]
+	names, columns = ticker_cache.load_columns(path)
+	assert columns[0].tolist() == [1500000000, 1500000000, 1500000900]
@@ -1,11 +1,10 @@
 from datetime import datetime
 from time import mktime
 import pandas as pd
+import numpy as np
 import os
-import math
-import plotly.plotly as pl
-import plotly.graph_objs as go
-from random import uniform, randrange
+import ticker_cache
+import validation
 from structures import *
 
 def unix_timestamp_to_str(timestamp):
@@ -48,26 +47,85 @@ def datetime_from_string(date_str):
 Returns a list of TickerInfoEntry instances obtained from .csv file for a given ticker for a period of time defined by 'start_date' and 'end_date'
 If no information for the period is available, returns empty list
 '''
-def get_ticker_data(path, start_date, end_date, time_col_idx=0):
+def get_ticker_data(path, start_date, end_date, time_col_idx=0, use_cache=True, resolution=None):
 	""" Collects rows from .csv files within given period of time and returns them as a list
 
-		Note: the function assumes that given .csv file has timestamp column using which it can perform sorting
+		Note: the function assumes that given .csv file has timestamp column using which it can perform sorting.
+		Returned rows are sorted by timestamp in ascending order.
 
 		Args:
 			path - path to input .csv file
 			start_date - file entries with timestamp earlier than this date won't be returned
 			end_date - file entries with timestamp later than this date won't be returned
 			time_col_idx - index of timestamp column in the given file. Default value is 0.
+			use_cache - if True, rows are read from the normalized binary cache (see 'ticker_cache'). Default value is True.
+			resolution - if given, bars of this resolution (e.g. "4h" or number of seconds) are returned instead of rows of the file, see 'get_ticker_columns'. Default value is None.
 
 		Returns:
-			a list of Pandas dataframe rows that are within specified time period
+			a list of rows (tuples of column values) that are within specified time period
 	"""
-	if path is None or len(path) == 0):
-		raise ValueError("path to file must be non-empty string")
 	if start_date == end_date:
 		return list()
+	if use_cache or resolution is not None:
+		columns = get_ticker_columns(path, start_date, end_date, time_col_idx, use_cache, resolution)
+		return list(zip(*[column.tolist() for column in columns]))
+	dataframe, timestamps, selection = _load_ticker_frame(path, start_date, end_date, time_col_idx)
+	return list(dataframe.iloc[selection].itertuples(index=False, name=None))
+
+def get_ticker_columns(path, start_date, end_date, time_col_idx=0, use_cache=True, resolution=None):
+	""" Collects columns of .csv file within given period of time and returns them as typed NumPy arrays
+
+		Note: the period of time is located with a binary search over timestamps sorted in ascending order,
+		so rows of the file aren't visited one by one. Returned columns are sorted by timestamp in ascending order.
+
+		If 'use_cache' is set, columns are memory-mapped from the normalized binary cache of the file (see 'ticker_cache'),
+		which is built on first access and rebuilt once the file changes. Cached columns are returned in the order of the file,
+		ValueError is raised if 'time_col_idx' doesn't match the timestamp column detected in the file (see 'ticker_cache.read_csv_columns').
+
+		If 'resolution' is set, rows are aggregated into bars of that resolution: OHLCV bars for candle columns and time-weighted averages
+		for the other ones (see 'resample'). Bars are labelled by their start and selected by it. They are served from the cheapest level
+		of the cached bar pyramid (1h, 4h, 1d) which satisfies the resolution, so the binary cache is always used for them.
+
+		Args:
+			path - path to input .csv file
+			start_date - file entries with timestamp earlier than this date won't be returned
+			end_date - file entries with timestamp later than this date won't be returned
+			time_col_idx - index of timestamp column in the given file. Default value is 0.
+			use_cache - if True, columns are read from the normalized binary cache. Default value is True.
+			resolution - resolution name (e.g. "1h", "4h", "1d") or duration of bars in seconds. Default value is None (rows of the file).
+
+		Returns:
+			a tuple containing a NumPy array per column of the file: timestamp column is of int64 type, remaining columns are of float64 type
+			(values that don't represent a number are set to NaN)
+	"""
+	if start_date == end_date:
+		return tuple()
+	if use_cache or resolution is not None:
+		_validate_ticker_path(path, start_date, end_date)
+		names, columns = ticker_cache.load_columns(path, resolution)
+		file_time_col_idx = ticker_cache.get_time_column_index(path)
+		if time_col_idx != file_time_col_idx:
+			raise ValueError("timestamp column of the file is at index %d, not %d" % (file_time_col_idx, time_col_idx))
+		selection = _time_range_selection(columns[0], start_date, end_date)
+		# cached columns have timestamps first, move them back to their position in the file
+		columns = columns[1:time_col_idx + 1] + columns[:1] + columns[time_col_idx + 1:]
+		return tuple(np.asarray(column[selection]) for column in columns)
+	dataframe, timestamps, selection = _load_ticker_frame(path, start_date, end_date, time_col_idx)
+	columns = list()
+	for idx in range(len(dataframe.columns)):
+		if idx == time_col_idx:
+			column = timestamps[selection]
+		else:
+			column = pd.to_numeric(dataframe.iloc[:, idx], errors="coerce").to_numpy(dtype=np.float64)[selection]
+		columns.append(np.ascontiguousarray(column))
+	return tuple(columns)
+
+def _validate_ticker_path(path, start_date, end_date):
+	""" Raises ValueError if given path doesn't point to a .csv file or given period of time is invalid """
+	if path is None or len(path) == 0:
+		raise ValueError("path to file must be non-empty string")
 	if start_date > end_date:
-		throw ValueError("starting date must be less than or equal to end date")
+		raise ValueError("starting date must be less than or equal to end date")
 	if not os.path.isfile(path):
 		raise ValueError("first parameter must be a path to file")
 	filename, file_extension = os.path.splitext(path)
@@ -75,93 +133,190 @@ def get_ticker_data(path, start_date, end_date, time_col_idx=0):
 		raise ValueError("name of the input file must have non-zero length")
 	if file_extension != ".csv":
 		raise ValueError("input file must have .csv extension")
+
+def _load_ticker_frame(path, start_date, end_date, time_col_idx):
+	""" Reads .csv file and locates its rows within given period of time
+
+		Args:
+			path - path to input .csv file
+			start_date - earliest timestamp of the period
+			end_date - latest timestamp of the period
+			time_col_idx - index of timestamp column in the given file
+
+		Returns:
+			a tuple of Pandas dataframe, int64 NumPy array of its timestamps and selection (slice or index array) of the rows within the period, in ascending timestamp order
+	"""
+	_validate_ticker_path(path, start_date, end_date)
 	dataframe = pd.read_csv(path)
 	assert(time_col_idx >= 0 and time_col_idx < len(dataframe.columns)), "Invalid timestamp column!"
-	rows = list()
-	for index, row in dataframe.iterrows():
-		try:
-			timestamp = row[time_col_idx]
-			if isinstance(timestamp, int):
-				pass
-			elif isinstance(timestamp, basestring) or isinstance(timestamp, float):
-				timestamp = int(timestamp)
+	try:
+		timestamps = pd.to_numeric(dataframe.iloc[:, time_col_idx]).to_numpy(dtype=np.float64).astype(np.int64)
+	except (ValueError, TypeError):
+		raise ValueError("timestamp column is not present in %s" % (path))
+	if len(timestamps) and timestamps.min() < 0:
+		raise ValueError("Invalid value of timestamp: %d" % (timestamps.min()))
+	return dataframe, timestamps, _time_range_selection(timestamps, start_date, end_date)
+
+def _time_range_selection(timestamps, start_date, end_date):
+	""" Locates timestamps within given period of time using binary search
+
+		Note: timestamps sorted in descending order are reversed, unsorted timestamps are sorted first (stable sort)
+
+		Args:
+			timestamps - NumPy array of timestamps
+			start_date - earliest timestamp of the period (inclusive)
+			end_date - latest timestamp of the period (inclusive)
+
+		Returns:
+			a slice or NumPy index array selecting timestamps within the period in ascending order
+	"""
+	order = None
+	if len(timestamps) >= 2:
+		deltas = np.diff(timestamps)
+		if (deltas < 0).any():
+			if (deltas <= 0).all():
+				order = np.arange(len(timestamps) - 1, -1, -1)
 			else:
-				raise Exception("Expected timestamp to be float, int or string, instead got " + timestamp)
-			if timestamp < 0.0:
-				raise Exception("Invalid value of timestamp: " + timestamp)
-			if timestamp >= start_date and timestamp <= end_date:
-				rows.append(row)
-		except:
-			raise Exception("timestamp column is not present in %s" % (path))
-	return rows
+				order = np.argsort(timestamps, kind="mergesort")
+	sorted_timestamps = timestamps if order is None else timestamps[order]
+	lo = np.searchsorted(sorted_timestamps, start_date, side="left")
+	hi = np.searchsorted(sorted_timestamps, end_date, side="right")
+	if order is None:
+		return slice(lo, hi)
+	return order[lo:hi]
+
+def _is_ticker_columns(df_rows):
+	""" Returns True if input is a tuple of NumPy columns as returned by 'get_ticker_columns', otherwise returns False """
+	return isinstance(df_rows, tuple) and len(df_rows) > 0 and all(isinstance(column, np.ndarray) for column in df_rows)
+
+def _require_valid(names, columns):
+	""" Checks columns in bulk before their entries are created without per-entry checks, see 'validation.require_valid'. Descending timestamps are tolerated as entries are reversed afterwards """
+	try:
+		columns = [column if isinstance(column, np.ndarray) else np.array(column, dtype=np.float64) for column in columns]
+	except (TypeError, ValueError):
+		raise ValueError("unexpected values in rows")
+	validation.require_valid(validation.validate_columns(names, columns), (validation.DESCENDING,))
 
-def df_rows_to_interest_entries(ticker_name, df_rows, price_idx, volume_idx, time_idx=0):
+def df_rows_to_interest_entries(ticker_name, df_rows, price_idx, volume_idx, time_idx=0, validated=False):
 	""" Attempts to converts Pandas dataframe rows to DetailedTickerEntry instances and returns them as a list
 
 		Args:
 			ticker_name - name of associated currency ticker
-			df_rows - Pandas dataframe rows that are to converted into DetailedTickerEntry instances
+			df_rows - Pandas dataframe rows or tuple of NumPy columns returned by 'get_ticker_columns' that are to converted into DetailedTickerEntry instances
 			price_idx - index of close price value within rows in the given dataframe
 			volume_idx - index of volume value within rows in the given dataframe
 			time_idx - index of timestamp value within rows in the given dataframe. Default value is 0.
+			validated - if True, values are checked in bulk (see 'validation') instead of per entry and ValueError is raised if they have issues. Default value is False.
 		Returns:
 			a list of DetailedTickerEntry instances
 	"""
-	if not len(df_rows):
+	columnar = _is_ticker_columns(df_rows)
+	if not len(df_rows) or (columnar and not len(df_rows[0])):
 		return list()
-	max_idx = len(df_rows[0]) - 1
+	max_idx = len(df_rows) - 1 if columnar else len(df_rows[0]) - 1
 	if price_idx > max_idx or volume_idx > max_idx or time_idx > max_idx:
 		raise ValueError("input index value out of bounds")
+	if columnar:
+		rows = zip(df_rows[time_idx].tolist(), df_rows[price_idx].tolist(), df_rows[volume_idx].tolist())
+	else:
+		rows = ((row[time_idx], row[price_idx], row[volume_idx]) for row in df_rows)
+	if validated:
+		if not columnar:
+			rows = list(rows)
+		_require_valid(("timestamp", "close_price", "volume"), (df_rows[time_idx], df_rows[price_idx], df_rows[volume_idx]) if columnar else list(zip(*rows)))
+	make_entry = DetailedTickerEntry.from_validated if validated else DetailedTickerEntry
 	entries = list()
-	for row in df_rows:
+	for timestamp, close_price, volume in rows:
 		try:
-			timestamp = int(row[time_idx])
-			close_price = float(row[price_idx])
-			volume = float(row[volume_idx])
-			interest_entry = DetailedTickerEntry(ticker_name, timestamp, close_price, volume)
+			interest_entry = make_entry(ticker_name, int(timestamp), float(close_price), float(volume))
 			entries.append(interest_entry)
 		except:
-			raise ValueError("unexpected values in row", row)
+			raise ValueError("unexpected values in row", (timestamp, close_price, volume))
 	# assure that entries are sorted in ascending order by timestamp
 	if len(entries) >= 2 and entries[0].timestamp > entries[-1].timestamp:
 		entries = entries[::-1]
 	return entries
 
-def df_rows_to_lending_entries(ticker_name, df_rows, lending_rate_idx, time_idx=0):
+def df_rows_to_lending_entries(ticker_name, df_rows, lending_rate_idx, time_idx=0, validated=False):
 	""" Attempts to converts Pandas dataframe rows to LendingTickerEntry instances and returns them as a list
 
 		Args:
 			ticker_name - name of associated currency ticker
-			df_rows - Pandas dataframe rows that are to converted into DetailedTickerEntry instances
+			df_rows - Pandas dataframe rows or tuple of NumPy columns returned by 'get_ticker_columns' that are to converted into LendingTickerEntry instances
 			lending_rate_idx - index of lending rate value within rows in the given dataframe.
 			time_idx - index of timestamp value within rows in the given dataframe. Default value is 0.
+			validated - if True, values are checked in bulk (see 'validation') instead of per entry and ValueError is raised if they have issues. Default value is False.
 		Returns:
 			a list of LendingTickerEntry instances
 	"""
-	if not len(df_rows):
+	columnar = _is_ticker_columns(df_rows)
+	if not len(df_rows) or (columnar and not len(df_rows[0])):
 		return list()
-	max_idx = len(df_rows[0]) - 1
+	max_idx = len(df_rows) - 1 if columnar else len(df_rows[0]) - 1
 	if lending_rate_idx > max_idx or time_idx > max_idx:
 		raise ValueError("input index value out of bounds")
+	if columnar:
+		rows = zip(df_rows[time_idx].tolist(), df_rows[lending_rate_idx].tolist())
+	else:
+		rows = ((row[time_idx], row[lending_rate_idx]) for row in df_rows)
+	if validated:
+		if not columnar:
+			rows = list(rows)
+		_require_valid(("timestamp", "lending_rate"), (df_rows[time_idx], df_rows[lending_rate_idx]) if columnar else list(zip(*rows)))
+	make_entry = LendingTickerEntry.from_validated if validated else LendingTickerEntry
 	entries = list()
-	for row in df_rows:
+	for timestamp, lending_rate in rows:
 		try:
-			timestamp = int(row[time_idx])
-			lending_rate = float(row[lending_rate_idx])
-			interest_entry = LendingTickerEntry(ticker_name, timestamp, lending_rate)
+			interest_entry = make_entry(ticker_name, int(timestamp), float(lending_rate))
 			entries.append(interest_entry)
 		except:
-			raise ValueError("unexpected values in row", row)
+			raise ValueError("unexpected values in row", (timestamp, lending_rate))
 	# assure that entries are sorted in ascending order by timestamp
 	if len(entries) >= 2 and entries[0].timestamp > entries[-1].timestamp:
 		entries = entries[::-1]
 	return entries
 
-def generate_sample_lending_intervals(num_intervals, num_entries, start_time, end_time):
+def columns_to_lending_series(ticker_name, columns, lending_rate_idx, time_idx=0):
+	""" Converts columns returned by 'get_ticker_columns' into LendingSeries without creating an object per entry
+
+		Args:
+			ticker_name - name of associated currency ticker
+			columns - tuple of NumPy columns returned by 'get_ticker_columns'
+			lending_rate_idx - index of lending rate column
+			time_idx - index of timestamp column. Default value is 0.
+		Returns:
+			LendingSeries sorted by timestamp in ascending order
+	"""
+	if lending_rate_idx >= len(columns) or time_idx >= len(columns):
+		raise ValueError("input index value out of bounds")
+	timestamps, lending_rates = columns[time_idx], columns[lending_rate_idx]
+	order = _time_range_selection(timestamps, -np.inf, np.inf)
+	return LendingSeries(ticker_name, timestamps[order], lending_rates[order])
+
+def columns_to_price_series(ticker_name, columns, price_idx, volume_idx, time_idx=0):
+	""" Converts columns returned by 'get_ticker_columns' into PriceSeries without creating an object per entry
+
+		Args:
+			ticker_name - name of associated currency ticker
+			columns - tuple of NumPy columns returned by 'get_ticker_columns'
+			price_idx - index of close price column
+			volume_idx - index of volume column
+			time_idx - index of timestamp column. Default value is 0.
+		Returns:
+			PriceSeries sorted by timestamp in ascending order
+	"""
+	if price_idx >= len(columns) or volume_idx >= len(columns) or time_idx >= len(columns):
+		raise ValueError("input index value out of bounds")
+	timestamps = columns[time_idx]
+	order = _time_range_selection(timestamps, -np.inf, np.inf)
+	return PriceSeries(ticker_name, timestamps[order], columns[price_idx][order], columns[volume_idx][order])
+
+def generate_sample_lending_intervals(num_intervals, num_entries, start_time, end_time, seed=None):
 	""" Returns number of LendingInterval entries as specified by 'num_intervals' where each LendingInterval contains number of LendingTickerEntry as specified by 'num_entries'
 		Time period in which LendingInterval entries should be generated is specified by 'starting_time' and 'ending_time'.
 
 		The function is to be used for testing when needed to generate LendingInterval instances using randomized data.
+		For long series with realistic lending rates see 'synthetic.generate_lending_columns'.
 
 		Note: within each generated LendingInterval object, LendingTickerEntry instances are sorted by timestamp in ascending order
 
@@ -170,6 +325,7 @@ def generate_sample_lending_intervals(num_intervals, num_entries, start_time, en
 			num_entries - number of LendingTickerEntry instances within each LendingInterval
 			start_time - specifies start of the time period into which generated LendingInterval instances should fall
 			end_time - specifies end of the time period into which generated LendingInterval instances should fall
+			seed - seed of the random generator. Default value is None (unseeded).
 
 		Returns:
 			a list of LendingInterval entries
@@ -180,85 +336,43 @@ def generate_sample_lending_intervals(num_intervals, num_entries, start_time, en
 		raise ValueError("num_intervals and num_entries must be positive!")
 	if type(num_intervals) is not int or type(num_entries) is not int:
 		raise TypeError("num_intervals and num_entries must be positive integers!")
+	if end_time - start_time <= num_entries:
+		raise ValueError("time period must be longer than num_entries seconds!")
+	rng = np.random.default_rng(seed)
+	bounds = rng.integers(start_time, end_time, (num_intervals, 2))
+	# assure that time difference between interval start and interval end is at least 'num_entries', redraw ends of intervals which are too short
+	too_short = np.abs(bounds[:, 1] - bounds[:, 0]) < num_entries
+	while too_short.any():
+		bounds[too_short, 1] = rng.integers(start_time, end_time, int(too_short.sum()))
+		too_short = np.abs(bounds[:, 1] - bounds[:, 0]) < num_entries
+	bounds.sort(axis=1)
+	lending_rates = rng.uniform(1.0, 100.0, (num_intervals, num_entries))
 	lending_intervals = list()
-	for i in range(num_intervals):
-		interval_start = randrange(start_time, end_time)
-		interval_end = randrange(start_time, end_time)
-		# assure that interval start and interval end are non-equal and time difference between them is larger than 'num_entries'
-		while interval_start == interval_end or math.fabs(interval_start - interval_end) < num_entries:
-			interval_end = randrange(start_time, end_time)
-		# if interval start is larger than the interval end, invert the values
-		if interval_start > interval_end:
-			tmp_time = interval_end
-			interval_end = interval_start
-			interval_start = tmp_time
-		lending_entries = list()
-		lending_entry_timestamps = set()
-		# assure that no entries with same timestamp are generated for the same lending interval
-		while len(lending_entry_timestamps) < num_entries:
-			rnd_time = randrange(interval_start, interval_end)
-			lending_entry_timestamps.add(rnd_time)
-		for j in range(num_entries):
-			rnd_lr = uniform(1.0, 100.0)
-			lending_entry = LendingTickerEntry("TEST", lending_entry_timestamps.pop(), rnd_lr)
-			lending_entries.append(lending_entry)
-		lending_entries.sort(key=lambda x: x.timestamp)
+	for (interval_start, interval_end), interval_rates in zip(bounds.tolist(), lending_rates.tolist()):
+		# distinct timestamps within the interval, sorted in ascending order
+		timestamps = np.sort(interval_start + rng.choice(interval_end - interval_start, num_entries, replace=False)).tolist()
+		lending_entries = [LendingTickerEntry("TEST", timestamp, lending_rate) for timestamp, lending_rate in zip(timestamps, interval_rates)]
 		lending_interval = LendingInterval("TEST", lending_entries[0].timestamp, lending_entries[-1].timestamp, lending_entries)
 		lending_intervals.append(lending_interval)
 	return lending_intervals
 
-def generate_sample_lending_ticker_entries(num_entries, min_date, max_date, min_lending_rate=0.1, max_lending_rate=100.0):
+def generate_sample_lending_ticker_entries(num_entries, min_date, max_date, min_lending_rate=0.1, max_lending_rate=100.0, seed=None):
 	""" Generates and returns number sample, randomized LendingTickerEntry instances within given timeframe.
 
-	The function is to be used for testing.
+	The function is to be used for testing. For long series with realistic lending rates see 'synthetic.generate_lending_columns'.
 
 	Args:
 		num_entries - number of LendingTickerEntry instances to generate
 		min_date - minimum timestamp value allowed for generated LendingTickerEntry instances
-		max_date - maximum timestamp value allowed for generated LendingTickerEntry instances
+		max_date - maximum timestamp value allowed for generated LendingTickerEntry instances (exclusive)
 		min_lending_rate - minimum lending rate value allowed for generated LendingTickerEntry instances
 		max_lending_rate - maximum lending rate value allowed for generated LendingTickerEntry instances
+		seed - seed of the random generator. Default value is None (unseeded).
 
 	Returns:
 		a list of LendingTickerEntry instances containing "num_entries" instances
 	"""
-	entries = list()
-	for i in range(num_entries):
-		timestamp = randrange(min_date, max_date)
-		lending_rate = randrange(min_lending_rate, max_lending_rate)
-		entry = LendingTickerEntry("Test", timestamp, lending_rate)
-		entries.append(entry)
-	return entries
-
-def plot_interval(x_data, y_data, title, y_title, x_title="Time"):
-	""" Plots given data arrays using Plotly online service and uploads it to Plotly cloud service
-
-		Args:
-			x_data - list containing x-axis values
-			y_data - list containing y-axis values
-			title - general title for the plotted graph.
-			y_title - title for y-axis.
-			x_title - title for x-axis. Default value is "Time".
-	"""
-	data = [go.Scatter(x=x_data, y=y_data)]
-	layout = go.Layout(
-		title=title,
-		xaxis=dict(
-			title=x_title,
-			titlefont=dict(
-				family='Courier New, monospace',
-				size=18,
-				color='#7f7f7f'
-        	)
-    	),
-    	yaxis=dict(
-    		title=y_title,
-    		titlefont=dict(
-    			family='Courier New, monospace',
-    			size=18,
-    			color='#7f7f7f'
-        	)
-   		)
-	)
-	fig = go.Figure(data=data, layout=layout)
-	pl.plot(fig, auto_open=False)
\ No newline at end of file
+	rng = np.random.default_rng(seed)
+	timestamps = rng.integers(min_date, max_date, num_entries).tolist()
+	lending_rates = rng.uniform(min_lending_rate, max_lending_rate, num_entries).tolist()
+	return [LendingTickerEntry("Test", timestamp, lending_rate) for timestamp, lending_rate in zip(timestamps, lending_rates)]
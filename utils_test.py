@@ -1,5 +1,7 @@
+import os
 import pytest
 import utils
+import resample
 
 def test_generate_sample_lending_intervals_zero_num_intervals():
 	""" Tests whether 'generate_sample_lending_intervals' function returns empty list when given 'num_intervals' value of 0 """
@@ -68,4 +70,107 @@ def test_generate_sample_lending_intervals_within_given_timerange():
 	end_time = 1489123457
 	result = utils.generate_sample_lending_intervals(10, 10, start_time, end_time)
 	for entry in result:
-		assert entry.start_date >= start_time and entry.end_date <= end_time
\ No newline at end of file
+		assert entry.start_date >= start_time and entry.end_date <= end_time
+
+def write_sample_csv(path, rows, header="timestamp,open_price,close_price,high,low,volume"):
+	""" Writes given rows into a .csv file with given header and returns its path as a string """
+	with open(str(path), "w") as f:
+		f.write(header + "\n")
+		for row in rows:
+			f.write(",".join(str(value) for value in row) + "\n")
+	return str(path)
+
+def test_get_ticker_columns_typed_columns(tmp_path):
+	""" Tests whether 'get_ticker_columns' returns int64 timestamp column and float64 value columns """
+	path = write_sample_csv(tmp_path / "sample.csv", [(1500000000 + i * 900, 1.0, 2.0, 3.0, 0.5, 10.0) for i in range(10)])
+	columns = utils.get_ticker_columns(path, 1500000000, 1500009000)
+	assert len(columns) == 6
+	assert columns[0].dtype == utils.np.int64
+	assert all(column.dtype == utils.np.float64 for column in columns[1:])
+
+def test_get_ticker_columns_inclusive_period(tmp_path):
+	""" Tests whether 'get_ticker_columns' returns only rows within the period, including rows exactly at 'start_date' and 'end_date' """
+	path = write_sample_csv(tmp_path / "sample.csv", [(1500000000 + i * 900, 1.0, float(i) + 1.0, 3.0, 0.5, 10.0) for i in range(10)])
+	columns = utils.get_ticker_columns(path, 1500000900, 1500003600)
+	assert columns[0].tolist() == [1500000900, 1500001800, 1500002700, 1500003600]
+	assert columns[2].tolist() == [2.0, 3.0, 4.0, 5.0]
+
+def test_get_ticker_columns_descending_file(tmp_path):
+	""" Tests whether 'get_ticker_columns' returns rows sorted by timestamp in ascending order when the file is sorted in descending order """
+	path = write_sample_csv(tmp_path / "sample.csv", [(1500009000 - i * 900, 1.0, 2.0, 3.0, 0.5, 10.0) for i in range(10)])
+	columns = utils.get_ticker_columns(path, 1500000000, 1500009000)
+	assert columns[0].tolist() == sorted(columns[0].tolist())
+	assert len(columns[0]) == 10
+
+def test_get_ticker_columns_same_start_end_date(tmp_path):
+	""" Tests whether 'get_ticker_columns' returns no columns when 'start_date' equals 'end_date' """
+	path = write_sample_csv(tmp_path / "sample.csv", [(1500000000, 1.0, 2.0, 3.0, 0.5, 10.0)])
+	assert utils.get_ticker_columns(path, 1500000000, 1500000000) == tuple()
+
+def test_get_ticker_columns_invalid_period(tmp_path):
+	""" Tests whether 'get_ticker_columns' throws ValueError if 'start_date' is larger than 'end_date' """
+	path = write_sample_csv(tmp_path / "sample.csv", [(1500000000, 1.0, 2.0, 3.0, 0.5, 10.0)])
+	with pytest.raises(ValueError):
+		utils.get_ticker_columns(path, 1500000010, 1500000000)
+
+def test_df_rows_to_entries_accept_columns(tmp_path):
+	""" Tests whether 'df_rows_to_interest_entries' and 'df_rows_to_lending_entries' produce same entries from columns returned by 'get_ticker_columns' as from rows returned by 'get_ticker_data' """
+	path = write_sample_csv(tmp_path / "sample.csv", [(1500009000 - i * 900, 1.0, float(i) + 1.0, 3.0, 0.5, 10.0 + i) for i in range(10)])
+	columns = utils.get_ticker_columns(path, 1500000000, 1500009000)
+	rows = utils.get_ticker_data(path, 1500000000, 1500009000)
+	from_columns = utils.df_rows_to_interest_entries("TEST", columns, 2, 5, 0)
+	from_rows = utils.df_rows_to_interest_entries("TEST", rows, 2, 5, 0)
+	assert [(e.timestamp, e.close_price, e.volume) for e in from_columns] == [(e.timestamp, e.close_price, e.volume) for e in from_rows]
+	lending_entries = utils.df_rows_to_lending_entries("TEST", columns, 2, 0)
+	assert [(e.timestamp, e.lending_rate) for e in lending_entries] == [(e.timestamp, e.close_price) for e in from_columns]
+
+def test_get_ticker_columns_cached_matches_uncached(tmp_path):
+	""" Tests whether 'get_ticker_columns' returns same columns when served from the binary cache as when parsed from the .csv file """
+	path = write_sample_csv(tmp_path / "sample.csv", [(1500009000 - i * 900, 1.0, float(i) + 1.0, 3.0, 0.5, 10.0) for i in range(10)])
+	uncached = utils.get_ticker_columns(path, 1500000900, 1500008100, use_cache=False)
+	cached = utils.get_ticker_columns(path, 1500000900, 1500008100)
+	assert [column.tolist() for column in cached] == [column.tolist() for column in uncached]
+
+def test_get_ticker_columns_cached_time_column(tmp_path):
+	""" Tests whether cached columns honor 'time_col_idx' of a file with timestamps in its second column and whether a wrong index is refused """
+	path = str(tmp_path / "sample.csv")
+	with open(path, "w") as f:
+		f.write("rate,timestamp\n" + "".join("%f,%d\n" % (float(i) + 1.0, 1500000000 + i * 900) for i in range(10)))
+	uncached = utils.get_ticker_columns(path, 1500000900, 1500008100, 1, use_cache=False)
+	cached = utils.get_ticker_columns(path, 1500000900, 1500008100, 1)
+	assert [column.tolist() for column in cached] == [column.tolist() for column in uncached]
+	assert cached[1].tolist() == [1500000000 + i * 900 for i in range(1, 10)]
+	with pytest.raises(ValueError):
+		utils.get_ticker_columns(path, 1500000900, 1500008100)
+
+def test_columns_to_series(tmp_path):
+	""" Tests whether 'columns_to_lending_series' and 'columns_to_price_series' keep the values of columns returned by 'get_ticker_columns' """
+	path = write_sample_csv(tmp_path / "sample.csv", [(1500000000 + i * 900, 1.0, float(i) + 1.0, 3.0, 0.5, 10.0 + i) for i in range(10)])
+	columns = utils.get_ticker_columns(path, 1500000000, 1500009000)
+	lending_series = utils.columns_to_lending_series("TEST", columns, 2, 0)
+	price_series = utils.columns_to_price_series("TEST", columns, 2, 5, 0)
+	assert lending_series.lending_rates.tolist() == columns[2].tolist()
+	assert price_series.volumes.tolist() == columns[5].tolist()
+	assert price_series.timestamps.tolist() == columns[0].tolist()
+
+def test_get_ticker_columns_resolution_uses_pyramid(tmp_path):
+	""" Tests whether 'get_ticker_columns' with 'resolution' returns bars built from the cached pyramid level and matching bars built from the rows """
+	rows = [(1500000000 + i * 900, float(i), float(i) + 0.5, float(i) + 1.0, float(i) - 1.0, 1.0) for i in range(200)]
+	path = write_sample_csv(tmp_path / "sample.csv", rows)
+	bars = utils.get_ticker_columns(path, 1499900000, 1500200000, resolution="8h")
+	assert os.path.isfile(path + ".cache.4h.bin")
+	names, columns = utils.ticker_cache.load_columns(path)
+	expected = resample.resample_columns(names, columns, "8h")
+	for column, expected_column in zip(bars, expected):
+		assert column.tolist() == expected_column.tolist()
+	assert utils.get_ticker_data(path, 1499900000, 1500200000, resolution="8h") == list(zip(*[column.tolist() for column in expected]))
+
+def test_generate_sample_data_seeded():
+	""" Tests whether sample intervals and entries are reproducible given a seed and entries fall within given bounds """
+	first = utils.generate_sample_lending_intervals(5, 20, 1479123456, 1489123457, seed=3)
+	second = utils.generate_sample_lending_intervals(5, 20, 1479123456, 1489123457, seed=3)
+	assert [[(entry.timestamp, entry.lending_rate) for entry in interval.lending_entries] for interval in first] == \
+		[[(entry.timestamp, entry.lending_rate) for entry in interval.lending_entries] for interval in second]
+	entries = utils.generate_sample_lending_ticker_entries(1000, 100, 200, 0.1, 100.0, seed=3)
+	assert len(entries) == 1000
+	assert all(100 <= entry.timestamp < 200 and 0.1 <= entry.lending_rate <= 100.0 for entry in entries)
@@ -0,0 +1,243 @@
+import sys
+import collections
+import numpy as np
+
+'''
+Array-level data quality checks of ticker data.
+
+Instead of validating each value as an entry object is constructed, a whole series is checked at once with a few NumPy passes:
+timestamps for NaN, non-positive values, millisecond units, sort order and duplicates, value columns for NaN and non-positive values.
+The result is a ValidationReport listing every problem found with the number of affected rows and the first of them.
+Data can also be repaired in one go: timestamps rescaled to seconds, invalid rows dropped, rows sorted in ascending order and duplicates removed.
+
+Data that passed validation (or was repaired) can be turned into entry objects without per-object checks, see e.g. 'LendingTickerEntry.from_validated'.
+Loaders asked for such entries check the columns in bulk first and refuse data with issues, see 'require_valid'.
+'''
+
+ValidationIssue = collections.namedtuple("ValidationIssue", ["check", "column", "count", "first_index", "message"])
+
+"""
+Constants
+"""
+# timestamps larger than this value are assumed to be in milliseconds
+MILLISECONDS_THRESHOLD = 10**11
+NAN = "nan"
+NON_POSITIVE = "non_positive"
+MILLISECONDS = "milliseconds"
+DESCENDING = "descending"
+UNSORTED = "unsorted"
+DUPLICATES = "duplicates"
+KEEP_FIRST = "first"
+KEEP_LAST = "last"
+
+
+'''
+Result of validation of a series: number of rows and the list of found issues
+'''
+class ValidationReport(object):
+
+	def __init__(self, num_rows, issues, actions=None):
+		self.num_rows = num_rows
+		self.issues = list(issues)
+		# repairs applied to the data as (action, number of affected rows) pairs, see 'repair_columns'
+		self.actions = list(actions or ())
+
+	def is_valid(self):
+		""" Returns True if no issues were found """
+		return not self.issues
+
+	def get_issues(self, check, column=None):
+		""" Returns issues of given check, optionally only those of given column """
+		return [issue for issue in self.issues if issue.check == check and (column is None or issue.column == column)]
+
+	def to_dict(self):
+		return {"num_rows": self.num_rows, "issues": [issue._asdict() for issue in self.issues], "actions": [list(action) for action in self.actions]}
+
+	@classmethod
+	def from_dict(cls, data):
+		return cls(data["num_rows"], [ValidationIssue(**issue) for issue in data["issues"]], [tuple(action) for action in data.get("actions", ())])
+
+	def to_string(self):
+		lines = ["[ValidationReport] number of rows: %d, issues: %d" % (self.num_rows, len(self.issues))]
+		lines.extend("  %s" % (issue.message) for issue in self.issues)
+		lines.extend("  repaired: %s (%d rows)" % action for action in self.actions)
+		return "\n".join(lines)
+
+def _issue(check, column, mask, message):
+	""" Returns ValidationIssue for rows selected by a boolean mask, None if no row is selected """
+	count = int(np.count_nonzero(mask))
+	if not count:
+		return None
+	first_index = int(np.argmax(mask))
+	return ValidationIssue(check, column, count, first_index, "%s: %d rows %s, first at row %d" % (column, count, message, first_index))
+
+def _check_timestamps(name, timestamps):
+	issues = list()
+	is_float = np.issubdtype(timestamps.dtype, np.floating)
+	nan = np.isnan(timestamps) if is_float else np.zeros(len(timestamps), dtype=bool)
+	issues.append(_issue(NAN, name, nan, "have no timestamp"))
+	issues.append(_issue(NON_POSITIVE, name, timestamps <= 0, "have non-positive timestamp"))
+	issues.append(_issue(MILLISECONDS, name, timestamps > MILLISECONDS_THRESHOLD, "have timestamp in milliseconds"))
+	if len(timestamps) > 1:
+		steps = np.diff(timestamps)
+		# rows following a row with larger timestamp
+		decreasing = np.concatenate(([False], steps < 0))
+		if decreasing.any():
+			if (steps <= 0).all():
+				issues.append(_issue(DESCENDING, name, decreasing, "follow a larger timestamp, rows are sorted in descending order"))
+			else:
+				issues.append(_issue(UNSORTED, name, decreasing, "follow a larger timestamp"))
+			order = np.argsort(timestamps, kind="mergesort")
+			sorted_timestamps = timestamps[order]
+			repeated = np.zeros(len(timestamps), dtype=bool)
+			repeated[order[1:]] = sorted_timestamps[1:] == sorted_timestamps[:-1]
+		else:
+			repeated = np.concatenate(([False], steps == 0))
+		issues.append(_issue(DUPLICATES, name, repeated, "repeat timestamp of another row"))
+	return issues
+
+def validate_columns(names, columns, positive_columns=None):
+	""" Checks columns of ticker data for NaN and non-positive values, timestamp units, sort order and duplicate timestamps
+
+		Args:
+			names - column names, the first column is timestamp
+			columns - NumPy arrays of the columns, timestamps first
+			positive_columns - names of value columns which must be positive. Default value is None (all value columns).
+
+		Returns:
+			ValidationReport
+	"""
+	if len(names) != len(columns) or not len(columns):
+		raise ValueError("names and columns should be non-empty and of the same length")
+	timestamps = np.asarray(columns[0])
+	if timestamps.ndim != 1 or any(len(column) != len(timestamps) for column in columns):
+		raise ValueError("columns should be one-dimensional and of the same length")
+	issues = _check_timestamps(names[0], timestamps)
+	for name, column in zip(names[1:], columns[1:]):
+		column = np.asarray(column, dtype=np.float64)
+		issues.append(_issue(NAN, name, np.isnan(column), "have no value"))
+		if positive_columns is None or name in positive_columns:
+			issues.append(_issue(NON_POSITIVE, name, column <= 0.0, "have non-positive value"))
+	return ValidationReport(len(timestamps), [issue for issue in issues if issue is not None])
+
+def require_valid(report, allowed_checks=()):
+	""" Raises ValueError listing issues of given ValidationReport, except issues of 'allowed_checks', used before entries are created without per-entry checks
+
+		Args:
+			report - ValidationReport, e.g. returned by 'validate_columns' or stored by 'ticker_cache'
+			allowed_checks - checks whose issues are tolerated, e.g. DESCENDING if rows are reversed afterwards. Default value is ().
+	"""
+	issues = [issue for issue in report.issues if issue.check not in allowed_checks]
+	if issues:
+		raise ValueError("data didn't pass validation:\n%s" % ("\n".join("  %s" % (issue.message) for issue in issues)))
+
+def get_repair_indices(timestamps, value_columns=(), drop_invalid=True, dedupe=True, keep=KEEP_LAST):
+	""" Computes which rows, in which order, form the repaired data
+
+		Args:
+			timestamps - NumPy array of timestamps
+			value_columns - NumPy arrays of value columns whose NaN or non-positive values make a row invalid
+			drop_invalid - if True, rows with NaN or non-positive timestamp or value are dropped. Default value is True.
+			dedupe - if True, a single row is kept for each timestamp. Default value is True.
+			keep - which of the rows with the same timestamp is kept, "first" or "last" (in the original order). Default value is "last".
+
+		Returns:
+			a tuple of int64 NumPy array of row indices sorted by timestamp (stable) and a list of (action, number of affected rows) pairs
+	"""
+	if keep not in (KEEP_FIRST, KEEP_LAST):
+		raise ValueError("keep should be either \"first\" or \"last\"")
+	timestamps = np.asarray(timestamps)
+	actions = list()
+	rows = np.arange(len(timestamps), dtype=np.int64)
+	if drop_invalid:
+		invalid = ~(timestamps > 0)
+		for column in value_columns:
+			invalid |= ~(np.asarray(column, dtype=np.float64) > 0.0)
+		if invalid.any():
+			actions.append(("dropped invalid rows", int(invalid.sum())))
+			rows = rows[~invalid]
+	order = np.argsort(timestamps[rows], kind="mergesort")
+	moved = int(np.count_nonzero(order != np.arange(len(order))))
+	if moved:
+		actions.append(("sorted rows", moved))
+	rows = rows[order]
+	if dedupe and len(rows) > 1:
+		sorted_timestamps = timestamps[rows]
+		# within a run of equal timestamps the stable sort keeps the original order
+		if keep == KEEP_LAST:
+			kept = np.concatenate((sorted_timestamps[1:] != sorted_timestamps[:-1], [True]))
+		else:
+			kept = np.concatenate(([True], sorted_timestamps[1:] != sorted_timestamps[:-1]))
+		if not kept.all():
+			actions.append(("removed duplicate timestamps", int(len(kept) - kept.sum())))
+			rows = rows[kept]
+	return rows, actions
+
+def rescale_timestamps(timestamps):
+	""" Converts timestamps to int64 seconds, dividing them by 1000 if their median is larger than MILLISECONDS_THRESHOLD
+
+		Returns:
+			a tuple of int64 NumPy array and a boolean telling whether timestamps were rescaled
+	"""
+	timestamps = np.asarray(timestamps)
+	if len(timestamps) and np.median(timestamps) > MILLISECONDS_THRESHOLD:
+		return np.asarray(timestamps // 1000).astype(np.int64), True
+	return timestamps.astype(np.int64), False
+
+def repair_columns(names, columns, rescale=True, drop_invalid=True, dedupe=True, keep=KEEP_LAST, positive_columns=None):
+	""" Validates columns of ticker data and repairs them: rescales timestamps to seconds, drops invalid rows, sorts rows and removes duplicates
+
+		Args:
+			names - column names, the first column is timestamp
+			columns - NumPy arrays of the columns, timestamps first
+			rescale - if True, timestamps in milliseconds are converted to seconds. Default value is True.
+			drop_invalid, dedupe, keep - see 'get_repair_indices'
+			positive_columns - names of value columns which must be positive. Default value is None (all value columns).
+
+		Returns:
+			a tuple of repaired columns (int64 timestamps followed by float64 columns, sorted in ascending order) and
+			ValidationReport of the original columns with applied repairs in its 'actions'
+	"""
+	report = validate_columns(names, columns, positive_columns)
+	timestamps = np.asarray(columns[0])
+	actions = list()
+	if rescale:
+		timestamps, rescaled = rescale_timestamps(timestamps)
+		if rescaled:
+			actions.append(("rescaled timestamps to seconds", len(timestamps)))
+	value_columns = [np.asarray(column, dtype=np.float64) for column in columns[1:]]
+	checked = [column for name, column in zip(names[1:], value_columns) if positive_columns is None or name in positive_columns]
+	rows, repair_actions = get_repair_indices(timestamps, checked, drop_invalid, dedupe, keep)
+	report.actions = actions + repair_actions
+	repaired = [np.ascontiguousarray(np.asarray(timestamps, dtype=np.int64)[rows])] + [np.ascontiguousarray(column[rows]) for column in value_columns]
+	return tuple(repaired), report
+
+def validate_series(series):
+	""" Validates columns of a LendingSeries, PriceSeries or AlignedSeries, see 'validate_columns'
+
+		Note: lending rates of AlignedSeries are NaN where they couldn't be aligned, such rows are reported as well.
+	"""
+	return validate_columns(("timestamps",) + tuple(series.columns), [series.timestamps] + [getattr(series, name) for name in series.columns])
+
+def repair_series(series, drop_invalid=True, dedupe=True, keep=KEEP_LAST):
+	""" Repairs a series, see 'repair_columns'
+
+		Returns:
+			a tuple of repaired copy of the series (of the same type) and ValidationReport of the original series
+	"""
+	report = validate_series(series)
+	timestamps, rescaled = rescale_timestamps(series.timestamps)
+	rows, actions = get_repair_indices(timestamps, [getattr(series, name) for name in series.columns], drop_invalid, dedupe, keep)
+	repaired = series[rows]
+	repaired.timestamps = timestamps[rows]
+	report.actions = ([("rescaled timestamps to seconds", len(timestamps))] if rescaled else []) + actions
+	return repaired, report
+
+def main():
+	import ticker_cache
+	for path in sys.argv[1:]:
+		ticker_cache.ensure_cached([path])
+		print("%s:\n%s" % (path, ticker_cache.get_validation_report(path).to_string()))
+
+if __name__ == "__main__":
+	main()
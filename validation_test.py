@@ -0,0 +1,86 @@
+import pytest
+import numpy as np
+import validation
+import structures
+import utils
+
+NAMES = ("timestamp", "close_price", "volume")
+
+def test_valid_columns():
+	""" Tests whether sorted, unique, positive data in seconds yields an empty report """
+	report = validation.validate_columns(NAMES, (np.array([10, 20, 30]), np.array([1.0, 2.0, 3.0]), np.array([1.0, 1.0, 1.0])))
+	assert report.is_valid() and report.num_rows == 3
+
+def test_detected_issues():
+	""" Tests whether NaN and non-positive values, milliseconds, unsorted rows and duplicates are reported with counts and first offending row """
+	timestamps = np.array([1500000000000, 1500000900000, 1500000000000, 1500001800000], dtype=np.int64)
+	report = validation.validate_columns(NAMES, (timestamps, np.array([1.0, np.nan, 2.0, 0.0]), np.array([1.0, 1.0, -1.0, 1.0])))
+	assert report.get_issues(validation.MILLISECONDS)[0].count == 4
+	unsorted = report.get_issues(validation.UNSORTED)[0]
+	assert (unsorted.count, unsorted.first_index) == (1, 2)
+	duplicates = report.get_issues(validation.DUPLICATES)[0]
+	assert (duplicates.count, duplicates.first_index) == (1, 2)
+	assert report.get_issues(validation.NAN, "close_price")[0].first_index == 1
+	assert report.get_issues(validation.NON_POSITIVE, "close_price")[0].first_index == 3
+	assert report.get_issues(validation.NON_POSITIVE, "volume")[0].first_index == 2
+	assert validation.ValidationReport.from_dict(report.to_dict()).issues == report.issues
+
+def test_descending_order():
+	""" Tests whether data stored in descending order is reported as such rather than as unsorted """
+	report = validation.validate_columns(NAMES[:2], (np.array([30, 20, 20, 10]), np.ones(4)))
+	assert report.get_issues(validation.DESCENDING)[0].count == 2
+	assert not report.get_issues(validation.UNSORTED)
+	assert report.get_issues(validation.DUPLICATES)[0].count == 1
+
+def test_repair_columns():
+	""" Tests whether repair rescales timestamps, drops invalid rows, sorts rows and keeps the last of the rows with the same timestamp """
+	timestamps = np.array([3000, 2000, 2000, 1000, 4000], dtype=np.int64) * 1000 + 1500000000000
+	close_prices = np.array([3.0, 2.0, 2.5, 1.0, np.nan])
+	columns, report = validation.repair_columns(NAMES, (timestamps, close_prices, np.ones(5)))
+	assert columns[0].tolist() == [1500001000, 1500002000, 1500003000]
+	assert columns[1].tolist() == [1.0, 2.5, 3.0]
+	assert [action for action, count in report.actions] == ["rescaled timestamps to seconds", "dropped invalid rows", "sorted rows", "removed duplicate timestamps"]
+	assert validation.validate_columns(NAMES, columns).is_valid()
+	columns = validation.repair_columns(NAMES, (timestamps, close_prices, np.ones(5)), keep=validation.KEEP_FIRST)[0]
+	assert columns[1].tolist() == [1.0, 2.0, 3.0]
+
+def test_repair_series():
+	""" Tests whether a repaired series keeps its type and ticker """
+	series = structures.PriceSeries("LTC", [30, 10, 10, 20], [3.0, 1.0, 1.5, 2.0], [1.0, 1.0, 1.0, 1.0])
+	repaired, report = validation.repair_series(series)
+	assert isinstance(repaired, structures.PriceSeries) and repaired.ticker == "LTC"
+	assert repaired.timestamps.tolist() == [10, 20, 30]
+	assert repaired.close_prices.tolist() == [1.5, 2.0, 3.0]
+	assert not report.is_valid() and validation.validate_series(repaired).is_valid()
+
+def test_validated_entries_skip_checks():
+	""" Tests whether entries created from validated data equal checked entries and skip the checks """
+	columns = (np.array([10, 20]), np.array([1.5, 2.5]), np.array([3.0, 4.0]))
+	checked = utils.df_rows_to_interest_entries("LTC", columns, 1, 2)
+	trusted = utils.df_rows_to_interest_entries("LTC", columns, 1, 2, validated=True)
+	assert all(a.is_equal(b) and a.close_price == b.close_price and a.volume == b.volume for a, b in zip(checked, trusted))
+	# a negative lending rate would be rejected by the setter
+	entry = structures.LendingTickerEntry.from_validated("BTC", 10, -1.0)
+	assert entry.lending_rate == -1.0
+	with pytest.raises(Exception):
+		structures.LendingTickerEntry("BTC", 10, -1.0)
+	lending = structures.LendingSeries("BTC", [10, 20], [1.0, 2.0]).to_entries(validated=True)
+	assert [entry.lending_rate for entry in lending] == [1.0, 2.0]
+
+def test_validated_entries_refuse_invalid_data():
+	""" Tests whether validated loaders refuse data with NaN, non-positive values or duplicate timestamps instead of skipping the checks, while descending rows are reversed """
+	for columns in ((np.array([10, 20]), np.array([np.nan, 2.5]), np.array([3.0, 4.0])),
+			(np.array([10, 20]), np.array([1.5, 2.5]), np.array([3.0, -4.0])),
+			(np.array([10, 10]), np.array([1.5, 2.5]), np.array([3.0, 4.0]))):
+		with pytest.raises(ValueError):
+			utils.df_rows_to_interest_entries("LTC", columns, 1, 2, validated=True)
+	with pytest.raises(ValueError):
+		utils.df_rows_to_lending_entries("BTC", [(10, 1.0), (20, 0.0)], 1, validated=True)
+	lending = utils.df_rows_to_lending_entries("BTC", [(20, 2.0), (10, 1.0)], 1, validated=True)
+	assert [entry.timestamp for entry in lending] == [10, 20]
+	with pytest.raises(ValueError):
+		structures.LendingSeries("BTC", [10, 20], [1.0, np.nan]).to_entries(validated=True)
+	report = validation.validate_columns(("timestamp", "lending_rate"), (np.array([10, 10]), np.array([1.0, 2.0])))
+	with pytest.raises(ValueError):
+		validation.require_valid(report)
+	validation.require_valid(report, (validation.DUPLICATES,))
@@ -0,0 +1,284 @@
+import argparse
+import itertools
+import collections
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+import ticker_cache
+import backtest
+import lr_growing_altcoin as analysis
+from sweep import parse_duration
+from structures import *
+
+'''
+Walk-forward evaluation of the analysis: history is split into rolling folds of a train window followed by a test window.
+Parameters (duration of lending intervals, minimum number of tickers within interest interval and close strategy) are chosen on the train window
+of each fold by the average return of deals made during "growing" InterestInterval instances, and the chosen parameters are scored on the test window,
+so every reported test result is out of sample.
+
+Lending intervals of fixed duration don't depend on the window they are looked at from, as long as they are aligned to the same grid.
+Lending rates of the whole history are therefore bucketed once per duration, interest intervals are discovered once per duration and minimum
+number of tickers and deal times are computed once per close strategy, all before folds start. A fold only selects deals whose whole lending
+interval lies within its windows, so work which overlapping folds have in common is done once. Interest intervals are detected against the average
+of their lending interval, so a lending interval straddling the end of a train window would let the train window see test data, its deals are left out.
+Changepoints depend on all entries of the segmented series, so with "changepoints" duration each window is segmented on its own
+(segmenting the whole history would let train windows see the future), these results are reused by all candidates of a fold.
+
+Folds are spread across a process pool. Data files are ingested into the binary cache (see 'ticker_cache') before the pool starts, so workers
+memory-map the same read-only price series, and deal tables are handed to each worker once when it starts.
+'''
+
+Fold = collections.namedtuple("Fold", ["fold", "train_start", "train_end", "test_start", "test_end"])
+DealTable = collections.namedtuple("DealTable", ["bucket_starts", "bucket_ends", "interval_starts", "interval_ends", "enter_times", "close_times"])
+
+"""
+Constants
+"""
+DAY = 24*60*60
+DEFAULT_DURATIONS = [5 * DAY, analysis.TEN_DAYS]
+DEFAULT_MIN_NUM_TICKERS = [5, 10, 20]
+# minimum number of deals within the train window for parameters to be chosen
+DEFAULT_MIN_TRADES = 5
+RESULT_COLUMNS = list(Fold._fields) + [
+	"duration", "min_num_tickers", "close_strategy",
+	"train_num_trades", "train_avg_return", "test_num_trades", "test_hit_rate", "test_avg_return", "error"]
+
+# shared state of the current worker process, set up by '_init_worker'
+_worker_state = dict()
+
+
+def make_folds(period_start, period_end, train_length, test_length, step=None):
+	""" Splits a period into rolling folds: a train window directly followed by a test window, both moved forward by 'step' from one fold to the next
+
+		Args:
+			period_start - start of the period
+			period_end - end of the period
+			train_length - length of train windows, in seconds
+			test_length - length of test windows, in seconds
+			step - distance between starts of consecutive folds, in seconds. Default value is None (test windows don't overlap).
+
+		Returns:
+			a list of Fold instances, test windows of which end no later than 'period_end'
+	"""
+	step = test_length if step is None else step
+	if train_length <= 0 or test_length <= 0 or step <= 0:
+		raise ValueError("lengths of windows and step must be positive")
+	folds = list()
+	train_start = period_start
+	while train_start + train_length + test_length <= period_end:
+		folds.append(Fold(len(folds), train_start, train_start + train_length, train_start + train_length, train_start + train_length + test_length))
+		train_start += step
+	return folds
+
+def get_strategy_name(strategy_pair):
+	""" Returns name of the close strategy of a (EnterDealStrategy subclass, CloseDealStrategy subclass, parameters) tuple together with its parameters """
+	parameters = strategy_pair[2] if len(strategy_pair) > 2 else dict()
+	if not parameters:
+		return strategy_pair[1].__name__
+	return "%s(%s)" % (strategy_pair[1].__name__, ", ".join("%s=%s" % (name, parameters[name]) for name in sorted(parameters)))
+
+def get_deal_tables(interest_intervals, lending_intervals, strategy_pairs):
+	""" Computes deals of all InterestInterval instances for each strategy pair, the intervals are batched once for all strategies
+
+		Args:
+			interest_intervals - list of InterestInterval instances
+			lending_intervals - list of LendingInterval instances the interest intervals were discovered in, sorted by start date
+			strategy_pairs - list of (EnterDealStrategy subclass, CloseDealStrategy subclass, parameters) tuples
+
+		Returns:
+			a list of DealTable instances, one per strategy pair, deals are ordered by start of their interval
+	"""
+	intervals = sorted(interest_intervals, key=lambda interval: interval.start_date)
+	batch = IntervalBatch(intervals)
+	interval_starts = np.array([interval.start_date for interval in intervals], dtype=np.int64)
+	interval_ends = np.array([interval.end_date for interval in intervals], dtype=np.int64)
+	# an interest interval never ends at the last entry of its lending interval, so it belongs to the last lending interval starting at or before it
+	lending_starts = np.array([interval.start_date for interval in lending_intervals], dtype=np.int64)
+	lending_ends = np.array([interval.end_date for interval in lending_intervals], dtype=np.int64)
+	buckets = np.searchsorted(lending_starts, interval_starts, side="right") - 1
+	bucket_starts, bucket_ends = lending_starts[buckets], lending_ends[buckets]
+	tables = list()
+	for pair in strategy_pairs:
+		parameters = pair[2] if len(pair) > 2 else dict()
+		enter_times, close_times = backtest.get_deal_times(batch, pair[0], pair[1], parameters)
+		tables.append(DealTable(bucket_starts, bucket_ends, interval_starts, interval_ends, enter_times, close_times))
+	return tables
+
+def select_deals(table, window_start, window_end):
+	""" Returns DealTable with deals of lending intervals lying within given window (both ends inclusive), their interest intervals were detected only from data of the window """
+	mask = (table.bucket_starts >= window_start) & (table.bucket_ends <= window_end)
+	return DealTable(*[column[mask] for column in table])
+
+def get_history_deals(lending_series, durations, min_num_tickers, strategy_pairs):
+	""" Computes deals over the whole history for every fixed duration, minimum number of tickers and strategy pair
+
+		Lending rates are bucketed once per duration and interest intervals are discovered once per duration and minimum number of tickers.
+		Durations given as "changepoints" are skipped, see 'get_window_deals'.
+
+		Returns:
+			a dictionary mapping (duration, min_num_tickers, index of strategy pair) to DealTable
+	"""
+	deals = dict()
+	for duration in durations:
+		if duration == analysis.CHANGEPOINTS:
+			continue
+		lending_intervals = analysis.generate_lending_intervals(duration, lending_series)
+		for min_num in min_num_tickers:
+			growing = analysis.get_interest_intervals(lending_intervals, min_num)[0]
+			for pair_idx, table in enumerate(get_deal_tables(growing, lending_intervals, strategy_pairs)):
+				deals[(duration, min_num, pair_idx)] = table
+	return deals
+
+def get_window_deals(window_start, window_end, min_num, pair_idx):
+	""" Computes deals of a window segmented at changepoints of lending rate within current worker process
+
+		The window is segmented once and its interest intervals are discovered once per minimum number of tickers, results are kept for
+		other candidates of the fold. A window too short to be segmented has no deals.
+	"""
+	memo = _worker_state["windows"]
+	if (window_start, window_end) not in memo:
+		try:
+			lending_series = analysis.load_lending_series(window_start, window_end, _worker_state["lending"])
+			memo[(window_start, window_end)] = analysis.get_lending_intervals(analysis.CHANGEPOINTS, lending_series)
+		except ValueError:
+			memo[(window_start, window_end)] = list()
+	key = (window_start, window_end, min_num)
+	if key not in memo:
+		growing = analysis.get_interest_intervals(memo[(window_start, window_end)], min_num)[0] if memo[(window_start, window_end)] else list()
+		memo[key] = get_deal_tables(growing, memo[(window_start, window_end)], _worker_state["strategy_pairs"])
+	return memo[key][pair_idx]
+
+def _init_worker(deals, lending_path, target_paths, strategy_pairs, fee=0.0, min_trades=DEFAULT_MIN_TRADES):
+	_worker_state["deals"] = deals
+	_worker_state["lending"] = lending_path
+	_worker_state["targets"] = target_paths
+	_worker_state["strategy_pairs"] = strategy_pairs
+	_worker_state["fee"] = fee
+	_worker_state["min_trades"] = min_trades
+	_worker_state["windows"] = dict()
+
+def get_returns(table, price_series, fee=0.0):
+	""" Returns NumPy array with returns of deals of a DealTable against prices of every target currency, deals without prices are left out """
+	returns = list()
+	for series in price_series:
+		enter_prices, exit_prices = backtest.get_deal_prices(table.enter_times, table.close_times, series)
+		returns.append(exit_prices * (1.0 - fee) / (enter_prices * (1.0 + fee)) - 1.0)
+	returns = np.concatenate(returns) if returns else np.empty(0)
+	return returns[~np.isnan(returns)]
+
+def run_fold(fold, candidates):
+	""" Chooses parameters on the train window of a fold and scores them on its test window, within current worker process
+
+		Args:
+			fold - Fold instance
+			candidates - list of (duration, min_num_tickers, index of strategy pair) tuples, in order of preference when their train returns are equal
+
+		Returns:
+			a dictionary with the fold, chosen parameters and their results, see RESULT_COLUMNS
+	"""
+	row = dict(fold._asdict())
+	row.update(duration=None, min_num_tickers=None, close_strategy=None, train_num_trades=0, train_avg_return=float("nan"),
+		test_num_trades=0, test_hit_rate=float("nan"), test_avg_return=float("nan"), error=None)
+	price_series = list()
+	for ticker, path in sorted(_worker_state["targets"].items()):
+		try:
+			price_series.append(analysis.load_price_series(ticker, fold.train_start, fold.test_end, path))
+		except ValueError:
+			# target currency without prices within the fold
+			continue
+
+	def get_deals(candidate, window_start, window_end):
+		duration, min_num, pair_idx = candidate
+		if duration == analysis.CHANGEPOINTS:
+			return get_window_deals(window_start, window_end, min_num, pair_idx)
+		return select_deals(_worker_state["deals"][candidate], window_start, window_end)
+
+	best = None
+	for candidate in candidates:
+		returns = get_returns(get_deals(candidate, fold.train_start, fold.train_end), price_series, _worker_state["fee"])
+		if len(returns) < _worker_state["min_trades"]:
+			continue
+		if best is None or returns.mean() > best[1].mean():
+			best = (candidate, returns)
+	if best is None:
+		row["error"] = "no parameters with at least %d deals within train window" % (_worker_state["min_trades"])
+		return row
+	candidate, train_returns = best
+	test_returns = get_returns(get_deals(candidate, fold.test_start, fold.test_end), price_series, _worker_state["fee"])
+	row.update(duration=candidate[0], min_num_tickers=candidate[1], close_strategy=get_strategy_name(_worker_state["strategy_pairs"][candidate[2]]),
+		train_num_trades=len(train_returns), train_avg_return=float(train_returns.mean()), test_num_trades=len(test_returns))
+	if len(test_returns):
+		row.update(test_hit_rate=float(np.mean(test_returns > 0.0)), test_avg_return=float(test_returns.mean()))
+	return row
+
+def get_out_of_sample_return(results):
+	""" Returns average return of all test deals of walk-forward results, NaN if there are none """
+	num_trades = results["test_num_trades"].sum()
+	if not num_trades:
+		return float("nan")
+	traded = results[results["test_num_trades"] > 0]
+	return float((traded["test_avg_return"] * traded["test_num_trades"]).sum() / num_trades)
+
+def run_walk_forward(folds, durations=DEFAULT_DURATIONS, min_num_tickers=DEFAULT_MIN_NUM_TICKERS, strategy_pairs=backtest.DEFAULT_STRATEGY_PAIRS,
+		tickers=None, data_dir=analysis.DATA_DIR, lending_path=analysis.BTC_LENDING_DATA, fee=0.0, min_trades=DEFAULT_MIN_TRADES, max_workers=None):
+	""" Runs walk-forward evaluation of given folds, folds are evaluated in parallel
+
+		Args:
+			folds - list of Fold instances, see 'make_folds'
+			durations - candidate durations of lending intervals, in seconds, or "changepoints". Default value is DEFAULT_DURATIONS.
+			min_num_tickers - candidate values of minimum number of entries within InterestInterval. Default value is DEFAULT_MIN_NUM_TICKERS.
+			strategy_pairs - candidate (EnterDealStrategy subclass, CloseDealStrategy subclass, parameters) tuples. Default value is backtest.DEFAULT_STRATEGY_PAIRS.
+			tickers - target currency tickers. Default value is None (all tickers with price data in 'data_dir').
+			data_dir - directory containing price data files of target currencies
+			lending_path - path to BTC lending rates file
+			fee - fraction of deal value paid when entering and again when closing a deal. Default value is 0.0.
+			min_trades - minimum number of deals within the train window for parameters to be chosen. Default value is DEFAULT_MIN_TRADES.
+			max_workers - number of worker processes, 0 runs folds in the current process. Default value is None (number of CPUs).
+
+		Returns:
+			Pandas dataframe with a row per fold, see RESULT_COLUMNS
+	"""
+	if not 0.0 <= fee < 1.0: raise ValueError("fee should be in range [0.0, 1.0)")
+	if not folds:
+		return pd.DataFrame(columns=RESULT_COLUMNS)
+	tickers = tickers or analysis.get_target_tickers(data_dir)
+	target_paths = dict((ticker, analysis.get_target_data_path(ticker, data_dir)) for ticker in tickers)
+	# ingest data files once, workers then only memory-map the binary cache
+	ticker_cache.ensure_cached([lending_path] + list(target_paths.values()))
+	# intervals of fixed duration are aligned to the start of the history, so that all folds share them
+	lending_series = analysis.load_lending_series(min(fold.train_start for fold in folds), max(fold.test_end for fold in folds), lending_path)
+	deals = get_history_deals(lending_series, durations, min_num_tickers, strategy_pairs)
+	candidates = list(itertools.product(durations, min_num_tickers, range(len(strategy_pairs))))
+	initargs = (deals, lending_path, target_paths, list(strategy_pairs), fee, min_trades)
+	if max_workers == 0:
+		_init_worker(*initargs)
+		rows = [run_fold(fold, candidates) for fold in folds]
+	else:
+		with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=initargs) as executor:
+			rows = list(executor.map(run_fold, folds, itertools.repeat(candidates)))
+	return pd.DataFrame(rows, columns=RESULT_COLUMNS)
+
+def main():
+	parser = argparse.ArgumentParser(description="Walk-forward evaluation of parameters chosen on rolling train windows of BTC lending rates and scored on the following test windows")
+	parser.add_argument("--period", type=float, nargs=2, default=(1480530600.0, 1507062600.0), help="period start and end")
+	parser.add_argument("--train-days", type=float, default=90.0, help="length of train windows, in days")
+	parser.add_argument("--test-days", type=float, default=30.0, help="length of test windows, in days")
+	parser.add_argument("--step-days", type=float, help="distance between starts of consecutive folds, in days, length of test windows by default")
+	parser.add_argument("--durations", type=parse_duration, nargs="+", default=DEFAULT_DURATIONS, help="candidate durations of lending intervals, in seconds, or \"changepoints\"")
+	parser.add_argument("--min-num-tickers", type=int, nargs="+", default=DEFAULT_MIN_NUM_TICKERS, help="candidate minimum numbers of entries within interest interval")
+	parser.add_argument("--tickers", nargs="+", help="target currency tickers, all tickers in data directory by default")
+	parser.add_argument("--fee", type=float, default=0.0, help="fraction of deal value paid on enter and on close")
+	parser.add_argument("--min-trades", type=int, default=DEFAULT_MIN_TRADES, help="minimum number of deals within train window for parameters to be chosen")
+	parser.add_argument("--workers", type=int, help="number of worker processes")
+	parser.add_argument("--output", help=".csv file to write the results table to")
+	args = parser.parse_args()
+	step = args.step_days * DAY if args.step_days else None
+	folds = make_folds(args.period[0], args.period[1], args.train_days * DAY, args.test_days * DAY, step)
+	results = run_walk_forward(folds, args.durations, args.min_num_tickers, tickers=args.tickers, fee=args.fee, min_trades=args.min_trades, max_workers=args.workers)
+	if args.output:
+		results.to_csv(args.output, index=False)
+	print(results.to_string())
+	print("out-of-sample average return: %f over %d deals" % (get_out_of_sample_return(results), results["test_num_trades"].sum()))
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,75 @@
+import math
+import pytest
+import numpy as np
+import backtest
+import walkforward
+import sample_data
+import lr_growing_altcoin as analysis
+
+def write_sample_data(data_dir):
+	""" Writes BTC lending rates file with a sine-shaped lending rate and LTC and ETH price files into 'data_dir' and returns path to lending rates file """
+	timestamps = sample_data.get_timestamps(24 * 120)
+	hours = np.arange(len(timestamps))
+	price_timestamps = sample_data.get_timestamps(4 * 24 * 120, step=900)
+	quarters = np.arange(len(price_timestamps))
+	prices = dict((ticker, (price_timestamps, 100.0 + slope * quarters / 100.0 + np.sin(quarters / 7.0))) for ticker, slope in (("LTC", 1.0), ("ETH", -0.5)))
+	return sample_data.write_data_files(data_dir, timestamps, 10.0 + 5.0 * np.sin(hours / 10.0) + 2.0 * np.sin(hours / 37.0), prices)
+
+def test_make_folds():
+	""" Tests whether folds are made of a train window directly followed by a test window and stay within the period """
+	folds = walkforward.make_folds(0, 100, 40, 20)
+	assert [(fold.train_start, fold.train_end, fold.test_start, fold.test_end) for fold in folds] == [(0, 40, 40, 60), (20, 60, 60, 80), (40, 80, 80, 100)]
+	assert len(walkforward.make_folds(0, 100, 40, 20, step=30)) == 2
+	assert walkforward.make_folds(0, 50, 40, 20) == []
+	with pytest.raises(ValueError):
+		walkforward.make_folds(0, 100, 40, 0)
+
+def test_history_deals_match_window(tmp_path):
+	""" Tests whether deals of a window selected from deals of the whole history equal deals computed on the window alone, if the window is aligned to the intervals """
+	lending_path = write_sample_data(tmp_path)
+	duration = 86400 * 5
+	history = analysis.load_lending_series(1500000000, 1500000000 + 86400 * 120, lending_path)
+	deals = walkforward.get_history_deals(history, [duration, analysis.CHANGEPOINTS], [5], backtest.DEFAULT_STRATEGY_PAIRS)
+	assert sorted(deals) == [(duration, 5, pair_idx) for pair_idx in range(len(backtest.DEFAULT_STRATEGY_PAIRS))]
+	window_start, window_end = 1500000000 + duration * 4, 1500000000 + duration * 10
+	window = analysis.load_lending_series(window_start, window_end, lending_path)
+	lending_intervals = analysis.generate_lending_intervals(duration, window)
+	growing = analysis.get_interest_intervals(lending_intervals, 5)[0]
+	expected = walkforward.get_deal_tables(growing, lending_intervals, backtest.DEFAULT_STRATEGY_PAIRS)
+	for pair_idx in range(len(backtest.DEFAULT_STRATEGY_PAIRS)):
+		selected = walkforward.select_deals(deals[(duration, 5, pair_idx)], window_start, window_end)
+		assert len(selected.enter_times) > 0
+		for column, expected_column in zip(selected, expected[pair_idx]):
+			assert np.array_equal(column, expected_column)
+
+def test_select_deals_straddling_bucket(tmp_path):
+	""" Tests whether deals of a lending interval straddling the end of a train window are left out even if their interest interval ends within the window """
+	lending_path = write_sample_data(tmp_path)
+	duration = 86400 * 5
+	history = analysis.load_lending_series(1500000000, 1500000000 + 86400 * 120, lending_path)
+	table = walkforward.get_history_deals(history, [duration], [5], backtest.DEFAULT_STRATEGY_PAIRS)[(duration, 5, 0)]
+	# the 5th lending interval straddles the end of the train window, one of its interest intervals ends before it
+	train_end = 1500000000 + duration * 4 + 86400 * 3
+	straddling = (table.bucket_starts < train_end) & (table.bucket_ends > train_end) & (table.interval_ends <= train_end)
+	assert straddling.any()
+	selected = walkforward.select_deals(table, 1500000000, train_end)
+	assert (selected.bucket_ends <= train_end).all()
+	aligned = walkforward.select_deals(table, 1500000000, 1500000000 + duration * 4)
+	for column, aligned_column in zip(selected, aligned):
+		assert np.array_equal(column, aligned_column)
+
+def test_run_walk_forward(tmp_path):
+	""" Tests whether parameters are chosen and scored for every fold and whether results don't depend on the number of workers """
+	lending_path = write_sample_data(tmp_path)
+	folds = walkforward.make_folds(1500000000, 1500000000 + 86400 * 120, 86400 * 40, 86400 * 20)
+	durations = [86400 * 2, 86400 * 5, analysis.CHANGEPOINTS]
+	results = walkforward.run_walk_forward(folds, durations, [5, 10], tickers=["LTC", "ETH"], data_dir=str(tmp_path), lending_path=lending_path, min_trades=2, max_workers=0)
+	assert list(results["fold"]) == [0, 1, 2, 3]
+	assert all(results["error"].isnull())
+	assert all(results["duration"].isin(durations)) and all(results["min_num_tickers"].isin([5, 10]))
+	assert all(results["train_num_trades"] >= 2) and all(results["test_num_trades"] > 0)
+	assert not math.isnan(walkforward.get_out_of_sample_return(results))
+	parallel = walkforward.run_walk_forward(folds, durations, [5, 10], tickers=["LTC", "ETH"], data_dir=str(tmp_path), lending_path=lending_path, min_trades=2, max_workers=2)
+	assert parallel.equals(results)
+	strict = walkforward.run_walk_forward(folds[:1], durations, [5, 10], tickers=["LTC"], data_dir=str(tmp_path), lending_path=lending_path, min_trades=10000, max_workers=0)
+	assert strict["error"].notnull().all() and strict["test_num_trades"].tolist() == [0]